@@ -0,0 +1,30 @@
+"""Add compression filter columns to aires_acondicionados
+
+Revision ID: 0b6e4d9f7a25
+Revises: f3c8a2d6b490
+Create Date: 2026-10-19 14:41:07.902316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b6e4d9f7a25'
+down_revision: Union[str, None] = 'f3c8a2d6b490'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('aires_acondicionados', sa.Column('compresion_tolerancia_temp', sa.Float(), nullable=True, comment='Variación de temperatura (°C) por debajo de la cual se descarta una lectura'))
+    op.add_column('aires_acondicionados', sa.Column('compresion_tolerancia_hum', sa.Float(), nullable=True, comment='Variación de humedad (%) por debajo de la cual se descarta una lectura'))
+    op.add_column('aires_acondicionados', sa.Column('compresion_max_intervalo', sa.Integer(), nullable=True, comment='Segundos máximos sin guardar una lectura (latido)'))
+
+
+def downgrade() -> None:
+    op.drop_column('aires_acondicionados', 'compresion_max_intervalo')
+    op.drop_column('aires_acondicionados', 'compresion_tolerancia_hum')
+    op.drop_column('aires_acondicionados', 'compresion_tolerancia_temp')
@@ -0,0 +1,38 @@
+"""Add sketches_lecturas table
+
+Revision ID: 4b8e2f1c9a07
+Revises: cb0a7519e904
+Create Date: 2026-10-19 09:12:40.381122
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8e2f1c9a07'
+down_revision: Union[str, None] = 'cb0a7519e904'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('sketches_lecturas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('aire_id', sa.Integer(), nullable=False),
+    sa.Column('hora', sa.DateTime(), nullable=False, comment='Inicio de la hora que resume el sketch'),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('sketch_temperatura', sa.LargeBinary(), nullable=False),
+    sa.Column('sketch_humedad', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['aire_id'], ['aires_acondicionados.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('aire_id', 'hora', name='uq_sketches_lecturas_aire_hora')
+    )
+    # Los sketches de las lecturas existentes los genera DataManager.poblar_resumenes_si_necesario()
+    # en segundo plano al arrancar
+
+
+def downgrade() -> None:
+    op.drop_table('sketches_lecturas')
@@ -0,0 +1,58 @@
+"""Add declarative alert rules and their alerts
+
+Revision ID: 5e9b2f7c1a08
+Revises: c61f9a3e2d84
+Create Date: 2026-10-19 20:41:03.518207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9b2f7c1a08'
+down_revision: Union[str, None] = 'c61f9a3e2d84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('reglas_alerta',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nombre', sa.String(length=100), nullable=False),
+    sa.Column('tipo', sa.String(length=20), nullable=False, comment='cambio, sostenido o sin_lecturas'),
+    sa.Column('variable', sa.String(length=20), nullable=True, comment='temperatura o humedad (no aplica a sin_lecturas)'),
+    sa.Column('operador', sa.String(length=2), nullable=True, comment="'>' (sube / por encima) o '<' (baja / por debajo)"),
+    sa.Column('valor', sa.Float(), nullable=True, comment='Cambio máximo (cambio) o límite (sostenido)'),
+    sa.Column('ventana_minutos', sa.Float(), nullable=False),
+    sa.Column('es_global', sa.Boolean(), nullable=True),
+    sa.Column('aire_id', sa.Integer(), nullable=True),
+    sa.Column('activa', sa.Boolean(), nullable=True),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=False),
+    sa.Column('ultima_modificacion', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['aire_id'], ['aires_acondicionados.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('alertas_reglas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('regla_id', sa.Integer(), nullable=False),
+    sa.Column('aire_id', sa.Integer(), nullable=False),
+    sa.Column('fecha', sa.DateTime(), nullable=False, comment='Lectura que disparó la alerta (sin_lecturas: la última recibida)'),
+    sa.Column('valor', sa.Float(), nullable=True, comment='Valor de la lectura (sin_lecturas: minutos sin lecturas)'),
+    sa.Column('mensaje', sa.String(length=255), nullable=False),
+    sa.Column('fecha_registro', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['aire_id'], ['aires_acondicionados.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['regla_id'], ['reglas_alerta.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alertas_reglas_regla_id'), 'alertas_reglas', ['regla_id'], unique=False)
+    op.create_index('ix_alertas_reglas_aire_fecha', 'alertas_reglas', ['aire_id', 'fecha'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_alertas_reglas_aire_fecha', table_name='alertas_reglas')
+    op.drop_index(op.f('ix_alertas_reglas_regla_id'), table_name='alertas_reglas')
+    op.drop_table('alertas_reglas')
+    op.drop_table('reglas_alerta')
@@ -0,0 +1,36 @@
+"""Add eventos_cambios table
+
+Revision ID: 7c3d91e5b2a4
+Revises: 4b8e2f1c9a07
+Create Date: 2026-10-19 10:04:17.552930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3d91e5b2a4'
+down_revision: Union[str, None] = '4b8e2f1c9a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('eventos_cambios',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tabla', sa.String(length=100), nullable=False),
+    sa.Column('aire_id', sa.Integer(), nullable=True),
+    sa.Column('entidad_id', sa.Integer(), nullable=True),
+    sa.Column('origen', sa.String(length=50), nullable=False, comment='Proceso que realizó el cambio'),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_eventos_cambios_fecha'), 'eventos_cambios', ['fecha'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_eventos_cambios_fecha'), table_name='eventos_cambios')
+    op.drop_table('eventos_cambios')
@@ -0,0 +1,31 @@
+"""Compact lecturas storage: REAL values and BRIN index on fecha
+
+Revision ID: 8d1f5c2e7b63
+Revises: 0b6e4d9f7a25
+Create Date: 2026-10-19 15:20:33.145870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d1f5c2e7b63'
+down_revision: Union[str, None] = '0b6e4d9f7a25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # double precision -> real: 8 bytes menos por fila. Reescribe la tabla con bloqueo
+    # exclusivo (una sola vez para ambas columnas): ejecutar en una ventana de mantenimiento.
+    op.execute("ALTER TABLE lecturas ALTER COLUMN temperatura TYPE real, ALTER COLUMN humedad TYPE real")
+    op.create_index('ix_lecturas_fecha_brin', 'lecturas', ['fecha'], unique=False, postgresql_using='brin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_lecturas_fecha_brin', table_name='lecturas', postgresql_using='brin')
+    op.alter_column('lecturas', 'humedad', existing_type=sa.REAL(), type_=sa.Float(), existing_nullable=False)
+    op.alter_column('lecturas', 'temperatura', existing_type=sa.REAL(), type_=sa.Float(), existing_nullable=False)
@@ -0,0 +1,37 @@
+"""Add unique constraint on alertas_reglas (regla_id, aire_id, fecha)
+
+Revision ID: 9f2a6c4e8b17
+Revises: 5e9b2f7c1a08
+Create Date: 2026-10-19 18:40:12.517903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f2a6c4e8b17'
+down_revision: Union[str, None] = '5e9b2f7c1a08'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Alertas repetidas por varios workers evaluando a la vez: se conserva la de menor ID
+    op.get_bind().execute(sa.text(
+        "DELETE FROM alertas_reglas WHERE id IN ("
+        " SELECT id FROM ("
+        "  SELECT id, row_number() OVER (PARTITION BY regla_id, aire_id, fecha ORDER BY id) AS n FROM alertas_reglas"
+        " ) numeradas WHERE n > 1"
+        ")"
+    ))
+    op.create_unique_constraint('uq_alertas_reglas_regla_aire_fecha', 'alertas_reglas', ['regla_id', 'aire_id', 'fecha'])
+    # Cubierto por la restricción, que empieza por regla_id
+    op.drop_index('ix_alertas_reglas_regla_id', table_name='alertas_reglas')
+
+
+def downgrade() -> None:
+    op.create_index('ix_alertas_reglas_regla_id', 'alertas_reglas', ['regla_id'], unique=False)
+    op.drop_constraint('uq_alertas_reglas_regla_aire_fecha', 'alertas_reglas', type_='unique')
@@ -0,0 +1,43 @@
+"""Add piramide_lecturas table
+
+Revision ID: a4e7b1c9d350
+Revises: 8d1f5c2e7b63
+Create Date: 2026-10-19 16:02:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e7b1c9d350'
+down_revision: Union[str, None] = '8d1f5c2e7b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('piramide_lecturas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('aire_id', sa.Integer(), nullable=False),
+    sa.Column('nivel', sa.Integer(), nullable=False, comment='Bloques de RESOLUCION_BASE * 2**nivel segundos'),
+    sa.Column('inicio', sa.DateTime(), nullable=False, comment='Inicio del bloque'),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('temp_suma', sa.Float(), nullable=False),
+    sa.Column('temp_min', sa.Float(), nullable=False),
+    sa.Column('temp_max', sa.Float(), nullable=False),
+    sa.Column('hum_suma', sa.Float(), nullable=False),
+    sa.Column('hum_min', sa.Float(), nullable=False),
+    sa.Column('hum_max', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['aire_id'], ['aires_acondicionados.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('aire_id', 'nivel', 'inicio', name='uq_piramide_lecturas_aire_nivel_inicio')
+    )
+    # La pirámide de las lecturas existentes la genera DataManager.poblar_resumenes_si_necesario()
+    # en segundo plano al arrancar
+
+
+def downgrade() -> None:
+    op.drop_table('piramide_lecturas')
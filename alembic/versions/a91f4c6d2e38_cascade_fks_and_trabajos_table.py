@@ -0,0 +1,63 @@
+"""Add ON DELETE CASCADE to aire/equipo foreign keys and trabajos table
+
+Revision ID: a91f4c6d2e38
+Revises: 7c3d91e5b2a4
+Create Date: 2026-10-19 11:20:05.918264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91f4c6d2e38'
+down_revision: Union[str, None] = '7c3d91e5b2a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (tabla, columna, tabla referida)
+CLAVES_FORANEAS = [
+    ('lecturas', 'aire_id', 'aires_acondicionados'),
+    ('mantenimientos', 'aire_id', 'aires_acondicionados'),
+    ('mantenimientos', 'otro_equipo_id', 'otros_equipos'),
+    ('umbrales_configuracion', 'aire_id', 'aires_acondicionados'),
+]
+
+
+def _recrear_claves(ondelete):
+    # Los nombres de las restricciones se leen de la base: no tienen por qué ser los de PostgreSQL por defecto
+    inspector = sa.inspect(op.get_bind())
+    for tabla, columna, referida in CLAVES_FORANEAS:
+        nombres = [
+            fk['name'] for fk in inspector.get_foreign_keys(tabla)
+            if fk['constrained_columns'] == [columna] and fk['referred_table'] == referida and fk['name']
+        ]
+        for nombre in nombres:
+            op.drop_constraint(nombre, tabla, type_='foreignkey')
+        nombre = nombres[0] if nombres else f'{tabla}_{columna}_fkey'
+        op.create_foreign_key(nombre, tabla, referida, [columna], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    _recrear_claves('CASCADE')
+    op.create_table('trabajos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=50), nullable=False),
+    sa.Column('estado', sa.String(length=20), nullable=False, comment='pendiente, en_curso, completado o error'),
+    sa.Column('parametros', sa.Text(), nullable=True, comment='JSON con los argumentos del trabajo'),
+    sa.Column('progreso', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('mensaje', sa.Text(), nullable=True),
+    sa.Column('resultado', sa.Text(), nullable=True, comment='JSON con el resultado al terminar'),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=False),
+    sa.Column('fecha_inicio', sa.DateTime(), nullable=True),
+    sa.Column('fecha_fin', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('trabajos')
+    _recrear_claves(None)
@@ -0,0 +1,27 @@
+"""Add ultima_fecha to estado_detector_anomalias
+
+Revision ID: b3e8d5a1f604
+Revises: 9f2a6c4e8b17
+Create Date: 2026-10-19 19:05:38.406215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e8d5a1f604'
+down_revision: Union[str, None] = '9f2a6c4e8b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('estado_detector_anomalias', sa.Column('ultima_fecha', sa.Float(), nullable=True, comment='Última fecha evaluada (segundos): un checkpoint no pisa un estado más nuevo'))
+    op.execute("UPDATE estado_detector_anomalias SET ultima_fecha = CAST(CAST(estado AS json) ->> 'ultima_fecha' AS double precision)")
+
+
+def downgrade() -> None:
+    op.drop_column('estado_detector_anomalias', 'ultima_fecha')
@@ -0,0 +1,50 @@
+"""Add online anomaly detection tables and lecturas.anomalia flag
+
+Revision ID: c61f9a3e2d84
+Revises: a4e7b1c9d350
+Create Date: 2026-10-19 18:27:15.094412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c61f9a3e2d84'
+down_revision: Union[str, None] = 'a4e7b1c9d350'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Con un DEFAULT constante PostgreSQL agrega la columna sin reescribir la tabla
+    op.add_column('lecturas', sa.Column('anomalia', sa.Boolean(), server_default=sa.false(), nullable=False, comment='El detector en línea encontró un pico o el inicio de una deriva (ver anomalias.py)'))
+    op.create_table('anomalias_lecturas',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('aire_id', sa.Integer(), nullable=False),
+    sa.Column('fecha', sa.DateTime(), nullable=False, comment='Fecha de la lectura anómala'),
+    sa.Column('variable', sa.String(length=20), nullable=False, comment='temperatura o humedad'),
+    sa.Column('tipo', sa.String(length=20), nullable=False, comment='pico o deriva'),
+    sa.Column('valor', sa.Float(), nullable=False),
+    sa.Column('esperado', sa.Float(), nullable=False, comment='Media rápida (pico) o lenta (deriva) antes de la lectura'),
+    sa.Column('puntuacion', sa.Float(), nullable=False, comment='Desviaciones respecto de lo esperado'),
+    sa.ForeignKeyConstraint(['aire_id'], ['aires_acondicionados.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_anomalias_lecturas_aire_fecha', 'anomalias_lecturas', ['aire_id', 'fecha'], unique=False)
+    op.create_table('estado_detector_anomalias',
+    sa.Column('aire_id', sa.Integer(), nullable=False),
+    sa.Column('estado', sa.Text(), nullable=False, comment='JSON con lecturas, última fecha y EWMA por variable'),
+    sa.Column('actualizado', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['aire_id'], ['aires_acondicionados.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('aire_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('estado_detector_anomalias')
+    op.drop_index('ix_anomalias_lecturas_aire_fecha', table_name='anomalias_lecturas')
+    op.drop_table('anomalias_lecturas')
+    op.drop_column('lecturas', 'anomalia')
@@ -0,0 +1,54 @@
+"""Add unique constraint on lecturas (aire_id, fecha)
+
+Revision ID: d2b7e8a4f615
+Revises: a91f4c6d2e38
+Create Date: 2026-10-19 12:02:51.204377
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2b7e8a4f615'
+down_revision: Union[str, None] = 'a91f4c6d2e38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # La restricción no se puede crear con duplicados: se conserva la lectura de menor ID.
+    # En tablas grandes conviene limpiarlas antes por lotes con POST /api/lecturas/deduplicar.
+    conexion = op.get_bind()
+    aires = [aire_id for (aire_id,) in conexion.execute(sa.text(
+        "SELECT DISTINCT aire_id FROM lecturas WHERE aire_id IS NOT NULL"
+        " GROUP BY aire_id, fecha HAVING count(*) > 1"
+    ))]
+    resultado = conexion.execute(sa.text(
+        "DELETE FROM lecturas WHERE id IN ("
+        " SELECT id FROM ("
+        "  SELECT id, row_number() OVER (PARTITION BY aire_id, fecha ORDER BY id) AS n FROM lecturas"
+        " ) numeradas WHERE n > 1"
+        ")"
+    ))
+    if aires:
+        # Los sketches de esos aires contaban los duplicados: se borran y el arranque los
+        # regenera en segundo plano (DataManager.poblar_resumenes_si_necesario)
+        conexion.execute(
+            sa.text("DELETE FROM sketches_lecturas WHERE aire_id IN :aires")
+            .bindparams(sa.bindparam('aires', expanding=True)),
+            {'aires': aires}
+        )
+    if resultado.rowcount:
+        logging.getLogger('alembic.runtime.migration').info(
+            "Se eliminaron %d lecturas duplicadas de %d aires; sus sketches se regenerarán al arrancar",
+            resultado.rowcount, len(aires)
+        )
+    op.create_unique_constraint('uq_lecturas_aire_fecha', 'lecturas', ['aire_id', 'fecha'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_lecturas_aire_fecha', 'lecturas', type_='unique')
@@ -0,0 +1,37 @@
+"""Add ingest_queue table
+
+Revision ID: e5a0c3b9d172
+Revises: d2b7e8a4f615
+Create Date: 2026-10-19 13:15:09.773018
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a0c3b9d172'
+down_revision: Union[str, None] = 'd2b7e8a4f615'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ingest_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('aire_id', sa.Integer(), nullable=False),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.Column('temperatura', sa.Float(), nullable=False),
+    sa.Column('humedad', sa.Float(), nullable=False),
+    sa.Column('recibida', sa.DateTime(), nullable=False),
+    sa.Column('intentos', sa.Integer(), nullable=False, comment='Procesamientos fallidos de esta lectura'),
+    sa.Column('error', sa.Text(), nullable=True, comment='Último error al procesarla'),
+    sa.ForeignKeyConstraint(['aire_id'], ['aires_acondicionados.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('ingest_queue')
@@ -0,0 +1,28 @@
+"""Add sensor columns to aires_acondicionados
+
+Revision ID: f3c8a2d6b490
+Revises: e5a0c3b9d172
+Create Date: 2026-10-19 14:02:41.318554
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c8a2d6b490'
+down_revision: Union[str, None] = 'e5a0c3b9d172'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('aires_acondicionados', sa.Column('sensor_url', sa.String(length=300), nullable=True, comment='Endpoint del sensor: http(s)://... (JSON) o tcp://host:puerto[/unidad] (línea de texto)'))
+    op.add_column('aires_acondicionados', sa.Column('sensor_intervalo', sa.Integer(), nullable=True, comment='Segundos entre sondeos del sensor (por defecto POLLER_INTERVALO)'))
+
+
+def downgrade() -> None:
+    op.drop_column('aires_acondicionados', 'sensor_intervalo')
+    op.drop_column('aires_acondicionados', 'sensor_url')
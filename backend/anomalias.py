@@ -0,0 +1,216 @@
+"""
+Detección de anomalías en línea durante la ingesta.
+
+Para cada aire y variable (temperatura y humedad) se mantienen dos medias
+móviles exponenciales (EWMA) con su varianza:
+    - rápida (alfa): sigue el valor actual; una lectura a más de 'umbral'
+      desviaciones de la media rápida es un pico,
+    - lenta (alfa_lento): sigue el nivel habitual; cuando la media rápida se
+      separa más de 'umbral_deriva' desviaciones lentas empieza una deriva
+      (solo se registra el inicio de cada episodio, que termina cuando la
+      separación baja de la mitad del umbral).
+
+Cada lectura actualiza el estado en O(1). Los picos se incorporan recortados a
+media ± umbral · desviación, así una lectura aislada no dispara la varianza pero
+un cambio de nivel sostenido termina absorbido. Las primeras 'calentamiento'
+lecturas de un aire solo alimentan el estado.
+
+El estado vive en memoria del proceso y se guarda periódicamente en la base de
+datos (DataManager.guardar_estado_anomalias); al arrancar se retoma desde ahí.
+Las lecturas con fecha anterior o igual a la última evaluada del aire (cargas
+históricas) no se evalúan.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+VARIABLES = ('temperatura', 'humedad')
+# Desviación mínima por variable: evita z enormes en series casi constantes
+DESVIACION_MINIMA = {'temperatura': 0.05, 'humedad': 0.2}
+
+# Posiciones del estado de una variable: media, varianza, media lenta, varianza lenta, en deriva
+_M, _V, _ML, _VL, _D = range(5)
+
+
+class DetectorAnomalias:
+    """
+    Args:
+        cargar: Función () -> diccionario aire_id -> estado guardado (ver a_dict)
+        alfa: Peso de cada lectura en la EWMA rápida
+        alfa_lento: Peso de cada lectura en la EWMA lenta
+        umbral: Desviaciones (rápidas) a partir de las que una lectura es un pico
+        umbral_deriva: Desviaciones (lentas) entre media rápida y lenta que marcan una deriva
+        calentamiento: Lecturas de un aire antes de empezar a señalar anomalías
+    """
+
+    def __init__(self, cargar, alfa=0.05, alfa_lento=0.005, umbral=4.0, umbral_deriva=3.0, calentamiento=30):
+        self.cargar = cargar
+        self.alfa = alfa
+        self.alfa_lento = alfa_lento
+        self.umbral = umbral
+        self.umbral_deriva = umbral_deriva
+        self.calentamiento = calentamiento
+        # aire_id -> [lecturas, última fecha (s), estado temperatura, estado humedad]
+        self._estados = None
+        self._modificados = set()
+        self._lock = threading.Lock()
+        self._metricas = {'evaluadas': 0, 'picos': 0, 'derivas': 0, 'segundos': 0.0}
+
+    def _asegurar_cargado(self):
+        if self._estados is None:
+            estados = {}
+            for aire_id, guardado in self.cargar().items():
+                estados[int(aire_id)] = [
+                    guardado['lecturas'], guardado['ultima_fecha'],
+                    *[list(guardado[variable]) for variable in VARIABLES]
+                ]
+            self._estados = estados
+
+    @staticmethod
+    def a_dict(estado):
+        """Estado de un aire serializable (para el checkpoint)."""
+        return {'lecturas': estado[0], 'ultima_fecha': estado[1],
+                **{variable: list(estado[2 + i]) for i, variable in enumerate(VARIABLES)}}
+
+    def evaluar(self, lecturas_df):
+        """
+        Evalúa lecturas nuevas sin modificar el estado del detector.
+
+        Args:
+            lecturas_df: DataFrame con aire_id, fecha, temperatura y humedad
+
+        Returns:
+            (lista de anomalías: diccionarios con aire_id, fecha, variable, tipo ('pico' o
+            'deriva'), valor, esperado y puntuacion; estados nuevos de los aires evaluados,
+            para confirmar() tras el commit)
+        """
+        if lecturas_df is None or lecturas_df.empty:
+            return [], {}
+        inicio_reloj = time.perf_counter()
+        aire_ids = lecturas_df['aire_id'].to_numpy(dtype=np.int64)
+        fechas = pd.to_datetime(lecturas_df['fecha']).to_numpy(dtype='datetime64[us]')
+        segundos = fechas.astype('datetime64[s]').astype(np.int64)
+        orden = np.lexsort((segundos, aire_ids))
+        aire_ids, segundos, fechas = aire_ids[orden].tolist(), segundos[orden].tolist(), fechas[orden]
+        valores = [lecturas_df[variable].to_numpy(dtype=np.float64)[orden].tolist() for variable in VARIABLES]
+
+        with self._lock:
+            self._asegurar_cargado()
+            base = {a: self._estados.get(a) for a in set(aire_ids)}
+
+        alfa, alfa_lento, umbral, umbral_deriva = self.alfa, self.alfa_lento, self.umbral, self.umbral_deriva
+        minimas = [DESVIACION_MINIMA[variable] for variable in VARIABLES]
+        anomalias, nuevos = [], {}
+        aire_actual, estado, evaluadas = None, None, 0
+        for i, aire_id in enumerate(aire_ids):
+            if aire_id != aire_actual:
+                aire_actual = aire_id
+                previo = base[aire_id]
+                estado = [previo[0], previo[1], list(previo[2]), list(previo[3])] if previo is not None else None
+                nuevos[aire_id] = estado
+            segundo = segundos[i]
+            if estado is None:
+                # Primera lectura del aire: inicializa medias y varianzas
+                estado = [1, segundo] + [[valores[k][i], 0.0, valores[k][i], 0.0, False] for k in range(len(VARIABLES))]
+                nuevos[aire_id] = estado
+                continue
+            if segundo <= estado[1]:
+                continue  # histórica: no se evalúa
+            evaluadas += 1
+            listo = estado[0] >= self.calentamiento
+            for k in range(len(VARIABLES)):
+                x = valores[k][i]
+                s = estado[2 + k]
+                media, varianza, media_lenta, varianza_lenta = s[_M], s[_V], s[_ML], s[_VL]
+                desviacion = max(varianza ** 0.5, minimas[k])
+                diferencia = x - media
+                z = abs(diferencia) / desviacion
+                if listo and z > umbral:
+                    anomalias.append({'aire_id': aire_id, 'fecha': fechas[i], 'variable': VARIABLES[k],
+                                      'tipo': 'pico', 'valor': x, 'esperado': media, 'puntuacion': z})
+                    # Recortar el pico para que no arrastre la media ni infle la varianza
+                    diferencia = umbral * desviacion if diferencia > 0 else -umbral * desviacion
+                s[_V] = (1.0 - alfa) * (varianza + alfa * diferencia * diferencia)
+                s[_M] = media + alfa * diferencia
+                diferencia_lenta = (media + diferencia) - media_lenta
+                s[_VL] = (1.0 - alfa_lento) * (varianza_lenta + alfa_lento * diferencia_lenta * diferencia_lenta)
+                s[_ML] = media_lenta + alfa_lento * diferencia_lenta
+
+                desviacion_lenta = max(s[_VL] ** 0.5, minimas[k])
+                separacion = abs(s[_M] - s[_ML]) / desviacion_lenta
+                # Histéresis: la deriva termina al bajar de la mitad del umbral
+                en_deriva = listo and (separacion > umbral_deriva or (s[_D] and separacion > umbral_deriva / 2))
+                if en_deriva and not s[_D]:
+                    anomalias.append({'aire_id': aire_id, 'fecha': fechas[i], 'variable': VARIABLES[k],
+                                      'tipo': 'deriva', 'valor': x, 'esperado': s[_ML], 'puntuacion': separacion})
+                s[_D] = en_deriva
+            estado[0] += 1
+            estado[1] = segundo
+
+        for anomalia in anomalias:
+            anomalia['fecha'] = pd.Timestamp(anomalia['fecha']).to_pydatetime()
+        with self._lock:
+            self._metricas['evaluadas'] += evaluadas
+            self._metricas['segundos'] += time.perf_counter() - inicio_reloj
+        return anomalias, nuevos
+
+    def confirmar(self, nuevos, anomalias=()):
+        """Aplica los estados devueltos por evaluar() una vez confirmadas las lecturas."""
+        if not nuevos:
+            return
+        with self._lock:
+            self._asegurar_cargado()
+            for aire_id, estado in nuevos.items():
+                actual = self._estados.get(aire_id)
+                # Otro lote del mismo aire pudo confirmarse antes con lecturas más nuevas
+                if actual is None or estado[1] > actual[1]:
+                    self._estados[aire_id] = estado
+                    self._modificados.add(aire_id)
+            for anomalia in anomalias:
+                self._metricas['picos' if anomalia['tipo'] == 'pico' else 'derivas'] += 1
+
+    def pendientes(self):
+        """Estados modificados desde el último checkpoint (y los marca como guardados)."""
+        with self._lock:
+            if self._estados is None:
+                return {}
+            pendientes = {a: self.a_dict(self._estados[a]) for a in self._modificados if a in self._estados}
+            self._modificados = set()
+        return pendientes
+
+    def devolver(self, pendientes):
+        """Vuelve a marcar como pendientes los estados de un checkpoint fallido."""
+        with self._lock:
+            self._modificados.update(pendientes)
+
+    def adoptar(self, guardados):
+        """
+        Sustituye el estado de los aires por el guardado por otro proceso cuando este
+        es más nuevo (su checkpoint no se escribió para no pisarlo).
+
+        Args:
+            guardados: Diccionario aire_id -> estado guardado (ver a_dict)
+        """
+        with self._lock:
+            if self._estados is None:
+                return
+            for aire_id, guardado in guardados.items():
+                actual = self._estados.get(aire_id)
+                if actual is None or guardado['ultima_fecha'] > actual[1]:
+                    self._estados[aire_id] = [
+                        guardado['lecturas'], guardado['ultima_fecha'],
+                        *[list(guardado[variable]) for variable in VARIABLES]
+                    ]
+
+    def metricas(self):
+        with self._lock:
+            evaluadas, segundos = self._metricas['evaluadas'], self._metricas['segundos']
+            return dict(
+                self._metricas,
+                segundos=round(segundos, 3),
+                lecturas_por_segundo=round(evaluadas / segundos) if segundos else None,
+                aires=len(self._estados) if self._estados is not None else 0
+            )
+
@@ -15,8 +15,14 @@ else:
 
 
 from database import init_db, session, Usuario, Lectura, AireAcondicionado, Mantenimiento, OtroEquipo
-from data_manager import DataManager
-from flask import Flask, jsonify, request, session, Blueprint
+from data_manager import DataManager, LECTURA_FILTRADA
+from series_temporales import METODOS_REMUESTREO
+from excursiones import PERIODOS as PERIODOS_EXCURSIONES
+from reglas import validar_regla
+from trabajos import obtener_trabajo
+from ingesta import ColaIngesta, ColaLlena, ingerir_ndjson
+import importacion
+from flask import Flask, jsonify, request, session, Blueprint, Response, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import (
     JWTManager, 
@@ -27,6 +33,12 @@ from flask_jwt_extended import (
 )
 from datetime import timedelta, datetime
 import pandas as pd
+import numpy as np
+import atexit
+import json
+import queue
+import tempfile
+import threading
 
 
 # # Añadir el directorio principal al path para importar los módulos de database y data_manager
@@ -93,6 +105,27 @@ init_db()
 data_manager = DataManager()
 # Crear usuario administrador por defecto si no existe ninguno
 data_manager.crear_admin_por_defecto()
+# Escuchar los cambios hechos por otros workers para invalidar la caché local
+data_manager.bus.iniciar()
+# Cargar en memoria las lecturas recientes sin retrasar el arranque
+threading.Thread(target=data_manager.calentar_ventana, name='calentar-ventana', daemon=True).start()
+
+# Modo de ingesta de POST /api/lecturas: 'directa' (un commit por lectura),
+# 'diferida' (cola en memoria con commit agrupado, responde 202) o
+# 'cola' (tabla ingest_queue procesada por worker.py, responde 202)
+INGESTA_MODO = os.environ.get('INGESTA_MODO', 'directa')
+cola_ingesta = None
+if INGESTA_MODO == 'diferida':
+    cola_ingesta = ColaIngesta(
+        data_manager,
+        max_pendientes=int(os.environ.get('INGESTA_MAX_PENDIENTES', 10000)),
+        intervalo_ms=float(os.environ.get('INGESTA_INTERVALO_MS', 50)),
+        max_lote=int(os.environ.get('INGESTA_MAX_LOTE', 1000))
+    )
+    cola_ingesta.iniciar()
+    atexit.register(cola_ingesta.detener)
+# Registrado después que la cola: atexit ejecuta en orden inverso, el último lote entra al checkpoint
+atexit.register(data_manager.guardar_estado_anomalias)
 
 # Ruta de inicio
 @aircontrol_bp.route('/')
@@ -314,6 +347,13 @@ def get_aire_by_id(aire_id):
                 'condensadora_serial': aire_obj.condensadora_serial,
                 'condensadora_codigo_inventario': aire_obj.condensadora_codigo_inventario,
                 'condensadora_ubicacion_instalacion': aire_obj.condensadora_ubicacion_instalacion,
+                # Sensor sondeado por poller.py
+                'sensor_url': aire_obj.sensor_url,
+                'sensor_intervalo': aire_obj.sensor_intervalo,
+                # Filtro de compresión de la ingesta
+                'compresion_tolerancia_temp': aire_obj.compresion_tolerancia_temp,
+                'compresion_tolerancia_hum': aire_obj.compresion_tolerancia_hum,
+                'compresion_max_intervalo': aire_obj.compresion_max_intervalo,
                 # Añade otros campos si los tienes en el modelo AireAcondicionado
             }
             return jsonify(aire_dict) # Devuelve el diccionario como JSON
@@ -504,6 +544,60 @@ def update_aire(aire_id):
         return jsonify({'success': False, 'mensaje': 'Error interno del servidor al actualizar el aire'}), 500
 
 
+@aircontrol_bp.route('/api/aires/<int:aire_id>/sensor', methods=['PUT'])
+@jwt_required()
+def update_sensor_aire(aire_id):
+    """
+    Configura el sensor que sondea poller.py: {"sensor_url": "http://..." | "tcp://host:puerto/unidad" | null,
+    "sensor_intervalo": segundos | null}. El poller toma los cambios en su siguiente recarga.
+    """
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') != 'admin':
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    data = request.get_json() or {}
+    sensor_url = data.get('sensor_url') or None
+    sensor_intervalo = data.get('sensor_intervalo')
+    try:
+        if sensor_intervalo is not None:
+            sensor_intervalo = int(sensor_intervalo)
+        if not data_manager.configurar_sensor(aire_id, sensor_url, sensor_intervalo):
+            return jsonify({'success': False, 'mensaje': 'Aire acondicionado no encontrado'}), 404
+        return jsonify({'success': True, 'mensaje': 'Sensor configurado correctamente'}), 200
+    except (TypeError, ValueError) as ve:
+        return jsonify({'success': False, 'mensaje': str(ve)}), 400
+    except Exception as e:
+        print(f"Error al configurar el sensor del aire {aire_id}: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error interno del servidor al configurar el sensor'}), 500
+
+@aircontrol_bp.route('/api/aires/<int:aire_id>/compresion', methods=['PUT'])
+@jwt_required()
+def update_compresion_aire(aire_id):
+    """
+    Configura el filtro de compresión de la ingesta: {"tolerancia_temp": °C, "tolerancia_hum": %,
+    "max_intervalo": segundos}. Con ambas tolerancias nulas se desactiva. Las estadísticas de un
+    aire comprimido deben pedirse con ponderado=true (error acotado por la tolerancia).
+    """
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') != 'admin':
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    data = request.get_json() or {}
+    try:
+        tolerancia_temp = float(data['tolerancia_temp']) if data.get('tolerancia_temp') is not None else None
+        tolerancia_hum = float(data['tolerancia_hum']) if data.get('tolerancia_hum') is not None else None
+        max_intervalo = int(data['max_intervalo']) if data.get('max_intervalo') is not None else None
+        if not data_manager.configurar_compresion(aire_id, tolerancia_temp, tolerancia_hum, max_intervalo):
+            return jsonify({'success': False, 'mensaje': 'Aire acondicionado no encontrado'}), 404
+        return jsonify({'success': True, 'mensaje': 'Filtro de compresión configurado correctamente'}), 200
+    except (TypeError, ValueError) as ve:
+        return jsonify({'success': False, 'mensaje': str(ve)}), 400
+    except Exception as e:
+        print(f"Error al configurar la compresión del aire {aire_id}: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error interno del servidor al configurar la compresión'}), 500
+
 @aircontrol_bp.route('/api/aires/<int:aire_id>', methods=['DELETE'])
 @jwt_required()
 def delete_aire(aire_id):
@@ -511,6 +605,17 @@ def delete_aire(aire_id):
     if jwt_data.get('rol') not in ['admin', 'supervisor']:
         return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
     
+    # Aires con muchas lecturas se borran por lotes en segundo plano
+    segundo_plano = request.args.get('segundo_plano', 'false').lower() == 'true'
+    umbral_lotes = int(os.environ.get('ELIMINACION_LOTES_MIN_LECTURAS', 100000))
+    if segundo_plano or data_manager.contar_lecturas_aire(aire_id) > umbral_lotes:
+        trabajo_id = data_manager.iniciar_eliminacion_aire(aire_id)
+        return jsonify({
+            'success': True,
+            'mensaje': 'Eliminación del aire iniciada en segundo plano',
+            'trabajo_id': trabajo_id
+        }), 202
+
     data_manager.eliminar_aire(aire_id)
     return jsonify({'success': True, 'mensaje': 'Aire acondicionado eliminado exitosamente'})
 
@@ -765,6 +870,231 @@ def get_lecturas():
     
     return jsonify({'success': True, 'data': lecturas})
 
+@aircontrol_bp.route('/api/lecturas/recientes', methods=['GET'])
+@jwt_required()
+def get_lecturas_recientes():
+    """
+    Lecturas de las últimas horas de un aire, servidas desde la ventana en memoria
+    cuando la cubre, junto con su tasa de cambio de los últimos 30 minutos.
+    Parámetros: aire_id (requerido), horas (por defecto 6).
+    """
+    aire_id = request.args.get('aire_id', type=int)
+    horas = request.args.get('horas', default=6, type=float)
+    if not aire_id:
+        return jsonify({'success': False, 'mensaje': 'El parámetro aire_id es requerido'}), 400
+    if horas <= 0:
+        return jsonify({'success': False, 'mensaje': 'El parámetro horas debe ser positivo'}), 400
+    try:
+        lecturas_df, fuente = data_manager.obtener_lecturas_recientes(aire_id, horas=horas)
+        lecturas = [
+            {'fecha': fecha.strftime('%Y-%m-%d %H:%M:%S'), 'temperatura': float(temperatura), 'humedad': float(humedad)}
+            for fecha, temperatura, humedad in zip(lecturas_df['fecha'], lecturas_df['temperatura'], lecturas_df['humedad'])
+        ] if not lecturas_df.empty else []
+        return jsonify({
+            'success': True,
+            'data': lecturas,
+            'tasa_cambio': data_manager.obtener_tasa_cambio(aire_id),
+            'fuente': fuente
+        })
+    except Exception as e:
+        print(f"Error al obtener lecturas recientes del aire {aire_id}: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al obtener las lecturas recientes'}), 500
+
+@aircontrol_bp.route('/api/lecturas/zoom', methods=['GET'])
+@jwt_required()
+def get_lecturas_zoom():
+    """
+    Serie de un aire para un gráfico con zoom: a lo sumo un punto por píxel, cada
+    uno con promedio, mínimo y máximo del intervalo que representa.
+    Parámetros: aire_id, desde y hasta ('YYYY-MM-DD HH:MM:SS') y ancho_px (por defecto 1000).
+    """
+    aire_id = request.args.get('aire_id', type=int)
+    ancho_px = request.args.get('ancho_px', default=1000, type=int)
+    if not aire_id:
+        return jsonify({'success': False, 'mensaje': 'El parámetro aire_id es requerido'}), 400
+    try:
+        desde = datetime.strptime(request.args.get('desde', ''), '%Y-%m-%d %H:%M:%S')
+        hasta = datetime.strptime(request.args.get('hasta', ''), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Los parámetros desde y hasta son requeridos con formato 'YYYY-MM-DD HH:MM:SS'"}), 400
+    if desde >= hasta:
+        return jsonify({'success': False, 'mensaje': "'desde' debe ser anterior a 'hasta'"}), 400
+    if not 1 <= ancho_px <= 10000:
+        return jsonify({'success': False, 'mensaje': 'El parámetro ancho_px debe estar entre 1 y 10000'}), 400
+    try:
+        puntos_df, resolucion = data_manager.obtener_lecturas_zoom(aire_id, desde, hasta, ancho_px=ancho_px)
+        puntos = [
+            {
+                'fecha': fila.fecha.strftime('%Y-%m-%d %H:%M:%S'),
+                'total': int(fila.total),
+                'temperatura_promedio': round(float(fila.temperatura_promedio), 2),
+                'temperatura_min': float(fila.temperatura_min),
+                'temperatura_max': float(fila.temperatura_max),
+                'humedad_promedio': round(float(fila.humedad_promedio), 2),
+                'humedad_min': float(fila.humedad_min),
+                'humedad_max': float(fila.humedad_max),
+            }
+            for fila in puntos_df.itertuples(index=False)
+        ]
+        return jsonify({'success': True, 'data': puntos, 'resolucion_segundos': resolucion})
+    except Exception as e:
+        print(f"Error al obtener la serie con zoom del aire {aire_id}: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al obtener la serie del aire'}), 500
+
+@aircontrol_bp.route('/api/lecturas/alineadas', methods=['GET'])
+@jwt_required()
+def get_lecturas_alineadas():
+    """
+    Temperatura y humedad de varios aires en una rejilla regular común, como matrices
+    tiempo x aire (o tiempo x ubicación con agrupar=ubicacion), para compararlos.
+    Parámetros: desde y hasta ('YYYY-MM-DD HH:MM:SS'), aire_ids (lista separada por
+    comas) o ubicacion, paso_min (por defecto 5), metodo=anterior|lineal|media y
+    max_hueco_min (opcional).
+    """
+    try:
+        desde = datetime.strptime(request.args.get('desde', ''), '%Y-%m-%d %H:%M:%S')
+        hasta = datetime.strptime(request.args.get('hasta', ''), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Los parámetros desde y hasta son requeridos con formato 'YYYY-MM-DD HH:MM:SS'"}), 400
+    try:
+        aire_ids_str = request.args.get('aire_ids')
+        aire_ids = [int(a) for a in aire_ids_str.split(',') if a.strip()] if aire_ids_str else None
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': 'aire_ids debe ser una lista de IDs separados por comas'}), 400
+    paso_min = request.args.get('paso_min', default=5, type=float)
+    max_hueco_min = request.args.get('max_hueco_min', type=float)
+    metodo = request.args.get('metodo', default='anterior')
+    agrupar = request.args.get('agrupar')
+    if desde >= hasta:
+        return jsonify({'success': False, 'mensaje': "'desde' debe ser anterior a 'hasta'"}), 400
+    if paso_min <= 0:
+        return jsonify({'success': False, 'mensaje': 'El parámetro paso_min debe ser positivo'}), 400
+    if metodo not in METODOS_REMUESTREO:
+        return jsonify({'success': False, 'mensaje': f"Método inválido. Use {', '.join(METODOS_REMUESTREO)}"}), 400
+    if agrupar not in (None, 'ubicacion'):
+        return jsonify({'success': False, 'mensaje': "El parámetro agrupar solo admite 'ubicacion'"}), 400
+    puntos = (hasta - desde).total_seconds() / (paso_min * 60)
+    if puntos * (len(aire_ids) if aire_ids else data_manager.contar_aires()) > 500000:
+        return jsonify({'success': False, 'mensaje': 'La matriz supera los 500000 valores, aumente paso_min o reduzca los aires'}), 400
+
+    try:
+        alineadas = data_manager.obtener_series_alineadas(
+            desde, hasta, paso_min * 60, aire_ids=aire_ids, ubicacion=request.args.get('ubicacion'),
+            metodo=metodo, max_hueco=max_hueco_min * 60 if max_hueco_min else None, agrupar_por=agrupar
+        )
+
+        def _matriz(valores):
+            valores = np.round(valores, 2)
+            return [[None if np.isnan(v) else float(v) for v in fila] for fila in valores]
+
+        return jsonify({
+            'success': True,
+            'fechas': [fecha.strftime('%Y-%m-%d %H:%M:%S') for fecha in alineadas['fechas']],
+            'columnas': [c if isinstance(c, str) else int(c) for c in alineadas['columnas']],
+            'temperatura': _matriz(alineadas['temperatura']),
+            'humedad': _matriz(alineadas['humedad'])
+        })
+    except Exception as e:
+        print(f"Error al alinear series de lecturas: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al alinear las series'}), 500
+
+@aircontrol_bp.route('/api/lecturas/rolling', methods=['GET'])
+@jwt_required()
+def get_lecturas_rolling():
+    """
+    Lecturas de un aire con su media, desviación, mínimo y máximo en una ventana de
+    tiempo móvil, para superponer medias móviles al gráfico de temperatura.
+    Parámetros: aire_id (requerido), ventana (p. ej. 15min, 1h, 24h; por defecto 1h),
+    desde y hasta ('YYYY-MM-DD HH:MM:SS'; por defecto las últimas 24 horas) y
+    variable=temperatura|humedad.
+    """
+    aire_id = request.args.get('aire_id', type=int)
+    variable = request.args.get('variable', default='temperatura')
+    if not aire_id:
+        return jsonify({'success': False, 'mensaje': 'El parámetro aire_id es requerido'}), 400
+    try:
+        ventana = pd.Timedelta(request.args.get('ventana', '1h')).total_seconds()
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': 'Ventana inválida. Use por ejemplo 15min, 1h o 24h'}), 400
+    if not 0 < ventana <= 31 * 24 * 3600:
+        return jsonify({'success': False, 'mensaje': 'La ventana debe ser positiva y de hasta 31 días'}), 400
+    try:
+        desde_str = request.args.get('desde')
+        hasta_str = request.args.get('hasta')
+        hasta = datetime.strptime(hasta_str, '%Y-%m-%d %H:%M:%S') if hasta_str else datetime.now()
+        desde = datetime.strptime(desde_str, '%Y-%m-%d %H:%M:%S') if desde_str else hasta - timedelta(hours=24)
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Formato de fecha inválido. Use 'YYYY-MM-DD HH:MM:SS'"}), 400
+    if desde >= hasta:
+        return jsonify({'success': False, 'mensaje': "'desde' debe ser anterior a 'hasta'"}), 400
+
+    try:
+        moviles_df = data_manager.obtener_estadisticas_moviles(aire_id, ventana, desde, hasta, variable=variable)
+    except ValueError as ve:
+        return jsonify({'success': False, 'mensaje': str(ve)}), 400
+    except Exception as e:
+        print(f"Error al calcular estadísticas móviles del aire {aire_id}: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al calcular las estadísticas móviles'}), 500
+
+    def _valor(v):
+        return None if pd.isna(v) else round(float(v), 3)
+
+    return jsonify({
+        'success': True,
+        'ventana_segundos': ventana,
+        'data': [
+            {
+                'fecha': fila.fecha.strftime('%Y-%m-%d %H:%M:%S'),
+                'valor': float(fila.valor),
+                'media': _valor(fila.media),
+                'desviacion': _valor(fila.desviacion),
+                'minimo': _valor(fila.minimo),
+                'maximo': _valor(fila.maximo),
+                'lecturas': int(fila.lecturas),
+            }
+            for fila in moviles_df.itertuples(index=False)
+        ]
+    })
+
+def _encolar_lectura(aire_id, fecha_dt, temperatura, humedad):
+    """
+    Ingesta diferida: encola la lectura y responde 202. Con confirmar=true espera
+    al commit del lote y responde 201 con el ID, como la ingesta directa.
+    """
+    confirmar = request.args.get('confirmar', 'false').lower() == 'true'
+    try:
+        ticket = cola_ingesta.encolar([{
+            'aire_id': aire_id, 'fecha': fecha_dt, 'temperatura': temperatura, 'humedad': humedad
+        }])
+    except ColaLlena as cl:
+        respuesta = jsonify({'success': False, 'mensaje': str(cl)})
+        respuesta.headers['Retry-After'] = '1'
+        return respuesta, 429
+
+    if not confirmar:
+        return jsonify({'success': True, 'mensaje': 'Lectura aceptada para su registro', 'encolada': True}), 202
+
+    try:
+        confirmada = ticket.esperar(timeout=float(os.environ.get('INGESTA_TIMEOUT_CONFIRMACION', 10)))
+    except Exception as e:
+        return jsonify({'success': False, 'mensaje': f'Error al registrar la lectura: {e}'}), 500
+    if not confirmada:
+        return jsonify({'success': True, 'mensaje': 'Lectura aceptada, confirmación pendiente', 'encolada': True}), 202
+
+    lectura_id = data_manager.obtener_id_lectura(aire_id, fecha_dt)
+    if lectura_id is None:
+        return jsonify({'success': True, 'mensaje': 'Lectura descartada por el filtro de compresión', 'filtrada': True}), 200
+    return jsonify({
+        'success': True,
+        'mensaje': 'Lectura registrada exitosamente',
+        'id': lectura_id,
+        'fecha': fecha_dt.strftime('%Y-%m-%d %H:%M:%S')
+    }), 201
+
 @aircontrol_bp.route('/api/lecturas', methods=['POST'])
 @jwt_required()
 def add_lectura():
@@ -808,13 +1138,33 @@ def add_lectura():
         except ValueError:
             errors['fecha_hora'] = "Formato de fecha y hora inválido. Use 'YYYY-MM-DD HH:MM:SS'"
 
+    # Un aire inexistente haría fallar el commit agrupado de las lecturas de otras peticiones
+    if 'aire_id' not in errors and aire_id not in data_manager.obtener_ids_aires():
+        errors['aire_id'] = f'El aire {aire_id} no existe'
+
     if errors:
         # Devolver 400 Bad Request si hay errores de validación
         return jsonify({'success': False, 'mensaje': 'Datos inválidos', 'errors': errors}), 400
 
+    if cola_ingesta is not None:
+        return _encolar_lectura(aire_id, fecha_dt, temperatura, humedad)
+    if INGESTA_MODO == 'cola':
+        try:
+            data_manager.encolar_lecturas_bd([{
+                'aire_id': aire_id, 'fecha': fecha_dt, 'temperatura': temperatura, 'humedad': humedad
+            }])
+        except Exception as e:
+            print(f"Error al encolar la lectura en ingest_queue: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return jsonify({'success': False, 'mensaje': 'Error interno al registrar la lectura'}), 500
+        return jsonify({'success': True, 'mensaje': 'Lectura aceptada para su registro', 'encolada': True}), 202
+
     # Llamar al data_manager con los datos validados y convertidos
     lectura_id = data_manager.agregar_lectura(aire_id, fecha_dt, temperatura, humedad)
 
+    if lectura_id == LECTURA_FILTRADA:
+        # Dentro de la tolerancia de la última lectura guardada del aire (ver compresion.py)
+        return jsonify({'success': True, 'mensaje': 'Lectura descartada por el filtro de compresión', 'filtrada': True}), 200
     if lectura_id:
         # Devolver 201 Created en éxito
         # También devuelve la fecha guardada para consistencia (opcional pero bueno)
@@ -850,6 +1200,80 @@ def add_lectura():
         # Devolver 500 Internal Server Error si data_manager falló
         return jsonify({'success': False, 'mensaje': 'Error interno al registrar la lectura'}), 500
 
+@aircontrol_bp.route('/api/lecturas/stream', methods=['POST'])
+@jwt_required()
+def stream_lecturas():
+    """
+    Ingesta de lecturas como NDJSON (un objeto por línea con aire_id, fecha_hora,
+    temperatura y humedad) en una petición de larga duración, con cuerpo chunked.
+    Las lecturas se guardan en micro-lotes y la respuesta, también NDJSON, lleva
+    una confirmación por lote con sus errores por línea y una línea final con totales.
+    Parámetros: lote (lecturas por transacción, 500) e intervalo_ms (1000).
+    """
+    max_lote = max(1, min(request.args.get('lote', default=500, type=int), 10000))
+    intervalo = max(request.args.get('intervalo_ms', default=1000, type=float), 10) / 1000.0
+    flujo = request.stream
+
+    def generar():
+        for confirmacion in ingerir_ndjson(data_manager, flujo, max_lote=max_lote, intervalo=intervalo):
+            yield json.dumps(confirmacion) + '\n'
+
+    return Response(stream_with_context(generar()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@aircontrol_bp.route('/api/lecturas/import', methods=['POST'])
+@jwt_required()
+def import_lecturas():
+    """
+    Importa lecturas desde un archivo CSV/XLSX (campo 'archivo') en segundo plano.
+    Campos opcionales: aire_id (archivos sin columna de aire) y formato_fecha
+    (formato strptime). Devuelve el ID del trabajo para consultar el progreso
+    y los errores por fila en /api/trabajos/<id>.
+    """
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') not in ['admin', 'supervisor']:
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    archivo = request.files.get('archivo')
+    if archivo is None or not archivo.filename:
+        return jsonify({'success': False, 'mensaje': "No se recibió ningún archivo en el campo 'archivo'"}), 400
+    if not importacion.extension_valida(archivo.filename):
+        return jsonify({'success': False, 'mensaje': 'Formato no soportado. Use CSV o XLSX'}), 400
+    aire_id = request.form.get('aire_id', type=int)
+    formato_fecha = request.form.get('formato_fecha') or None
+
+    descriptor, ruta = tempfile.mkstemp(prefix='importacion_', suffix=os.path.splitext(archivo.filename)[1].lower())
+    os.close(descriptor)
+    archivo.save(ruta)
+    try:
+        trabajo_id, formato = data_manager.importar_lecturas(ruta, aire_id=aire_id, formato_fecha=formato_fecha)
+    except ValueError as ve:
+        os.remove(ruta)
+        return jsonify({'success': False, 'mensaje': str(ve)}), 400
+    except Exception as e:
+        os.remove(ruta)
+        print(f"Error al iniciar la importación de {archivo.filename}: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error interno al iniciar la importación'}), 500
+
+    return jsonify({
+        'success': True,
+        'mensaje': 'Importación iniciada',
+        'trabajo_id': trabajo_id,
+        'formato': formato['tipo'],
+        'aires': [aire for aire, _, _ in formato['series'] if aire is not None]
+    }), 202
+
+@aircontrol_bp.route('/api/lecturas/deduplicar', methods=['POST'])
+@jwt_required()
+def deduplicar_lecturas():
+    """Inicia la limpieza por lotes de lecturas repetidas para un mismo aire y fecha."""
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') != 'admin':
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+    trabajo_id = data_manager.iniciar_deduplicacion_lecturas()
+    return jsonify({'success': True, 'mensaje': 'Deduplicación de lecturas iniciada', 'trabajo_id': trabajo_id}), 202
+
 @aircontrol_bp.route('/api/lecturas/<int:lectura_id>', methods=['DELETE'])
 @jwt_required()
 def delete_lectura(lectura_id):
@@ -864,24 +1288,95 @@ def delete_lectura(lectura_id):
     else:
         return jsonify({'success': False, 'mensaje': 'Error al eliminar la lectura'})
 
+@aircontrol_bp.route('/api/lecturas', methods=['DELETE'])
+@jwt_required()
+def delete_lecturas_rango():
+    """
+    Elimina en lote las lecturas de un aire y/o rango de fechas.
+    Parámetros: aire_id, desde (inclusiva), hasta (exclusiva) en formato
+    'YYYY-MM-DD HH:MM:SS' y dry_run=true para solo contar. Sin aire_id el
+    borrado afecta a todos los aires y exige todos_los_aires=true.
+    """
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') == 'operador':
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    aire_id = request.args.get('aire_id', type=int)
+    # Con type=int un valor mal formado se convierte en None, que significaría "todos los aires"
+    if 'aire_id' in request.args and aire_id is None:
+        return jsonify({'success': False, 'mensaje': 'aire_id debe ser un número entero'}), 400
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+    try:
+        desde_str = request.args.get('desde')
+        hasta_str = request.args.get('hasta')
+        desde = datetime.strptime(desde_str, '%Y-%m-%d %H:%M:%S') if desde_str else None
+        hasta = datetime.strptime(hasta_str, '%Y-%m-%d %H:%M:%S') if hasta_str else None
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Formato de fecha inválido. Use 'YYYY-MM-DD HH:MM:SS'"}), 400
+    if aire_id is None and desde is None and hasta is None:
+        return jsonify({'success': False, 'mensaje': 'Debe indicar aire_id, desde o hasta'}), 400
+    if desde is not None and hasta is not None and desde >= hasta:
+        return jsonify({'success': False, 'mensaje': "'desde' debe ser anterior a 'hasta'"}), 400
+    if aire_id is None and not dry_run and request.args.get('todos_los_aires', 'false').lower() != 'true':
+        return jsonify({'success': False, 'mensaje': 'Sin aire_id se borran las lecturas de todos los aires: '
+                                                     'confírmelo con todos_los_aires=true'}), 400
+
+    eliminadas = data_manager.eliminar_lecturas_rango(aire_id=aire_id, desde=desde, hasta=hasta, dry_run=dry_run)
+    if eliminadas is None:
+        return jsonify({'success': False, 'mensaje': 'Error al eliminar las lecturas'}), 500
+
+    if dry_run:
+        mensaje = f'Se eliminarían {eliminadas} lecturas'
+    else:
+        mensaje = f'{eliminadas} lecturas eliminadas exitosamente'
+    return jsonify({'success': True, 'mensaje': mensaje, 'eliminadas': eliminadas, 'dry_run': dry_run})
+
 # Rutas para estadísticas
+def _opciones_ponderacion():
+    """
+    Lee las opciones de estadísticas ponderadas por tiempo de la query string:
+    ponderado=true, metodo=trapecio|escalon y max_intervalo_min (minutos).
+    """
+    ponderado = request.args.get('ponderado', default=False, type=lambda v: v.lower() == 'true')
+    metodo = request.args.get('metodo', default='trapecio')
+    max_intervalo_min = request.args.get('max_intervalo_min', type=float)
+    if metodo not in ('trapecio', 'escalon'):
+        raise ValueError("Método inválido. Use 'trapecio' o 'escalon'")
+    return {
+        'ponderado': ponderado,
+        'metodo': metodo,
+        'max_intervalo': max_intervalo_min * 60 if max_intervalo_min else None
+    }
+
 @aircontrol_bp.route('/api/estadisticas/general', methods=['GET'])
 @jwt_required()
 def get_estadisticas_general():
-    stats = data_manager.obtener_estadisticas_generales()
+    try:
+        opciones = _opciones_ponderacion()
+    except ValueError as ve:
+        return jsonify({'success': False, 'mensaje': str(ve)}), 400
+    stats = data_manager.obtener_estadisticas_generales(**opciones)
     return jsonify(stats)
 
 @aircontrol_bp.route('/api/estadisticas/aire/<int:aire_id>', methods=['GET'])
 @jwt_required()
 def get_estadisticas_aire(aire_id):
-    stats = data_manager.obtener_estadisticas_por_aire(aire_id)
+    try:
+        opciones = _opciones_ponderacion()
+    except ValueError as ve:
+        return jsonify({'success': False, 'mensaje': str(ve)}), 400
+    stats = data_manager.obtener_estadisticas_por_aire(aire_id, **opciones)
     return jsonify(stats)
 
 @aircontrol_bp.route('/api/estadisticas/ubicacion', methods=['GET'])
 @jwt_required()
 def get_estadisticas_ubicacion():
     ubicacion = request.args.get('ubicacion')
-    stats_df = data_manager.obtener_estadisticas_por_ubicacion(ubicacion)
+    try:
+        opciones = _opciones_ponderacion()
+    except ValueError as ve:
+        return jsonify({'success': False, 'mensaje': str(ve)}), 400
+    stats_df = data_manager.obtener_estadisticas_por_ubicacion(ubicacion, **opciones)
     
     if stats_df.empty:
         return jsonify([])
@@ -895,6 +1390,40 @@ def get_estadisticas_ubicacion():
     
     return jsonify(stats)
 
+@aircontrol_bp.route('/api/estadisticas/percentiles', methods=['GET'])
+@jwt_required()
+def get_estadisticas_percentiles():
+    """
+    Percentiles aproximados (p50/p90/p95/p99) para una ventana de tiempo.
+    Acepta varios aire_id, una ubicación y 'desde'/'hasta' o 'horas' (por defecto 24).
+    """
+    aire_ids = request.args.getlist('aire_id', type=int)
+    ubicacion = request.args.get('ubicacion')
+    desde_str = request.args.get('desde')
+    hasta_str = request.args.get('hasta')
+    horas = request.args.get('horas', default=24, type=int)
+
+    try:
+        hasta = datetime.strptime(hasta_str, '%Y-%m-%d %H:%M:%S') if hasta_str else datetime.now()
+        desde = datetime.strptime(desde_str, '%Y-%m-%d %H:%M:%S') if desde_str else hasta - timedelta(hours=horas)
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Formato de fecha inválido. Use 'YYYY-MM-DD HH:MM:SS'"}), 400
+
+    try:
+        percentiles = data_manager.obtener_percentiles(
+            aire_ids=aire_ids or None,
+            ubicacion=ubicacion,
+            desde=desde,
+            hasta=hasta
+        )
+        percentiles['desde'] = desde.strftime('%Y-%m-%d %H:%M:%S')
+        percentiles['hasta'] = hasta.strftime('%Y-%m-%d %H:%M:%S')
+        return jsonify(percentiles)
+    except Exception as e:
+        print(f"Error en get_estadisticas_percentiles: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error interno al calcular los percentiles'}), 500
+
 # Rutas para mantenimientos
 @aircontrol_bp.route('/api/mantenimientos', methods=['GET'])
 @jwt_required()
@@ -1161,6 +1690,82 @@ def add_umbral():
     else:
         return jsonify({'success': False, 'mensaje': 'Error al configurar el umbral'})
 
+@aircontrol_bp.route('/api/umbrales/simular', methods=['POST'])
+@jwt_required()
+def simular_umbral():
+    """
+    Evalúa un umbral propuesto (sin guardarlo) contra las lecturas de un periodo:
+    cuántas lecturas lo violan, en cuántos episodios, cuánto tiempo fuera y en qué
+    aires. Cuerpo: temp_min, temp_max, hum_min, hum_max, es_global, aire_id (si no
+    es global) y opcionalmente desde/hasta ('YYYY-MM-DD HH:MM:SS', por defecto los
+    últimos 30 días).
+    """
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') not in ['admin', 'supervisor']:
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    data = request.get_json(silent=True) or {}
+    es_global = data.get('es_global', False)
+    aire_id = data.get('aire_id') if not es_global else None
+    try:
+        temp_min, temp_max = float(data['temp_min']), float(data['temp_max'])
+        hum_min, hum_max = float(data['hum_min']), float(data['hum_max'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'mensaje': 'Todos los umbrales son requeridos'}), 400
+    if not es_global and not aire_id:
+        return jsonify({'success': False, 'mensaje': 'Se requiere un aire acondicionado para umbrales específicos'}), 400
+    if temp_min >= temp_max or hum_min >= hum_max:
+        return jsonify({'success': False, 'mensaje': 'Los valores mínimos deben ser menores que los máximos'}), 400
+    try:
+        hasta = datetime.strptime(data['hasta'], '%Y-%m-%d %H:%M:%S') if data.get('hasta') else datetime.now()
+        desde = datetime.strptime(data['desde'], '%Y-%m-%d %H:%M:%S') if data.get('desde') else hasta - timedelta(days=30)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'mensaje': "Formato de fecha inválido. Use 'YYYY-MM-DD HH:MM:SS'"}), 400
+    if desde >= hasta:
+        return jsonify({'success': False, 'mensaje': 'La fecha desde debe ser anterior a hasta'}), 400
+
+    try:
+        simulacion_df = data_manager.simular_umbral(temp_min, temp_max, hum_min, hum_max,
+                                                    aire_id=aire_id, desde=desde, hasta=hasta)
+        afectados = simulacion_df[simulacion_df['lecturas_fuera'] > 0]
+        aires = [
+            {
+                'aire_id': int(fila.aire_id),
+                'nombre': fila.nombre,
+                'ubicacion': fila.ubicacion,
+                'lecturas': int(fila.lecturas),
+                'lecturas_fuera': int(fila.lecturas_fuera),
+                'fuera_temperatura': int(fila.fuera_temperatura),
+                'fuera_humedad': int(fila.fuera_humedad),
+                'episodios': int(fila.episodios),
+                'minutos_fuera': round(fila.segundos_fuera / 60, 1),
+                'episodio_mas_largo_minutos': round(fila.episodio_mas_largo / 60, 1),
+                'primera_violacion': fila.primera_violacion.strftime('%Y-%m-%d %H:%M:%S'),
+                'ultima_violacion': fila.ultima_violacion.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for fila in afectados.itertuples(index=False)
+        ]
+        return jsonify({
+            'success': True,
+            'data': {
+                'desde': desde.strftime('%Y-%m-%d %H:%M:%S'),
+                'hasta': hasta.strftime('%Y-%m-%d %H:%M:%S'),
+                'aires_evaluados': len(simulacion_df),
+                'aires_afectados': len(afectados),
+                'lecturas': int(simulacion_df['lecturas'].sum()),
+                'lecturas_fuera': int(simulacion_df['lecturas_fuera'].sum()),
+                'episodios': int(simulacion_df['episodios'].sum()),
+                'minutos_fuera': round(float(simulacion_df['segundos_fuera'].sum()) / 60, 1),
+                'episodio_mas_largo_minutos': round(float(simulacion_df['episodio_mas_largo'].max()) / 60, 1)
+                if not simulacion_df.empty else 0.0,
+                'aires': aires
+            }
+        })
+    except Exception as e:
+        print(f"Error al simular el umbral: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al simular el umbral'}), 500
+
 @aircontrol_bp.route('/api/umbrales/<int:umbral_id>', methods=['PUT'])
 @jwt_required()
 def update_umbral(umbral_id):
@@ -1341,6 +1946,411 @@ def get_dashboard_resumen():
         traceback.print_exc()
         return jsonify({'success': False, 'mensaje': 'Error interno al obtener el resumen del dashboard'}), 500
 
+@aircontrol_bp.route('/api/dashboard/sparklines', methods=['GET'])
+@jwt_required()
+def get_dashboard_sparklines():
+    """
+    Temperatura y humedad resumidas de las últimas horas de todos los aires en una
+    sola respuesta, para las mini gráficas del dashboard. Cada serie tiene un valor
+    por bloque (null si no hubo lecturas); el bloque i empieza en desde + i * paso_segundos.
+    Parámetros: horas (por defecto 24) y puntos (por defecto 48, máximo de bloques).
+    """
+    horas = request.args.get('horas', default=24, type=float)
+    puntos = request.args.get('puntos', default=48, type=int)
+    if not 0 < horas <= 24 * 31:
+        return jsonify({'success': False, 'mensaje': 'El parámetro horas debe estar entre 0 y 744'}), 400
+    if not 2 <= puntos <= 1000:
+        return jsonify({'success': False, 'mensaje': 'El parámetro puntos debe estar entre 2 y 1000'}), 400
+    try:
+        sparklines = data_manager.obtener_sparklines(horas=horas, puntos=puntos)
+        temperatura = np.round(sparklines['temperatura'], 1)
+        humedad = np.round(sparklines['humedad'], 1)
+        aires = [
+            {
+                'id': int(aire_id),
+                'nombre': nombre,
+                'ubicacion': ubicacion,
+                'temperatura': [None if np.isnan(v) else float(v) for v in temperatura[i]],
+                'humedad': [None if np.isnan(v) else float(v) for v in humedad[i]],
+            }
+            for i, (aire_id, nombre, ubicacion) in enumerate(sparklines['aires'].itertuples(index=False))
+        ]
+        return jsonify({
+            'success': True,
+            'desde': sparklines['desde'].strftime('%Y-%m-%d %H:%M:%S'),
+            'paso_segundos': sparklines['paso_segundos'],
+            'aires': aires
+        })
+    except Exception as e:
+        print(f"Error al obtener las sparklines del dashboard: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al obtener las series del dashboard'}), 500
+
+@aircontrol_bp.route('/api/anomalias', methods=['GET'])
+@jwt_required()
+def get_anomalias():
+    """
+    Anomalías encontradas por el detector en línea de la ingesta (picos e inicios
+    de deriva), de la más reciente a la más antigua.
+    Parámetros opcionales: aire_id, desde y hasta ('YYYY-MM-DD HH:MM:SS'),
+    tipo=pico|deriva y limite (por defecto 200, máximo 5000).
+    """
+    aire_id = request.args.get('aire_id', type=int)
+    tipo = request.args.get('tipo')
+    limite = request.args.get('limite', default=200, type=int)
+    try:
+        desde_str = request.args.get('desde')
+        hasta_str = request.args.get('hasta')
+        desde = datetime.strptime(desde_str, '%Y-%m-%d %H:%M:%S') if desde_str else None
+        hasta = datetime.strptime(hasta_str, '%Y-%m-%d %H:%M:%S') if hasta_str else None
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Formato de fecha inválido. Use 'YYYY-MM-DD HH:MM:SS'"}), 400
+    if tipo not in (None, 'pico', 'deriva'):
+        return jsonify({'success': False, 'mensaje': "Tipo inválido. Use 'pico' o 'deriva'"}), 400
+    if not 1 <= limite <= 5000:
+        return jsonify({'success': False, 'mensaje': 'El parámetro limite debe estar entre 1 y 5000'}), 400
+    try:
+        anomalias_df = data_manager.obtener_anomalias(aire_id=aire_id, desde=desde, hasta=hasta, tipo=tipo, limite=limite)
+        anomalias = [
+            {
+                'id': int(fila.id),
+                'aire_id': int(fila.aire_id),
+                'nombre_aire': fila.nombre_aire,
+                'fecha': fila.fecha.strftime('%Y-%m-%d %H:%M:%S'),
+                'variable': fila.variable,
+                'tipo': fila.tipo,
+                'valor': round(float(fila.valor), 2),
+                'esperado': round(float(fila.esperado), 2),
+                'puntuacion': round(float(fila.puntuacion), 2),
+            }
+            for fila in anomalias_df.itertuples(index=False)
+        ]
+        return jsonify({'success': True, 'data': anomalias})
+    except Exception as e:
+        print(f"Error al obtener anomalías: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al obtener las anomalías'}), 500
+
+@aircontrol_bp.route('/api/predicciones', methods=['GET'])
+@jwt_required()
+def get_predicciones():
+    """
+    Aires cuya tendencia reciente cruzará sus umbrales de temperatura o humedad en
+    las próximas horas, del cruce más cercano al más lejano (0 horas: ya fuera).
+    Parámetros opcionales: horizonte_horas (por defecto 24), historia_horas (horas
+    de lecturas para ajustar la tendencia, por defecto 6), variable
+    (temperatura|humedad) y aire_id.
+    """
+    horizonte_horas = request.args.get('horizonte_horas', default=24, type=float)
+    historia_horas = request.args.get('historia_horas', default=6, type=float)
+    variable = request.args.get('variable')
+    aire_id = request.args.get('aire_id', type=int)
+    if not 0 < horizonte_horas <= 24 * 7:
+        return jsonify({'success': False, 'mensaje': 'El parámetro horizonte_horas debe estar entre 0 y 168'}), 400
+    if not 1 <= historia_horas <= 24 * 7:
+        return jsonify({'success': False, 'mensaje': 'El parámetro historia_horas debe estar entre 1 y 168'}), 400
+    if variable not in (None, 'temperatura', 'humedad'):
+        return jsonify({'success': False, 'mensaje': "Variable inválida. Use 'temperatura' o 'humedad'"}), 400
+    try:
+        predicciones_df = data_manager.obtener_predicciones(horizonte_horas=horizonte_horas,
+                                                             historia_horas=historia_horas)
+        if variable is not None:
+            predicciones_df = predicciones_df[predicciones_df['variable'] == variable]
+        if aire_id is not None:
+            predicciones_df = predicciones_df[predicciones_df['aire_id'] == aire_id]
+        predicciones = [
+            {
+                'aire_id': int(fila.aire_id),
+                'nombre': fila.nombre,
+                'ubicacion': fila.ubicacion,
+                'variable': fila.variable,
+                'limite': fila.limite,
+                'valor_limite': float(fila.valor_limite),
+                'nivel_actual': round(float(fila.nivel_actual), 2),
+                'pendiente_por_hora': round(float(fila.pendiente_por_hora), 3),
+                'error': round(float(fila.error), 2),
+                'horas_hasta_cruce': round(float(fila.horas_hasta_cruce), 2),
+                'fecha_estimada': fila.fecha_estimada.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for fila in predicciones_df.itertuples(index=False)
+        ]
+        return jsonify({'success': True, 'data': predicciones})
+    except Exception as e:
+        print(f"Error al calcular las predicciones: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al calcular las predicciones'}), 500
+
+@aircontrol_bp.route('/api/excursiones', methods=['GET'])
+@jwt_required()
+def get_excursiones():
+    """
+    Tiempo fuera de los umbrales aplicables y excursiones (número y duración de la
+    más larga) por aire o por ubicación, y por periodo, para los informes de SLA.
+    Parámetros: desde y hasta ('YYYY-MM-DD HH:MM:SS', por defecto los últimos 7 días),
+    periodo=hora|dia|semana|total (por defecto dia), agrupar=aire|ubicacion,
+    aire_ids (lista separada por comas) o ubicacion.
+    """
+    try:
+        hasta_str = request.args.get('hasta')
+        desde_str = request.args.get('desde')
+        hasta = datetime.strptime(hasta_str, '%Y-%m-%d %H:%M:%S') if hasta_str else datetime.now()
+        desde = datetime.strptime(desde_str, '%Y-%m-%d %H:%M:%S') if desde_str else hasta - timedelta(days=7)
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Formato de fecha inválido. Use 'YYYY-MM-DD HH:MM:SS'"}), 400
+    try:
+        aire_ids_str = request.args.get('aire_ids')
+        aire_ids = [int(a) for a in aire_ids_str.split(',') if a.strip()] if aire_ids_str else None
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': 'aire_ids debe ser una lista de IDs separados por comas'}), 400
+    periodo = request.args.get('periodo', default='dia')
+    agrupar = request.args.get('agrupar', default='aire')
+    if desde >= hasta:
+        return jsonify({'success': False, 'mensaje': "'desde' debe ser anterior a 'hasta'"}), 400
+    if periodo != 'total' and periodo not in PERIODOS_EXCURSIONES:
+        return jsonify({'success': False, 'mensaje': f"Periodo inválido. Use {', '.join(PERIODOS_EXCURSIONES)} o total"}), 400
+    if agrupar not in ('aire', 'ubicacion'):
+        return jsonify({'success': False, 'mensaje': "El parámetro agrupar admite 'aire' o 'ubicacion'"}), 400
+
+    try:
+        excursiones_df = data_manager.obtener_excursiones(
+            desde=desde, hasta=hasta, periodo=None if periodo == 'total' else periodo, agrupar_por=agrupar,
+            aire_ids=aire_ids, ubicacion=request.args.get('ubicacion')
+        )
+        filas = []
+        for fila in excursiones_df.to_dict('records'):
+            registro = {'aire_id': int(fila['aire_id']), 'nombre': fila['nombre']} if agrupar == 'aire' else {'aires': int(fila['aires'])}
+            registro.update({
+                'ubicacion': fila['ubicacion'],
+                'periodo': fila['periodo'].strftime('%Y-%m-%d %H:%M:%S') if not pd.isna(fila['periodo']) else None,
+                'lecturas': int(fila['lecturas']),
+                'lecturas_fuera': int(fila['lecturas_fuera']),
+                'excursiones': int(fila['episodios']),
+                'minutos_fuera': round(float(fila['segundos_fuera']) / 60, 1),
+                'excursion_mas_larga_minutos': round(float(fila['episodio_mas_largo']) / 60, 1),
+            })
+            filas.append(registro)
+        return jsonify({
+            'success': True,
+            'desde': desde.strftime('%Y-%m-%d %H:%M:%S'),
+            'hasta': hasta.strftime('%Y-%m-%d %H:%M:%S'),
+            'data': filas
+        })
+    except Exception as e:
+        print(f"Error al calcular las excursiones: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al calcular las excursiones'}), 500
+
+@aircontrol_bp.route('/api/cache/metricas', methods=['GET'])
+@jwt_required()
+def get_cache_metricas():
+    """Métricas de la caché de consultas (aciertos, fallos, desalojos, invalidaciones)."""
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') != 'admin':
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+    return jsonify({'success': True, 'data': data_manager.cache.metricas()})
+
+@aircontrol_bp.route('/api/reglas', methods=['GET'])
+@jwt_required()
+def get_reglas():
+    """
+    Reglas de alerta declarativas. Con aire_id devuelve las que aplican a ese aire
+    (propias y globales).
+    """
+    aire_id = request.args.get('aire_id', type=int)
+    try:
+        reglas_df = data_manager.obtener_reglas_alerta(aire_id)
+        reglas = [
+            {
+                'id': int(fila.id),
+                'nombre': fila.nombre,
+                'tipo': fila.tipo,
+                'variable': fila.variable if pd.notna(fila.variable) else None,
+                'operador': fila.operador if pd.notna(fila.operador) else None,
+                'valor': float(fila.valor) if pd.notna(fila.valor) else None,
+                'ventana_minutos': float(fila.ventana_minutos),
+                'es_global': bool(fila.es_global),
+                'aire_id': int(fila.aire_id) if pd.notna(fila.aire_id) else None,
+                'aire_nombre': fila.nombre_aire if pd.notna(fila.nombre_aire) else None,
+                'activa': bool(fila.activa),
+            }
+            for fila in reglas_df.itertuples(index=False)
+        ]
+        return jsonify({'success': True, 'data': reglas})
+    except Exception as e:
+        print(f"Error al obtener las reglas de alerta: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al obtener las reglas de alerta'}), 500
+
+def _datos_regla(data):
+    """Campos de una regla en el cuerpo de la petición y su error de validación (o None)."""
+    campos = {
+        'nombre': data.get('nombre'),
+        'tipo': data.get('tipo'),
+        'variable': data.get('variable'),
+        'operador': data.get('operador'),
+        'valor': data.get('valor'),
+        'ventana_minutos': data.get('ventana_minutos'),
+        'activa': data.get('activa', True),
+    }
+    if not campos['nombre']:
+        return campos, 'El nombre es requerido'
+    for campo in ('valor', 'ventana_minutos'):
+        if campos[campo] is not None and not isinstance(campos[campo], (int, float)):
+            return campos, f'El campo {campo} debe ser numérico'
+    return campos, validar_regla(campos['tipo'], campos['variable'], campos['operador'],
+                                 campos['valor'], campos['ventana_minutos'])
+
+@aircontrol_bp.route('/api/reglas', methods=['POST'])
+@jwt_required()
+def add_regla():
+    """
+    Crea una regla de alerta: tipo cambio (variable, operador '>' sube / '<' baja,
+    valor y ventana_minutos), sostenido (variable, operador, valor límite y
+    ventana_minutos) o sin_lecturas (solo ventana_minutos). Global o de un aire.
+    """
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') not in ['admin', 'supervisor']:
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    data = request.get_json() or {}
+    campos, error = _datos_regla(data)
+    if error:
+        return jsonify({'success': False, 'mensaje': error}), 400
+    es_global = bool(data.get('es_global', False))
+    aire_id = data.get('aire_id') if not es_global else None
+    if not es_global and not aire_id:
+        return jsonify({'success': False, 'mensaje': 'Se requiere un aire acondicionado para reglas específicas'}), 400
+
+    regla_id = data_manager.crear_regla_alerta(es_global=es_global, aire_id=aire_id, **campos)
+    if regla_id:
+        return jsonify({'success': True, 'mensaje': 'Regla de alerta creada exitosamente', 'id': regla_id})
+    return jsonify({'success': False, 'mensaje': 'Error al crear la regla de alerta'}), 500
+
+@aircontrol_bp.route('/api/reglas/<int:regla_id>', methods=['PUT'])
+@jwt_required()
+def update_regla(regla_id):
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') not in ['admin', 'supervisor']:
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    campos, error = _datos_regla(request.get_json() or {})
+    if error:
+        return jsonify({'success': False, 'mensaje': error}), 400
+
+    if data_manager.actualizar_regla_alerta(regla_id, **campos):
+        return jsonify({'success': True, 'mensaje': 'Regla de alerta actualizada exitosamente'})
+    return jsonify({'success': False, 'mensaje': 'Error al actualizar la regla de alerta'}), 404
+
+@aircontrol_bp.route('/api/reglas/<int:regla_id>', methods=['DELETE'])
+@jwt_required()
+def delete_regla(regla_id):
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') not in ['admin', 'supervisor']:
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+
+    if data_manager.eliminar_regla_alerta(regla_id):
+        return jsonify({'success': True, 'mensaje': 'Regla de alerta eliminada exitosamente'})
+    return jsonify({'success': False, 'mensaje': 'Error al eliminar la regla de alerta'}), 404
+
+@aircontrol_bp.route('/api/reglas/alertas', methods=['GET'])
+@jwt_required()
+def get_alertas_reglas():
+    """
+    Alertas disparadas por las reglas, de la más reciente a la más antigua.
+    Parámetros opcionales: aire_id, regla_id, desde y hasta ('YYYY-MM-DD HH:MM:SS')
+    y limite (por defecto 200, máximo 5000).
+    """
+    aire_id = request.args.get('aire_id', type=int)
+    regla_id = request.args.get('regla_id', type=int)
+    limite = request.args.get('limite', default=200, type=int)
+    try:
+        desde_str = request.args.get('desde')
+        hasta_str = request.args.get('hasta')
+        desde = datetime.strptime(desde_str, '%Y-%m-%d %H:%M:%S') if desde_str else None
+        hasta = datetime.strptime(hasta_str, '%Y-%m-%d %H:%M:%S') if hasta_str else None
+    except ValueError:
+        return jsonify({'success': False, 'mensaje': "Formato de fecha inválido. Use 'YYYY-MM-DD HH:MM:SS'"}), 400
+    if not 1 <= limite <= 5000:
+        return jsonify({'success': False, 'mensaje': 'El parámetro limite debe estar entre 1 y 5000'}), 400
+    try:
+        alertas_df = data_manager.obtener_alertas_reglas(aire_id=aire_id, regla_id=regla_id, desde=desde,
+                                                         hasta=hasta, limite=limite)
+        alertas = [
+            {
+                'id': int(fila.id),
+                'regla_id': int(fila.regla_id),
+                'nombre_regla': fila.nombre_regla,
+                'tipo': fila.tipo,
+                'aire_id': int(fila.aire_id),
+                'nombre_aire': fila.nombre_aire,
+                'fecha': fila.fecha.strftime('%Y-%m-%d %H:%M:%S'),
+                'valor': round(float(fila.valor), 2) if pd.notna(fila.valor) else None,
+                'mensaje': fila.mensaje,
+                'fecha_registro': fila.fecha_registro.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for fila in alertas_df.itertuples(index=False)
+        ]
+        return jsonify({'success': True, 'data': alertas})
+    except Exception as e:
+        print(f"Error al obtener las alertas de reglas: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return jsonify({'success': False, 'mensaje': 'Error al obtener las alertas de reglas'}), 500
+
+@aircontrol_bp.route('/api/ingesta/metricas', methods=['GET'])
+@jwt_required()
+def get_ingesta_metricas():
+    """
+    Profundidad de la cola de ingesta diferida, latencia de los flush y contadores,
+    más el estado de la ventana de lecturas recientes, del detector de anomalías y
+    del motor de reglas de alerta de este worker.
+    """
+    jwt_data = get_jwt()
+    if jwt_data.get('rol') != 'admin':
+        return jsonify({'success': False, 'mensaje': 'No tienes permiso para realizar esta acción'}), 403
+    extra = {'ventana': data_manager.ventana.metricas(), 'anomalias': data_manager.detector.metricas(),
+             'reglas': data_manager.reglas.metricas()}
+    if INGESTA_MODO == 'cola':
+        return jsonify({'success': True, 'data': dict(data_manager.metricas_cola_ingesta(), modo=INGESTA_MODO, **extra)})
+    if cola_ingesta is None:
+        return jsonify({'success': True, 'data': dict(modo=INGESTA_MODO, **extra)})
+    return jsonify({'success': True, 'data': dict(cola_ingesta.metricas(), modo=INGESTA_MODO, **extra)})
+
+@aircontrol_bp.route('/api/trabajos/<int:trabajo_id>', methods=['GET'])
+@jwt_required()
+def get_trabajo(trabajo_id):
+    """Estado y progreso de un trabajo en segundo plano."""
+    trabajo = obtener_trabajo(trabajo_id)
+    if trabajo is None:
+        return jsonify({'success': False, 'mensaje': 'Trabajo no encontrado'}), 404
+    return jsonify({'success': True, 'data': trabajo})
+
+@aircontrol_bp.route('/api/eventos', methods=['GET'])
+@jwt_required()
+def stream_eventos():
+    """
+    Server-Sent Events con los cambios confirmados en cualquier worker
+    (tabla, aire_id, entidad_id, fecha). Envía un comentario cada 15 s para
+    mantener viva la conexión a través de proxies.
+    """
+    cola = data_manager.bus.suscribir()
+
+    def generar():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    evento = cola.get(timeout=15)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                datos = {k: v for k, v in evento.items() if k != 'origen'}
+                yield f"event: {evento['tabla']}\ndata: {json.dumps(datos)}\n\n"
+        finally:
+            data_manager.bus.desuscribir(cola)
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Registrar el Blueprint con el prefijo /aircontrol
 app.register_blueprint(aircontrol_bp, url_prefix='/aircontrol')
 
@@ -0,0 +1,455 @@
+"""
+Verificaciones de precisión y pruebas de rendimiento sobre datos sintéticos.
+
+Uso (desde el directorio backend):
+    python benchmarks.py sketches
+    python benchmarks.py compresion
+    python benchmarks.py almacenamiento   (solo PostgreSQL; usa tablas temporales)
+    python benchmarks.py worker      (escribe en DATABASE_URL: usar una base de pruebas)
+    python benchmarks.py anomalias
+    python benchmarks.py predicciones
+    python benchmarks.py simulacion
+    python benchmarks.py reglas
+"""
+import argparse
+import multiprocessing
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+from sketches import DDSketch, ALPHA_POR_DEFECTO
+from compresion import estados_umbrales, filtrar_banda_muerta
+from series_temporales import estadisticas_ponderadas_tiempo
+from anomalias import DetectorAnomalias
+from reglas import MotorReglas
+from prediccion import ajustar_tendencias, horas_hasta_cruce
+from series_mmap import AlmacenSeries, DTYPE_LECTURA
+import excursiones
+
+
+def _lecturas_sinteticas(n, semilla=0):
+    """Temperaturas y humedades con un decimal, como las que registran los operadores."""
+    rng = np.random.default_rng(semilla)
+    temperatura = np.round(rng.normal(23.0, 2.5, n) + rng.standard_t(3, n) * 0.3, 1)
+    humedad = np.round(np.clip(rng.normal(50.0, 8.0, n), 5, 99), 1)
+    return temperatura, humedad
+
+
+def benchmark_sketches(n=1_000_000, horas=24 * 30, alpha=ALPHA_POR_DEFECTO):
+    """
+    Compara los percentiles de sketches horarios fusionados con los percentiles
+    exactos de NumPy y verifica la cota de error relativo 'alpha'. Lanza
+    AssertionError (salida distinta de cero) si algún percentil la supera.
+    """
+    temperatura, humedad = _lecturas_sinteticas(n)
+    cuantiles = [0.5, 0.9, 0.95, 0.99]
+
+    inicio = time.perf_counter()
+    serializados = []
+    for bloque_temp, bloque_hum in zip(np.array_split(temperatura, horas), np.array_split(humedad, horas)):
+        sketch_temp, sketch_hum = DDSketch(alpha), DDSketch(alpha)
+        sketch_temp.agregar(bloque_temp)
+        sketch_hum.agregar(bloque_hum)
+        serializados.append((sketch_temp.a_bytes(), sketch_hum.a_bytes()))
+    duracion_construccion = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    fusion_temp, fusion_hum = DDSketch(alpha), DDSketch(alpha)
+    for datos_temp, datos_hum in serializados:
+        fusion_temp.fusionar(DDSketch.desde_bytes(datos_temp))
+        fusion_hum.fusionar(DDSketch.desde_bytes(datos_hum))
+    duracion_fusion = time.perf_counter() - inicio
+
+    bytes_por_hora = np.mean([len(t) + len(h) for t, h in serializados])
+    print(f"{n} lecturas en {horas} sketches horarios")
+    print(f"  construcción: {duracion_construccion:.2f}s, fusión: {duracion_fusion * 1000:.1f}ms, "
+          f"{bytes_por_hora:.0f} bytes por hora (temperatura + humedad)")
+
+    fuera_de_cota = []
+    for nombre, datos, sketch in (('temperatura', temperatura, fusion_temp), ('humedad', humedad, fusion_hum)):
+        for q, aproximado in zip(cuantiles, sketch.cuantiles(cuantiles)):
+            exacto_inferior = np.percentile(datos, q * 100, method='lower')
+            exacto_lineal = np.percentile(datos, q * 100)
+            error = abs(aproximado - exacto_inferior) / abs(exacto_inferior)
+            dentro = error <= alpha + 1e-12
+            if not dentro:
+                fuera_de_cota.append(f"{nombre} p{q * 100:g} (error_rel={error:.5f})")
+            print(f"  {nombre} p{q * 100:g}: sketch={aproximado:.3f} numpy(lower)={exacto_inferior:.3f} "
+                  f"numpy(linear)={exacto_lineal:.3f} error_rel={error:.5f} {'OK' if dentro else 'FUERA DE COTA'}")
+    # No se usa assert: se eliminaría al ejecutar con python -O
+    if fuera_de_cota:
+        raise AssertionError(f"Error relativo por encima de alpha={alpha}: {', '.join(fuera_de_cota)}")
+    return True
+
+
+def _serie_sala(n, intervalo=60, semilla=0):
+    """
+    Serie de una sala sana muestreada cada 'intervalo' segundos: ciclo diario suave,
+    deriva lenta, ruido de centésimas y algunas excursiones de unas horas.
+    """
+    rng = np.random.default_rng(semilla)
+    t = np.arange(n) * float(intervalo)
+    dia = 2 * np.pi * t / 86400
+    temperatura = 22.0 + 0.8 * np.sin(dia) + np.cumsum(rng.normal(0, 0.002, n)) + rng.normal(0, 0.02, n)
+    humedad = 50.0 + 3.0 * np.sin(dia + 1.0) + np.cumsum(rng.normal(0, 0.005, n)) + rng.normal(0, 0.05, n)
+    for inicio in rng.integers(0, n - 240, max(n // 20000, 1)):
+        temperatura[inicio:inicio + 180] += np.linspace(0, 4.0, 180)
+    return t, np.round(temperatura, 2), np.round(humedad, 2)
+
+
+def benchmark_compresion(n=43_200, intervalo=60, tolerancias=((0.05, 0.2), (0.1, 0.5), (0.2, 1.0), (0.5, 2.0)),
+                         max_intervalo=900, umbrales=((18.0, 24.5, 30.0, 60.0),)):
+    """
+    Mide la reducción de almacenamiento del filtro de banda muerta (compresion.py)
+    sobre 'n' lecturas sintéticas y verifica la cota de error documentada: valores
+    reconstruidos, promedio ponderado (metodo='escalon'), mínimo y máximo a menos
+    de la tolerancia; todos los cruces de umbral conservados; latido respetado.
+    """
+    t, temperatura, humedad = _serie_sala(n, intervalo)
+    estados = estados_umbrales(temperatura, humedad, list(umbrales))
+    cruces = np.flatnonzero(np.any(estados[1:] != estados[:-1], axis=1)) + 1
+    fechas = pd.to_datetime(t, unit='s')
+    print(f"{n} lecturas cada {intervalo}s ({n * intervalo / 86400:.0f} días), {len(cruces)} cruces de umbral, "
+          f"latido {max_intervalo}s")
+
+    correcto = True
+    for tol_temp, tol_hum in tolerancias:
+        inicio = time.perf_counter()
+        guardar = filtrar_banda_muerta(t, temperatura, humedad, estados, tol_temp=tol_temp, tol_hum=tol_hum,
+                                       max_intervalo=max_intervalo)
+        duracion = time.perf_counter() - inicio
+
+        # Reconstrucción manteniendo el último valor guardado
+        indice = np.maximum.accumulate(np.where(guardar, np.arange(n), 0))
+        error_temp = np.abs(temperatura - temperatura[indice]).max()
+        error_hum = np.abs(humedad - humedad[indice]).max()
+        guardadas = np.flatnonzero(guardar)
+        hueco = np.diff(t[guardadas]).max() if len(guardadas) > 1 else 0
+
+        # Estadísticas sobre el mismo tramo (hasta la última lectura guardada)
+        tramo = slice(0, guardadas[-1] + 1)
+        completo = pd.DataFrame({'aire_id': 1, 'fecha': fechas[tramo], 'temperatura': temperatura[tramo],
+                                 'humedad': humedad[tramo]})
+        exactas = estadisticas_ponderadas_tiempo(completo, metodo='escalon').iloc[0]
+        comprimidas = estadisticas_ponderadas_tiempo(completo[guardar[tramo]], metodo='escalon').iloc[0]
+        errores = {
+            f'{col}_{estadistico}': abs(comprimidas[f'{col}_{estadistico}'] - exactas[f'{col}_{estadistico}'])
+            for col in ('temperatura', 'humedad') for estadistico in ('promedio', 'min', 'max')
+        }
+
+        # Mismo criterio que filtrar_banda_muerta: un error igual a la tolerancia es válido
+        dentro = (error_temp <= tol_temp and error_hum <= tol_hum and hueco <= max_intervalo
+                  and guardar[cruces].all()
+                  and all(error <= (tol_temp if col.startswith('temperatura') else tol_hum)
+                          for col, error in errores.items()))
+        correcto = correcto and dentro
+        print(f"  tolerancia {tol_temp}°C / {tol_hum}%: {guardar.sum()} guardadas "
+              f"({100 * guardar.mean():.1f} %, reducción x{n / guardar.sum():.1f}) en {duracion * 1000:.0f}ms; "
+              f"error máx. {error_temp:.3f}°C / {error_hum:.3f}%; "
+              f"promedio ±{errores['temperatura_promedio']:.4f}°C / ±{errores['humedad_promedio']:.4f}%; "
+              f"min/max ±{max(errores['temperatura_min'], errores['temperatura_max']):.3f}°C; "
+              f"{'OK' if dentro else 'FUERA DE COTA'}")
+    return correcto
+
+
+def benchmark_almacenamiento(n=1_000_000, aires=100):
+    """
+    Bytes por lectura con el esquema anterior (double precision, sin índice por fecha)
+    y con el actual (real + BRIN sobre fecha), cargando las mismas 'n' lecturas en
+    tablas temporales con sus índices. También informa el tamaño de la tabla real.
+    """
+    from sqlalchemy import text
+    from database import engine
+
+    if engine.dialect.name != 'postgresql':
+        print(f"Motor {engine.dialect.name}: la medición usa funciones de PostgreSQL (pg_table_size)")
+        return None
+
+    esquemas = {
+        'antes (double precision)': (
+            "temperatura double precision NOT NULL, humedad double precision NOT NULL", []
+        ),
+        'después (real + BRIN)': (
+            "temperatura real NOT NULL, humedad real NOT NULL",
+            ["CREATE INDEX ON {tabla} USING brin (fecha)"]
+        ),
+    }
+    with engine.begin() as conexion:
+        for numero, (nombre, (columnas, indices)) in enumerate(esquemas.items()):
+            tabla = f"bench_lecturas_{numero}"
+            conexion.execute(text(
+                f"CREATE TEMP TABLE {tabla} (id serial PRIMARY KEY, aire_id integer, "
+                f"fecha timestamp NOT NULL, {columnas}, UNIQUE (aire_id, fecha)) ON COMMIT DROP"
+            ))
+            for indice in indices:
+                conexion.execute(text(indice.format(tabla=tabla)))
+            inicio = time.perf_counter()
+            conexion.execute(text(
+                f"INSERT INTO {tabla} (aire_id, fecha, temperatura, humedad) "
+                f"SELECT g % :aires + 1, timestamp '2024-01-01' + (g / :aires) * interval '1 minute', "
+                f"round((22 + random() * 4)::numeric, 1), round((45 + random() * 15)::numeric, 1) "
+                f"FROM generate_series(0, :n - 1) g"
+            ), {'aires': aires, 'n': n})
+            duracion = time.perf_counter() - inicio
+            tabla_bytes, indices_bytes = conexion.execute(text(
+                f"SELECT pg_table_size('{tabla}'), pg_indexes_size('{tabla}')"
+            )).one()
+            print(f"{nombre}: {n} lecturas cargadas en {duracion:.1f}s; tabla {tabla_bytes / n:.1f} B/lectura, "
+                  f"índices {indices_bytes / n:.1f} B/lectura, total {(tabla_bytes + indices_bytes) / n:.1f} B/lectura")
+
+        lecturas = conexion.execute(text("SELECT count(*) FROM lecturas")).scalar()
+        if lecturas:
+            tabla_bytes, indices_bytes = conexion.execute(text(
+                "SELECT pg_table_size('lecturas'), pg_indexes_size('lecturas')"
+            )).one()
+            print(f"lecturas actual: {lecturas} filas; tabla {tabla_bytes / lecturas:.1f} B/lectura, "
+                  f"índices {indices_bytes / lecturas:.1f} B/lectura")
+    return True
+
+
+def _proceso_worker(max_lote, barrera, resultados):
+    import worker
+    from data_manager import DataManager
+    data_manager = DataManager()
+    barrera.wait()
+    resultados.put(worker.procesar(data_manager, max_lote=max_lote, hasta_vaciar=True))
+
+
+def benchmark_worker(n=200_000, procesos=(1, 2, 4, 8), max_lote=1000):
+    """
+    Mide el rendimiento de worker.py con varios procesos vaciando ingest_queue.
+    Las lecturas sintéticas se fechan en 2100 y se borran al terminar cada ronda.
+    Con PostgreSQL los procesos toman lotes en paralelo (SKIP LOCKED); con otros
+    motores se serializan y solo sirve para comprobar el funcionamiento.
+    """
+    from data_manager import DataManager
+    from database import engine
+
+    data_manager = DataManager()
+    if engine.dialect.name != 'postgresql':
+        print(f"Aviso: motor {engine.dialect.name}, sin SKIP LOCKED los workers no escalan")
+    aires = data_manager.obtener_aires()['id'].astype(int).tolist()[:10]
+    if not aires:
+        print("No hay aires en la base de datos")
+        return False
+
+    temperatura, humedad = _lecturas_sinteticas(n)
+    contexto = multiprocessing.get_context('spawn')
+    base = datetime(2100, 1, 1)
+    for ronda, cantidad in enumerate(procesos):
+        inicio_serie = base + timedelta(days=30 * ronda)
+        segundos = np.arange(n) // len(aires)
+        lecturas = [
+            {'aire_id': aires[i % len(aires)], 'fecha': inicio_serie + timedelta(seconds=int(segundos[i])),
+             'temperatura': float(temperatura[i]), 'humedad': float(humedad[i])}
+            for i in range(n)
+        ]
+        for inicio in range(0, n, 50_000):
+            data_manager.encolar_lecturas_bd(lecturas[inicio:inicio + 50_000])
+
+        barrera = contexto.Barrier(cantidad + 1)
+        resultados = contexto.Queue()
+        trabajadores = [contexto.Process(target=_proceso_worker, args=(max_lote, barrera, resultados))
+                        for _ in range(cantidad)]
+        for proceso in trabajadores:
+            proceso.start()
+        barrera.wait()
+        inicio = time.perf_counter()
+        procesadas = sum(resultados.get() for _ in trabajadores)
+        duracion = time.perf_counter() - inicio
+        for proceso in trabajadores:
+            proceso.join()
+        print(f"{cantidad} worker(s): {procesadas} lecturas en {duracion:.2f}s -> "
+              f"{procesadas / duracion:,.0f} lecturas/s")
+
+        data_manager.eliminar_lecturas_rango(desde=inicio_serie, hasta=inicio_serie + timedelta(days=30))
+    return True
+
+
+def benchmark_anomalias(n=1_000_000, aires=1000, tamano_lote=1000, picos=2000):
+    """
+    Mide el rendimiento del detector de anomalías de la ingesta sobre lotes como
+    los de la cola (lecturas intercaladas de muchos aires) y comprueba que
+    detecta los picos inyectados.
+    """
+    rng = np.random.default_rng(1)
+    por_aire = n // aires
+    n = por_aire * aires
+    temperatura, humedad = _lecturas_sinteticas(n)
+    # Lecturas cada minuto, intercaladas por aire como llegan a la ingesta
+    aire_ids = np.tile(np.arange(1, aires + 1), por_aire)
+    fechas = np.datetime64('2024-01-01T00:00:00') + (np.arange(n) // aires).astype('timedelta64[m]')
+    # Picos tras el calentamiento, sobre la temperatura
+    detector = DetectorAnomalias(cargar=lambda: {})
+    posiciones = rng.choice(np.arange(detector.calentamiento * aires * 2, n), size=picos, replace=False)
+    temperatura[posiciones] += rng.choice([-1, 1], size=picos) * 20.0
+    lecturas = pd.DataFrame({'aire_id': aire_ids, 'fecha': fechas, 'temperatura': temperatura, 'humedad': humedad})
+
+    inyectados = set(zip(aire_ids[posiciones].tolist(), fechas[posiciones].astype('datetime64[us]').tolist()))
+    detectados = set()
+    inicio = time.perf_counter()
+    for desde in range(0, n, tamano_lote):
+        anomalias, nuevos = detector.evaluar(lecturas.iloc[desde:desde + tamano_lote])
+        detector.confirmar(nuevos, anomalias)
+        detectados.update((a['aire_id'], a['fecha']) for a in anomalias
+                          if a['tipo'] == 'pico' and a['variable'] == 'temperatura')
+    duracion = time.perf_counter() - inicio
+
+    metricas = detector.metricas()
+    recall = len(inyectados & detectados) / len(inyectados)
+    print(f"{n} lecturas de {aires} aires en lotes de {tamano_lote}: {duracion:.2f}s -> {n / duracion:,.0f} lecturas/s")
+    print(f"Picos inyectados detectados: {recall:.1%}; picos: {metricas['picos']}, derivas: {metricas['derivas']}")
+    return recall >= 0.95
+
+
+def benchmark_predicciones(aires=10_000, bloques=72, paso_minutos=5, horizonte=24):
+    """
+    Mide el ajuste de tendencias de toda la flota (bloques de la pirámide de las
+    últimas horas) y comprueba que recupera las pendientes y el tiempo hasta el
+    cruce pese a bloques vacíos y picos.
+    """
+    rng = np.random.default_rng(2)
+    x = (np.arange(bloques) - bloques + 0.5) * paso_minutos / 60.0
+    pendientes = rng.normal(0.0, 0.3, aires)
+    niveles = rng.normal(23.0, 1.5, aires)
+    y = niveles[:, None] + pendientes[:, None] * x + rng.normal(0.0, 0.2, (aires, bloques))
+    y[rng.random((aires, bloques)) < 0.05] = np.nan
+    picos = rng.random((aires, bloques)) < 0.02
+    y[picos] += 8.0
+    pesos = rng.integers(1, 6, (aires, bloques)).astype(np.float64)
+
+    inicio = time.perf_counter()
+    tendencia = ajustar_tendencias(x, y, pesos=pesos)
+    horas, _ = horas_hasta_cruce(tendencia['nivel'], tendencia['pendiente'],
+                                 np.full(aires, 16.0), np.full(aires, 27.0), horizonte)
+    duracion = time.perf_counter() - inicio
+
+    error_pendiente = np.abs(tendencia['pendiente'] - pendientes)
+    esperadas, _ = horas_hasta_cruce(niveles, pendientes, np.full(aires, 16.0), np.full(aires, 27.0), horizonte)
+    coinciden = np.mean(np.isnan(horas) == np.isnan(esperadas))
+    print(f"{aires} aires x {bloques} bloques: {duracion * 1000:.1f} ms")
+    print(f"Error de pendiente (°C/h): mediana {np.median(error_pendiente):.4f}, p99 {np.percentile(error_pendiente, 99):.4f}")
+    print(f"Aires con cruce en {horizonte}h: {int((~np.isnan(horas)).sum())} (clasificación igual a la real: {coinciden:.1%})")
+    return bool(np.percentile(error_pendiente, 99) < 0.1 and coinciden > 0.95)
+
+
+def benchmark_simulacion(aires=500, dias=365, intervalo=300):
+    """
+    Mide la simulación de un umbral (POST /api/umbrales/simular) sobre un año de
+    lecturas de la flota en archivos de la caché de series, y compara los
+    episodios con un recorrido lectura a lectura en una muestra.
+    """
+    n = dias * 86400 // intervalo
+    limites = {'temp_min': 18.0, 'temp_max': 26.0, 'hum_min': 30.0, 'hum_max': 70.0}
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = AlmacenSeries(directorio, None, None, None)
+        fechas = np.datetime64('2024-01-01', 'us').astype(np.int64) + np.arange(n, dtype=np.int64) * intervalo * 1_000_000
+        for aire_id in range(1, aires + 1):
+            temperatura, humedad = _lecturas_sinteticas(n, semilla=aire_id)
+            registros = np.empty(n, dtype=DTYPE_LECTURA)
+            registros['id'] = np.arange(n)
+            registros['fecha'] = fechas
+            registros['temperatura'] = temperatura
+            registros['humedad'] = humedad
+            registros.tofile(almacen._ruta(aire_id))
+
+        inicio = time.perf_counter()
+        resumenes = []
+        for aire_id in range(1, aires + 1):
+            serie = almacen.leer(aire_id)
+            resumenes.append(excursiones.resumir(serie['fecha'], serie['temperatura'], serie['humedad'], limites))
+        duracion = time.perf_counter() - inicio
+
+        serie = almacen.leer(1)
+        episodios, previo = 0, False
+        for temperatura, humedad in zip(serie['temperatura'][:50_000].tolist(), serie['humedad'][:50_000].tolist()):
+            fuera = not (18.0 <= temperatura <= 26.0 and 30.0 <= humedad <= 70.0)
+            episodios += fuera and not previo
+            previo = fuera
+        muestra = excursiones.resumir(serie['fecha'][:50_000], serie['temperatura'][:50_000],
+                                      serie['humedad'][:50_000], limites)
+
+    total = aires * n
+    print(f"{aires} aires x {dias} días ({total:,} lecturas): {duracion:.2f}s -> {total / duracion:,.0f} lecturas/s")
+    print(f"Lecturas fuera: {sum(r['lecturas_fuera'] for r in resumenes):,}, "
+          f"episodios: {sum(r['episodios'] for r in resumenes):,}")
+    print(f"Episodios en la muestra: {muestra['episodios']} (recorrido: {episodios})")
+    return muestra['episodios'] == episodios
+
+
+def benchmark_reglas(aires=2000, por_aire=100, tamano_lote=1000, afectados=200):
+    """
+    Mide el motor de reglas de alerta sobre lotes de lecturas intercaladas con dos
+    reglas globales y una propia de cada aire, y comprueba que cada episodio
+    inyectado (rampa, humedad sostenida, frío sostenido) dispara una sola alerta.
+    """
+    rng = np.random.default_rng(3)
+    n = aires * por_aire
+    # Series estables, una lectura por minuto
+    temperatura = np.round(23.0 + rng.normal(0.0, 0.2, (por_aire, aires)), 1)
+    humedad = np.round(50.0 + rng.normal(0.0, 1.0, (por_aire, aires)), 1)
+    rampa, humeda, fria = rng.permutation(aires)[:3 * afectados].reshape(3, afectados)
+    for columna in rampa:
+        t0 = rng.integers(20, por_aire - 20)
+        temperatura[t0:, columna] += np.minimum(np.arange(por_aire - t0), 8) * 1.0
+    for columna in humeda:
+        t0 = rng.integers(20, por_aire - 30)
+        humedad[t0:t0 + 20, columna] = 90.0
+    for columna in fria:
+        t0 = rng.integers(20, por_aire - 10)
+        temperatura[t0:, columna] = 5.0
+
+    reglas = [
+        {'id': 1, 'nombre': 'Subida brusca', 'tipo': 'cambio', 'variable': 'temperatura', 'operador': '>',
+         'valor': 5.0, 'ventana_minutos': 10, 'es_global': True, 'aire_id': None},
+        {'id': 2, 'nombre': 'Humedad alta', 'tipo': 'sostenido', 'variable': 'humedad', 'operador': '>',
+         'valor': 85.0, 'ventana_minutos': 15, 'es_global': True, 'aire_id': None},
+    ] + [
+        {'id': 2 + aire_id, 'nombre': f'Frío {aire_id}', 'tipo': 'sostenido', 'variable': 'temperatura',
+         'operador': '<', 'valor': 10.0, 'ventana_minutos': 5, 'es_global': False, 'aire_id': aire_id}
+        for aire_id in range(1, aires + 1)
+    ]
+    motor = MotorReglas(cargar=lambda: reglas)
+    lecturas = pd.DataFrame({
+        'aire_id': np.tile(np.arange(1, aires + 1), por_aire),
+        'fecha': np.datetime64('2024-01-01T00:00:00') + (np.arange(n) // aires).astype('timedelta64[m]'),
+        'temperatura': temperatura.ravel(),
+        'humedad': humedad.ravel(),
+    })
+
+    disparadas = []
+    inicio = time.perf_counter()
+    for desde in range(0, n, tamano_lote):
+        alertas, nuevos = motor.evaluar(lecturas.iloc[desde:desde + tamano_lote])
+        motor.confirmar(nuevos, alertas)
+        disparadas.extend((a['regla_id'], a['aire_id']) for a in alertas)
+    duracion = time.perf_counter() - inicio
+
+    esperadas = ({(1, int(c) + 1) for c in rampa} | {(2, int(c) + 1) for c in humeda}
+                 | {(2 + int(c) + 1, int(c) + 1) for c in fria})
+    metricas = motor.metricas()
+    print(f"{n} lecturas de {aires} aires ({metricas['instancias']} evaluadores) en lotes de {tamano_lote}: "
+          f"{duracion:.2f}s -> {n / duracion:,.0f} lecturas/s")
+    print(f"Alertas: {len(disparadas)} (esperadas {len(esperadas)}, distintas {len(set(disparadas))})")
+    return len(disparadas) == len(set(disparadas)) and set(disparadas) == esperadas
+
+
+BENCHMARKS = {
+    'sketches': benchmark_sketches,
+    'compresion': benchmark_compresion,
+    'almacenamiento': benchmark_almacenamiento,
+    'worker': benchmark_worker,
+    'anomalias': benchmark_anomalias,
+    'predicciones': benchmark_predicciones,
+    'simulacion': benchmark_simulacion,
+    'reglas': benchmark_reglas,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    args = parser.parse_args()
+    resultado = BENCHMARKS[args.benchmark]()
+    raise SystemExit(0 if resultado in (None, True) else 1)
@@ -0,0 +1,195 @@
+"""
+Caché en memoria de consultas de solo lectura del DataManager.
+
+- LRU acotado por número de entradas, con expiración (TTL) por entrada.
+- Cada entrada lleva etiquetas (tabla o 'aire:<id>'); los métodos de escritura
+  invalidan las etiquetas afectadas.
+- Single-flight: si varias peticiones piden la misma clave ausente a la vez,
+  solo una ejecuta la consulta y las demás esperan su resultado.
+"""
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class _Entrada:
+    __slots__ = ('valor', 'expira', 'tags')
+
+    def __init__(self, valor, expira, tags):
+        self.valor = valor
+        self.expira = expira
+        self.tags = tags
+
+
+class _Vuelo:
+    """Cálculo en curso de una clave, compartido por las peticiones concurrentes."""
+    __slots__ = ('evento', 'valor', 'error')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.valor = None
+        self.error = None
+
+
+class CacheConsultas:
+    """
+    Args:
+        max_entradas: Número máximo de entradas antes de desalojar la menos usada
+        ttl: Segundos de vida por defecto de cada entrada
+    """
+
+    def __init__(self, max_entradas=256, ttl=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._por_tag = {}
+        self._en_vuelo = {}
+        # Versión por etiqueta: evita guardar un resultado calculado antes de una invalidación
+        self._versiones = {}
+        self._metricas = {
+            'aciertos': 0,
+            'fallos': 0,
+            'esperas_compartidas': 0,
+            'desalojos': 0,
+            'expiradas': 0,
+            'invalidaciones': 0,
+            'entradas_invalidadas': 0,
+        }
+
+    def obtener(self, clave, calcular, tags=(), ttl=None):
+        """
+        Devuelve el valor de 'clave', calculándolo con 'calcular()' si no está en caché.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada.expira > ahora:
+                    self._entradas.move_to_end(clave)
+                    self._metricas['aciertos'] += 1
+                    return entrada.valor
+                self._quitar(clave)
+                self._metricas['expiradas'] += 1
+
+            vuelo = self._en_vuelo.get(clave)
+            propietario = vuelo is None
+            if propietario:
+                vuelo = self._en_vuelo[clave] = _Vuelo()
+                versiones = {tag: self._versiones.get(tag, 0) for tag in tags}
+                self._metricas['fallos'] += 1
+            else:
+                self._metricas['esperas_compartidas'] += 1
+
+        if not propietario:
+            vuelo.evento.wait()
+            if vuelo.error is not None:
+                raise vuelo.error
+            return vuelo.valor
+
+        try:
+            valor = calcular()
+        except Exception as e:
+            with self._lock:
+                self._en_vuelo.pop(clave, None)
+            vuelo.error = e
+            vuelo.evento.set()
+            raise
+
+        with self._lock:
+            self._en_vuelo.pop(clave, None)
+            vigente = all(self._versiones.get(tag, 0) == version for tag, version in versiones.items())
+            if vigente:
+                self._guardar(clave, valor, tags, ttl if ttl is not None else self.ttl)
+        vuelo.valor = valor
+        vuelo.evento.set()
+        return valor
+
+    def invalidar(self, *tags):
+        """Elimina todas las entradas con alguna de las etiquetas indicadas."""
+        with self._lock:
+            self._metricas['invalidaciones'] += 1
+            for tag in tags:
+                self._versiones[tag] = self._versiones.get(tag, 0) + 1
+                for clave in list(self._por_tag.get(tag, ())):
+                    self._quitar(clave)
+                    self._metricas['entradas_invalidadas'] += 1
+
+    def limpiar(self):
+        with self._lock:
+            for tag in self._por_tag:
+                self._versiones[tag] = self._versiones.get(tag, 0) + 1
+            self._entradas.clear()
+            self._por_tag.clear()
+
+    def metricas(self):
+        with self._lock:
+            consultas = self._metricas['aciertos'] + self._metricas['fallos']
+            return dict(
+                self._metricas,
+                entradas=len(self._entradas),
+                max_entradas=self.max_entradas,
+                ttl=self.ttl,
+                tasa_aciertos=round(self._metricas['aciertos'] / consultas, 4) if consultas else 0.0
+            )
+
+    def _guardar(self, clave, valor, tags, ttl):
+        if clave in self._entradas:
+            self._quitar(clave)
+        self._entradas[clave] = _Entrada(valor, time.monotonic() + ttl, tuple(tags))
+        for tag in tags:
+            self._por_tag.setdefault(tag, set()).add(clave)
+        while len(self._entradas) > self.max_entradas:
+            clave_antigua = next(iter(self._entradas))
+            self._quitar(clave_antigua)
+            self._metricas['desalojos'] += 1
+
+    def _quitar(self, clave):
+        entrada = self._entradas.pop(clave, None)
+        if entrada is None:
+            return
+        for tag in entrada.tags:
+            claves = self._por_tag.get(tag)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._por_tag[tag]
+
+
+def _copiar(valor):
+    # Cada llamada recibe su propia copia para que modificarla no altere la caché
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy()
+    if isinstance(valor, frozenset):
+        return valor  # inmutable: se comparte sin copiar
+    return copy.deepcopy(valor)
+
+
+def consulta_cacheada(tags, ttl=None):
+    """
+    Decorador para métodos de lectura del DataManager (usa self.cache).
+
+    Args:
+        tags: Tupla de etiquetas fijas o función (*args, **kwargs) -> etiquetas
+        ttl: Segundos de vida de la entrada (None para el TTL de la caché)
+    """
+    def decorador(metodo):
+        @functools.wraps(metodo)
+        def envoltura(self, *args, **kwargs):
+            etiquetas = tuple(tags(*args, **kwargs)) if callable(tags) else tuple(tags)
+            clave = (metodo.__name__, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(clave)
+            except TypeError:
+                # Argumentos no hashables (listas, etc.): consultar sin caché
+                return metodo(self, *args, **kwargs)
+            valor = self.cache.obtener(
+                clave, lambda: metodo(self, *args, **kwargs), tags=etiquetas, ttl=ttl
+            )
+            return _copiar(valor)
+        return envoltura
+    return decorador
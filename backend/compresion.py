@@ -0,0 +1,95 @@
+"""
+Filtro de compresión de lecturas en la ingesta: banda muerta con latido.
+
+Para los aires que lo tienen configurado, una lectura nueva se descarta si su
+temperatura y su humedad están a no más de la tolerancia de la última lectura
+guardada del mismo aire (el "ancla"), salvo que:
+    - hayan pasado max_intervalo segundos desde el ancla (latido), o
+    - cambie su situación respecto de algún umbral (los cruces se guardan siempre).
+
+Una tolerancia en None deja de comparar esa variable (solo decide la otra);
+con tolerancia 0 se descartan las repeticiones exactas.
+
+Cota de error: si la serie se reconstruye manteniendo el último valor guardado
+(estadisticas_ponderadas_tiempo con metodo='escalon'), cada lectura descartada
+está a no más de la tolerancia del valor que la representa. Por eso el promedio
+ponderado por tiempo, el mínimo y el máximo de un aire comprimido difieren de
+los de la serie completa en a lo sumo la tolerancia (de las variables comparadas). Las estadísticas por conteo
+(promedio simple, percentiles de los sketches) sí se sesgan hacia los tramos
+con más variación: para aires comprimidos conviene usar ponderado=True.
+El latido debe ser menor que el max_intervalo usado en las estadísticas para
+que los huecos por compresión no se confundan con cortes del sensor.
+
+Las lecturas con fecha anterior o igual al ancla (cargas históricas) no se filtran.
+"""
+import numpy as np
+
+
+def estados_umbrales(temperaturas, humedades, umbrales):
+    """
+    Situación de cada lectura respecto de los umbrales: una fila de booleanos
+    (bajo temp_min, sobre temp_max, bajo hum_min, sobre hum_max) por umbral.
+
+    Args:
+        temperaturas, humedades: Arrays de la misma longitud
+        umbrales: Lista de tuplas (temp_min, temp_max, hum_min, hum_max)
+
+    Returns:
+        Array booleano de forma (n, 4 * len(umbrales))
+    """
+    temperaturas = np.asarray(temperaturas, dtype=float)
+    humedades = np.asarray(humedades, dtype=float)
+    if not umbrales:
+        return np.zeros((len(temperaturas), 0), dtype=bool)
+    limites = np.asarray(umbrales, dtype=float)
+    return np.concatenate([
+        temperaturas[:, None] < limites[:, 0],
+        temperaturas[:, None] > limites[:, 1],
+        humedades[:, None] < limites[:, 2],
+        humedades[:, None] > limites[:, 3],
+    ], axis=1)
+
+
+def filtrar_banda_muerta(segundos, temperaturas, humedades, estados, ancla=None,
+                         tol_temp=0.0, tol_hum=0.0, max_intervalo=None):
+    """
+    Decide qué lecturas de un aire (ordenadas por fecha) hay que guardar.
+
+    Args:
+        segundos: Fechas de las lecturas en segundos (array creciente)
+        temperaturas, humedades: Valores de las lecturas
+        estados: Resultado de estados_umbrales para estas lecturas
+        ancla: (segundos, temperatura, humedad, estado) de la última lectura guardada,
+            o None si el aire no tiene lecturas
+        tol_temp, tol_hum: Tolerancias (None: no se compara esa variable; con ambas
+            en None no se descarta nada)
+        max_intervalo: Segundos máximos sin guardar una lectura (None = sin latido)
+
+    Returns:
+        Array booleano, True para las lecturas que se guardan
+    """
+    n = len(segundos)
+    guardar = np.ones(n, dtype=bool)
+    if tol_temp is None and tol_hum is None:
+        return guardar
+    if ancla is None or n == 0:
+        if n == 0:
+            return guardar
+        ancla = (segundos[0], temperaturas[0], humedades[0], estados[0])
+        inicio = 1
+    else:
+        inicio = 0
+    seg_ancla, temp_ancla, hum_ancla, estado_ancla = ancla
+    estado_ancla = np.asarray(estado_ancla, dtype=bool)
+
+    for i in range(inicio, n):
+        if segundos[i] <= seg_ancla:
+            continue  # histórica: no se compara con el ancla
+        if ((tol_temp is None or abs(temperaturas[i] - temp_ancla) <= tol_temp)
+                and (tol_hum is None or abs(humedades[i] - hum_ancla) <= tol_hum)
+                and (max_intervalo is None or segundos[i] - seg_ancla < max_intervalo)
+                and np.array_equal(estados[i], estado_ancla)):
+            guardar[i] = False
+            continue
+        seg_ancla, temp_ancla, hum_ancla, estado_ancla = segundos[i], temperaturas[i], humedades[i], estados[i]
+    return guardar
@@ -2,21 +2,107 @@ import pandas as pd
 import os
 import numpy as np
 import io
-from datetime import datetime
-from database import session, AireAcondicionado, Lectura, Mantenimiento, UmbralConfiguracion, Usuario, init_db , OtroEquipo
+import json
+from datetime import datetime, timedelta
+from database import Session, session, engine, LecturaEnCola, AireAcondicionado, Lectura, Mantenimiento, UmbralConfiguracion, Usuario, init_db , OtroEquipo, SketchLecturas, PiramideLecturas, AnomaliaLectura, EstadoDetectorAnomalias, ReglaAlerta, AlertaRegla
+from sketches import DDSketch, fusionar_serializados, ALPHA_POR_DEFECTO
+from series_temporales import estadisticas_ponderadas_tiempo, remuestrear, estadisticas_moviles
+from cache import CacheConsultas, consulta_cacheada
+from notificaciones import BusNotificaciones
+from trabajos import iniciar_trabajo
+import importacion
+from compresion import estados_umbrales, filtrar_banda_muerta
+from ventana_caliente import VentanaCaliente
+from series_mmap import AlmacenSeries
+import piramide
+import prediccion
+import excursiones
+from anomalias import DetectorAnomalias
+from reglas import MotorReglas
 from cryptography.fernet import Fernet
 import hashlib
-from sqlalchemy import func, distinct, desc
+from sqlalchemy import func, distinct, desc, insert, update, or_, and_, bindparam, text, tuple_, exists
 from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 import traceback
 import sys
+import time
+import threading
+from urllib.parse import urlparse
+
+# Valor de agregar_lectura cuando el filtro de compresión descartó la lectura
+LECTURA_FILTRADA = 0
+
+# Esquemas de URL que entiende poller.py
+ESQUEMAS_SENSOR = ('http', 'https', 'tcp')
+
+# 'ignorar': se conserva la lectura existente; 'actualizar': se sobrescriben sus valores
+MODOS_CONFLICTO = ('ignorar', 'actualizar')
+
 
 class DataManager:
     def __init__(self):
         self.data_dir = "data"
         self.aires_file = os.path.join(self.data_dir, "aires_acondicionados.csv")
         self.lecturas_file = os.path.join(self.data_dir, "lecturas.csv")
+
+        # Caché de consultas de lectura (aires, umbrales, ubicaciones, estadísticas)
+        self.cache = CacheConsultas(
+            max_entradas=int(os.environ.get('CACHE_MAX_ENTRADAS', 256)),
+            ttl=float(os.environ.get('CACHE_TTL_SEGUNDOS', 300))
+        )
+        # Qué hacer al recibir una lectura con un (aire_id, fecha) ya guardado
+        self.modo_conflicto = os.environ.get('LECTURAS_CONFLICTO', 'ignorar')
+        if self.modo_conflicto not in MODOS_CONFLICTO:
+            raise ValueError(f"LECTURAS_CONFLICTO inválido: {self.modo_conflicto}. Use {', '.join(MODOS_CONFLICTO)}")
+        # Propaga las escrituras a los demás procesos (NOTIFY o tabla de eventos)
+        self.bus = BusNotificaciones(
+            engine, self.cache,
+            intervalo_sondeo=float(os.environ.get('NOTIFICACIONES_INTERVALO_SONDEO', 2))
+        )
+        # Lecturas recientes de cada aire en memoria (ver ventana_caliente.py)
+        self.ventana = VentanaCaliente(
+            self._cargar_ventana,
+            horas=float(os.environ.get('VENTANA_HORAS', 24)),
+            lecturas_por_aire=int(os.environ.get('VENTANA_LECTURAS_POR_AIRE', 2880)),
+            max_bytes=float(os.environ.get('VENTANA_MAX_MB', 64)) * 1024 * 1024
+        )
+        # Series completas por aire en archivos mapeados en memoria, para análisis (ver series_mmap.py)
+        self.series = AlmacenSeries(
+            os.environ.get('SERIES_DIRECTORIO', os.path.join(self.data_dir, 'series')),
+            self._leer_lecturas_desde_id, self._contar_lecturas_por_aire, self._leer_serie_aire,
+            intervalo_conciliacion=float(os.environ.get('SERIES_INTERVALO_CONCILIACION', 3600))
+        )
+        self._series_pendientes = True
+        # Detector de anomalías en línea de la ingesta (ver anomalias.py); su estado se
+        # guarda en la base de datos cada ANOMALIAS_INTERVALO_CHECKPOINT segundos
+        self.detector = DetectorAnomalias(
+            self._cargar_estado_anomalias,
+            alfa=float(os.environ.get('ANOMALIAS_ALFA', 0.05)),
+            umbral=float(os.environ.get('ANOMALIAS_UMBRAL', 4.0)),
+            umbral_deriva=float(os.environ.get('ANOMALIAS_UMBRAL_DERIVA', 3.0))
+        )
+        self.intervalo_checkpoint_anomalias = float(os.environ.get('ANOMALIAS_INTERVALO_CHECKPOINT', 60))
+        self._ultimo_checkpoint_anomalias = time.monotonic()
+        # Reglas de alerta (ver reglas.py): las evalúa un único proceso (evaluar_reglas, lanzado
+        # por worker.py) sobre las lecturas con id posterior a la última evaluada; las sin_lecturas
+        # se revisan cada REGLAS_INTERVALO_SIN_LECTURAS segundos
+        self.reglas = MotorReglas(self._cargar_reglas_alerta, recarga=float(os.environ.get('REGLAS_RECARGA', 60)))
+        self.intervalo_sin_lecturas = float(os.environ.get('REGLAS_INTERVALO_SIN_LECTURAS', 60))
+        # Segundos que se sigue esperando un id saltado (transacción aún sin confirmar)
+        self.espera_huecos_reglas = float(os.environ.get('REGLAS_ESPERA_HUECOS', 120))
+        self._ultima_revision_sin_lecturas = 0.0
+        # Último id de lectura evaluado (None: hay que repasar las ventanas desde la base de datos)
+        # y rangos [desde, hasta, detectado] de ids por debajo que aún pueden confirmarse
+        self._reglas_ultimo_id = None
+        self._reglas_huecos = []
+        self._conexion_evaluador = None
+        # True mientras este proceso sea el evaluador de reglas (ver es_evaluador_reglas)
+        self.evaluador_reglas = False
+        self._hilo_reglas = None
+        self._detener_reglas = threading.Event()
+        self.bus.agregar_oyente(self._al_recibir_cambio)
         
         # Asegurar que el directorio de datos exista
         if not os.path.exists(self.data_dir):
@@ -27,6 +113,8 @@ class DataManager:
         
         # Migrar datos de CSV a base de datos si es necesario
         self.migrar_datos_si_necesario()
+        # Resúmenes de las lecturas anteriores a sus tablas (una sola vez tras actualizar)
+        self.poblar_resumenes_si_necesario()
     
     def migrar_datos_si_necesario(self):
         # Verificar si hay datos en la base de datos
@@ -65,17 +153,190 @@ class DataManager:
                     if lecturas_df['fecha'].dtype == 'object':
                         lecturas_df['fecha'] = pd.to_datetime(lecturas_df['fecha'])
                     
-                    for _, row in lecturas_df.iterrows():
-                        lectura = Lectura(
-                            id=int(row['id']),
-                            aire_id=int(row['aire_id']),
-                            fecha=row['fecha'],
-                            temperatura=float(row['temperatura']),
-                            humedad=float(row['humedad'])
-                        )
-                        session.add(lectura)
-                    session.commit()
-    
+                    # Como el resto de la ingesta: los (aire_id, fecha) repetidos se resuelven con
+                    # ON CONFLICT en lugar de abortar la carga, y los resúmenes se actualizan al insertar
+                    for inicio in range(0, len(lecturas_df), 50000):
+                        bloque = lecturas_df.iloc[inicio:inicio + 50000]
+                        sesion = Session()
+                        try:
+                            resumen = self._cargar_lecturas(sesion, bloque)
+                            sesion.commit()
+                        finally:
+                            sesion.close()
+                        self._despues_de_ingesta(resumen, bloque['aire_id'].unique())
+
+    def _registrar_cambio(self, tabla, aire_id=None, entidad_id=None, ventana_actualizada=False, borradas=False):
+        """
+        Invalida las consultas cacheadas afectadas por una escritura ya confirmada
+        y la notifica a los demás procesos.
+
+        Args:
+            tabla: Nombre de la tabla modificada (etiqueta de caché)
+            aire_id: ID del aire afectado, si aplica
+            entidad_id: ID de la fila modificada, si aplica
+            ventana_actualizada: True si las lecturas ya se añadieron a la ventana caliente
+            borradas: True si se borraron lecturas del aire (se reescribe su serie en disco)
+        """
+        tags = [tabla]
+        if aire_id is not None:
+            tags.append(f'aire:{aire_id}')
+        self.cache.invalidar(*tags)
+        if tabla == 'lecturas':
+            self._series_pendientes = True
+            if borradas and aire_id is not None:
+                self.series.marcar_modificados([aire_id])
+            if not ventana_actualizada:
+                self.ventana.invalidar(aire_id)
+        elif tabla == 'reglas_alerta':
+            self.reglas.recargar()
+        self.bus.publicar(tabla, aire_id=aire_id, entidad_id=entidad_id)
+
+    def _al_recibir_cambio(self, evento):
+        """
+        Oyente del bus: las lecturas cambiadas por otro proceso se recargan en la ventana
+        y las reglas de alerta modificadas se recompilan.
+        """
+        if evento is None:
+            self.ventana.invalidar()
+            self._series_pendientes = True
+            self.reglas.recargar()
+        elif evento['tabla'] == 'lecturas':
+            self.ventana.invalidar(evento.get('aire_id'))
+            self._series_pendientes = True
+        elif evento['tabla'] == 'reglas_alerta':
+            self.reglas.recargar()
+
+    def _cargar_ventana(self, aire_ids, desde):
+        """Últimas lecturas (hasta la capacidad de la ventana) de cada aire desde 'desde'."""
+        sesion = Session()
+        try:
+            orden = func.row_number().over(partition_by=Lectura.aire_id, order_by=Lectura.fecha.desc()).label('orden')
+            recientes = sesion.query(Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad, orden) \
+                .filter(Lectura.aire_id.in_([int(a) for a in aire_ids]), Lectura.fecha >= desde) \
+                .subquery()
+            df = pd.read_sql(
+                sesion.query(recientes.c.aire_id, recientes.c.fecha, recientes.c.temperatura, recientes.c.humedad)
+                .filter(recientes.c.orden <= self.ventana.lecturas_por_aire).statement,
+                sesion.connection()
+            )
+        finally:
+            sesion.close()
+        if not df.empty:
+            df['fecha'] = pd.to_datetime(df['fecha'])
+        return df
+
+    def calentar_ventana(self):
+        """Carga la ventana caliente de todos los aires (pensado para un hilo al arrancar)."""
+        try:
+            inicio = time.perf_counter()
+            aires = self.obtener_aires()
+            if not aires.empty:
+                self.ventana.calentar(aires['id'].astype(int).tolist())
+            metricas = self.ventana.metricas()
+            print(f"Ventana caliente cargada: {metricas['aires']} aires, {metricas['lecturas']} lecturas "
+                  f"en {time.perf_counter() - inicio:.1f}s")
+        except Exception as e:
+            print(f"Error al calentar la ventana de lecturas recientes: {e}", file=sys.stderr)
+            traceback.print_exc()
+
+    def obtener_lecturas_recientes(self, aire_id, horas=6):
+        """
+        Lecturas de un aire en las últimas 'horas', desde la ventana caliente si la
+        cubre y, si no, desde la base de datos.
+
+        Returns:
+            (DataFrame con fecha, temperatura y humedad, 'memoria' o 'base_de_datos')
+        """
+        desde = datetime.now() - timedelta(hours=horas)
+        lecturas = self.ventana.obtener(aire_id, desde=desde)
+        if lecturas is not None:
+            return lecturas, 'memoria'
+        lecturas = self._leer_lecturas(aire_ids=[aire_id], desde=desde)
+        return lecturas[['fecha', 'temperatura', 'humedad']] if not lecturas.empty else lecturas, 'base_de_datos'
+
+    def obtener_tasa_cambio(self, aire_id, minutos=30):
+        """Pendiente por hora de temperatura y humedad en los últimos minutos (ver VentanaCaliente.tasa_cambio)."""
+        return self.ventana.tasa_cambio(aire_id, minutos=minutos)
+
+    def _leer_lecturas_desde_id(self, ultimo_id, limite):
+        """Lecturas con id mayor que 'ultimo_id', ordenadas por id (sincronización de series)."""
+        sesion = Session()
+        try:
+            df = pd.read_sql(
+                sesion.query(Lectura.id, Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad)
+                .filter(Lectura.id > ultimo_id, Lectura.aire_id.isnot(None))
+                .order_by(Lectura.id).limit(limite).statement,
+                sesion.connection()
+            )
+        finally:
+            sesion.close()
+        return df
+
+    def _contar_lecturas_por_aire(self):
+        sesion = Session()
+        try:
+            filas = sesion.query(Lectura.aire_id, func.count(Lectura.id)) \
+                .filter(Lectura.aire_id.isnot(None)).group_by(Lectura.aire_id).all()
+        finally:
+            sesion.close()
+        return {int(aire_id): int(lecturas) for aire_id, lecturas in filas}
+
+    def _leer_serie_aire(self, aire_id):
+        sesion = Session()
+        try:
+            df = pd.read_sql(
+                sesion.query(Lectura.id, Lectura.fecha, Lectura.temperatura, Lectura.humedad)
+                .filter(Lectura.aire_id == aire_id).order_by(Lectura.fecha).statement,
+                sesion.connection()
+            )
+        finally:
+            sesion.close()
+        return df
+
+    def sincronizar_series(self, forzar=False):
+        """
+        Pone al día la caché de series en disco si hubo cambios en lecturas desde la
+        última sincronización (propios o recibidos por el bus) o si se fuerza; al
+        forzarla también se concilia el número de lecturas de cada aire.
+
+        Returns:
+            Resumen de AlmacenSeries.sincronizar, o None si no hacía falta
+        """
+        if not (forzar or self._series_pendientes):
+            return None
+        # Se baja antes de sincronizar: un cambio durante la sincronización la vuelve a pedir
+        self._series_pendientes = False
+        try:
+            return self.series.sincronizar(conciliar=True if forzar else None)
+        except Exception:
+            self._series_pendientes = True
+            raise
+
+    def obtener_serie(self, aire_id):
+        """
+        Historial completo de un aire como array estructurado (id, fecha en microsegundos,
+        temperatura, humedad) mapeado desde disco, ordenado por fecha y sin copias.
+        """
+        self.sincronizar_series()
+        return self.series.leer(aire_id)
+
+    def obtener_historico(self, aire_ids=None):
+        """
+        Historial completo de lecturas (id, aire_id, fecha, temperatura, humedad) de los
+        aires pedidos, leído de la caché de series en lugar de la base de datos.
+
+        Returns:
+            DataFrame ordenado por aire_id y fecha
+        """
+        self.sincronizar_series()
+        return self.series.dataframe(aire_ids)
+
+    @consulta_cacheada(tags=('aires_acondicionados',))
+    def obtener_ids_aires(self):
+        """IDs de los aires existentes (frozenset, para validar lecturas sin copiar DataFrames)."""
+        return frozenset(aire_id for (aire_id,) in session.query(AireAcondicionado.id))
+
+    @consulta_cacheada(tags=('aires_acondicionados',))
     def obtener_aires(self):
         # Consultar todos los aires de la base de datos
         aires = session.query(AireAcondicionado).all()
@@ -101,7 +362,11 @@ class DataManager:
                 'condensadora_serial': aire.condensadora_serial,
                 'condensadora_codigo_inventario': aire.condensadora_codigo_inventario,
                 'condensadora_ubicacion_instalacion': aire.condensadora_ubicacion_instalacion,
-                
+                'sensor_url': aire.sensor_url,
+                'sensor_intervalo': aire.sensor_intervalo,
+                'compresion_tolerancia_temp': aire.compresion_tolerancia_temp,
+                'compresion_tolerancia_hum': aire.compresion_tolerancia_hum,
+                'compresion_max_intervalo': aire.compresion_max_intervalo,
             }
             for aire in aires
         ]
@@ -160,6 +425,7 @@ class DataManager:
 
             session.add(nuevo_aire)
             session.commit() # Intentar guardar en la BD
+            self._registrar_cambio('aires_acondicionados', nuevo_aire.id)
 
             return nuevo_aire.id # Devolver ID si el commit fue exitoso
       # --- CAPTURAR ERROR DE INTEGRIDAD ---
@@ -240,6 +506,7 @@ class DataManager:
 
 
                 session.commit()
+                self._registrar_cambio('aires_acondicionados', aire_id)
                 return True
         
         except IntegrityError as e:
@@ -260,19 +527,24 @@ class DataManager:
     
     def agregar_lectura(self, aire_id, fecha, temperatura, humedad):
         try:
-            # Crear nueva lectura en la base de datos
-            nueva_lectura = Lectura(
-                aire_id=aire_id,
-                fecha=fecha, # Asegúrate que la columna 'fecha' en tu BD acepte datetime
-                temperatura=temperatura,
-                humedad=humedad
-            )
-
-            session.add(nueva_lectura)
-            session.flush() # Opcional: asigna el ID antes del commit
+            # Insertar la lectura; si ya existe una para (aire_id, fecha) se ignora o actualiza
+            # según LECTURAS_CONFLICTO, así los reintentos de los gateways no duplican datos
+            resumen = self._cargar_lecturas(session, pd.DataFrame([{
+                'aire_id': aire_id, 'fecha': fecha, 'temperatura': temperatura, 'humedad': humedad
+            }]))
             session.commit() # Intentar guardar en la BD
+            self._confirmar_anomalias(resumen)
+            if resumen['filtradas']:
+                return LECTURA_FILTRADA
+            lectura_id = self.obtener_id_lectura(aire_id, fecha)
 
-            return nueva_lectura.id # Devolver ID si el commit fue exitoso
+            if resumen['horas_actualizadas']:
+                self._reconstruir_horas(resumen['horas_actualizadas'])
+            if resumen['insertadas'] or resumen['actualizadas']:
+                self.ventana.agregar(resumen['guardadas'])
+                self._registrar_cambio('lecturas', aire_id, entidad_id=lectura_id, ventana_actualizada=True)
+
+            return lectura_id # Devolver ID (el existente si era un reintento)
 
         except Exception as e:
             print(f"!!! ERROR en data_manager.agregar_lectura: {e}", file=sys.stderr)
@@ -280,6 +552,10 @@ class DataManager:
             session.rollback() # MUY IMPORTANTE: Deshacer cambios en la sesión si hubo error
             return None # Indicar fallo a la función que llamó (app.py)
     
+    def obtener_id_lectura(self, aire_id, fecha):
+        """ID de la lectura de un aire en una fecha exacta, o None."""
+        return session.query(Lectura.id).filter(Lectura.aire_id == aire_id, Lectura.fecha == fecha).scalar()
+
     def obtener_lecturas_por_aire(self, aire_id):
         # Consultar lecturas de un aire específico
         lecturas = session.query(Lectura).filter(Lectura.aire_id == aire_id).all()
@@ -297,6 +573,897 @@ class DataManager:
         ]
         
         return pd.DataFrame(lecturas_data)
+
+    def eliminar_lecturas_rango(self, aire_id=None, desde=None, hasta=None, dry_run=False, tamano_lote=5000):
+        """
+        Elimina las lecturas de un aire y/o rango de fechas en lotes acotados y
+        regenera los sketches horarios afectados.
+
+        Args:
+            aire_id: ID del aire (None para todos)
+            desde: Fecha mínima, inclusiva (opcional)
+            hasta: Fecha máxima, exclusiva (opcional)
+            dry_run: Solo contar las lecturas que se eliminarían
+            tamano_lote: Lecturas borradas por transacción
+
+        Returns:
+            Número de lecturas eliminadas (o que se eliminarían), o None si hubo un error
+        """
+        if aire_id is None and desde is None and hasta is None:
+            raise ValueError("Debe indicar aire_id, desde o hasta")
+
+        filtros = []
+        if aire_id is not None:
+            filtros.append(Lectura.aire_id == aire_id)
+        if desde is not None:
+            filtros.append(Lectura.fecha >= desde)
+        if hasta is not None:
+            filtros.append(Lectura.fecha < hasta)
+
+        try:
+            if dry_run:
+                return session.query(func.count(Lectura.id)).filter(*filtros).scalar() or 0
+
+            # Aires afectados, para invalidar solo sus estadísticas
+            aires = [a for (a,) in session.query(Lectura.aire_id).filter(*filtros).distinct()]
+        except Exception as e:
+            session.rollback()
+            print(f"Error al contar lecturas a eliminar: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return None
+
+        eliminadas = [0]
+        try:
+            self._borrar_lecturas_por_lotes(
+                session, filtros, tamano_lote, avance=lambda n: eliminadas.__setitem__(0, n)
+            )
+        except Exception as e:
+            session.rollback()
+            print(f"Error al eliminar lecturas (aire={aire_id}, desde={desde}, hasta={hasta}): {e}", file=sys.stderr)
+            traceback.print_exc()
+            return None
+        finally:
+            # Los lotes ya confirmados deben reflejarse aunque un lote posterior falle
+            if eliminadas[0]:
+                self._reconstruir_resumenes(aire_id=aire_id, desde=desde, hasta=hasta)
+                for aire in aires:
+                    self._registrar_cambio('lecturas', aire, borradas=True)
+        return eliminadas[0]
+
+    def _cargar_lecturas(self, sesion, lecturas_df):
+        """
+        Inserta un bloque de lecturas validadas y actualiza sus sketches horarios.
+        Las lecturas con un (aire_id, fecha) ya existente se ignoran o actualizan
+        según self.modo_conflicto. En PostgreSQL usa COPY FROM STDIN a una tabla
+        temporal de staging y la fusiona con INSERT ... ON CONFLICT. No hace commit.
+
+        Args:
+            sesion: Sesión de SQLAlchemy a utilizar
+            lecturas_df: DataFrame con columnas aire_id, fecha, temperatura, humedad
+
+        Returns:
+            Diccionario con 'insertadas', 'actualizadas', 'ignoradas', 'filtradas' (descartadas
+            por el filtro de compresión) y 'horas_actualizadas' (conjunto de (aire_id, hora)
+            cuyos sketches hay que reconstruir tras el commit, ver _reconstruir_horas), más
+            'guardadas' (DataFrame de las insertadas y actualizadas, para la ventana caliente),
+            'anomalias' y 'estados_anomalias' (para _confirmar_anomalias tras el commit)
+        """
+        resumen = {'insertadas': 0, 'actualizadas': 0, 'ignoradas': 0, 'filtradas': 0,
+                   'horas_actualizadas': set(), 'guardadas': None, 'anomalias': [], 'estados_anomalias': {}}
+        if lecturas_df.empty:
+            return resumen
+        actualizar = self.modo_conflicto == 'actualizar'
+        df = lecturas_df[['aire_id', 'fecha', 'temperatura', 'humedad']].astype(
+            {'aire_id': 'int64', 'temperatura': 'float64', 'humedad': 'float64'}
+        )
+        df['fecha'] = pd.to_datetime(df['fecha'])
+        # Repeticiones dentro del mismo bloque: ON CONFLICT no admite tocar dos veces la misma fila
+        df = df.drop_duplicates(['aire_id', 'fecha'], keep='last' if actualizar else 'first')
+        df, resumen['filtradas'] = self._filtrar_compresion(sesion, df)
+        if df.empty:
+            return resumen
+
+        conexion = sesion.connection()
+        if conexion.dialect.name == 'postgresql':
+            buffer = io.StringIO()
+            df.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S.%f')
+            buffer.seek(0)
+            cursor = conexion.connection.cursor()
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS lecturas_staging "
+                "(aire_id integer, fecha timestamp, temperatura double precision, humedad double precision) "
+                "ON COMMIT DELETE ROWS"
+            )
+            cursor.copy_expert("COPY lecturas_staging (aire_id, fecha, temperatura, humedad) FROM STDIN WITH (FORMAT csv)", buffer)
+            al_conflicto = (
+                "DO UPDATE SET temperatura = EXCLUDED.temperatura, humedad = EXCLUDED.humedad"
+                if actualizar else "DO NOTHING"
+            )
+            # xmax = 0 distingue las filas insertadas de las actualizadas
+            cursor.execute(
+                "INSERT INTO lecturas (aire_id, fecha, temperatura, humedad) "
+                "SELECT aire_id, fecha, temperatura, humedad FROM lecturas_staging "
+                f"ON CONFLICT ON CONSTRAINT uq_lecturas_aire_fecha {al_conflicto} "
+                "RETURNING aire_id, fecha, temperatura, humedad, (xmax = 0) AS insertada"
+            )
+            afectadas = pd.DataFrame(cursor.fetchall(),
+                                     columns=['aire_id', 'fecha', 'temperatura', 'humedad', 'insertada'])
+            cursor.execute("TRUNCATE lecturas_staging")
+            insertadas = afectadas[afectadas['insertada'].astype(bool)]
+            actualizadas = afectadas[~afectadas['insertada'].astype(bool)]
+        else:
+            # Otros motores: separar nuevas y existentes consultando las claves del rango del bloque
+            existentes = pd.DataFrame(
+                sesion.query(Lectura.id, Lectura.aire_id, Lectura.fecha).filter(
+                    Lectura.aire_id.in_([int(a) for a in df['aire_id'].unique()]),
+                    Lectura.fecha >= df['fecha'].min().to_pydatetime(),
+                    Lectura.fecha <= df['fecha'].max().to_pydatetime()
+                ).all(),
+                columns=['id', 'aire_id', 'fecha']
+            ).astype({'aire_id': 'int64'})
+            existentes['fecha'] = pd.to_datetime(existentes['fecha'])
+            cruce = df.merge(existentes, on=['aire_id', 'fecha'], how='left')
+            insertadas = cruce.loc[cruce['id'].isna(), ['aire_id', 'fecha', 'temperatura', 'humedad']]
+            actualizadas = cruce.loc[cruce['id'].notna()] if actualizar else cruce.iloc[0:0]
+
+            if not insertadas.empty:
+                sesion.execute(insert(Lectura), insertadas.to_dict('records'))
+            if not actualizadas.empty:
+                sesion.execute(update(Lectura), actualizadas.astype({'id': 'int64'})[
+                    ['id', 'temperatura', 'humedad']].to_dict('records'))
+
+        self._actualizar_sketches(sesion, insertadas)
+        self._actualizar_piramide(sesion, insertadas)
+        resumen['anomalias'], resumen['estados_anomalias'] = self._detectar_anomalias(sesion, insertadas)
+        resumen['insertadas'] = len(insertadas)
+        resumen['actualizadas'] = len(actualizadas)
+        resumen['ignoradas'] = len(lecturas_df) - len(insertadas) - len(actualizadas) - resumen['filtradas']
+        resumen['guardadas'] = pd.concat([insertadas, actualizadas])[['aire_id', 'fecha', 'temperatura', 'humedad']]
+        if not actualizadas.empty:
+            horas = pd.to_datetime(actualizadas['fecha']).dt.floor('h')
+            resumen['horas_actualizadas'] = set(zip(actualizadas['aire_id'].astype(int), horas.dt.to_pydatetime()))
+        return resumen
+
+    @consulta_cacheada(tags=('aires_acondicionados', 'umbrales_configuracion'), ttl=60)
+    def _config_compresion(self):
+        """
+        Tolerancias, latido y límites de umbrales (globales y propios) de los aires
+        con el filtro de compresión activo. El TTL corto acota cuánto tarda un cambio
+        en llegar a procesos que no escuchan el bus (worker.py, poller.py).
+
+        Returns:
+            Diccionario aire_id -> {'tol_temp', 'tol_hum', 'max_intervalo', 'umbrales'}
+        """
+        sesion = Session()
+        try:
+            aires = sesion.query(
+                AireAcondicionado.id, AireAcondicionado.compresion_tolerancia_temp,
+                AireAcondicionado.compresion_tolerancia_hum, AireAcondicionado.compresion_max_intervalo
+            ).filter(or_(AireAcondicionado.compresion_tolerancia_temp.isnot(None),
+                         AireAcondicionado.compresion_tolerancia_hum.isnot(None))).all()
+            if not aires:
+                return {}
+            umbrales = sesion.query(
+                UmbralConfiguracion.aire_id, UmbralConfiguracion.es_global,
+                UmbralConfiguracion.temp_min, UmbralConfiguracion.temp_max,
+                UmbralConfiguracion.hum_min, UmbralConfiguracion.hum_max
+            ).all()
+        finally:
+            sesion.close()
+        globales = [tuple(u[2:]) for u in umbrales if u.es_global]
+        return {
+            aire.id: {
+                'tol_temp': aire.compresion_tolerancia_temp,
+                'tol_hum': aire.compresion_tolerancia_hum,
+                'max_intervalo': aire.compresion_max_intervalo,
+                'umbrales': globales + [tuple(u[2:]) for u in umbrales if not u.es_global and u.aire_id == aire.id]
+            }
+            for aire in aires
+        }
+
+    def _filtrar_compresion(self, sesion, df):
+        """
+        Aplica el filtro de banda muerta (compresion.py) a las lecturas de los aires
+        que lo tienen activo, tomando como ancla la última lectura guardada de cada uno.
+
+        Returns:
+            (DataFrame con las lecturas a guardar, número de lecturas descartadas)
+        """
+        configuracion = self._config_compresion()
+        aires = [int(a) for a in df['aire_id'].unique() if int(a) in configuracion]
+        if not aires:
+            return df, 0
+
+        ultimas = sesion.query(Lectura.aire_id, func.max(Lectura.fecha).label('fecha')) \
+            .filter(Lectura.aire_id.in_(aires)).group_by(Lectura.aire_id).subquery()
+        anclas = {
+            fila.aire_id: fila for fila in sesion.query(
+                Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad
+            ).join(ultimas, (Lectura.aire_id == ultimas.c.aire_id) & (Lectura.fecha == ultimas.c.fecha))
+        }
+
+        df = df.sort_values(['aire_id', 'fecha'], kind='stable').reset_index(drop=True)
+        guardar = np.ones(len(df), dtype=bool)
+        aire_ids = df['aire_id'].to_numpy()
+        segundos = df['fecha'].to_numpy(dtype='datetime64[ns]').astype('int64') / 1e9
+        temperaturas = df['temperatura'].to_numpy()
+        humedades = df['humedad'].to_numpy()
+        for aire_id in aires:
+            config = configuracion[aire_id]
+            posiciones = np.flatnonzero(aire_ids == aire_id)
+            ancla = None
+            if aire_id in anclas:
+                fila = anclas[aire_id]
+                ancla = (pd.Timestamp(fila.fecha).value / 1e9, fila.temperatura, fila.humedad,
+                         estados_umbrales([fila.temperatura], [fila.humedad], config['umbrales'])[0])
+            guardar[posiciones] = filtrar_banda_muerta(
+                segundos[posiciones], temperaturas[posiciones], humedades[posiciones],
+                estados_umbrales(temperaturas[posiciones], humedades[posiciones], config['umbrales']),
+                ancla=ancla, tol_temp=config['tol_temp'], tol_hum=config['tol_hum'],
+                max_intervalo=config['max_intervalo']
+            )
+        return df[guardar], int((~guardar).sum())
+
+    def _detectar_anomalias(self, sesion, lecturas_df):
+        """
+        Evalúa las lecturas recién insertadas con el detector en línea, registra las
+        anomalías y marca sus lecturas. No hace commit ni modifica el estado del
+        detector: eso lo hace _confirmar_anomalias tras el commit.
+
+        Returns:
+            (lista de anomalías, estados nuevos de los aires evaluados)
+        """
+        anomalias, estados = self.detector.evaluar(lecturas_df)
+        if anomalias:
+            sesion.execute(insert(AnomaliaLectura), anomalias)
+            marcadas = {(anomalia['aire_id'], anomalia['fecha']) for anomalia in anomalias}
+            sesion.connection().execute(
+                update(Lectura.__table__)
+                .where(Lectura.aire_id == bindparam('marcar_aire_id'), Lectura.fecha == bindparam('marcar_fecha'))
+                .values(anomalia=True),
+                [{'marcar_aire_id': aire_id, 'marcar_fecha': fecha} for aire_id, fecha in marcadas]
+            )
+        return anomalias, estados
+
+    def _confirmar_anomalias(self, resumen):
+        """Aplica al detector el estado de un lote ya confirmado y guarda un checkpoint si toca."""
+        self.detector.confirmar(resumen['estados_anomalias'], resumen['anomalias'])
+        if time.monotonic() - self._ultimo_checkpoint_anomalias >= self.intervalo_checkpoint_anomalias:
+            self.guardar_estado_anomalias()
+
+    def _cargar_estado_anomalias(self):
+        sesion = Session()
+        try:
+            return {aire_id: json.loads(estado) for aire_id, estado in
+                    sesion.query(EstadoDetectorAnomalias.aire_id, EstadoDetectorAnomalias.estado)}
+        finally:
+            sesion.close()
+
+    def guardar_estado_anomalias(self):
+        """
+        Guarda en la base de datos el estado del detector de anomalías de los aires
+        modificados desde el último checkpoint. El estado guardado de un aire solo se
+        reemplaza si el nuevo llega a una fecha posterior: con varios procesos ingiriendo
+        el mismo aire, uno rezagado no pisa al más avanzado, sino que adopta su estado.
+
+        Returns:
+            Número de aires guardados
+        """
+        self._ultimo_checkpoint_anomalias = time.monotonic()
+        pendientes = self.detector.pendientes()
+        if not pendientes:
+            return 0
+        sesion = Session()
+        try:
+            # Los aires eliminados desde entonces ya no admiten estado (clave foránea)
+            aires = {a for (a,) in sesion.query(AireAcondicionado.id).filter(AireAcondicionado.id.in_(list(pendientes)))}
+            ahora = datetime.now()
+            registros = [{'aire_id': aire_id, 'estado': json.dumps(pendientes[aire_id]), 'actualizado': ahora,
+                          'ultima_fecha': pendientes[aire_id]['ultima_fecha']}
+                         for aire_id in aires]
+            if not registros:
+                return 0
+            tabla = EstadoDetectorAnomalias.__table__
+            if sesion.connection().dialect.name == 'postgresql':
+                sentencia = pg_insert(tabla).values(registros)
+                guardados = {a for (a,) in sesion.execute(
+                    sentencia.on_conflict_do_update(
+                        index_elements=[tabla.c.aire_id],
+                        set_={c: sentencia.excluded[c] for c in ('estado', 'actualizado', 'ultima_fecha')},
+                        where=or_(tabla.c.ultima_fecha.is_(None), tabla.c.ultima_fecha < sentencia.excluded.ultima_fecha)
+                    ).returning(tabla.c.aire_id)
+                )}
+            else:
+                existentes = {a for (a,) in sesion.query(EstadoDetectorAnomalias.aire_id)
+                              .filter(EstadoDetectorAnomalias.aire_id.in_(list(aires)))}
+                nuevos = [registro for registro in registros if registro['aire_id'] not in existentes]
+                if nuevos:
+                    sesion.execute(insert(tabla), nuevos)
+                guardados = {registro['aire_id'] for registro in nuevos}
+                for registro in registros:
+                    if registro['aire_id'] in existentes and sesion.execute(
+                        update(tabla).where(
+                            tabla.c.aire_id == registro['aire_id'],
+                            or_(tabla.c.ultima_fecha.is_(None), tabla.c.ultima_fecha < registro['ultima_fecha'])
+                        ).values(estado=registro['estado'], actualizado=ahora, ultima_fecha=registro['ultima_fecha'])
+                    ).rowcount:
+                        guardados.add(registro['aire_id'])
+            # Los no guardados tenían en la base de datos un estado más nuevo: se adopta
+            rezagados = aires - guardados
+            if rezagados:
+                self.detector.adoptar({
+                    aire_id: json.loads(estado) for aire_id, estado in
+                    sesion.query(EstadoDetectorAnomalias.aire_id, EstadoDetectorAnomalias.estado)
+                    .filter(EstadoDetectorAnomalias.aire_id.in_(list(rezagados)))
+                })
+            sesion.commit()
+            return len(guardados)
+        except Exception as e:
+            sesion.rollback()
+            self.detector.devolver(pendientes)
+            print(f"Error al guardar el estado del detector de anomalías: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return 0
+        finally:
+            sesion.close()
+
+    def obtener_anomalias(self, aire_id=None, desde=None, hasta=None, tipo=None, limite=200):
+        """
+        Anomalías registradas por el detector en línea, de la más reciente a la más antigua.
+
+        Returns:
+            DataFrame con id, aire_id, nombre_aire, fecha, variable, tipo, valor, esperado y puntuacion
+        """
+        query = session.query(
+            AnomaliaLectura.id, AnomaliaLectura.aire_id, AireAcondicionado.nombre.label('nombre_aire'),
+            AnomaliaLectura.fecha, AnomaliaLectura.variable, AnomaliaLectura.tipo,
+            AnomaliaLectura.valor, AnomaliaLectura.esperado, AnomaliaLectura.puntuacion
+        ).join(AireAcondicionado, AnomaliaLectura.aire_id == AireAcondicionado.id)
+        if aire_id is not None:
+            query = query.filter(AnomaliaLectura.aire_id == aire_id)
+        if desde is not None:
+            query = query.filter(AnomaliaLectura.fecha >= desde)
+        if hasta is not None:
+            query = query.filter(AnomaliaLectura.fecha < hasta)
+        if tipo is not None:
+            query = query.filter(AnomaliaLectura.tipo == tipo)
+        df = pd.read_sql(query.order_by(desc(AnomaliaLectura.fecha)).limit(limite).statement, session.connection())
+        if not df.empty:
+            df['fecha'] = pd.to_datetime(df['fecha'])
+        return df
+
+    def _cargar_reglas_alerta(self):
+        """Reglas de alerta activas como diccionarios (para MotorReglas)."""
+        sesion = Session()
+        try:
+            reglas = sesion.query(ReglaAlerta).filter(ReglaAlerta.activa == True).order_by(ReglaAlerta.id).all()
+            return [
+                {columna: getattr(regla, columna) for columna in (
+                    'id', 'nombre', 'tipo', 'variable', 'operador', 'valor', 'ventana_minutos',
+                    'es_global', 'aire_id', 'ultima_modificacion'
+                )}
+                for regla in reglas
+            ]
+        finally:
+            sesion.close()
+
+    def es_evaluador_reglas(self):
+        """
+        True si este proceso es el que evalúa las reglas de alerta. En PostgreSQL lo es el
+        que obtiene un bloqueo consultivo de sesión, que conserva mientras viva su conexión;
+        otros motores se usan con un solo proceso.
+        """
+        if engine.dialect.name != 'postgresql':
+            return True
+        try:
+            if self._conexion_evaluador is None:
+                conexion = engine.connect()
+                obtenido = conexion.execute(text("SELECT pg_try_advisory_lock(hashtext('evaluador_reglas'))")).scalar()
+                conexion.commit()
+                if not obtenido:
+                    conexion.close()
+                    return False
+                self._conexion_evaluador = conexion
+                # Otro evaluador pudo avanzar entretanto: se repasan las ventanas
+                self._reglas_ultimo_id = None
+            else:
+                self._conexion_evaluador.execute(text("SELECT 1"))
+                self._conexion_evaluador.commit()
+            return True
+        except Exception as e:
+            print(f"Se perdió la conexión del evaluador de reglas: {e}", file=sys.stderr)
+            if self._conexion_evaluador is not None:
+                try:
+                    self._conexion_evaluador.invalidate()
+                except Exception:
+                    pass
+            self._conexion_evaluador = None
+            return False
+
+    def _ultimas_lecturas(self, sesion, aire_ids=None):
+        """Fecha de la última lectura de cada aire (los que no tienen lecturas se omiten)."""
+        # Subconsulta correlacionada: cada máximo se resuelve con el índice (aire_id, fecha)
+        ultima = sesion.query(func.max(Lectura.fecha)).filter(Lectura.aire_id == AireAcondicionado.id) \
+            .correlate(AireAcondicionado).scalar_subquery()
+        query = sesion.query(AireAcondicionado.id, ultima)
+        if aire_ids is not None:
+            query = query.filter(AireAcondicionado.id.in_(aire_ids))
+        return {int(aire_id): pd.Timestamp(fecha).to_pydatetime() for aire_id, fecha in query if fecha is not None}
+
+    def _insertar_alertas_reglas(self, sesion, alertas):
+        """
+        Registra alertas ignorando las ya registradas (misma regla, aire y fecha). No hace commit.
+
+        Returns:
+            Número de alertas nuevas
+        """
+        if not alertas:
+            return 0
+        if sesion.connection().dialect.name == 'postgresql':
+            return len(sesion.execute(
+                pg_insert(AlertaRegla).values(alertas)
+                .on_conflict_do_nothing(constraint='uq_alertas_reglas_regla_aire_fecha')
+                .returning(AlertaRegla.id)
+            ).all())
+        return sesion.execute(insert(AlertaRegla).values(alertas).prefix_with('OR IGNORE', dialect='sqlite')).rowcount
+
+    def evaluar_reglas(self, max_lecturas=50000):
+        """
+        Evalúa con el motor de reglas las lecturas confirmadas desde el último ciclo y
+        revisa las reglas sin_lecturas si toca. Solo actúa en el proceso evaluador (ver
+        es_evaluador_reglas).
+
+        El avance se sigue por id de lectura, en orden de inserción, y no por fecha: una
+        lectura que llega después de otras más nuevas del mismo aire (cola, ingesta
+        diferida, importaciones) también se evalúa, repasando la ventana del aire desde
+        ella. Los ids saltados se vuelven a consultar durante espera_huecos_reglas
+        segundos, por si son de transacciones que aún no se habían confirmado.
+
+        Args:
+            max_lecturas: Lecturas nuevas leídas por ciclo como máximo
+
+        Returns:
+            Número de alertas registradas
+        """
+        self.evaluador_reglas = self.es_evaluador_reglas()
+        if not self.evaluador_reglas:
+            return 0
+        registradas = 0
+        horizonte = self.reglas.horizonte()
+        if horizonte is None:
+            # Sin reglas de ventana no hay estado que mantener; al crearlas se repasa todo
+            self._reglas_ultimo_id = None
+        else:
+            sesion = Session()
+            try:
+                if self._reglas_ultimo_id is None:
+                    registradas += self._repasar_ventanas_reglas(sesion, horizonte)
+                else:
+                    registradas += self._evaluar_lecturas_nuevas(sesion, horizonte, max_lecturas)
+            except Exception as e:
+                sesion.rollback()
+                # Las marcas solo avanzan tras el commit: se reintenta en el siguiente ciclo
+                print(f"Error al evaluar las reglas de alerta: {e}", file=sys.stderr)
+                traceback.print_exc()
+            finally:
+                sesion.close()
+        if time.monotonic() - self._ultima_revision_sin_lecturas >= self.intervalo_sin_lecturas:
+            registradas += self.revisar_reglas_sin_lecturas()
+        return registradas
+
+    def _repasar_ventanas_reglas(self, sesion, horizonte, max_aires=500):
+        """
+        Arranque del evaluador: evalúa desde cero la ventana más larga anterior a la
+        última lectura de cada aire (las alertas ya registradas se ignoran).
+        """
+        # La marca se toma antes de leer: lo que se confirme después entra en el siguiente ciclo
+        marca = sesion.query(func.max(Lectura.id)).scalar() or 0
+        registradas, estados = 0, {}
+        cotas = {aire_id: ultima - timedelta(seconds=horizonte) for aire_id, ultima in self._ultimas_lecturas(sesion).items()}
+        aire_ids = sorted(cotas)
+        for inicio in range(0, len(aire_ids), max_aires):
+            grupo = aire_ids[inicio:inicio + max_aires]
+            query = sesion.query(Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad) \
+                .filter(or_(*[and_(Lectura.aire_id == a, Lectura.fecha >= cotas[a]) for a in grupo]))
+            alertas, nuevos = self.reglas.evaluar(pd.read_sql(query.statement, sesion.connection()), desde_cero=True)
+            registradas += self._insertar_alertas_reglas(sesion, alertas)
+            estados.update(nuevos)
+        sesion.commit()
+        self.reglas.reiniciar()
+        self.reglas.confirmar(estados, reemplazar=True)
+        self._reglas_ultimo_id, self._reglas_huecos = marca, []
+        return registradas
+
+    def _evaluar_lecturas_nuevas(self, sesion, horizonte, max_lecturas):
+        """Un ciclo de evaluar_reglas con el evaluador ya en marcha."""
+        ahora = time.monotonic()
+        huecos = [hueco for hueco in self._reglas_huecos if ahora - hueco[2] < self.espera_huecos_reglas]
+        condiciones = [Lectura.id > self._reglas_ultimo_id] + [Lectura.id.between(a, b) for a, b, _ in huecos]
+        nuevas = pd.read_sql(
+            sesion.query(Lectura.id, Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad)
+            .filter(or_(*condiciones)).order_by(Lectura.id).limit(max_lecturas).statement,
+            sesion.connection()
+        )
+        if nuevas.empty:
+            self._reglas_huecos = huecos
+            return 0
+
+        # Huecos: los rangos pendientes y los ids saltados hasta el último leído, menos los leídos
+        ids = np.sort(nuevas['id'].to_numpy(dtype=np.int64))
+        ultimo_id = max(int(ids[-1]), self._reglas_ultimo_id)
+        pendientes = []
+        for desde, hasta, detectado in huecos + [[self._reglas_ultimo_id + 1, ultimo_id, ahora]]:
+            dentro = ids[(ids >= desde) & (ids <= hasta)]
+            bordes = np.concatenate(([desde - 1], dentro, [hasta + 1]))
+            for posicion in np.flatnonzero(np.diff(bordes) > 1):
+                pendientes.append([int(bordes[posicion]) + 1, int(bordes[posicion + 1]) - 1, detectado])
+        # Acotados: los más antiguos son los que menos probablemente lleguen
+        pendientes = sorted(pendientes)[-1000:]
+
+        nuevas = nuevas[nuevas['aire_id'].notna()]
+        nuevas['fecha'] = pd.to_datetime(nuevas['fecha'])
+        # Aires con lecturas anteriores a la última evaluada: se repasa su ventana desde ellas
+        evaluadas = self.reglas.ultimas_fechas()
+        primeras = nuevas.groupby('aire_id')['fecha'].min()
+        tardias = {int(aire_id): fecha.to_pydatetime() for aire_id, fecha in primeras.items()
+                   if int(aire_id) in evaluadas and fecha.to_pydatetime() <= evaluadas[int(aire_id)]}
+        alertas, nuevos = self.reglas.evaluar(nuevas[~nuevas['aire_id'].isin(list(tardias))])
+        alertas_tardias, nuevos_tardios = [], {}
+        if tardias:
+            query = sesion.query(Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad).filter(or_(
+                *[and_(Lectura.aire_id == a, Lectura.fecha >= fecha - timedelta(seconds=horizonte))
+                  for a, fecha in tardias.items()]
+            ))
+            alertas_tardias, nuevos_tardios = self.reglas.evaluar(
+                pd.read_sql(query.statement, sesion.connection()), desde_cero=True
+            )
+            # Las anteriores a la lectura tardía ya se evaluaron con la ventana completa
+            alertas_tardias = [alerta for alerta in alertas_tardias if alerta['fecha'] >= tardias[alerta['aire_id']]]
+        registradas = self._insertar_alertas_reglas(sesion, alertas + alertas_tardias)
+        sesion.commit()
+        self.reglas.confirmar(nuevos, alertas)
+        self.reglas.confirmar(nuevos_tardios, alertas_tardias, reemplazar=True)
+        self._reglas_ultimo_id = ultimo_id
+        self._reglas_huecos = pendientes
+        return registradas
+
+    def iniciar_evaluador_reglas(self, intervalo=5.0):
+        """Arranca el hilo que llama a evaluar_reglas cada 'intervalo' segundos."""
+        if self._hilo_reglas is not None and self._hilo_reglas.is_alive():
+            return
+        self._detener_reglas.clear()
+
+        def ciclo():
+            while not self._detener_reglas.wait(intervalo):
+                try:
+                    self.evaluar_reglas()
+                except Exception as e:
+                    print(f"Error en el evaluador de reglas: {e}", file=sys.stderr)
+                    traceback.print_exc()
+
+        self._hilo_reglas = threading.Thread(target=ciclo, name='evaluador-reglas', daemon=True)
+        self._hilo_reglas.start()
+
+    def detener_evaluador_reglas(self):
+        self._detener_reglas.set()
+        if self._hilo_reglas is not None:
+            self._hilo_reglas.join(timeout=10)
+
+    def revisar_reglas_sin_lecturas(self, ahora=None):
+        """
+        Dispara las reglas sin_lecturas de los aires cuya última lectura guardada es más
+        antigua que la ventana de la regla. La alerta lleva la fecha de esa lectura, así
+        que cada silencio se registra una sola vez aunque se revise varias veces.
+
+        Returns:
+            Número de alertas registradas
+        """
+        self._ultima_revision_sin_lecturas = time.monotonic()
+        sesion = Session()
+        try:
+            alertas = self.reglas.revisar_sin_lecturas(self._ultimas_lecturas(sesion), ahora or datetime.now())
+            registradas = self._insertar_alertas_reglas(sesion, alertas)
+            sesion.commit()
+            return registradas
+        except Exception as e:
+            sesion.rollback()
+            print(f"Error al revisar las reglas sin lecturas: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return 0
+        finally:
+            sesion.close()
+
+    def _despues_de_ingesta(self, resumen, aire_ids):
+        """
+        Tareas posteriores al commit de un lote cargado con _cargar_lecturas: sketches de
+        horas actualizadas, estado del detector de anomalías, ventana caliente e
+        invalidación de caché de los aires afectados.
+        """
+        self._confirmar_anomalias(resumen)
+        if resumen['horas_actualizadas']:
+            self._reconstruir_horas(resumen['horas_actualizadas'])
+        if resumen['insertadas'] or resumen['actualizadas']:
+            self.ventana.agregar(resumen['guardadas'])
+            for aire_id in aire_ids:
+                self._registrar_cambio('lecturas', int(aire_id), ventana_actualizada=True)
+
+    def encolar_lecturas_bd(self, lecturas):
+        """
+        Añade lecturas a la tabla ingest_queue para que las procesen los workers.
+
+        Args:
+            lecturas: Lista de diccionarios con aire_id, fecha, temperatura, humedad
+
+        Returns:
+            Número de lecturas encoladas
+        """
+        try:
+            session.execute(insert(LecturaEnCola), [
+                {k: lectura[k] for k in ('aire_id', 'fecha', 'temperatura', 'humedad')} for lectura in lecturas
+            ])
+            session.commit()
+            return len(lecturas)
+        except Exception:
+            session.rollback()
+            raise
+
+    def procesar_cola_ingesta(self, max_lote=1000, max_intentos=3):
+        """
+        Toma un lote de ingest_queue con FOR UPDATE SKIP LOCKED (varios workers
+        pueden procesar en paralelo sin pisarse), lo carga con _cargar_lecturas y
+        lo borra de la cola en la misma transacción. Si el lote falla, se procesa
+        lectura por lectura para aislar las que fallan, que quedan en la cola con
+        su error hasta agotar 'max_intentos'.
+
+        Returns:
+            Número de lecturas tomadas de la cola (0 si estaba vacía)
+        """
+        sesion = Session()
+        try:
+            pendientes = sesion.query(
+                LecturaEnCola.id, LecturaEnCola.aire_id, LecturaEnCola.fecha,
+                LecturaEnCola.temperatura, LecturaEnCola.humedad
+            ).filter(LecturaEnCola.intentos < max_intentos) \
+                .order_by(LecturaEnCola.id) \
+                .limit(max_lote) \
+                .with_for_update(skip_locked=True) \
+                .all()
+            if not pendientes:
+                sesion.rollback()
+                return 0
+            df = pd.DataFrame(pendientes, columns=['id', 'aire_id', 'fecha', 'temperatura', 'humedad'])
+            try:
+                resumen = self._cargar_lecturas(sesion, df)
+                sesion.query(LecturaEnCola).filter(LecturaEnCola.id.in_(df['id'].tolist())) \
+                    .delete(synchronize_session=False)
+                sesion.commit()
+            except Exception as e:
+                sesion.rollback()
+                print(f"Error al procesar un lote de {len(df)} lecturas de la cola, reintentando una a una: {e}", file=sys.stderr)
+                self._procesar_cola_individualmente(sesion, df['id'].tolist(), max_intentos)
+                return len(df)
+        finally:
+            sesion.close()
+
+        self._despues_de_ingesta(resumen, df['aire_id'].unique())
+        return len(df)
+
+    def _procesar_cola_individualmente(self, sesion, ids, max_intentos):
+        for lectura_id in ids:
+            try:
+                fila = sesion.query(
+                    LecturaEnCola.id, LecturaEnCola.aire_id, LecturaEnCola.fecha,
+                    LecturaEnCola.temperatura, LecturaEnCola.humedad
+                ).filter(LecturaEnCola.id == lectura_id, LecturaEnCola.intentos < max_intentos) \
+                    .with_for_update(skip_locked=True).first()
+                if fila is None:
+                    sesion.rollback()
+                    continue
+                df = pd.DataFrame([fila], columns=['id', 'aire_id', 'fecha', 'temperatura', 'humedad'])
+                resumen = self._cargar_lecturas(sesion, df)
+                sesion.query(LecturaEnCola).filter(LecturaEnCola.id == lectura_id).delete(synchronize_session=False)
+                sesion.commit()
+                self._despues_de_ingesta(resumen, [fila.aire_id])
+            except Exception as e:
+                sesion.rollback()
+                print(f"Error al procesar la lectura {lectura_id} de la cola: {e}", file=sys.stderr)
+                sesion.query(LecturaEnCola).filter(LecturaEnCola.id == lectura_id).update({
+                    LecturaEnCola.intentos: LecturaEnCola.intentos + 1,
+                    LecturaEnCola.error: str(e)[:2000]
+                }, synchronize_session=False)
+                sesion.commit()
+
+    def metricas_cola_ingesta(self, max_intentos=3):
+        """Profundidad de ingest_queue, lecturas con error y antigüedad de la más vieja."""
+        pendientes, mas_antigua = session.query(
+            func.count(LecturaEnCola.id), func.min(LecturaEnCola.recibida)
+        ).filter(LecturaEnCola.intentos < max_intentos).one()
+        fallidas = session.query(func.count(LecturaEnCola.id)).filter(LecturaEnCola.intentos >= max_intentos).scalar()
+        return {
+            'pendientes': pendientes or 0,
+            'fallidas': fallidas or 0,
+            'antiguedad_segundos': round((datetime.now() - mas_antigua).total_seconds(), 1) if mas_antigua else 0.0
+        }
+
+    def _reconstruir_horas(self, horas):
+        """
+        Reconstruye los sketches de las horas con lecturas actualizadas (ya confirmadas)
+        y marca sus aires para reescribirlos en la caché de series (no cambia su número
+        de lecturas, así que la sincronización no lo detectaría).
+
+        Args:
+            horas: Conjunto de (aire_id, hora) devuelto por _cargar_lecturas
+        """
+        por_aire = {}
+        for aire_id, hora in horas:
+            por_aire.setdefault(aire_id, []).append(hora)
+        self.series.marcar_modificados(por_aire)
+        for aire_id, lista in por_aire.items():
+            self._reconstruir_resumenes(aire_id=aire_id, desde=min(lista), hasta=max(lista) + timedelta(hours=1))
+
+    def importar_lecturas(self, ruta, aire_id=None, formato_fecha=None, tamano_bloque=importacion.TAMANO_BLOQUE):
+        """
+        Importa un archivo CSV/XLSX de lecturas en segundo plano.
+        El encabezado se valida antes de iniciar el trabajo; el archivo se borra al terminar.
+
+        Args:
+            ruta: Ruta del archivo subido
+            aire_id: Aire de las lecturas si el archivo no tiene columna de aire
+            formato_fecha: Formato strptime de la columna de fecha (None para inferirlo)
+            tamano_bloque: Filas leídas y cargadas por transacción
+
+        Returns:
+            (ID del trabajo, formato detectado)
+
+        Raises:
+            ValueError: Si el archivo no tiene un formato reconocible
+        """
+        aires_df = self.obtener_aires()[['id', 'nombre']]
+        formato = importacion.detectar_formato(importacion.leer_encabezado(ruta), aires_df, aire_id=aire_id)
+        trabajo_id = iniciar_trabajo(
+            'importar_lecturas',
+            lambda avance: self._importar_archivo(ruta, formato, aires_df, formato_fecha, tamano_bloque, avance),
+            parametros={'archivo': os.path.basename(ruta), 'formato': formato['tipo'],
+                        'aires': [a for a, _, _ in formato['series'] if a is not None],
+                        'formato_fecha': formato_fecha},
+            total=importacion.contar_filas(ruta)
+        )
+        return trabajo_id, formato
+
+    def _importar_archivo(self, ruta, formato, aires_df, formato_fecha, tamano_bloque, avance):
+        columnas = [formato['columna_fecha']]
+        if formato['columna_aire'] is not None:
+            columnas.append(formato['columna_aire'])
+        for _, col_temp, col_hum in formato['series']:
+            columnas.extend([col_temp, col_hum])
+
+        sesion = Session()
+        insertadas, actualizadas, ignoradas, filtradas, rechazadas, filas, errores = 0, 0, 0, 0, 0, 0, []
+        aires, horas_actualizadas, desde, hasta = set(), set(), None, None
+        try:
+            for inicio, bloque in importacion.leer_bloques(ruta, columnas, tamano_bloque):
+                validas, errores_bloque, rechazadas_bloque = importacion.convertir_bloque(
+                    bloque, inicio, formato, aires_df, formato_fecha
+                )
+                try:
+                    resumen = self._cargar_lecturas(sesion, validas)
+                    sesion.commit()
+                except Exception:
+                    sesion.rollback()
+                    raise
+                self._confirmar_anomalias(resumen)
+                insertadas += resumen['insertadas']
+                actualizadas += resumen['actualizadas']
+                ignoradas += resumen['ignoradas']
+                filtradas += resumen['filtradas']
+                horas_actualizadas |= resumen['horas_actualizadas']
+                rechazadas += rechazadas_bloque
+                errores.extend(errores_bloque[:importacion.MAX_ERRORES_REPORTADOS - len(errores)])
+                if not validas.empty:
+                    aires.update(int(a) for a in validas['aire_id'].unique())
+                    desde = min(filter(None, (desde, validas['fecha'].min())))
+                    hasta = max(filter(None, (hasta, validas['fecha'].max())))
+                filas = inicio + len(bloque)
+                avance(filas, mensaje=f'{insertadas} lecturas insertadas, {actualizadas} actualizadas, '
+                              f'{ignoradas} duplicadas ignoradas, {rechazadas} rechazadas')
+        finally:
+            sesion.close()
+            if horas_actualizadas:
+                self._reconstruir_horas(horas_actualizadas)
+            if insertadas or actualizadas:
+                for aire in aires:
+                    self._registrar_cambio('lecturas', aire)
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+
+        return {
+            'filas_leidas': filas,
+            'insertadas': insertadas,
+            'actualizadas': actualizadas,
+            'duplicadas_ignoradas': ignoradas,
+            'filtradas_compresion': filtradas,
+            'rechazadas': rechazadas,
+            'desde': desde,
+            'hasta': hasta,
+            'errores': errores,
+            'errores_truncados': rechazadas > len(errores)
+        }
+
+    def iniciar_deduplicacion_lecturas(self, tamano_lote=5000):
+        """
+        Elimina en segundo plano las lecturas repetidas para un mismo (aire_id, fecha),
+        conservando la de menor ID, y reconstruye los sketches de los aires afectados.
+
+        Returns:
+            ID del trabajo (ver trabajos.obtener_trabajo)
+        """
+        return iniciar_trabajo(
+            'deduplicar_lecturas',
+            lambda avance: self._deduplicar_lecturas(tamano_lote, avance),
+            parametros={'tamano_lote': tamano_lote}
+        )
+
+    def _deduplicar_lecturas(self, tamano_lote, avance):
+        sesion = Session()
+        eliminadas, por_aire = 0, {}
+        try:
+            aires = [a for (a,) in sesion.query(Lectura.aire_id).filter(Lectura.aire_id.isnot(None)).distinct()]
+            for indice, aire_id in enumerate(aires, start=1):
+                numeradas = sesion.query(
+                    Lectura.id, Lectura.fecha,
+                    func.row_number().over(partition_by=Lectura.fecha, order_by=Lectura.id).label('n')
+                ).filter(Lectura.aire_id == aire_id).subquery()
+                duplicadas = sesion.query(numeradas.c.id, numeradas.c.fecha).filter(numeradas.c.n > 1).all()
+                # Borrar por lotes de IDs para no mantener transacciones largas
+                for inicio in range(0, len(duplicadas), tamano_lote):
+                    lote = duplicadas[inicio:inicio + tamano_lote]
+                    sesion.query(Lectura).filter(Lectura.id.in_([fila.id for fila in lote])).delete(synchronize_session=False)
+                    self._borrar_alertas_huerfanas(sesion, [(aire_id, fila.fecha) for fila in lote])
+                    sesion.commit()
+                    eliminadas += len(lote)
+                    avance(indice - 1, total=len(aires), mensaje=f'{eliminadas} lecturas duplicadas eliminadas')
+                if duplicadas:
+                    por_aire[aire_id] = len(duplicadas)
+                avance(indice, total=len(aires), mensaje=f'{eliminadas} lecturas duplicadas eliminadas')
+        except Exception:
+            sesion.rollback()
+            raise
+        finally:
+            sesion.close()
+            for aire_id in por_aire:
+                self._reconstruir_resumenes(aire_id=aire_id)
+                self._registrar_cambio('lecturas', aire_id, borradas=True)
+
+        return {'eliminadas': eliminadas, 'por_aire': por_aire}
+
+    def _leer_lecturas(self, aire_ids=None, desde=None, hasta=None, columnas=None):
+        """
+        Lee lecturas directamente a un DataFrame sin materializar objetos ORM.
+
+        Args:
+            aire_ids: Lista de IDs de aires (None para todos)
+            desde: Fecha mínima, inclusiva (opcional)
+            hasta: Fecha máxima, exclusiva (opcional)
+            columnas: Columnas de Lectura a leer (por defecto aire_id, fecha, temperatura, humedad)
+
+        Returns:
+            DataFrame ordenado por aire_id y fecha
+        """
+        columnas = columnas or ['aire_id', 'fecha', 'temperatura', 'humedad']
+        query = session.query(*[getattr(Lectura, c) for c in columnas]).filter(Lectura.aire_id.isnot(None))
+        if aire_ids is not None:
+            query = query.filter(Lectura.aire_id.in_(list(aire_ids)))
+        if desde is not None:
+            query = query.filter(Lectura.fecha >= desde)
+        if hasta is not None:
+            query = query.filter(Lectura.fecha < hasta)
+        query = query.order_by(Lectura.aire_id, Lectura.fecha)
+        df = pd.read_sql(query.statement, session.connection())
+        if not df.empty:
+            df['fecha'] = pd.to_datetime(df['fecha'])
+        return df
         
     def eliminar_lectura(self, lectura_id):
         """
@@ -308,26 +1475,61 @@ class DataManager:
         Returns:
             True si se eliminó correctamente, False en caso contrario
         """
-        lectura = session.query(Lectura).filter(Lectura.id == lectura_id).first()
-        
-        if lectura:
-            session.delete(lectura)
-            session.commit()
-            return True
-        
-        return False
+        sesion = Session()
+        try:
+            lectura = sesion.query(Lectura).filter(Lectura.id == lectura_id).first()
+            if not lectura:
+                return False
+            aire_id, hora = lectura.aire_id, self._inicio_hora(lectura.fecha)
+            sesion.delete(lectura)
+            sesion.flush()
+            # Los resúmenes de esa hora se regeneran en la misma transacción que el borrado
+            if aire_id is not None:
+                fin = hora + timedelta(hours=1)
+                self._reconstruir_sketches_en(sesion, aire_id, hora, fin)
+                self._reconstruir_piramide_en(sesion, aire_id, hora, fin)
+            sesion.commit()
+        except Exception as e:
+            sesion.rollback()
+            print(f"Error al eliminar la lectura {lectura_id}: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return False
+        finally:
+            sesion.close()
+        self._registrar_cambio('lecturas', aire_id, entidad_id=lectura_id, borradas=True)
+        return True
     
-    def obtener_estadisticas_por_aire(self, aire_id):
+    @consulta_cacheada(tags=lambda aire_id, *args, **kwargs: (f'aire:{aire_id}',))
+    def obtener_estadisticas_por_aire(self, aire_id, ponderado=False, metodo='trapecio', max_intervalo=None):
         """
         Obtiene estadísticas para un aire acondicionado específico.
 
         Args:
             aire_id: ID del aire acondicionado.
+            ponderado: Si es True, promedio y desviación se ponderan por tiempo
+            metodo: Método de integración para el modo ponderado ('trapecio' o 'escalon')
+            max_intervalo: Segundos máximos atribuidos a un hueco entre lecturas (modo ponderado)
 
         Returns:
             Diccionario con estadísticas (estructura plana) o None si no hay datos.
         """
         try:
+            if ponderado:
+                stats = self._estadisticas_ponderadas(aire_ids=[aire_id], metodo=metodo, max_intervalo=max_intervalo)
+                if stats.empty:
+                    return self._estadisticas_vacias(desviacion=True)
+                fila = stats.iloc[0]
+                return {
+                    'temperatura_promedio': round(float(fila['temperatura_promedio']), 2),
+                    'temperatura_minima': round(float(fila['temperatura_min']), 2),
+                    'temperatura_maxima': round(float(fila['temperatura_max']), 2),
+                    'temperatura_desviacion': round(float(fila['temperatura_desviacion']), 2),
+                    'humedad_promedio': round(float(fila['humedad_promedio']), 2),
+                    'humedad_minima': round(float(fila['humedad_min']), 2),
+                    'humedad_maxima': round(float(fila['humedad_max']), 2),
+                    'humedad_desviacion': round(float(fila['humedad_desviacion']), 2),
+                }
+
             result = session.query(
                 func.avg(Lectura.temperatura).label('temp_avg'),
                 func.min(Lectura.temperatura).label('temp_min'),
@@ -372,7 +1574,621 @@ class DataManager:
                 'humedad_promedio': 0, 'humedad_minima': 0, 'humedad_maxima': 0, 'humedad_desviacion': 0,
             }
     
-    def obtener_estadisticas_generales(self):
+    @staticmethod
+    def _inicio_hora(fecha):
+        return pd.Timestamp(fecha).floor('h').to_pydatetime()
+
+    def _actualizar_sketches(self, sesion, lecturas_df):
+        """
+        Incorpora lecturas nuevas a los sketches horarios de cada aire.
+        No hace commit: se ejecuta dentro de la transacción que inserta las lecturas.
+
+        Args:
+            sesion: Sesión de SQLAlchemy a utilizar
+            lecturas_df: DataFrame con columnas aire_id, fecha, temperatura, humedad
+        """
+        if lecturas_df.empty:
+            return
+        df = lecturas_df[['aire_id', 'fecha', 'temperatura', 'humedad']].copy()
+        df['hora'] = pd.to_datetime(df['fecha']).dt.floor('h')
+        grupos = {(int(aire_id), hora.to_pydatetime()): grupo for (aire_id, hora), grupo in df.groupby(['aire_id', 'hora'])}
+
+        nuevos = self._fusionar_sketches(sesion, grupos)
+        if not nuevos:
+            return
+        if sesion.connection().dialect.name == 'postgresql':
+            # Otra ingesta puede crear la misma hora a la vez: ON CONFLICT espera a su commit
+            # y las horas que ya existan se fusionan en una segunda pasada
+            creadas = set(sesion.execute(
+                pg_insert(SketchLecturas).values(nuevos)
+                .on_conflict_do_nothing(constraint='uq_sketches_lecturas_aire_hora')
+                .returning(SketchLecturas.aire_id, SketchLecturas.hora)
+            ).tuples())
+            restantes = {clave: grupos[clave] for clave in ((n['aire_id'], n['hora']) for n in nuevos)
+                         if clave not in creadas}
+            if restantes:
+                self._fusionar_sketches(sesion, restantes)
+        else:
+            sesion.execute(insert(SketchLecturas), nuevos)
+
+    def _fusionar_sketches(self, sesion, grupos):
+        """
+        Fusiona cada grupo de lecturas con el sketch existente de su hora (bloqueándolo).
+
+        Args:
+            grupos: Diccionario (aire_id, hora) -> DataFrame de lecturas
+
+        Returns:
+            Filas (diccionarios) de las horas que aún no tienen sketch, para insertarlas
+        """
+        horas = [hora for _, hora in grupos]
+        # Una sola consulta para los sketches existentes del bloque (cargas masivas)
+        existentes = {
+            (fila.aire_id, fila.hora): fila
+            for fila in sesion.query(SketchLecturas).filter(
+                SketchLecturas.aire_id.in_({aire_id for aire_id, _ in grupos}),
+                SketchLecturas.hora >= min(horas),
+                SketchLecturas.hora <= max(horas)
+            ).with_for_update().populate_existing()
+        }
+
+        nuevos = []
+        for (aire_id, hora), grupo in grupos.items():
+            fila = existentes.get((aire_id, hora))
+            if fila:
+                sketch_temp = DDSketch.desde_bytes(fila.sketch_temperatura)
+                sketch_hum = DDSketch.desde_bytes(fila.sketch_humedad)
+            else:
+                sketch_temp, sketch_hum = DDSketch(), DDSketch()
+            sketch_temp.agregar(grupo['temperatura'].to_numpy())
+            sketch_hum.agregar(grupo['humedad'].to_numpy())
+
+            if fila:
+                fila.total = fila.total + len(grupo)
+                fila.sketch_temperatura = sketch_temp.a_bytes()
+                fila.sketch_humedad = sketch_hum.a_bytes()
+            else:
+                nuevos.append({
+                    'aire_id': aire_id,
+                    'hora': hora,
+                    'total': len(grupo),
+                    'sketch_temperatura': sketch_temp.a_bytes(),
+                    'sketch_humedad': sketch_hum.a_bytes()
+                })
+        sesion.flush()
+        return nuevos
+
+    def reconstruir_sketches(self, aire_id=None, desde=None, hasta=None, tamano_lote=100000):
+        """
+        Regenera los sketches horarios a partir de las lecturas guardadas.
+        Se usa para poblar los sketches de datos históricos y tras borrar lecturas.
+
+        Args:
+            aire_id: Limitar a un aire (None para todos)
+            desde: Inicio del rango (se alinea al inicio de la hora)
+            hasta: Fin del rango, exclusivo (se alinea al final de la hora)
+            tamano_lote: Lecturas leídas por bloque
+
+        Returns:
+            Número de sketches horarios generados
+        """
+        # Sesión propia: también se llama desde trabajos en segundo plano
+        sesion = Session()
+        try:
+            generados = self._reconstruir_sketches_en(sesion, aire_id, desde, hasta, tamano_lote)
+            sesion.commit()
+            return generados
+        except Exception as e:
+            sesion.rollback()
+            print(f"Error al reconstruir sketches de lecturas: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return 0
+        finally:
+            sesion.close()
+
+    def _reconstruir_sketches_en(self, sesion, aire_id, desde, hasta, tamano_lote=100000):
+        """Cuerpo de reconstruir_sketches dentro de una transacción ajena (no hace commit)."""
+        filtros_sketch = []
+        filtros_lectura = []
+        if aire_id is not None:
+            filtros_sketch.append(SketchLecturas.aire_id == aire_id)
+            filtros_lectura.append(Lectura.aire_id == aire_id)
+        if desde is not None:
+            desde = self._inicio_hora(desde)
+            filtros_sketch.append(SketchLecturas.hora >= desde)
+            filtros_lectura.append(Lectura.fecha >= desde)
+        if hasta is not None:
+            hasta = pd.Timestamp(hasta).ceil('h').to_pydatetime()
+            filtros_sketch.append(SketchLecturas.hora < hasta)
+            filtros_lectura.append(Lectura.fecha < hasta)
+
+        sesion.query(SketchLecturas).filter(*filtros_sketch).delete(synchronize_session=False)
+
+        # Acumular sketches por (aire, hora) leyendo las lecturas por bloques
+        sketches = {}
+        query = sesion.query(
+            Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad
+        ).filter(Lectura.aire_id.isnot(None), *filtros_lectura)
+        for bloque in pd.read_sql(query.statement, sesion.connection(), chunksize=tamano_lote):
+            bloque['hora'] = pd.to_datetime(bloque['fecha']).dt.floor('h')
+            for (aire, hora), grupo in bloque.groupby(['aire_id', 'hora']):
+                clave = (int(aire), hora.to_pydatetime())
+                if clave not in sketches:
+                    sketches[clave] = [DDSketch(), DDSketch(), 0]
+                sketches[clave][0].agregar(grupo['temperatura'].to_numpy())
+                sketches[clave][1].agregar(grupo['humedad'].to_numpy())
+                sketches[clave][2] += len(grupo)
+
+        sesion.add_all([
+            SketchLecturas(
+                aire_id=aire,
+                hora=hora,
+                total=total,
+                sketch_temperatura=sketch_temp.a_bytes(),
+                sketch_humedad=sketch_hum.a_bytes()
+            )
+            for (aire, hora), (sketch_temp, sketch_hum, total) in sketches.items()
+        ])
+        return len(sketches)
+
+    def _aires_sin_resumenes(self, sesion):
+        """
+        Aires con lecturas anteriores a las tablas de resúmenes: los que no tienen el
+        sketch de la hora de su primera lectura, o su bloque del nivel 0 de la pirámide
+        (la ingesta solo crea los de horas y bloques nuevos).
+
+        Returns:
+            Diccionario tabla de resúmenes -> lista de aire_ids por poblar
+        """
+        primera = sesion.query(func.min(Lectura.fecha)).filter(Lectura.aire_id == AireAcondicionado.id) \
+            .correlate(AireAcondicionado).scalar_subquery()
+        primeras = {int(aire_id): pd.Timestamp(fecha)
+                    for aire_id, fecha in sesion.query(AireAcondicionado.id, primera) if fecha is not None}
+        if not primeras:
+            return {}
+        horas = [(aire_id, fecha.floor('h').to_pydatetime()) for aire_id, fecha in primeras.items()]
+        con_sketch = {aire_id for (aire_id,) in sesion.query(SketchLecturas.aire_id).filter(
+            tuple_(SketchLecturas.aire_id, SketchLecturas.hora).in_(horas))}
+        bloques = [(aire_id, piramide.limites(fecha, None, 0)[0]) for aire_id, fecha in primeras.items()]
+        con_bloque = {aire_id for (aire_id,) in sesion.query(PiramideLecturas.aire_id).filter(
+            PiramideLecturas.nivel == 0, tuple_(PiramideLecturas.aire_id, PiramideLecturas.inicio).in_(bloques))}
+        faltan = {'sketches': sorted(set(primeras) - con_sketch), 'piramide': sorted(set(primeras) - con_bloque)}
+        return {tabla: aire_ids for tabla, aire_ids in faltan.items() if aire_ids}
+
+    def poblar_resumenes_si_necesario(self):
+        """
+        Lanza en segundo plano la generación de los resúmenes (ver _aires_sin_resumenes)
+        de las lecturas guardadas antes de que existieran sus tablas. Es reanudable: si
+        el proceso muere a mitad, el siguiente arranque sigue con los aires pendientes.
+
+        Returns:
+            ID del trabajo, o None si no hay nada que poblar
+        """
+        try:
+            if not self._aires_sin_resumenes(session):
+                return None
+        except Exception as e:
+            session.rollback()
+            print(f"Error al comprobar los resúmenes de lecturas: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return None
+        return iniciar_trabajo('poblar_resumenes', self._poblar_resumenes)
+
+    def _poblar_resumenes(self, avance):
+        # Cada worker lo lanza al arrancar: en PostgreSQL solo uno lo ejecuta a la vez
+        with engine.connect() as conexion:
+            exclusivo = conexion.dialect.name == 'postgresql'
+            if exclusivo and not conexion.execute(text("SELECT pg_try_advisory_lock(hashtext('poblar_resumenes'))")).scalar():
+                return {'omitido': 'Otro proceso está poblando los resúmenes'}
+            try:
+                sesion = Session()
+                try:
+                    faltan = self._aires_sin_resumenes(sesion)
+                finally:
+                    sesion.close()
+                reconstruir = {'sketches': self.reconstruir_sketches, 'piramide': self.reconstruir_piramide}
+                aire_ids = sorted(set().union(*faltan.values()))
+                for i, aire_id in enumerate(aire_ids):
+                    for tabla, pendientes in faltan.items():
+                        if aire_id in pendientes:
+                            reconstruir[tabla](aire_id=aire_id)
+                    # Las lecturas no cambian: solo se invalidan las consultas cacheadas del aire
+                    self._registrar_cambio('lecturas', aire_id, ventana_actualizada=True)
+                    avance(i + 1, total=len(aire_ids))
+                return {tabla: len(pendientes) for tabla, pendientes in faltan.items()}
+            finally:
+                if exclusivo:
+                    conexion.execute(text("SELECT pg_advisory_unlock(hashtext('poblar_resumenes'))"))
+
+    def _reconstruir_resumenes(self, aire_id=None, desde=None, hasta=None):
+        """Regenera los resúmenes derivados de las lecturas (sketches horarios y pirámide)."""
+        self.reconstruir_sketches(aire_id=aire_id, desde=desde, hasta=hasta)
+        self.reconstruir_piramide(aire_id=aire_id, desde=desde, hasta=hasta)
+
+    def _actualizar_piramide(self, sesion, lecturas_df):
+        """
+        Incorpora lecturas nuevas a la pirámide de resúmenes de cada aire (ver piramide.py).
+        No hace commit: se ejecuta dentro de la transacción que inserta las lecturas.
+
+        Args:
+            sesion: Sesión de SQLAlchemy a utilizar
+            lecturas_df: DataFrame con columnas aire_id, fecha, temperatura, humedad
+        """
+        if lecturas_df.empty:
+            return
+        resumenes = [(nivel, piramide.resumir(lecturas_df, nivel)) for nivel in range(piramide.NIVELES)]
+
+        # Una sola consulta para los bloques existentes de todos los niveles
+        existentes = {
+            (fila.aire_id, fila.nivel, fila.inicio): fila
+            for fila in sesion.query(
+                PiramideLecturas.id, PiramideLecturas.aire_id, PiramideLecturas.nivel, PiramideLecturas.inicio,
+                *[getattr(PiramideLecturas, c) for c in piramide.COLUMNAS_RESUMEN]
+            ).filter(
+                PiramideLecturas.aire_id.in_([int(a) for a in lecturas_df['aire_id'].unique()]),
+                or_(*[
+                    and_(PiramideLecturas.nivel == nivel,
+                         PiramideLecturas.inicio.between(resumen['inicio'].min().to_pydatetime(),
+                                                         resumen['inicio'].max().to_pydatetime()))
+                    for nivel, resumen in resumenes
+                ])
+            ).with_for_update()
+        }
+
+        nuevos, actualizados = [], []
+        for nivel, resumen in resumenes:
+            for fila in resumen.itertuples(index=False):
+                valores = {
+                    'total': int(fila.total),
+                    'temp_suma': float(fila.temp_suma), 'temp_min': float(fila.temp_min), 'temp_max': float(fila.temp_max),
+                    'hum_suma': float(fila.hum_suma), 'hum_min': float(fila.hum_min), 'hum_max': float(fila.hum_max),
+                }
+                clave = (int(fila.aire_id), nivel, fila.inicio.to_pydatetime())
+                existente = existentes.get(clave)
+                if existente is not None:
+                    actualizados.append(dict(piramide.combinar(existente._asdict(), valores), id=existente.id))
+                else:
+                    nuevos.append(dict(valores, aire_id=clave[0], nivel=nivel, inicio=clave[2]))
+        if nuevos:
+            if sesion.connection().dialect.name == 'postgresql':
+                # Otra ingesta puede crear el mismo bloque a la vez: se fusiona con el suyo
+                tabla = pg_insert(PiramideLecturas)
+                sesion.execute(tabla.on_conflict_do_update(
+                    constraint='uq_piramide_lecturas_aire_nivel_inicio',
+                    set_={
+                        'total': PiramideLecturas.total + tabla.excluded.total,
+                        'temp_suma': PiramideLecturas.temp_suma + tabla.excluded.temp_suma,
+                        'temp_min': func.least(PiramideLecturas.temp_min, tabla.excluded.temp_min),
+                        'temp_max': func.greatest(PiramideLecturas.temp_max, tabla.excluded.temp_max),
+                        'hum_suma': PiramideLecturas.hum_suma + tabla.excluded.hum_suma,
+                        'hum_min': func.least(PiramideLecturas.hum_min, tabla.excluded.hum_min),
+                        'hum_max': func.greatest(PiramideLecturas.hum_max, tabla.excluded.hum_max),
+                    }
+                ), nuevos)
+            else:
+                sesion.execute(insert(PiramideLecturas), nuevos)
+        if actualizados:
+            sesion.execute(update(PiramideLecturas), actualizados)
+
+    def reconstruir_piramide(self, aire_id=None, desde=None, hasta=None, tamano_lote=100000):
+        """
+        Regenera la pirámide de resúmenes a partir de las lecturas guardadas: el nivel 0
+        desde las lecturas y cada nivel superior desde el anterior. Se usa para poblarla
+        con datos históricos y tras borrar o actualizar lecturas.
+
+        Args:
+            aire_id: Limitar a un aire (None para todos, de uno en uno)
+            desde: Inicio del rango (se amplía al bloque que lo contiene en cada nivel)
+            hasta: Fin del rango, exclusivo (se amplía igual)
+            tamano_lote: Lecturas leídas por bloque
+
+        Returns:
+            Número de bloques generados
+        """
+        # Sesión propia: también se llama desde trabajos en segundo plano
+        sesion = Session()
+        try:
+            if aire_id is None:
+                aire_ids = [a for (a,) in sesion.query(AireAcondicionado.id)]
+            else:
+                aire_ids = [aire_id]
+            generados = 0
+            for aire in aire_ids:
+                generados += self._reconstruir_piramide_en(sesion, aire, desde, hasta, tamano_lote)
+                sesion.commit()
+            return generados
+        except Exception as e:
+            sesion.rollback()
+            print(f"Error al reconstruir la pirámide de lecturas: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return 0
+        finally:
+            sesion.close()
+
+    def _reconstruir_piramide_en(self, sesion, aire, desde, hasta, tamano_lote=100000):
+        """Pirámide de un aire para reconstruir_piramide dentro de una transacción ajena (no hace commit)."""
+        generados = 0
+        for nivel in range(piramide.NIVELES):
+            inicio, fin = piramide.limites(desde, hasta, nivel)
+            filtros = [PiramideLecturas.aire_id == aire, PiramideLecturas.nivel == nivel]
+            if inicio is not None:
+                filtros.append(PiramideLecturas.inicio >= inicio)
+            if fin is not None:
+                filtros.append(PiramideLecturas.inicio < fin)
+            sesion.query(PiramideLecturas).filter(*filtros).delete(synchronize_session=False)
+
+            if nivel == 0:
+                query = sesion.query(Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad) \
+                    .filter(Lectura.aire_id == aire)
+                if inicio is not None:
+                    query = query.filter(Lectura.fecha >= inicio)
+                if fin is not None:
+                    query = query.filter(Lectura.fecha < fin)
+                partes = [piramide.resumir(bloque, 0)
+                          for bloque in pd.read_sql(query.statement, sesion.connection(), chunksize=tamano_lote)]
+                partes = [parte for parte in partes if not parte.empty]
+                # Un bloque puede quedar repartido entre dos lotes de lecturas
+                resumen = piramide.subir_nivel(pd.concat(partes), 0) if partes else None
+            else:
+                # Bloques del nivel anterior dentro del rango (los recién generados y los vecinos)
+                query = sesion.query(
+                    PiramideLecturas.aire_id, PiramideLecturas.inicio,
+                    *[getattr(PiramideLecturas, c) for c in piramide.COLUMNAS_RESUMEN]
+                ).filter(PiramideLecturas.aire_id == aire, PiramideLecturas.nivel == nivel - 1)
+                if inicio is not None:
+                    query = query.filter(PiramideLecturas.inicio >= inicio)
+                if fin is not None:
+                    query = query.filter(PiramideLecturas.inicio < fin)
+                anterior = pd.read_sql(query.statement, sesion.connection())
+                resumen = piramide.subir_nivel(anterior, nivel) if not anterior.empty else None
+
+            if resumen is None:
+                continue
+            registros = resumen.assign(nivel=nivel, inicio=resumen['inicio'].dt.to_pydatetime()) \
+                .astype({'aire_id': 'int64', 'total': 'int64'}).to_dict('records')
+            sesion.execute(insert(PiramideLecturas), registros)
+            generados += len(registros)
+        return generados
+
+    def obtener_estadisticas_moviles(self, aire_id, ventana, desde, hasta, variable='temperatura',
+                                     tamano_lote=50000, max_lecturas=200000):
+        """
+        Estadísticas en ventana de tiempo móvil (ver series_temporales.estadisticas_moviles)
+        para cada lectura de un aire en [desde, hasta). Solo se leen las lecturas del rango
+        más una ventana previa, por bloques: de cada bloque se conservan las lecturas de la
+        última ventana para continuar el cálculo en el siguiente.
+
+        Args:
+            aire_id: ID del aire
+            ventana: Duración de la ventana en segundos
+            desde, hasta: Rango de las lecturas a devolver
+            variable: 'temperatura' o 'humedad'
+            tamano_lote: Lecturas leídas por bloque
+            max_lecturas: Máximo de lecturas a devolver (ValueError si el rango tiene más)
+
+        Returns:
+            DataFrame con fecha, valor, media, desviacion, minimo, maximo y lecturas
+        """
+        if variable not in ('temperatura', 'humedad'):
+            raise ValueError("Variable inválida. Use 'temperatura' o 'humedad'")
+        sesion = Session()
+        try:
+            query = sesion.query(Lectura.fecha, getattr(Lectura, variable).label('valor')).filter(
+                Lectura.aire_id == aire_id,
+                Lectura.fecha >= desde - timedelta(seconds=ventana),
+                Lectura.fecha < hasta
+            ).order_by(Lectura.fecha)
+            partes, devueltas = [], 0
+            previas = pd.DataFrame(columns=['fecha', 'valor'])
+            for bloque in pd.read_sql(query.statement, sesion.connection(), chunksize=tamano_lote):
+                if bloque.empty:
+                    continue
+                bloque['fecha'] = pd.to_datetime(bloque['fecha'])
+                datos = pd.concat([previas, bloque], ignore_index=True) if not previas.empty else bloque
+                estadisticas = estadisticas_moviles(datos['fecha'], datos['valor'], ventana)
+                # Solo las lecturas nuevas del bloque y dentro del rango pedido
+                nuevas = pd.concat([datos, estadisticas], axis=1).iloc[len(previas):]
+                nuevas = nuevas[nuevas['fecha'] >= desde]
+                devueltas += len(nuevas)
+                if devueltas > max_lecturas:
+                    raise ValueError(f"El rango tiene más de {max_lecturas} lecturas, redúzcalo")
+                partes.append(nuevas)
+                previas = datos.loc[datos['fecha'] > datos['fecha'].iloc[-1] - timedelta(seconds=ventana),
+                                    ['fecha', 'valor']]
+        finally:
+            sesion.close()
+        if not partes:
+            return pd.DataFrame(columns=['fecha', 'valor', 'media', 'desviacion', 'minimo', 'maximo', 'lecturas'])
+        return pd.concat(partes, ignore_index=True)
+
+    def obtener_series_alineadas(self, desde, hasta, paso, aire_ids=None, ubicacion=None, metodo='anterior',
+                                 max_hueco=None, agrupar_por=None):
+        """
+        Temperatura y humedad de varios aires alineadas en una rejilla regular común
+        (ver series_temporales.remuestrear), leyendo las lecturas en una sola consulta.
+
+        Args:
+            desde, hasta: Rango de la rejilla [desde, hasta)
+            paso: Segundos entre puntos
+            aire_ids: Aires a incluir (None para todos, o los de 'ubicacion')
+            ubicacion: Limitar a los aires de una ubicación
+            metodo: 'anterior', 'lineal' o 'media'
+            max_hueco: Segundos máximos para rellenar con 'anterior' o 'lineal'
+            agrupar_por: 'ubicacion' para promediar los aires de cada ubicación en cada punto
+
+        Returns:
+            Diccionario con 'fechas' (DatetimeIndex), 'columnas' (IDs de aire o ubicaciones)
+            y 'temperatura' y 'humedad' (matrices puntos x columnas, NaN sin dato)
+        """
+        query = session.query(AireAcondicionado.id, AireAcondicionado.ubicacion).order_by(AireAcondicionado.id)
+        if aire_ids is not None:
+            query = query.filter(AireAcondicionado.id.in_(list(aire_ids)))
+        if ubicacion:
+            query = query.filter(AireAcondicionado.ubicacion == ubicacion)
+        aires = pd.DataFrame(query.all(), columns=['id', 'ubicacion'])
+
+        # Margen para encontrar la lectura anterior a 'desde' (y la siguiente a 'hasta' al interpolar)
+        margen = timedelta(seconds=0 if metodo == 'media' else (max_hueco or paso))
+        lecturas = self._leer_lecturas(
+            aire_ids=aires['id'].tolist(), desde=desde - margen,
+            hasta=hasta + (margen if metodo == 'lineal' else timedelta(0))
+        ) if not aires.empty else pd.DataFrame()
+        fechas, columnas, matrices = remuestrear(
+            lecturas, desde, hasta, paso, series=aires['id'].to_numpy(), metodo=metodo, max_hueco=max_hueco
+        )
+        if agrupar_por == 'ubicacion':
+            codigos, ubicaciones = pd.factorize(aires['ubicacion'].fillna('Sin ubicación'))
+            # Matriz aire -> ubicación: sumas y conteos de cada punto con un producto matricial
+            pertenece = (codigos[:, None] == np.arange(len(ubicaciones))).astype(np.float64)
+            for col, matriz in matrices.items():
+                hay_dato = ~np.isnan(matriz)
+                suma = np.where(hay_dato, matriz, 0.0) @ pertenece
+                conteo = hay_dato.astype(np.float64) @ pertenece
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    matrices[col] = np.where(conteo > 0, suma / conteo, np.nan)
+            columnas = np.asarray(ubicaciones)
+        return {'fechas': fechas, 'columnas': columnas,
+                'temperatura': matrices['temperatura'], 'humedad': matrices['humedad']}
+
+    def obtener_lecturas_zoom(self, aire_id, desde, hasta, ancho_px=1000):
+        """
+        Serie de un aire en [desde, hasta) con a lo sumo un punto por píxel, desde
+        el nivel de la pirámide que corresponde al zoom (ver piramide.py).
+
+        Returns:
+            (DataFrame con fecha, total y promedio/mínimo/máximo de temperatura y humedad,
+            segundos por punto o None si son lecturas crudas)
+        """
+        nivel = piramide.elegir_nivel((hasta - desde).total_seconds(), ancho_px)
+        if nivel is None:
+            crudas = self._leer_lecturas(aire_ids=[aire_id], desde=desde, hasta=hasta)
+            # Con sensores muy frecuentes las crudas pueden superar el ancho: usar el nivel 0
+            if len(crudas) <= ancho_px:
+                temperaturas, humedades = crudas['temperatura'], crudas['humedad']
+                return pd.DataFrame({
+                    'fecha': crudas['fecha'], 'total': np.ones(len(crudas), dtype=np.int64),
+                    'temperatura_promedio': temperaturas, 'temperatura_min': temperaturas, 'temperatura_max': temperaturas,
+                    'humedad_promedio': humedades, 'humedad_min': humedades, 'humedad_max': humedades,
+                }), None
+            nivel = 0
+
+        nivel_guardado = min(nivel, piramide.NIVELES - 1)
+        inicio, _ = piramide.limites(desde, None, nivel)
+        bloques = pd.read_sql(
+            session.query(
+                PiramideLecturas.aire_id, PiramideLecturas.inicio,
+                *[getattr(PiramideLecturas, c) for c in piramide.COLUMNAS_RESUMEN]
+            ).filter(
+                PiramideLecturas.aire_id == aire_id, PiramideLecturas.nivel == nivel_guardado,
+                PiramideLecturas.inicio >= inicio, PiramideLecturas.inicio < hasta
+            ).order_by(PiramideLecturas.inicio).statement,
+            session.connection()
+        )
+        if not bloques.empty:
+            bloques['inicio'] = pd.to_datetime(bloques['inicio'])
+            if nivel > nivel_guardado:
+                # Zoom más amplio que el último nivel guardado
+                bloques = piramide.subir_nivel(bloques, nivel)
+        return pd.DataFrame({
+            'fecha': bloques['inicio'],
+            'total': bloques['total'],
+            'temperatura_promedio': bloques['temp_suma'] / bloques['total'],
+            'temperatura_min': bloques['temp_min'],
+            'temperatura_max': bloques['temp_max'],
+            'humedad_promedio': bloques['hum_suma'] / bloques['total'],
+            'humedad_min': bloques['hum_min'],
+            'humedad_max': bloques['hum_max'],
+        }), piramide.resolucion(nivel)
+
+    def obtener_percentiles(self, aire_ids=None, ubicacion=None, desde=None, hasta=None,
+                            percentiles=(50, 90, 95, 99)):
+        """
+        Calcula percentiles aproximados de temperatura y humedad para una ventana
+        y un conjunto de aires, fusionando los sketches horarios.
+
+        La ventana se alinea a horas completas: la hora que contiene 'desde'
+        y la que contiene 'hasta' se incluyen enteras. El error relativo de cada
+        percentil está acotado por 'error_relativo' (ver sketches.py).
+
+        Args:
+            aire_ids: Lista de IDs de aires (None para todos)
+            ubicacion: Filtrar además por la ubicación de los aires
+            desde: Inicio de la ventana (None para el inicio del historial)
+            hasta: Fin de la ventana (None para el final del historial)
+            percentiles: Percentiles a calcular (0-100)
+
+        Returns:
+            Diccionario con los percentiles de temperatura y humedad
+        """
+        query = session.query(SketchLecturas.sketch_temperatura, SketchLecturas.sketch_humedad, SketchLecturas.total)
+        if aire_ids:
+            query = query.filter(SketchLecturas.aire_id.in_(aire_ids))
+        if ubicacion:
+            query = query.join(AireAcondicionado, SketchLecturas.aire_id == AireAcondicionado.id)\
+                         .filter(AireAcondicionado.ubicacion == ubicacion)
+        if desde is not None:
+            query = query.filter(SketchLecturas.hora >= self._inicio_hora(desde))
+        if hasta is not None:
+            query = query.filter(SketchLecturas.hora <= self._inicio_hora(hasta))
+
+        filas = query.all()
+        sketch_temp = fusionar_serializados(fila.sketch_temperatura for fila in filas)
+        sketch_hum = fusionar_serializados(fila.sketch_humedad for fila in filas)
+
+        qs = [p / 100 for p in percentiles]
+
+        def formatear(sketch):
+            return {
+                f"p{p:g}": (round(valor, 2) if valor is not None else None)
+                for p, valor in zip(percentiles, sketch.cuantiles(qs))
+            }
+
+        return {
+            'temperatura': formatear(sketch_temp),
+            'humedad': formatear(sketch_hum),
+            'total_lecturas': sum(fila.total for fila in filas),
+            'error_relativo': ALPHA_POR_DEFECTO
+        }
+
+    @staticmethod
+    def _estadisticas_vacias(desviacion=False):
+        stats = {
+            'temperatura_promedio': 0, 'temperatura_minima': 0, 'temperatura_maxima': 0,
+            'humedad_promedio': 0, 'humedad_minima': 0, 'humedad_maxima': 0,
+        }
+        if desviacion:
+            stats.update({'temperatura_desviacion': 0, 'humedad_desviacion': 0})
+        return stats
+
+    def _estadisticas_ponderadas(self, aire_ids=None, agrupar_por=None, metodo='trapecio', max_intervalo=None):
+        """Lee las lecturas y calcula estadísticas ponderadas por tiempo (ver series_temporales.py)."""
+        lecturas_df = self.obtener_historico(aire_ids=aire_ids)
+        if lecturas_df.empty:
+            return pd.DataFrame()
+        if agrupar_por == 'ubicacion':
+            ubicaciones = dict(session.query(AireAcondicionado.id, AireAcondicionado.ubicacion).all())
+            lecturas_df['ubicacion'] = lecturas_df['aire_id'].map(ubicaciones)
+        return estadisticas_ponderadas_tiempo(
+            lecturas_df, agrupar_por=agrupar_por, metodo=metodo, max_intervalo=max_intervalo
+        )
+
+    @consulta_cacheada(tags=('lecturas',))
+    def obtener_estadisticas_generales(self, ponderado=False, metodo='trapecio', max_intervalo=None):
+        if ponderado:
+            stats = self._estadisticas_ponderadas(metodo=metodo, max_intervalo=max_intervalo)
+            if stats.empty:
+                return dict(self._estadisticas_vacias(), total_lecturas=0)
+            fila = stats.iloc[0]
+            return {
+                'temperatura_promedio': round(float(fila['temperatura_promedio']), 2),
+                'temperatura_minima': round(float(fila['temperatura_min']), 2),
+                'temperatura_maxima': round(float(fila['temperatura_max']), 2),
+                'humedad_promedio': round(float(fila['humedad_promedio']), 2),
+                'humedad_minima': round(float(fila['humedad_min']), 2),
+                'humedad_maxima': round(float(fila['humedad_max']), 2),
+                'total_lecturas': int(fila['lecturas'])
+            }
+
         # Consultar estadísticas generales desde la base de datos
         result = session.query(
             func.avg(Lectura.temperatura).label('temp_avg'),
@@ -407,6 +2223,7 @@ class DataManager:
             'total_lecturas': result.total_lecturas or 0
         }
         
+    @consulta_cacheada(tags=('aires_acondicionados',))
     def obtener_ubicaciones(self):
         """
         Obtiene todas las ubicaciones únicas de los aires acondicionados.
@@ -417,6 +2234,7 @@ class DataManager:
         ubicaciones = session.query(distinct(AireAcondicionado.ubicacion)).all()
         return [ubicacion[0] for ubicacion in ubicaciones]
     
+    @consulta_cacheada(tags=('aires_acondicionados',))
     def obtener_aires_por_ubicacion(self, ubicacion):
         """
         Obtiene los aires acondicionados en una ubicación específica.
@@ -442,12 +2260,16 @@ class DataManager:
         
         return pd.DataFrame(aires_data)
     
-    def obtener_estadisticas_por_ubicacion(self, ubicacion=None):
+    @consulta_cacheada(tags=('lecturas', 'aires_acondicionados'))
+    def obtener_estadisticas_por_ubicacion(self, ubicacion=None, ponderado=False, metodo='trapecio', max_intervalo=None):
         """
         Obtiene estadísticas agrupadas por ubicación.
         
         Args:
             ubicacion: Opcional, filtrar por una ubicación específica
+            ponderado: Si es True, promedio y desviación se ponderan por tiempo
+            metodo: Método de integración para el modo ponderado ('trapecio' o 'escalon')
+            max_intervalo: Segundos máximos atribuidos a un hueco entre lecturas (modo ponderado)
             
         Returns:
             DataFrame con estadísticas por ubicación
@@ -456,6 +2278,27 @@ class DataManager:
         aires_count = session.query(AireAcondicionado).count()
         if aires_count == 0:
             return pd.DataFrame()
+
+        if ponderado:
+            query = session.query(AireAcondicionado.id)
+            if ubicacion:
+                query = query.filter(AireAcondicionado.ubicacion == ubicacion)
+            aires_ids = [fila[0] for fila in query.all()]
+            stats = self._estadisticas_ponderadas(aire_ids=aires_ids, agrupar_por='ubicacion',
+                                                  metodo=metodo, max_intervalo=max_intervalo)
+            if stats.empty:
+                return pd.DataFrame()
+            num_aires = self.obtener_aires().groupby('ubicacion')['id'].count()
+            stats = stats.rename(columns={
+                'temperatura_desviacion': 'temperatura_std',
+                'humedad_desviacion': 'humedad_std',
+                'lecturas': 'lecturas_totales'
+            })
+            stats.insert(0, 'num_aires', num_aires.reindex(stats.index).fillna(0).astype(int))
+            stats = stats.rename_axis('ubicacion').reset_index().drop(columns=['duracion_horas'])
+            columnas = [c for c in stats.columns if c not in ('ubicacion', 'num_aires', 'lecturas_totales')]
+            stats[columnas] = stats[columnas].round(2)
+            return stats
         
         # Obtener todas las ubicaciones o la ubicación específica
         if ubicacion:
@@ -514,9 +2357,192 @@ class DataManager:
         aire = session.query(AireAcondicionado).filter(AireAcondicionado.id == aire_id).first()
         
         if aire:
-            # SQLAlchemy eliminará automáticamente las lecturas asociadas debido a la relación cascade
+            # La base de datos borra en cascada lecturas, mantenimientos, umbrales y sketches
+            # (ON DELETE CASCADE con passive_deletes), sin cargarlos en memoria
             session.delete(aire)
             session.commit()
+            self._registrar_cambio('aires_acondicionados', aire_id)
+            self._registrar_cambio('lecturas', aire_id, borradas=True)
+            self._registrar_cambio('umbrales_configuracion')
+
+    def configurar_sensor(self, aire_id, sensor_url, sensor_intervalo=None):
+        """
+        Asigna (o quita, con sensor_url=None) el endpoint que sondea poller.py.
+
+        Args:
+            aire_id: ID del aire acondicionado
+            sensor_url: 'http(s)://...' que responde JSON o 'tcp://host:puerto[/unidad]'
+            sensor_intervalo: Segundos entre sondeos (None = valor por defecto del poller)
+
+        Returns:
+            True si se actualizó, False si el aire no existe
+
+        Raises:
+            ValueError: Si la URL o el intervalo no son válidos
+        """
+        if sensor_url:
+            partes = urlparse(sensor_url)
+            if partes.scheme not in ESQUEMAS_SENSOR or not partes.hostname:
+                raise ValueError(f"URL de sensor inválida; esquemas admitidos: {', '.join(ESQUEMAS_SENSOR)}")
+            if partes.scheme == 'tcp' and not partes.port:
+                raise ValueError("Las URL tcp:// deben indicar el puerto")
+        if sensor_intervalo is not None and sensor_intervalo <= 0:
+            raise ValueError("El intervalo de sondeo debe ser positivo")
+
+        aire = session.query(AireAcondicionado).filter(AireAcondicionado.id == aire_id).first()
+        if not aire:
+            return False
+        try:
+            aire.sensor_url = sensor_url or None
+            aire.sensor_intervalo = sensor_intervalo
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        self._registrar_cambio('aires_acondicionados', aire_id)
+        return True
+
+    def configurar_compresion(self, aire_id, tolerancia_temp=None, tolerancia_hum=None, max_intervalo=None):
+        """
+        Configura el filtro de compresión de la ingesta de un aire (ver compresion.py).
+        Con ambas tolerancias en None el filtro queda desactivado.
+
+        Args:
+            aire_id: ID del aire acondicionado
+            tolerancia_temp: Variación de temperatura (°C) que se considera ruido
+            tolerancia_hum: Variación de humedad (%) que se considera ruido
+            max_intervalo: Segundos máximos sin guardar una lectura (latido)
+
+        Returns:
+            True si se actualizó, False si el aire no existe
+
+        Raises:
+            ValueError: Si algún valor es negativo o nulo donde no corresponde
+        """
+        for nombre, valor in (('tolerancia_temp', tolerancia_temp), ('tolerancia_hum', tolerancia_hum)):
+            if valor is not None and valor < 0:
+                raise ValueError(f"{nombre} no puede ser negativa")
+        if max_intervalo is not None and max_intervalo <= 0:
+            raise ValueError("max_intervalo debe ser positivo")
+
+        aire = session.query(AireAcondicionado).filter(AireAcondicionado.id == aire_id).first()
+        if not aire:
+            return False
+        try:
+            aire.compresion_tolerancia_temp = tolerancia_temp
+            aire.compresion_tolerancia_hum = tolerancia_hum
+            aire.compresion_max_intervalo = max_intervalo
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        self._registrar_cambio('aires_acondicionados', aire_id)
+        return True
+
+    def obtener_sensores(self):
+        """Devuelve id, sensor_url y sensor_intervalo de los aires con sensor configurado."""
+        sesion = Session()
+        try:
+            filas = (sesion.query(AireAcondicionado.id, AireAcondicionado.sensor_url, AireAcondicionado.sensor_intervalo)
+                     .filter(AireAcondicionado.sensor_url.isnot(None))
+                     .order_by(AireAcondicionado.id)
+                     .all())
+        finally:
+            sesion.close()
+        return pd.DataFrame(filas, columns=['id', 'sensor_url', 'sensor_intervalo'])
+
+    def contar_lecturas_aire(self, aire_id):
+        return session.query(func.count(Lectura.id)).filter(Lectura.aire_id == aire_id).scalar() or 0
+
+    def iniciar_eliminacion_aire(self, aire_id, tamano_lote=5000, pausa=0.05):
+        """
+        Elimina un aire en segundo plano, borrando sus lecturas en lotes acotados
+        para no mantener una transacción ni bloqueos largos.
+
+        Args:
+            aire_id: ID del aire a eliminar
+            tamano_lote: Lecturas borradas por transacción
+            pausa: Segundos de espera entre lotes para dejar paso a otras escrituras
+
+        Returns:
+            ID del trabajo (ver trabajos.obtener_trabajo)
+        """
+        return iniciar_trabajo(
+            'eliminar_aire',
+            lambda avance: self._eliminar_aire_por_lotes(aire_id, avance, tamano_lote, pausa),
+            parametros={'aire_id': aire_id, 'tamano_lote': tamano_lote},
+            total=self.contar_lecturas_aire(aire_id)
+        )
+
+    @staticmethod
+    def _borrar_alertas_huerfanas(sesion, claves):
+        """
+        Borra las anomalías y alertas de reglas de los (aire_id, fecha) de 'claves' que
+        ya no tienen lectura. Se llama en la misma transacción que borra las lecturas.
+        """
+        claves = [(aire_id, fecha) for aire_id, fecha in claves if aire_id is not None]
+        if not claves:
+            return
+        for modelo in (AnomaliaLectura, AlertaRegla):
+            sesion.query(modelo).filter(
+                tuple_(modelo.aire_id, modelo.fecha).in_(claves),
+                ~exists().where(Lectura.aire_id == modelo.aire_id, Lectura.fecha == modelo.fecha)
+            ).delete(synchronize_session=False)
+
+    @staticmethod
+    def _borrar_lecturas_por_lotes(sesion, filtros, tamano_lote, pausa=0, avance=None):
+        """
+        Borra las lecturas que cumplen 'filtros' en transacciones de a lo sumo
+        'tamano_lote' filas, confirmando cada lote.
+
+        Returns:
+            Número de lecturas borradas
+        """
+        borradas, ultimo_id = 0, 0
+        while True:
+            # Cursor por id: cada lote sigue donde terminó el anterior sin recorrer lo ya borrado
+            filas = sesion.query(Lectura.id, Lectura.aire_id, Lectura.fecha) \
+                .filter(*filtros, Lectura.id > ultimo_id) \
+                .order_by(Lectura.id) \
+                .limit(tamano_lote).all()
+            if not filas:
+                break
+            ultimo_id = filas[-1].id
+            sesion.query(Lectura).filter(Lectura.id.in_([fila.id for fila in filas])).delete(synchronize_session=False)
+            DataManager._borrar_alertas_huerfanas(sesion, [(fila.aire_id, fila.fecha) for fila in filas])
+            sesion.commit()
+            borradas += len(filas)
+            if avance is not None:
+                avance(borradas)
+            if len(filas) < tamano_lote:
+                break
+            if pausa:
+                time.sleep(pausa)
+        return borradas
+
+    def _eliminar_aire_por_lotes(self, aire_id, avance, tamano_lote, pausa):
+        sesion = Session()
+        borradas = 0
+        try:
+            borradas = self._borrar_lecturas_por_lotes(
+                sesion, [Lectura.aire_id == aire_id], tamano_lote, pausa=pausa, avance=avance
+            )
+
+            # El resto (mantenimientos, umbrales, sketches y lecturas llegadas mientras tanto)
+            # es pequeño y lo borra la cascada de la base de datos
+            eliminado = sesion.query(AireAcondicionado).filter(AireAcondicionado.id == aire_id).delete(synchronize_session=False)
+            sesion.commit()
+        except Exception:
+            sesion.rollback()
+            raise
+        finally:
+            sesion.close()
+            # Aunque falle a mitad, los lotes ya confirmados cambiaron las estadísticas
+            self._registrar_cambio('lecturas', aire_id, borradas=True)
+
+        self._registrar_cambio('aires_acondicionados', aire_id)
+        self._registrar_cambio('umbrales_configuracion')
+        return {'aire_id': aire_id, 'lecturas_eliminadas': borradas, 'aire_eliminado': bool(eliminado)}
             
     def obtener_aire_por_id(self, aire_id):
         """
@@ -568,6 +2594,7 @@ class DataManager:
             )
             session.add(nuevo_equipo)
             session.commit()
+            self._registrar_cambio('otros_equipos', entidad_id=nuevo_equipo.id)
             print(f"OtroEquipo agregado: ID={nuevo_equipo.id}, Nombre={nombre}, Tipo={tipo}")
             return nuevo_equipo.id
         except IntegrityError as e:
@@ -585,6 +2612,7 @@ class DataManager:
             traceback.print_exc()
             return None
 
+    @consulta_cacheada(tags=('otros_equipos',))
     def obtener_otros_equipos(self):
         """Obtiene todos los equipos diversos."""
         try:
@@ -637,6 +2665,7 @@ class DataManager:
 
             equipo.ultima_modificacion = datetime.now() # Actualizar timestamp
             session.commit()
+            self._registrar_cambio('otros_equipos', entidad_id=equipo_id)
             print(f"OtroEquipo actualizado: ID={equipo_id}")
             return True
         except IntegrityError as e:
@@ -661,6 +2690,7 @@ class DataManager:
             if equipo:
                 session.delete(equipo)
                 session.commit()
+                self._registrar_cambio('otros_equipos', entidad_id=equipo_id)
                 print(f"OtroEquipo eliminado: ID={equipo_id}")
                 return True
             else:
@@ -884,9 +2914,11 @@ class DataManager:
         
         session.add(nuevo_umbral)
         session.commit()
+        self._registrar_cambio('umbrales_configuracion', aire_id, entidad_id=nuevo_umbral.id)
         
         return nuevo_umbral.id
         
+    @consulta_cacheada(tags=('umbrales_configuracion', 'aires_acondicionados'))
     def obtener_umbrales_configuracion(self, aire_id=None, solo_globales=False):
         """
         Obtiene todas las configuraciones de umbrales, opcionalmente filtradas por aire_id.
@@ -1005,6 +3037,7 @@ class DataManager:
             # No se puede cambiar es_global o aire_id una vez creado
             
             session.commit()
+            self._registrar_cambio('umbrales_configuracion', entidad_id=umbral_id)
             return True
             
         return False
@@ -1035,6 +3068,7 @@ class DataManager:
             # Eliminar el umbral
             session.delete(umbral)
             session.commit()
+            self._registrar_cambio('umbrales_configuracion', entidad_id=umbral_id)
             print(f"Umbral con ID {umbral_id} eliminado correctamente")
             return True
             
@@ -1120,6 +3154,233 @@ class DataManager:
             'alertas': alertas
         }
     
+    def _aires_informe(self, aire_ids=None, ubicacion=None):
+        """DataFrame con id, nombre y ubicacion de los aires pedidos (todos por defecto), ordenado por id."""
+        query = session.query(AireAcondicionado.id, AireAcondicionado.nombre, AireAcondicionado.ubicacion)
+        if aire_ids is not None:
+            query = query.filter(AireAcondicionado.id.in_([int(a) for a in aire_ids]))
+        if ubicacion:
+            query = query.filter(AireAcondicionado.ubicacion == ubicacion)
+        return pd.DataFrame(query.order_by(AireAcondicionado.id).all(), columns=['id', 'nombre', 'ubicacion'])
+
+    def _series_en_rango(self, aires, desde=None, hasta=None):
+        """
+        Recorre aire por aire las lecturas en [desde, hasta) de la caché de series.
+
+        Yields:
+            (aire_id, nombre, ubicacion, serie): serie es la porción del array mapeado del
+            aire (ver obtener_serie); los aires sin lecturas en el rango se omiten
+        """
+        # Las fechas de la caché de series están en microsegundos
+        desde_us = np.datetime64(pd.Timestamp(desde), 'us').astype(np.int64) if desde is not None else None
+        hasta_us = np.datetime64(pd.Timestamp(hasta), 'us').astype(np.int64) if hasta is not None else None
+        self.sincronizar_series()
+        for aire_id, nombre, ubicacion in aires.itertuples(index=False):
+            serie = self.series.leer(aire_id)
+            inicio = np.searchsorted(serie['fecha'], desde_us, side='left') if desde_us is not None else 0
+            fin = np.searchsorted(serie['fecha'], hasta_us, side='left') if hasta_us is not None else len(serie)
+            if fin > inicio:
+                yield int(aire_id), nombre, ubicacion, serie[inicio:fin]
+
+    def simular_umbral(self, temp_min, temp_max, hum_min, hum_max, aire_id=None, desde=None, hasta=None):
+        """
+        Evalúa un umbral propuesto contra las lecturas históricas, aire por aire, sobre
+        la caché de series en disco (ver excursiones.py).
+
+        Args:
+            temp_min, temp_max, hum_min, hum_max: Límites propuestos
+            aire_id: Aire del umbral, o None para un umbral global (todos los aires)
+            desde, hasta: Rango de fechas [desde, hasta) (None: sin límite)
+
+        Returns:
+            DataFrame con una fila por aire con lecturas en el rango: aire_id, nombre,
+            ubicacion y las columnas de excursiones.resumir, ordenado por segundos_fuera
+            descendente
+        """
+        limites = {'temp_min': temp_min, 'temp_max': temp_max, 'hum_min': hum_min, 'hum_max': hum_max}
+        aires = self._aires_informe(aire_ids=[aire_id] if aire_id is not None else None)
+        filas = []
+        for id_aire, nombre, ubicacion, serie in self._series_en_rango(aires, desde, hasta):
+            resumen = excursiones.resumir(serie['fecha'], serie['temperatura'], serie['humedad'], limites)
+            filas.append(dict(resumen, aire_id=id_aire, nombre=nombre, ubicacion=ubicacion))
+
+        columnas = ['aire_id', 'nombre', 'ubicacion', 'lecturas', 'lecturas_fuera', 'fuera_temperatura',
+                    'fuera_humedad', 'episodios', 'segundos_fuera', 'episodio_mas_largo',
+                    'primera_violacion', 'ultima_violacion']
+        resultado = pd.DataFrame(filas, columns=columnas)
+        for columna in ('primera_violacion', 'ultima_violacion'):
+            resultado[columna] = pd.to_datetime(resultado[columna], unit='us')
+        return resultado.sort_values(['segundos_fuera', 'aire_id'], ascending=[False, True], ignore_index=True)
+
+    def obtener_excursiones(self, desde=None, hasta=None, periodo='dia', agrupar_por='aire', aire_ids=None,
+                            ubicacion=None):
+        """
+        Tiempo fuera de umbrales y excursiones por aire (o ubicación) y periodo. Una
+        lectura está fuera si viola alguno de los umbrales activos que aplican a su
+        aire (globales y propios, como en verificar_lectura_dentro_umbrales); ver
+        excursiones.py para la definición de episodio.
+
+        Args:
+            desde, hasta: Rango de fechas [desde, hasta) (None: sin límite)
+            periodo: 'hora', 'dia', 'semana' o None para todo el rango
+            agrupar_por: 'aire' o 'ubicacion' (suma los aires de cada ubicación)
+            aire_ids: Aires a incluir (None para todos, o los de 'ubicacion')
+            ubicacion: Limitar a los aires de una ubicación
+
+        Returns:
+            DataFrame con aire_id, nombre y ubicacion (o ubicacion y aires), periodo
+            (inicio, NaT si periodo es None), lecturas, lecturas_fuera, episodios,
+            segundos_fuera y episodio_mas_largo (segundos), ordenado por grupo y periodo
+        """
+        aires = self._aires_informe(aire_ids=aire_ids, ubicacion=ubicacion)
+        limites = self._limites_umbrales(aires['id'])
+        posicion = {int(aire_id): i for i, aire_id in enumerate(aires['id'])}
+        partes = []
+        for aire_id, nombre, ubicacion_aire, serie in self._series_en_rango(aires, desde, hasta):
+            limites_aire = {columna: valores[posicion[aire_id]] for columna, valores in limites.items()}
+            if periodo is None:
+                resumen = excursiones.resumir(serie['fecha'], serie['temperatura'], serie['humedad'], limites_aire)
+                parte = pd.DataFrame([resumen]).assign(periodo=np.nan)
+            else:
+                parte = excursiones.por_periodo(serie['fecha'], serie['temperatura'], serie['humedad'],
+                                                limites_aire, periodo)
+            partes.append(parte.assign(aire_id=aire_id, nombre=nombre, ubicacion=ubicacion_aire))
+
+        metricas = ['lecturas', 'lecturas_fuera', 'episodios', 'segundos_fuera', 'episodio_mas_largo']
+        if not partes:
+            columnas = ['ubicacion', 'aires'] if agrupar_por == 'ubicacion' else ['aire_id', 'nombre', 'ubicacion']
+            return pd.DataFrame(columns=columnas + ['periodo'] + metricas)
+        resultado = pd.concat(partes, ignore_index=True)
+        resultado['periodo'] = pd.to_datetime(resultado['periodo'], unit='us')
+        if agrupar_por == 'ubicacion':
+            resultado = resultado.groupby(['ubicacion', 'periodo'], dropna=False, sort=True).agg(
+                aires=('aire_id', 'nunique'), lecturas=('lecturas', 'sum'), lecturas_fuera=('lecturas_fuera', 'sum'),
+                episodios=('episodios', 'sum'), segundos_fuera=('segundos_fuera', 'sum'),
+                episodio_mas_largo=('episodio_mas_largo', 'max')
+            ).reset_index()
+            return resultado[['ubicacion', 'aires', 'periodo'] + metricas]
+        return resultado[['aire_id', 'nombre', 'ubicacion', 'periodo'] + metricas].sort_values(
+            ['aire_id', 'periodo'], kind='stable', ignore_index=True)
+
+    @consulta_cacheada(tags=('reglas_alerta', 'aires_acondicionados'))
+    def obtener_reglas_alerta(self, aire_id=None):
+        """
+        Reglas de alerta, opcionalmente solo las que aplican a un aire (propias y globales).
+
+        Returns:
+            DataFrame con las columnas de reglas_alerta más nombre_aire
+        """
+        query = session.query(
+            ReglaAlerta.id, ReglaAlerta.nombre, ReglaAlerta.tipo, ReglaAlerta.variable, ReglaAlerta.operador,
+            ReglaAlerta.valor, ReglaAlerta.ventana_minutos, ReglaAlerta.es_global, ReglaAlerta.aire_id,
+            AireAcondicionado.nombre.label('nombre_aire'), ReglaAlerta.activa,
+            ReglaAlerta.fecha_creacion, ReglaAlerta.ultima_modificacion
+        ).outerjoin(AireAcondicionado, ReglaAlerta.aire_id == AireAcondicionado.id)
+        if aire_id is not None:
+            query = query.filter((ReglaAlerta.aire_id == aire_id) | (ReglaAlerta.es_global == True))
+        return pd.read_sql(query.order_by(ReglaAlerta.id).statement, session.connection())
+
+    def crear_regla_alerta(self, nombre, tipo, ventana_minutos, variable=None, operador=None, valor=None,
+                           es_global=False, aire_id=None, activa=True):
+        """
+        Crea una regla de alerta (ver reglas.validar_regla para las combinaciones válidas).
+
+        Returns:
+            ID de la regla creada, o None si hubo un error
+        """
+        # Si no es global, debe tener un aire_id
+        if not es_global and aire_id is None:
+            return None
+        try:
+            regla = ReglaAlerta(
+                nombre=nombre, tipo=tipo, ventana_minutos=ventana_minutos,
+                variable=variable if tipo != 'sin_lecturas' else None,
+                operador=operador if tipo != 'sin_lecturas' else None,
+                valor=valor if tipo != 'sin_lecturas' else None,
+                es_global=es_global, aire_id=None if es_global else aire_id, activa=activa
+            )
+            session.add(regla)
+            session.commit()
+            self._registrar_cambio('reglas_alerta', entidad_id=regla.id)
+            return regla.id
+        except Exception as e:
+            print(f"Error al crear la regla de alerta: {e}", file=sys.stderr)
+            traceback.print_exc()
+            session.rollback()
+            return None
+
+    def actualizar_regla_alerta(self, regla_id, nombre, tipo, ventana_minutos, variable=None, operador=None,
+                                valor=None, activa=True):
+        """
+        Actualiza una regla de alerta. Como en los umbrales, no se puede cambiar si es
+        global o su aire una vez creada.
+
+        Returns:
+            True si se actualizó, False si no existe o hubo un error
+        """
+        try:
+            regla = session.query(ReglaAlerta).filter(ReglaAlerta.id == regla_id).first()
+            if regla is None:
+                return False
+            regla.nombre = nombre
+            regla.tipo = tipo
+            regla.ventana_minutos = ventana_minutos
+            regla.variable = variable if tipo != 'sin_lecturas' else None
+            regla.operador = operador if tipo != 'sin_lecturas' else None
+            regla.valor = valor if tipo != 'sin_lecturas' else None
+            regla.activa = activa
+            session.commit()
+            self._registrar_cambio('reglas_alerta', entidad_id=regla_id)
+            return True
+        except Exception as e:
+            print(f"Error al actualizar la regla de alerta {regla_id}: {e}", file=sys.stderr)
+            traceback.print_exc()
+            session.rollback()
+            return False
+
+    def eliminar_regla_alerta(self, regla_id):
+        """Elimina una regla de alerta y sus alertas. Devuelve True si existía."""
+        try:
+            eliminadas = session.query(ReglaAlerta).filter(ReglaAlerta.id == regla_id).delete(synchronize_session=False)
+            session.commit()
+            if eliminadas:
+                self._registrar_cambio('reglas_alerta', entidad_id=regla_id)
+            return bool(eliminadas)
+        except Exception as e:
+            print(f"Error al eliminar la regla de alerta {regla_id}: {e}", file=sys.stderr)
+            traceback.print_exc()
+            session.rollback()
+            return False
+
+    def obtener_alertas_reglas(self, aire_id=None, regla_id=None, desde=None, hasta=None, limite=200):
+        """
+        Alertas disparadas por las reglas, de la más reciente a la más antigua.
+
+        Returns:
+            DataFrame con id, regla_id, nombre_regla, tipo, aire_id, nombre_aire, fecha,
+            valor, mensaje y fecha_registro
+        """
+        query = session.query(
+            AlertaRegla.id, AlertaRegla.regla_id, ReglaAlerta.nombre.label('nombre_regla'), ReglaAlerta.tipo,
+            AlertaRegla.aire_id, AireAcondicionado.nombre.label('nombre_aire'), AlertaRegla.fecha,
+            AlertaRegla.valor, AlertaRegla.mensaje, AlertaRegla.fecha_registro
+        ).join(ReglaAlerta, AlertaRegla.regla_id == ReglaAlerta.id) \
+            .join(AireAcondicionado, AlertaRegla.aire_id == AireAcondicionado.id)
+        if aire_id is not None:
+            query = query.filter(AlertaRegla.aire_id == aire_id)
+        if regla_id is not None:
+            query = query.filter(AlertaRegla.regla_id == regla_id)
+        if desde is not None:
+            query = query.filter(AlertaRegla.fecha >= desde)
+        if hasta is not None:
+            query = query.filter(AlertaRegla.fecha < hasta)
+        df = pd.read_sql(query.order_by(desc(AlertaRegla.fecha), desc(AlertaRegla.id)).limit(limite).statement,
+                         session.connection())
+        if not df.empty:
+            df['fecha'] = pd.to_datetime(df['fecha'])
+            df['fecha_registro'] = pd.to_datetime(df['fecha_registro'])
+        return df
+
     def exportar_datos(self, formato='csv'):
         # Asegurar que el directorio exista
         if not os.path.exists(self.data_dir):
@@ -1127,7 +3388,16 @@ class DataManager:
         
         # Obtener datos de la base de datos
         aires_df = self.obtener_aires()
-        lecturas_df = self.obtener_lecturas()
+        lecturas_df = self.obtener_historico()
+        # La caché de series solo guarda lecturas con aire: las que no lo tienen se leen aparte
+        sin_aire_df = pd.read_sql(
+            session.query(Lectura.id, Lectura.aire_id, Lectura.fecha, Lectura.temperatura, Lectura.humedad)
+            .filter(Lectura.aire_id.is_(None)).order_by(Lectura.fecha).statement,
+            session.connection()
+        )
+        if not sin_aire_df.empty:
+            sin_aire_df['fecha'] = pd.to_datetime(sin_aire_df['fecha'])
+            lecturas_df = pd.concat([lecturas_df, sin_aire_df], ignore_index=True)
         mantenimientos_df = self.obtener_mantenimientos()
         
         # Eliminar columna de imagen binaria para exportación
@@ -1570,6 +3840,156 @@ class DataManager:
             print(f"Error al contar otros equipos: {e}", file=sys.stderr)
             return 0
         
+    def _matriz_flota(self, desde, hasta, nivel):
+        """
+        Bloques de la pirámide de todos los aires en [desde, hasta) como matrices
+        aires x bloques, con una sola consulta. 'desde' debe estar alineado al nivel.
+
+        Returns:
+            (aires: DataFrame con id, nombre y ubicacion; diccionario de matrices
+            'total', 'temperatura' y 'humedad' con el promedio de cada bloque, NaN
+            si no hay lecturas)
+        """
+        nivel_guardado = min(nivel, piramide.NIVELES - 1)
+        paso = piramide.resolucion(nivel)
+        aires = pd.DataFrame(
+            session.query(AireAcondicionado.id, AireAcondicionado.nombre, AireAcondicionado.ubicacion)
+            .order_by(AireAcondicionado.id).all(),
+            columns=['id', 'nombre', 'ubicacion']
+        )
+        bloques = pd.read_sql(
+            session.query(
+                PiramideLecturas.aire_id, PiramideLecturas.inicio,
+                *[getattr(PiramideLecturas, c) for c in piramide.COLUMNAS_RESUMEN]
+            ).filter(
+                PiramideLecturas.nivel == nivel_guardado,
+                PiramideLecturas.inicio >= desde, PiramideLecturas.inicio < hasta
+            ).statement,
+            session.connection()
+        )
+        columnas = int(-((desde - hasta).total_seconds() // paso))
+        total = np.zeros((len(aires), columnas))
+        temperatura = np.full((len(aires), columnas), np.nan)
+        humedad = np.full((len(aires), columnas), np.nan)
+        if not bloques.empty:
+            bloques['inicio'] = pd.to_datetime(bloques['inicio'])
+            if nivel > nivel_guardado:
+                bloques = piramide.subir_nivel(bloques, nivel)
+            filas = pd.Index(aires['id']).get_indexer(bloques['aire_id'])
+            posiciones = ((bloques['inicio'] - desde).dt.total_seconds() // paso).to_numpy(dtype=np.int64)
+            validas = (filas >= 0) & (posiciones < columnas)
+            filas, posiciones = filas[validas], posiciones[validas]
+            total[filas, posiciones] = bloques['total'].to_numpy(dtype=np.float64)[validas]
+            temperatura[filas, posiciones] = bloques['temp_suma'].to_numpy()[validas] / total[filas, posiciones]
+            humedad[filas, posiciones] = bloques['hum_suma'].to_numpy()[validas] / total[filas, posiciones]
+        return aires, {'total': total, 'temperatura': temperatura, 'humedad': humedad}
+
+    @consulta_cacheada(tags=('lecturas', 'aires_acondicionados'), ttl=60)
+    def obtener_sparklines(self, horas=24, puntos=48):
+        """
+        Series resumidas de las últimas 'horas' de todos los aires, alineadas en una
+        rejilla común de a lo sumo 'puntos' bloques, con una sola consulta a la
+        pirámide de resúmenes (ver piramide.py).
+
+        Returns:
+            Diccionario con 'desde' (inicio del primer bloque), 'paso_segundos', 'aires'
+            (DataFrame con id, nombre y ubicacion) y 'temperatura' y 'humedad' (arrays
+            de forma aires x bloques con el promedio de cada bloque, NaN si no hay lecturas)
+        """
+        hasta = datetime.now()
+        nivel = piramide.elegir_nivel(horas * 3600, puntos) or 0
+        desde, _ = piramide.limites(hasta - timedelta(hours=horas), None, nivel)
+        aires, matrices = self._matriz_flota(desde, hasta, nivel)
+        return {'desde': desde, 'paso_segundos': piramide.resolucion(nivel), 'aires': aires,
+                'temperatura': matrices['temperatura'], 'humedad': matrices['humedad']}
+
+    def _limites_umbrales(self, aire_ids):
+        """
+        Límites efectivos de cada aire según los umbrales con notificación activa que
+        le aplican (globales y propios, como en verificar_lectura_dentro_umbrales): el
+        mínimo más alto y el máximo más bajo de todos ellos.
+
+        Returns:
+            Diccionario con arrays alineados con aire_ids para temp_min, temp_max,
+            hum_min y hum_max (NaN si ningún umbral aplica)
+        """
+        aire_ids = np.asarray(aire_ids, dtype=np.int64)
+        umbrales_df = self.obtener_umbrales_configuracion()
+        limites = {}
+        for columna, reducir in (('temp_min', np.fmax), ('temp_max', np.fmin),
+                                 ('hum_min', np.fmax), ('hum_max', np.fmin)):
+            valores = np.full(len(aire_ids), np.nan)
+            if not umbrales_df.empty:
+                activos = umbrales_df[umbrales_df['notificar_activo'].astype(bool)]
+                globales = activos.loc[activos['es_global'].astype(bool), columna]
+                if not globales.empty:
+                    valores[:] = reducir.reduce(globales.to_numpy(dtype=np.float64))
+                propios = activos[~activos['es_global'].astype(bool) & activos['aire_id'].notnull()]
+                if not propios.empty:
+                    por_aire = propios.groupby(propios['aire_id'].astype(np.int64))[columna]
+                    por_aire = por_aire.max() if reducir is np.fmax else por_aire.min()
+                    valores = reducir(valores, por_aire.reindex(aire_ids).to_numpy(dtype=np.float64))
+            limites[columna] = valores
+        return limites
+
+    @consulta_cacheada(tags=('lecturas', 'aires_acondicionados', 'umbrales_configuracion'), ttl=300)
+    def obtener_predicciones(self, horizonte_horas=24, historia_horas=6, puntos=72):
+        """
+        Proyecta la tendencia reciente de temperatura y humedad de todos los aires y
+        estima cuándo cruzará cada uno sus umbrales (ver prediccion.py). La tendencia
+        se ajusta sobre los promedios de la pirámide de las últimas 'historia_horas'
+        (a lo sumo 'puntos' bloques), ponderados por sus lecturas.
+
+        Returns:
+            DataFrame con una fila por aire y variable que cruza (o ya está fuera de)
+            un límite antes de 'horizonte_horas', ordenado por horas_hasta_cruce:
+            aire_id, nombre, ubicacion, variable, limite (temp_max, temp_min, hum_max
+            o hum_min), valor_limite, nivel_actual, pendiente_por_hora, error,
+            horas_hasta_cruce y fecha_estimada
+        """
+        columnas = ['aire_id', 'nombre', 'ubicacion', 'variable', 'limite', 'valor_limite', 'nivel_actual',
+                    'pendiente_por_hora', 'error', 'horas_hasta_cruce', 'fecha_estimada']
+        ahora = datetime.now()
+        nivel = piramide.elegir_nivel(historia_horas * 3600, puntos) or 0
+        paso = piramide.resolucion(nivel)
+        desde, _ = piramide.limites(ahora - timedelta(hours=historia_horas), None, nivel)
+        aires, matrices = self._matriz_flota(desde, ahora, nivel)
+        if aires.empty:
+            return pd.DataFrame(columns=columnas)
+
+        # Centro de cada bloque (el último, incompleto, hasta ahora) en horas respecto a ahora
+        inicios = (desde - ahora).total_seconds() + paso * np.arange(matrices['total'].shape[1])
+        x = (inicios + np.minimum(inicios + paso, 0.0)) / 2.0 / 3600.0
+        limites = self._limites_umbrales(aires['id'])
+        partes = []
+        for variable, prefijo in (('temperatura', 'temp'), ('humedad', 'hum')):
+            tendencia = prediccion.ajustar_tendencias(x, matrices[variable], pesos=matrices['total'])
+            horas, superior = prediccion.horas_hasta_cruce(
+                tendencia['nivel'], tendencia['pendiente'],
+                limites[f'{prefijo}_min'], limites[f'{prefijo}_max'], horizonte_horas
+            )
+            cruzan = np.flatnonzero(~np.isnan(horas))
+            if len(cruzan) == 0:
+                continue
+            superior = superior[cruzan]
+            partes.append(pd.DataFrame({
+                'aire_id': aires['id'].to_numpy()[cruzan],
+                'nombre': aires['nombre'].to_numpy()[cruzan],
+                'ubicacion': aires['ubicacion'].to_numpy()[cruzan],
+                'variable': variable,
+                'limite': np.where(superior, f'{prefijo}_max', f'{prefijo}_min'),
+                'valor_limite': np.where(superior, limites[f'{prefijo}_max'][cruzan], limites[f'{prefijo}_min'][cruzan]),
+                'nivel_actual': tendencia['nivel'][cruzan],
+                'pendiente_por_hora': tendencia['pendiente'][cruzan],
+                'error': tendencia['error'][cruzan],
+                'horas_hasta_cruce': horas[cruzan],
+                'fecha_estimada': pd.Timestamp(ahora) + pd.to_timedelta(horas[cruzan], unit='h'),
+            }))
+        if not partes:
+            return pd.DataFrame(columns=columnas)
+        return pd.concat(partes, ignore_index=True).sort_values(
+            ['horas_hasta_cruce', 'aire_id'], kind='stable', ignore_index=True)
+
     def obtener_ultimas_lecturas_con_info_aire(self, limite=5):
         """
         Obtiene las últimas N lecturas registradas, incluyendo información
@@ -1,6 +1,6 @@
 import os
 import base64
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text, LargeBinary, Boolean, Date, CheckConstraint 
+from sqlalchemy import false, create_engine, event, Column, Integer, String, Float, REAL, DateTime, ForeignKey, Text, LargeBinary, Boolean, Date, CheckConstraint, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -14,6 +14,14 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 # Crear el motor de la base de datos
 engine = create_engine(DATABASE_URL)
 
+# SQLite solo aplica ON DELETE CASCADE con las claves foráneas activadas por conexión
+if engine.dialect.name == 'sqlite':
+    @event.listens_for(engine, 'connect')
+    def _activar_claves_foraneas(conexion_dbapi, registro):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 # Crear una sesión
 Session = sessionmaker(bind=engine)
 session = Session()
@@ -50,13 +58,21 @@ class AireAcondicionado(Base):
     condensadora_serial = Column(String(100), nullable=True, unique=True) # Seriales suelen ser únicos
     condensadora_codigo_inventario = Column(String(100), nullable=True, unique=True) # Códigos de inventario suelen ser únicos
     condensadora_ubicacion_instalacion = Column(String(200), nullable=True, comment="Ubicación específica de la condensadora si difiere de la general")
-   
+
+    # --- Sensor sondeado por poller.py ---
+    sensor_url = Column(String(300), nullable=True, comment="Endpoint del sensor: http(s)://... (JSON) o tcp://host:puerto[/unidad] (línea de texto)")
+    sensor_intervalo = Column(Integer, nullable=True, comment="Segundos entre sondeos del sensor (por defecto POLLER_INTERVALO)")
+
+    # --- Filtro de compresión en la ingesta (ver compresion.py); inactivo si ambas tolerancias son nulas ---
+    compresion_tolerancia_temp = Column(Float, nullable=True, comment="Variación de temperatura (°C) por debajo de la cual se descarta una lectura")
+    compresion_tolerancia_hum = Column(Float, nullable=True, comment="Variación de humedad (%) por debajo de la cual se descarta una lectura")
+    compresion_max_intervalo = Column(Integer, nullable=True, comment="Segundos máximos sin guardar una lectura (latido)")
     
-    # Relación con las lecturas
-    lecturas = relationship("Lectura", back_populates="aire", cascade="all, delete-orphan")
+    # Relación con las lecturas (la base de datos las borra en cascada, sin cargarlas)
+    lecturas = relationship("Lectura", back_populates="aire", cascade="all, delete-orphan", passive_deletes=True)
     
     # Relación con los mantenimientos
-    mantenimientos = relationship("Mantenimiento", back_populates="aire", cascade="all, delete-orphan")
+    mantenimientos = relationship("Mantenimiento", back_populates="aire", cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<AireAcondicionado(id={self.id}, nombre='{self.nombre}')>"
@@ -66,13 +82,24 @@ class Lectura(Base):
     __tablename__ = 'lecturas'
     
     id = Column(Integer, primary_key=True)
-    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id'))
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'))
     fecha = Column(DateTime, nullable=False)
-    temperatura = Column(Float, nullable=False)
-    humedad = Column(Float, nullable=False)
+    # REAL (4 bytes, ~7 cifras significativas) sobra para valores con uno o dos decimales
+    temperatura = Column(REAL, nullable=False)
+    humedad = Column(REAL, nullable=False)
+    anomalia = Column(Boolean, nullable=False, default=False, server_default=false(),
+                      comment="El detector en línea encontró un pico o el inicio de una deriva (ver anomalias.py)")
     
     # Relación con el aire acondicionado
     aire = relationship("AireAcondicionado", back_populates="lecturas")
+
+    __table_args__ = (
+        # Un aire no puede tener dos lecturas con la misma fecha (ingesta idempotente)
+        UniqueConstraint('aire_id', 'fecha', name='uq_lecturas_aire_fecha'),
+        # Las lecturas llegan en orden de fecha: un índice BRIN ocupa unos KB y basta
+        # para acotar por rango de fechas sin un B-tree del tamaño de la tabla
+        Index('ix_lecturas_fecha_brin', 'fecha', postgresql_using='brin'),
+    )
     
     def __repr__(self):
         return f"<Lectura(id={self.id}, aire_id={self.aire_id}, fecha='{self.fecha}')>"
@@ -82,8 +109,8 @@ class Mantenimiento(Base):
     __tablename__ = 'mantenimientos'
     
     id = Column(Integer, primary_key=True)
-    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id'), nullable=True)
-    otro_equipo_id = Column(Integer, ForeignKey('otros_equipos.id'), nullable=True)
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=True)
+    otro_equipo_id = Column(Integer, ForeignKey('otros_equipos.id', ondelete='CASCADE'), nullable=True)
    
     fecha = Column(DateTime, nullable=False, default=datetime.now)
     tipo_mantenimiento = Column(String(100), nullable=False)
@@ -120,7 +147,7 @@ class UmbralConfiguracion(Base):
     __tablename__ = 'umbrales_configuracion'
     
     id = Column(Integer, primary_key=True)
-    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id'), nullable=True)
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=True)
     nombre = Column(String(100), nullable=False)
     es_global = Column(Boolean, default=False)  # True si el umbral aplica a todos los aires
     
@@ -184,11 +211,177 @@ class OtroEquipo(Base):
     ultima_modificacion = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
 
     # Relación con los mantenimientos (Un equipo puede tener muchos mantenimientos)
-    mantenimientos = relationship("Mantenimiento", back_populates="otro_equipo", cascade="all, delete-orphan")
+    mantenimientos = relationship("Mantenimiento", back_populates="otro_equipo", cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return f"<OtroEquipo(id={self.id}, nombre='{self.nombre}', tipo='{self.tipo}')>"
 
+# Sketches de cuantiles por aire y por hora (ver sketches.py)
+class SketchLecturas(Base):
+    __tablename__ = 'sketches_lecturas'
+
+    id = Column(Integer, primary_key=True)
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=False)
+    hora = Column(DateTime, nullable=False, comment="Inicio de la hora que resume el sketch")
+    total = Column(Integer, nullable=False, default=0)
+    sketch_temperatura = Column(LargeBinary, nullable=False)
+    sketch_humedad = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('aire_id', 'hora', name='uq_sketches_lecturas_aire_hora'),
+    )
+
+    def __repr__(self):
+        return f"<SketchLecturas(aire_id={self.aire_id}, hora='{self.hora}', total={self.total})>"
+
+# Resúmenes de lecturas por aire en resoluciones que se duplican (ver piramide.py)
+class PiramideLecturas(Base):
+    __tablename__ = 'piramide_lecturas'
+
+    id = Column(Integer, primary_key=True)
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=False)
+    nivel = Column(Integer, nullable=False, comment="Bloques de RESOLUCION_BASE * 2**nivel segundos")
+    inicio = Column(DateTime, nullable=False, comment="Inicio del bloque")
+    total = Column(Integer, nullable=False, default=0)
+    temp_suma = Column(Float, nullable=False)
+    temp_min = Column(Float, nullable=False)
+    temp_max = Column(Float, nullable=False)
+    hum_suma = Column(Float, nullable=False)
+    hum_min = Column(Float, nullable=False)
+    hum_max = Column(Float, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('aire_id', 'nivel', 'inicio', name='uq_piramide_lecturas_aire_nivel_inicio'),
+    )
+
+    def __repr__(self):
+        return f"<PiramideLecturas(aire_id={self.aire_id}, nivel={self.nivel}, inicio='{self.inicio}', total={self.total})>"
+
+# Anomalías encontradas por el detector en línea de la ingesta (ver anomalias.py)
+class AnomaliaLectura(Base):
+    __tablename__ = 'anomalias_lecturas'
+
+    id = Column(Integer, primary_key=True)
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=False)
+    fecha = Column(DateTime, nullable=False, comment="Fecha de la lectura anómala")
+    variable = Column(String(20), nullable=False, comment="temperatura o humedad")
+    tipo = Column(String(20), nullable=False, comment="pico o deriva")
+    valor = Column(Float, nullable=False)
+    esperado = Column(Float, nullable=False, comment="Media rápida (pico) o lenta (deriva) antes de la lectura")
+    puntuacion = Column(Float, nullable=False, comment="Desviaciones respecto de lo esperado")
+
+    __table_args__ = (
+        Index('ix_anomalias_lecturas_aire_fecha', 'aire_id', 'fecha'),
+    )
+
+    def __repr__(self):
+        return f"<AnomaliaLectura(aire_id={self.aire_id}, fecha='{self.fecha}', variable='{self.variable}', tipo='{self.tipo}')>"
+
+# Checkpoint del estado del detector de anomalías de cada aire
+class EstadoDetectorAnomalias(Base):
+    __tablename__ = 'estado_detector_anomalias'
+
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), primary_key=True)
+    estado = Column(Text, nullable=False, comment="JSON con lecturas, última fecha y EWMA por variable")
+    ultima_fecha = Column(Float, nullable=True, comment="Última fecha evaluada (segundos): un checkpoint no pisa un estado más nuevo")
+    actualizado = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<EstadoDetectorAnomalias(aire_id={self.aire_id}, actualizado='{self.actualizado}')>"
+
+# Reglas de alerta declarativas (ver reglas.py)
+class ReglaAlerta(Base):
+    __tablename__ = 'reglas_alerta'
+
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(100), nullable=False)
+    tipo = Column(String(20), nullable=False, comment="cambio, sostenido o sin_lecturas")
+    variable = Column(String(20), nullable=True, comment="temperatura o humedad (no aplica a sin_lecturas)")
+    operador = Column(String(2), nullable=True, comment="'>' (sube / por encima) o '<' (baja / por debajo)")
+    valor = Column(Float, nullable=True, comment="Cambio máximo (cambio) o límite (sostenido)")
+    ventana_minutos = Column(Float, nullable=False)
+    es_global = Column(Boolean, default=False)  # True si la regla aplica a todos los aires
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=True)
+    activa = Column(Boolean, default=True)
+    fecha_creacion = Column(DateTime, nullable=False, default=datetime.now)
+    ultima_modificacion = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    aire = relationship("AireAcondicionado")
+
+    def __repr__(self):
+        alcance = 'global' if self.es_global else f'aire_id={self.aire_id}'
+        return f"<ReglaAlerta(id={self.id}, nombre='{self.nombre}', tipo='{self.tipo}', {alcance})>"
+
+# Alertas disparadas por las reglas de alerta
+class AlertaRegla(Base):
+    __tablename__ = 'alertas_reglas'
+
+    id = Column(Integer, primary_key=True)
+    regla_id = Column(Integer, ForeignKey('reglas_alerta.id', ondelete='CASCADE'), nullable=False)
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=False)
+    fecha = Column(DateTime, nullable=False, comment="Lectura que disparó la alerta (sin_lecturas: la última recibida)")
+    valor = Column(Float, nullable=True, comment="Valor de la lectura (sin_lecturas: minutos sin lecturas)")
+    mensaje = Column(String(255), nullable=False)
+    fecha_registro = Column(DateTime, nullable=False, default=datetime.now)
+
+    __table_args__ = (
+        # Cada alerta se registra una vez aunque la evalúen varios procesos
+        UniqueConstraint('regla_id', 'aire_id', 'fecha', name='uq_alertas_reglas_regla_aire_fecha'),
+        Index('ix_alertas_reglas_aire_fecha', 'aire_id', 'fecha'),
+    )
+
+    def __repr__(self):
+        return f"<AlertaRegla(regla_id={self.regla_id}, aire_id={self.aire_id}, fecha='{self.fecha}')>"
+
+# Cambios confirmados para los procesos que no pueden usar LISTEN/NOTIFY (ver notificaciones.py)
+class EventoCambio(Base):
+    __tablename__ = 'eventos_cambios'
+
+    id = Column(Integer, primary_key=True)
+    tabla = Column(String(100), nullable=False)
+    aire_id = Column(Integer, nullable=True)
+    entidad_id = Column(Integer, nullable=True)
+    origen = Column(String(50), nullable=False, comment="Proceso que realizó el cambio")
+    fecha = Column(DateTime, default=datetime.now, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<EventoCambio(id={self.id}, tabla='{self.tabla}', aire_id={self.aire_id})>"
+
+# Lecturas recibidas por la API pendientes de procesar por los workers de ingesta (ver worker.py)
+class LecturaEnCola(Base):
+    __tablename__ = 'ingest_queue'
+
+    id = Column(Integer, primary_key=True)
+    aire_id = Column(Integer, ForeignKey('aires_acondicionados.id', ondelete='CASCADE'), nullable=False)
+    fecha = Column(DateTime, nullable=False)
+    temperatura = Column(Float, nullable=False)
+    humedad = Column(Float, nullable=False)
+    recibida = Column(DateTime, nullable=False, default=datetime.now)
+    intentos = Column(Integer, nullable=False, default=0, comment="Procesamientos fallidos de esta lectura")
+    error = Column(Text, nullable=True, comment="Último error al procesarla")
+
+    def __repr__(self):
+        return f"<LecturaEnCola(id={self.id}, aire_id={self.aire_id}, fecha='{self.fecha}')>"
+
+# Trabajos en segundo plano (borrados por lotes, importaciones, etc.; ver trabajos.py)
+class Trabajo(Base):
+    __tablename__ = 'trabajos'
+
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String(50), nullable=False)
+    estado = Column(String(20), nullable=False, default='pendiente', comment="pendiente, en_curso, completado o error")
+    parametros = Column(Text, nullable=True, comment="JSON con los argumentos del trabajo")
+    progreso = Column(Integer, nullable=False, default=0)
+    total = Column(Integer, nullable=True)
+    mensaje = Column(Text, nullable=True)
+    resultado = Column(Text, nullable=True, comment="JSON con el resultado al terminar")
+    fecha_creacion = Column(DateTime, nullable=False, default=datetime.now)
+    fecha_inicio = Column(DateTime, nullable=True)
+    fecha_fin = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Trabajo(id={self.id}, tipo='{self.tipo}', estado='{self.estado}')>"
+
 
 def run_migrations():
     """Run database migrations using Alembic"""
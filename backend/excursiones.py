@@ -0,0 +1,130 @@
+"""
+Excursiones fuera de umbrales sobre series de lecturas ordenadas por fecha.
+
+El estado "fuera de límites" de cada lectura es un array booleano; sus tramos
+consecutivos (episodios) se obtienen codificando por longitud de racha con
+numpy.diff y numpy.flatnonzero, sin recorrer las lecturas en Python. Un episodio
+empieza en la primera lectura fuera y termina en la primera lectura que vuelve
+a estar dentro; si la serie acaba fuera, termina en su última lectura.
+
+Las series se procesan de a un aire (las columnas del archivo de la caché de
+series, ver series_mmap.py), así que la memoria usada es la de un aire.
+
+Para los informes (por día, semana u hora) el tiempo fuera de cada episodio se
+reparte entre los periodos que atraviesa.
+"""
+import numpy as np
+import pandas as pd
+
+# Segundos de cada periodo de los informes; las semanas empiezan el lunes (1970-01-05)
+PERIODOS = {'hora': 3600, 'dia': 86400, 'semana': 7 * 86400}
+_ORIGEN_PERIODO = {'hora': 0, 'dia': 0, 'semana': 4 * 86400}
+
+
+def fuera_de_limites(temperatura, humedad, temp_min=np.nan, temp_max=np.nan, hum_min=np.nan, hum_max=np.nan):
+    """
+    Lecturas fuera de los límites (NaN: sin límite).
+
+    Returns:
+        (fuera_temperatura, fuera_humedad): arrays booleanos
+    """
+    with np.errstate(invalid='ignore'):
+        fuera_temperatura = (temperatura < temp_min) | (temperatura > temp_max)
+        fuera_humedad = (humedad < hum_min) | (humedad > hum_max)
+    return fuera_temperatura, fuera_humedad
+
+
+def episodios(fechas, fuera):
+    """
+    Tramos consecutivos de lecturas fuera de límites.
+
+    Args:
+        fechas: Array int64 de fechas en microsegundos, ordenado
+        fuera: Array booleano del mismo largo
+
+    Returns:
+        (inicios, fines, duraciones): índices de la primera lectura de cada episodio,
+        índices de la lectura que lo cierra (la primera de vuelta dentro, o la última
+        de la serie si sigue fuera) y duración en segundos
+    """
+    cambios = np.diff(fuera.astype(np.int8), prepend=np.int8(0), append=np.int8(0))
+    inicios = np.flatnonzero(cambios == 1)
+    fines = np.minimum(np.flatnonzero(cambios == -1), len(fuera) - 1)
+    duraciones = (np.asarray(fechas)[fines] - np.asarray(fechas)[inicios]) / 1e6
+    return inicios, fines, duraciones
+
+
+def resumir(fechas, temperatura, humedad, limites):
+    """
+    Resume las violaciones de una serie frente a unos límites.
+
+    Args:
+        fechas, temperatura, humedad: Arrays de un aire ordenados por fecha (fechas en microsegundos)
+        limites: Diccionario con temp_min, temp_max, hum_min y hum_max (NaN: sin límite)
+
+    Returns:
+        Diccionario con lecturas, lecturas_fuera, fuera_temperatura, fuera_humedad,
+        episodios, segundos_fuera, episodio_mas_largo (segundos), primera_violacion y
+        ultima_violacion (microsegundos, o None)
+    """
+    fuera_temperatura, fuera_humedad = fuera_de_limites(temperatura, humedad, **limites)
+    fuera = fuera_temperatura | fuera_humedad
+    inicios, _, duraciones = episodios(fechas, fuera)
+    posiciones = np.flatnonzero(fuera)
+    return {
+        'lecturas': len(fuera),
+        'lecturas_fuera': len(posiciones),
+        'fuera_temperatura': int(fuera_temperatura.sum()),
+        'fuera_humedad': int(fuera_humedad.sum()),
+        'episodios': len(inicios),
+        'segundos_fuera': float(duraciones.sum()),
+        'episodio_mas_largo': float(duraciones.max()) if len(duraciones) else 0.0,
+        'primera_violacion': int(fechas[posiciones[0]]) if len(posiciones) else None,
+        'ultima_violacion': int(fechas[posiciones[-1]]) if len(posiciones) else None,
+    }
+
+
+def inicio_periodo(fechas, periodo):
+    """Inicio (microsegundos) del periodo que contiene cada fecha (microsegundos)."""
+    paso = PERIODOS[periodo] * 1_000_000
+    origen = _ORIGEN_PERIODO[periodo] * 1_000_000
+    return (np.asarray(fechas) - origen) // paso * paso + origen
+
+
+def por_periodo(fechas, temperatura, humedad, limites, periodo):
+    """
+    Como resumir, pero por periodo: el tiempo fuera de un episodio que cruza el
+    cambio de periodo se reparte entre ambos, y cada episodio cuenta (con su
+    duración completa) en el periodo en que empieza.
+
+    Returns:
+        DataFrame con periodo (inicio, en microsegundos), lecturas, lecturas_fuera,
+        episodios, segundos_fuera y episodio_mas_largo, ordenado por periodo
+    """
+    fuera_temperatura, fuera_humedad = fuera_de_limites(temperatura, humedad, **limites)
+    fuera = fuera_temperatura | fuera_humedad
+    fechas = np.asarray(fechas)
+    periodos = inicio_periodo(fechas, periodo)
+    inicios, fines, duraciones = episodios(fechas, fuera)
+
+    # Tramos de cada episodio dentro de cada periodo que atraviesa
+    paso = PERIODOS[periodo] * 1_000_000
+    desde, hasta = fechas[inicios], fechas[fines]
+    primero = periodos[inicios]
+    tramos = (inicio_periodo(hasta, periodo) - primero) // paso + 1
+    episodio = np.repeat(np.arange(len(inicios)), tramos)
+    desplazamiento = np.arange(len(episodio)) - np.repeat(np.cumsum(tramos) - tramos, tramos)
+    periodo_tramo = primero[episodio] + desplazamiento * paso
+    segundos_tramo = (np.minimum(hasta[episodio], periodo_tramo + paso)
+                      - np.maximum(desde[episodio], periodo_tramo)) / 1e6
+
+    lecturas = pd.DataFrame({'periodo': periodos, 'fuera': fuera}).groupby('periodo')['fuera'].agg(
+        lecturas='size', lecturas_fuera='sum')
+    por_episodio = pd.DataFrame({'periodo': primero, 'duracion': duraciones}).groupby('periodo')['duracion'].agg(
+        episodios='size', episodio_mas_largo='max')
+    tiempo = pd.DataFrame({'periodo': periodo_tramo, 'segundos_fuera': segundos_tramo}).groupby('periodo').sum()
+    resultado = lecturas.join([por_episodio, tiempo], how='outer').fillna(0)
+    for columna in ('lecturas', 'lecturas_fuera', 'episodios'):
+        resultado[columna] = resultado[columna].astype(np.int64)
+    return resultado.reset_index()[['periodo', 'lecturas', 'lecturas_fuera', 'episodios',
+                                    'segundos_fuera', 'episodio_mas_largo']]
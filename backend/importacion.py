@@ -0,0 +1,286 @@
+"""
+Lectura y validación de archivos de lecturas (CSV o XLSX) para la importación masiva.
+
+Se aceptan dos formatos:
+- Largo: una columna de fecha, 'temperatura', 'humedad' y opcionalmente 'aire_id'
+  (ID o nombre del aire). Sin columna de aire se usa el aire indicado al importar.
+- Ancho (exportaciones de registradores): una columna de fecha y un par de columnas
+  por aire, p. ej. 'Aire 1 Temperatura (°C)' / 'Aire 1 Humedad (%)' o 'temp_3' / 'hum_3'.
+
+Los archivos se leen por bloques y cada bloque se valida de forma vectorizada;
+las filas inválidas se devuelven como errores con su número de fila en el archivo.
+"""
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+TAMANO_BLOQUE = 200_000
+MAX_ERRORES_REPORTADOS = 1000
+LIMITES_TEMPERATURA = (-50.0, 100.0)
+LIMITES_HUMEDAD = (0.0, 100.0)
+EXTENSIONES_PERMITIDAS = ('.csv', '.txt', '.xlsx')
+
+_NOMBRES_FECHA = ('fecha', 'fecha_hora', 'fecha hora', 'timestamp', 'datetime', 'date', 'time', 'hora')
+_NOMBRES_AIRE = ('aire_id', 'aire', 'id_aire', 'equipo')
+_NOMBRES_MEDIDA = {
+    'temperatura': ('temperatura', 'temperature', 'temp', 't'),
+    'humedad': ('humedad', 'humidity', 'hum', 'rh', 'hr'),
+}
+_MEDIDA = r'(?P<medida>temp(?:eratura|erature)?|hum(?:edad|idity)?|rh)'
+_SEPARADOR = r'[\s_\-:|./]+'
+_PATRON_AIRE_MEDIDA = re.compile(rf'^(?P<aire>.+?){_SEPARADOR}{_MEDIDA}$', re.IGNORECASE)
+_PATRON_MEDIDA_AIRE = re.compile(rf'^{_MEDIDA}{_SEPARADOR}(?P<aire>.+)$', re.IGNORECASE)
+_PATRON_UNIDADES = re.compile(r'\s*[\(\[][^\)\]]*[\)\]]\s*$')
+
+
+def _normalizar_nombre(columna):
+    """Quita unidades entre paréntesis/corchetes y espacios sobrantes."""
+    return _PATRON_UNIDADES.sub('', str(columna)).strip()
+
+
+def _es_medida(nombre, medida):
+    return nombre.lower() in _NOMBRES_MEDIDA[medida]
+
+
+def _mapa_aires(aires_df):
+    """Diccionario de ID (como texto) y nombre en minúsculas -> ID de aire."""
+    mapa = {}
+    for aire_id, nombre in zip(aires_df['id'], aires_df['nombre']):
+        mapa[str(int(aire_id))] = int(aire_id)
+        if isinstance(nombre, str):
+            mapa.setdefault(nombre.strip().lower(), int(aire_id))
+    return mapa
+
+
+def detectar_formato(columnas, aires_df, aire_id=None):
+    """
+    Determina cómo convertir las columnas del archivo en lecturas.
+
+    Args:
+        columnas: Nombres de columna del archivo
+        aires_df: DataFrame de aires (id, nombre) para resolver las referencias
+        aire_id: Aire al que asignar las lecturas de un archivo largo sin columna de aire
+
+    Returns:
+        Diccionario con 'tipo' ('largo' o 'ancho'), 'columna_fecha', 'columna_aire'
+        (solo formato largo con columna de aire) y 'series': lista de
+        (aire_id, columna_temperatura, columna_humedad)
+
+    Raises:
+        ValueError: Si las columnas no corresponden a ningún formato soportado
+    """
+    nombres = {col: _normalizar_nombre(col) for col in columnas}
+    columna_fecha = next((col for col, n in nombres.items() if n.lower() in _NOMBRES_FECHA), None)
+    if columna_fecha is None:
+        raise ValueError(f"No se encontró una columna de fecha ({', '.join(_NOMBRES_FECHA)})")
+
+    col_temp = next((col for col, n in nombres.items() if _es_medida(n, 'temperatura')), None)
+    col_hum = next((col for col, n in nombres.items() if _es_medida(n, 'humedad')), None)
+    if col_temp is not None and col_hum is not None:
+        columna_aire = next((col for col, n in nombres.items() if n.lower() in _NOMBRES_AIRE), None)
+        if columna_aire is None:
+            if aire_id is None:
+                raise ValueError("El archivo no tiene columna 'aire_id': indique el aire al que pertenecen las lecturas")
+            if int(aire_id) not in set(aires_df['id'].astype(int)):
+                raise ValueError(f"El aire {aire_id} no existe")
+        return {
+            'tipo': 'largo',
+            'columna_fecha': columna_fecha,
+            'columna_aire': columna_aire,
+            'series': [(None if columna_aire else int(aire_id), col_temp, col_hum)]
+        }
+
+    # Formato ancho: agrupar las columnas de medida por aire
+    mapa = _mapa_aires(aires_df)
+    pares, desconocidos = {}, []
+    for col, nombre in nombres.items():
+        if col == columna_fecha:
+            continue
+        coincidencia = _PATRON_AIRE_MEDIDA.match(nombre) or _PATRON_MEDIDA_AIRE.match(nombre)
+        if not coincidencia:
+            continue
+        referencia = coincidencia.group('aire').strip()
+        aire = mapa.get(referencia.lower())
+        if aire is None:
+            desconocidos.append(referencia)
+            continue
+        medida = 'temperatura' if _es_medida(coincidencia.group('medida'), 'temperatura') else 'humedad'
+        pares.setdefault(aire, {})[medida] = col
+
+    if desconocidos:
+        raise ValueError(f"Aires desconocidos en las columnas: {', '.join(sorted(set(desconocidos)))}")
+    incompletos = [str(a) for a, cols in pares.items() if len(cols) < 2]
+    if incompletos:
+        raise ValueError(f"Falta la columna de temperatura o humedad para los aires: {', '.join(incompletos)}")
+    if not pares:
+        raise ValueError("No se reconocieron columnas de temperatura y humedad")
+
+    return {
+        'tipo': 'ancho',
+        'columna_fecha': columna_fecha,
+        'columna_aire': None,
+        'series': [(aire, cols['temperatura'], cols['humedad']) for aire, cols in sorted(pares.items())]
+    }
+
+
+def _separador_csv(ruta):
+    with open(ruta, 'r', encoding='utf-8-sig', errors='replace') as archivo:
+        encabezado = archivo.readline()
+    return max((',', ';', '\t'), key=encabezado.count)
+
+
+def leer_encabezado(ruta):
+    """Devuelve los nombres de columna del archivo."""
+    if ruta.lower().endswith('.xlsx'):
+        openpyxl = _importar_openpyxl()
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            fila = next(libro.active.iter_rows(max_row=1, values_only=True), ())
+            return [c for c in fila if c is not None]
+        finally:
+            libro.close()
+    return list(pd.read_csv(ruta, sep=_separador_csv(ruta), nrows=0, encoding='utf-8-sig',
+                            skipinitialspace=True).columns)
+
+
+def contar_filas(ruta):
+    """Número aproximado de filas de datos (para informar el progreso)."""
+    if ruta.lower().endswith('.xlsx'):
+        openpyxl = _importar_openpyxl()
+        libro = openpyxl.load_workbook(ruta, read_only=True)
+        try:
+            return max((libro.active.max_row or 1) - 1, 0)
+        finally:
+            libro.close()
+    lineas = 0
+    with open(ruta, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            lineas += bloque.count(b'\n')
+    return max(lineas - 1, 0)
+
+
+def leer_bloques(ruta, columnas, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Lee el archivo por bloques.
+
+    Yields:
+        (número de fila de datos del primer registro del bloque, DataFrame)
+    """
+    inicio = 0
+    if ruta.lower().endswith('.xlsx'):
+        openpyxl = _importar_openpyxl()
+        libro = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+        try:
+            filas = libro.active.iter_rows(values_only=True)
+            encabezado = list(next(filas, ()))
+            indices = [encabezado.index(col) for col in columnas]
+            bloque = []
+            for fila in filas:
+                bloque.append([fila[i] if i < len(fila) else None for i in indices])
+                if len(bloque) >= tamano_bloque:
+                    yield inicio, pd.DataFrame(bloque, columns=columnas)
+                    inicio += len(bloque)
+                    bloque = []
+            if bloque:
+                yield inicio, pd.DataFrame(bloque, columns=columnas)
+        finally:
+            libro.close()
+        return
+
+    lector = pd.read_csv(ruta, sep=_separador_csv(ruta), usecols=columnas, chunksize=tamano_bloque,
+                         encoding='utf-8-sig', skipinitialspace=True)
+    for bloque in lector:
+        yield inicio, bloque
+        inicio += len(bloque)
+
+
+def _importar_openpyxl():
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError("Para importar archivos .xlsx instale el paquete 'openpyxl'")
+    return openpyxl
+
+
+def _numerico(serie):
+    if not pd.api.types.is_numeric_dtype(serie):
+        # Admite coma decimal (exportaciones en configuración regional española)
+        serie = serie.astype(str).str.replace(',', '.', regex=False)
+    return pd.to_numeric(serie, errors='coerce')
+
+
+def convertir_bloque(bloque, inicio, formato, aires_df, formato_fecha=None):
+    """
+    Convierte y valida un bloque del archivo.
+
+    Args:
+        bloque: DataFrame con las columnas del archivo
+        inicio: Número de fila de datos del primer registro del bloque
+        formato: Resultado de detectar_formato
+        aires_df: DataFrame de aires (id, nombre)
+        formato_fecha: Formato strptime de la columna de fecha (None para inferirlo)
+
+    Returns:
+        (DataFrame válido con aire_id, fecha, temperatura, humedad,
+         lista de errores {'fila', 'aire_id', 'motivo'}, número de lecturas rechazadas)
+    """
+    # Fila en el archivo (1 = encabezado)
+    filas = np.arange(inicio + 2, inicio + 2 + len(bloque))
+    fechas = pd.to_datetime(bloque[formato['columna_fecha']], errors='coerce', format=formato_fecha)
+
+    partes = []
+    for aire, col_temp, col_hum in formato['series']:
+        if formato['columna_aire'] is not None:
+            mapa = _mapa_aires(aires_df)
+            aires = bloque[formato['columna_aire']].astype(str).str.strip().str.lower() \
+                .str.replace(r'\.0$', '', regex=True).map(mapa)
+        else:
+            aires = pd.Series(aire, index=bloque.index, dtype='float64')
+        parte = pd.DataFrame({
+            'fila': filas,
+            'aire_id': aires.to_numpy(dtype='float64'),
+            'fecha': fechas.to_numpy(),
+            'temperatura': _numerico(bloque[col_temp]).to_numpy(dtype='float64'),
+            'humedad': _numerico(bloque[col_hum]).to_numpy(dtype='float64')
+        })
+        if len(formato['series']) > 1:
+            # En formato ancho una celda vacía en ambas medidas es solo un aire sin muestra
+            parte = parte[parte['temperatura'].notna() | parte['humedad'].notna()]
+        partes.append(parte)
+    lecturas = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+
+    temp, hum = lecturas['temperatura'], lecturas['humedad']
+    condiciones = [
+        lecturas['aire_id'].isna(),
+        lecturas['fecha'].isna(),
+        temp.isna(),
+        ~temp.between(*LIMITES_TEMPERATURA),
+        hum.isna(),
+        ~hum.between(*LIMITES_HUMEDAD),
+    ]
+    motivos = [
+        'aire desconocido',
+        'fecha inválida',
+        'temperatura vacía o no numérica',
+        f'temperatura fuera de rango {LIMITES_TEMPERATURA}',
+        'humedad vacía o no numérica',
+        f'humedad fuera de rango {LIMITES_HUMEDAD}',
+    ]
+    motivo = np.select(condiciones, motivos, default='')
+    invalidas = motivo != ''
+
+    errores = [
+        {'fila': int(f), 'aire_id': None if np.isnan(a) else int(a), 'motivo': m}
+        for f, a, m in zip(lecturas['fila'].to_numpy()[invalidas][:MAX_ERRORES_REPORTADOS],
+                           lecturas['aire_id'].to_numpy()[invalidas][:MAX_ERRORES_REPORTADOS],
+                           motivo[invalidas][:MAX_ERRORES_REPORTADOS])
+    ]
+    validas = lecturas.loc[~invalidas, ['aire_id', 'fecha', 'temperatura', 'humedad']]
+    validas = validas.astype({'aire_id': 'int64'})
+    return validas.reset_index(drop=True), errores, int(invalidas.sum())
+
+
+def extension_valida(nombre_archivo):
+    return os.path.splitext(nombre_archivo or '')[1].lower() in EXTENSIONES_PERMITIDAS
@@ -0,0 +1,382 @@
+"""
+Ingesta diferida (write-behind) de lecturas con commit agrupado.
+
+Las lecturas aceptadas por la API se encolan en memoria y un hilo escritor
+las guarda en una sola transacción cada 'intervalo_ms' milisegundos o cada
+'max_lote' lecturas, lo que ocurra antes. Con la cola llena se rechazan
+nuevas lecturas (la API responde 429) en lugar de crecer sin límite.
+
+Quien necesite saber que su lectura ya está en la base de datos puede
+esperar el ticket que devuelve encolar() (confirmación durable).
+
+También incluye la ingesta de flujos NDJSON (POST /api/lecturas/stream),
+que guarda micro-lotes a medida que llegan las líneas.
+"""
+import collections
+import json
+import queue
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from database import Session
+
+
+class ColaLlena(Exception):
+    """La cola de ingesta no admite más lecturas por ahora."""
+
+
+class TicketIngesta:
+    """Permite esperar a que las lecturas de una petición se hayan confirmado."""
+    __slots__ = ('_evento', '_pendientes', '_lock', 'error')
+
+    def __init__(self, cantidad):
+        self._evento = threading.Event()
+        self._pendientes = cantidad
+        self._lock = threading.Lock()
+        self.error = None
+
+    def _resolver(self, cantidad, error=None):
+        with self._lock:
+            if error is not None and self.error is None:
+                self.error = error
+            self._pendientes -= cantidad
+            if self._pendientes <= 0:
+                self._evento.set()
+
+    def esperar(self, timeout=None):
+        """
+        Bloquea hasta que todas las lecturas del ticket se hayan guardado.
+
+        Returns:
+            True si se confirmaron, False si venció el timeout
+
+        Raises:
+            La excepción del lote si falló su escritura
+        """
+        if not self._evento.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+class ColaIngesta:
+    """
+    Args:
+        data_manager: DataManager cuyo _cargar_lecturas se usa para escribir
+        max_pendientes: Lecturas en cola a partir de las cuales se rechazan nuevas
+        intervalo_ms: Tiempo máximo que una lectura espera en cola antes del commit
+        max_lote: Lecturas máximas por transacción
+    """
+
+    def __init__(self, data_manager, max_pendientes=10000, intervalo_ms=50, max_lote=1000):
+        self.data_manager = data_manager
+        self.max_pendientes = max_pendientes
+        self.intervalo = intervalo_ms / 1000.0
+        self.max_lote = max_lote
+        self._cola = queue.Queue(maxsize=max_pendientes)
+        self._hilo = None
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._latencias = collections.deque(maxlen=1000)
+        self._metricas = {
+            'encoladas': 0,
+            'rechazadas_cola_llena': 0,
+            'lotes': 0,
+            'insertadas': 0,
+            'actualizadas': 0,
+            'duplicadas_ignoradas': 0,
+            'filtradas_compresion': 0,
+            'errores': 0,
+        }
+
+    def iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._escribir, name='ingesta-diferida', daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout=10):
+        """Detiene el escritor tras vaciar lo pendiente."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=timeout)
+
+    def encolar(self, lecturas):
+        """
+        Encola lecturas para su escritura diferida.
+
+        Args:
+            lecturas: Lista de diccionarios con aire_id, fecha, temperatura, humedad
+
+        Returns:
+            TicketIngesta para esperar la confirmación
+
+        Raises:
+            ColaLlena: Si no hay espacio para todas las lecturas
+        """
+        ticket = TicketIngesta(len(lecturas))
+        with self._lock:
+            # Todo o nada: no aceptar la mitad de una petición
+            if self._cola.qsize() + len(lecturas) > self.max_pendientes:
+                self._metricas['rechazadas_cola_llena'] += len(lecturas)
+                raise ColaLlena(f"Cola de ingesta llena ({self.max_pendientes} lecturas pendientes)")
+            for lectura in lecturas:
+                self._cola.put_nowait((lectura, ticket))
+            self._metricas['encoladas'] += len(lecturas)
+        return ticket
+
+    def metricas(self):
+        with self._lock:
+            latencias = np.array(self._latencias) if self._latencias else None
+            return dict(
+                self._metricas,
+                profundidad=self._cola.qsize(),
+                max_pendientes=self.max_pendientes,
+                intervalo_ms=self.intervalo * 1000,
+                max_lote=self.max_lote,
+                latencia_flush_ms={
+                    'ultima': round(latencias[-1] * 1000, 2),
+                    'promedio': round(latencias.mean() * 1000, 2),
+                    'p95': round(np.percentile(latencias, 95) * 1000, 2),
+                    'max': round(latencias.max() * 1000, 2),
+                } if latencias is not None else None,
+                lecturas_por_lote=round(
+                    (self._metricas['insertadas'] + self._metricas['actualizadas']
+                     + self._metricas['duplicadas_ignoradas'] + self._metricas['filtradas_compresion'])
+                    / self._metricas['lotes'], 1) if self._metricas['lotes'] else 0.0
+            )
+
+    def _tomar_lote(self):
+        """Espera la primera lectura y acumula hasta max_lote o hasta que pase el intervalo."""
+        try:
+            lote = [self._cola.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self):
+        while not (self._detener.is_set() and self._cola.empty()):
+            lote = self._tomar_lote()
+            if lote:
+                self._guardar_lote(lote)
+
+    def _guardar(self, df):
+        """Guarda lecturas en una transacción propia; devuelve (resumen, error)."""
+        sesion = Session()
+        try:
+            resumen = self.data_manager._cargar_lecturas(sesion, df)
+            sesion.commit()
+        except Exception as e:
+            sesion.rollback()
+            print(f"Error al guardar un lote de {len(df)} lecturas diferidas: {e}", file=sys.stderr)
+            traceback.print_exc()
+            return None, e
+        finally:
+            sesion.close()
+        self.data_manager._despues_de_ingesta(resumen, df['aire_id'].unique())
+        return resumen, None
+
+    def _guardar_lote(self, lote):
+        inicio = time.perf_counter()
+        resumen, error = self._guardar(pd.DataFrame([lectura for lectura, _ in lote]))
+        if error is None or len(lote) == 1:
+            partes = [(lote, resumen, error)]
+        else:
+            # El lote mezcla lecturas de varias peticiones ya aceptadas: se reintenta
+            # de a una para que solo la lectura inválida reciba el error
+            partes = [([elemento], *self._guardar(pd.DataFrame([elemento[0]]))) for elemento in lote]
+
+        duracion = time.perf_counter() - inicio
+        with self._lock:
+            self._latencias.append(duracion)
+            self._metricas['lotes'] += 1
+            for _, resumen, error in partes:
+                if error is None:
+                    self._metricas['insertadas'] += resumen['insertadas']
+                    self._metricas['actualizadas'] += resumen['actualizadas']
+                    self._metricas['duplicadas_ignoradas'] += resumen['ignoradas']
+                    self._metricas['filtradas_compresion'] += resumen['filtradas']
+                else:
+                    self._metricas['errores'] += 1
+
+        # Resolver los tickets agrupando por petición
+        for parte, _, error in partes:
+            por_ticket = collections.Counter(ticket for _, ticket in parte)
+            for ticket, cantidad in por_ticket.items():
+                ticket._resolver(cantidad, error)
+
+
+_FIN_FLUJO = object()
+
+
+def _encolar(cola, elemento, detener):
+    """Pone un elemento en la cola salvo que el consumidor haya terminado (devuelve False)."""
+    while not detener.is_set():
+        try:
+            cola.put(elemento, timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _leer_lineas(flujo, cola, max_linea, detener):
+    """
+    Hilo lector: pasa las líneas del cuerpo de la petición a una cola acotada.
+    Termina cuando se activa 'detener' (el consumidor ya no vacía la cola).
+    """
+    try:
+        while True:
+            linea = flujo.readline(max_linea)
+            if not linea or not _encolar(cola, linea, detener):
+                break
+    except Exception as e:
+        _encolar(cola, e, detener)
+    finally:
+        _encolar(cola, _FIN_FLUJO, detener)
+
+
+def _convertir_linea(linea, aires_validos):
+    """Convierte una línea NDJSON en un diccionario de lectura o lanza ValueError."""
+    try:
+        datos = json.loads(linea)
+    except ValueError:
+        raise ValueError('JSON inválido')
+    if not isinstance(datos, dict):
+        raise ValueError('Se esperaba un objeto JSON')
+    try:
+        aire_id = int(datos['aire_id'])
+        fecha = datetime.strptime(datos.get('fecha_hora') or datos['fecha'], '%Y-%m-%d %H:%M:%S')
+        temperatura = float(datos['temperatura'])
+        humedad = float(datos['humedad'])
+    except KeyError as e:
+        raise ValueError(f'Falta el campo {e}')
+    except (TypeError, ValueError):
+        raise ValueError("Valores inválidos (fecha 'YYYY-MM-DD HH:MM:SS', números para el resto)")
+    if aire_id not in aires_validos:
+        raise ValueError(f'El aire {aire_id} no existe')
+    return {'aire_id': aire_id, 'fecha': fecha, 'temperatura': temperatura, 'humedad': humedad}
+
+
+def ingerir_ndjson(data_manager, flujo, max_lote=500, intervalo=1.0, max_linea=65536):
+    """
+    Procesa un flujo NDJSON de lecturas (una por línea) a medida que llega y
+    las guarda en micro-lotes: cada 'max_lote' lecturas o cada 'intervalo'
+    segundos con lecturas pendientes. La memoria usada no depende de la
+    duración del flujo: un hilo lector alimenta una cola acotada.
+
+    Args:
+        data_manager: DataManager para cargar las lecturas
+        flujo: Objeto tipo archivo con el cuerpo de la petición
+        max_lote: Lecturas máximas por transacción
+        intervalo: Segundos máximos que una lectura espera a su commit
+        max_linea: Bytes máximos por línea
+
+    Yields:
+        Un diccionario de confirmación por lote y uno final con los totales
+    """
+    aires_validos = data_manager.obtener_ids_aires()
+    cola = queue.Queue(maxsize=max_lote * 2)
+    # Se activa al salir (también si el cliente se desconecta y se cierra el generador)
+    detener = threading.Event()
+    lector = threading.Thread(target=_leer_lineas, args=(flujo, cola, max_linea, detener),
+                              name='lector-ndjson', daemon=True)
+    lector.start()
+    try:
+        yield from _consumir_lineas(data_manager, cola, aires_validos, max_lote, intervalo)
+    finally:
+        detener.set()
+
+
+def _consumir_lineas(data_manager, cola, aires_validos, max_lote, intervalo):
+    """Bucle de ingerir_ndjson: agrupa las líneas de la cola en lotes y los guarda."""
+
+    totales = {'lotes': 0, 'lineas': 0, 'insertadas': 0, 'actualizadas': 0, 'ignoradas': 0, 'filtradas': 0, 'rechazadas': 0}
+    lote, errores, primera_linea = [], [], 1
+    limite = None
+    error_lectura = None
+    terminado = False
+    while not terminado:
+        espera = None if limite is None else max(limite - time.monotonic(), 0)
+        try:
+            elemento = cola.get(timeout=espera)
+        except queue.Empty:
+            elemento = None
+
+        if elemento is _FIN_FLUJO:
+            terminado = True
+        elif isinstance(elemento, Exception):
+            error_lectura = elemento
+        elif elemento is not None:
+            totales['lineas'] += 1
+            linea = elemento.strip()
+            if linea:
+                try:
+                    lote.append(_convertir_linea(linea, aires_validos))
+                except ValueError as e:
+                    errores.append({'linea': totales['lineas'], 'motivo': str(e)})
+                if limite is None:
+                    limite = time.monotonic() + intervalo
+
+        vencido = limite is not None and time.monotonic() >= limite
+        if (lote or errores) and (len(lote) >= max_lote or vencido or terminado):
+            confirmacion = guardar_lecturas(data_manager, lote)
+            totales['lotes'] += 1
+            for clave in ('insertadas', 'actualizadas', 'ignoradas', 'filtradas'):
+                totales[clave] += confirmacion[clave]
+            totales['rechazadas'] += len(errores)
+            confirmacion.update({
+                'lote': totales['lotes'],
+                'lineas': [primera_linea, totales['lineas']],
+                'errores': errores
+            })
+            yield confirmacion
+            lote, errores, primera_linea, limite = [], [], totales['lineas'] + 1, None
+
+    resumen = dict(totales, fin=True)
+    if error_lectura is not None:
+        resumen['error'] = f'Error al leer el flujo: {error_lectura}'
+    yield resumen
+
+
+def guardar_lecturas(data_manager, lote):
+    """
+    Guarda una lista de lecturas (diccionarios) en una transacción propia y
+    ejecuta el trabajo posterior a la ingesta. Es seguro llamarla desde hilos.
+
+    Returns:
+        Diccionario con insertadas, actualizadas, ignoradas, filtradas (y error si falló)
+    """
+    if not lote:
+        return {'insertadas': 0, 'actualizadas': 0, 'ignoradas': 0, 'filtradas': 0}
+    df = pd.DataFrame(lote)
+    sesion = Session()
+    try:
+        resumen = data_manager._cargar_lecturas(sesion, df)
+        sesion.commit()
+    except Exception as e:
+        sesion.rollback()
+        print(f"Error al guardar un lote de {len(lote)} lecturas: {e}", file=sys.stderr)
+        traceback.print_exc()
+        return {'insertadas': 0, 'actualizadas': 0, 'ignoradas': 0, 'filtradas': 0, 'error': str(e)}
+    finally:
+        sesion.close()
+    data_manager._despues_de_ingesta(resumen, df['aire_id'].unique())
+    return {k: resumen[k] for k in ('insertadas', 'actualizadas', 'ignoradas', 'filtradas')}
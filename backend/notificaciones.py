@@ -0,0 +1,210 @@
+"""
+Bus de notificaciones de cambios entre procesos (workers de gunicorn).
+
+Cada escritura confirmada se publica con la tabla afectada y los IDs
+relevantes. Cada proceso escucha esos eventos en un hilo ligero, invalida
+las entradas de su caché local y reenvía el evento a sus suscriptores SSE.
+
+- PostgreSQL: NOTIFY / LISTEN sobre el canal CANAL_POR_DEFECTO.
+- Otros motores: los eventos se guardan en la tabla 'eventos_cambios' y cada
+  proceso la consulta periódicamente a partir del último ID visto.
+"""
+import json
+import os
+import queue
+import select
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+CANAL_POR_DEFECTO = 'aircontrol_cambios'
+# Antigüedad a partir de la cual se purgan los eventos del modo sondeo
+RETENCION_EVENTOS = timedelta(hours=1)
+
+
+class BusNotificaciones:
+    """
+    Args:
+        engine: Engine de SQLAlchemy
+        cache: CacheConsultas local a invalidar al recibir eventos de otros procesos
+        canal: Canal de NOTIFY/LISTEN (solo PostgreSQL)
+        intervalo_sondeo: Segundos entre consultas en el modo sondeo
+    """
+
+    def __init__(self, engine, cache, canal=CANAL_POR_DEFECTO, intervalo_sondeo=2.0):
+        self.engine = engine
+        self.cache = cache
+        self.canal = canal
+        self.intervalo_sondeo = intervalo_sondeo
+        self.usa_notify = engine.dialect.name == 'postgresql'
+        # Identifica a este proceso para no invalidar dos veces sus propios cambios
+        self.origen = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._suscriptores = set()
+        self._oyentes = []
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._detener = threading.Event()
+
+    # --- Publicación ---
+
+    def publicar(self, tabla, aire_id=None, entidad_id=None):
+        """
+        Publica un cambio ya confirmado. Los errores se registran pero no se propagan:
+        la escritura ya está hecha y, en el peor caso, la caché expira por TTL.
+        """
+        evento = {
+            'tabla': tabla,
+            'aire_id': aire_id,
+            'entidad_id': entidad_id,
+            'origen': self.origen,
+            'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        try:
+            with self.engine.begin() as conn:
+                if self.usa_notify:
+                    conn.execute(text("SELECT pg_notify(:canal, :payload)"),
+                                 {'canal': self.canal, 'payload': json.dumps(evento)})
+                else:
+                    conn.execute(text(
+                        "INSERT INTO eventos_cambios (tabla, aire_id, entidad_id, origen, fecha) "
+                        "VALUES (:tabla, :aire_id, :entidad_id, :origen, :fecha)"
+                    ), dict(evento, fecha=datetime.now()))
+        except Exception as e:
+            print(f"Error al publicar notificación de cambio en {tabla}: {e}", file=sys.stderr)
+        # Los suscriptores SSE de este mismo proceso se enteran sin esperar al listener
+        self._difundir(evento)
+
+    # --- Oyentes de cambios de otros procesos ---
+
+    def agregar_oyente(self, funcion):
+        """
+        Registra funcion(evento) para los cambios hechos por otros procesos. Tras
+        reconectar el listener se llama con None: pudo perderse cualquier cambio.
+        """
+        with self._lock:
+            self._oyentes.append(funcion)
+
+    def _avisar_oyentes(self, evento):
+        with self._lock:
+            oyentes = list(self._oyentes)
+        for funcion in oyentes:
+            try:
+                funcion(evento)
+            except Exception as e:
+                print(f"Error en un oyente del bus de notificaciones: {e}", file=sys.stderr)
+
+    # --- Suscriptores SSE locales ---
+
+    def suscribir(self, max_pendientes=100):
+        """Devuelve una cola que recibirá los eventos de cambio (dict)."""
+        cola = queue.Queue(maxsize=max_pendientes)
+        with self._lock:
+            self._suscriptores.add(cola)
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock:
+            self._suscriptores.discard(cola)
+
+    def _difundir(self, evento):
+        with self._lock:
+            suscriptores = list(self._suscriptores)
+        for cola in suscriptores:
+            try:
+                cola.put_nowait(evento)
+            except queue.Full:
+                # Un cliente lento no debe bloquear al resto: se descarta el evento para él
+                pass
+
+    # --- Escucha ---
+
+    def iniciar(self):
+        """Arranca el hilo de escucha (LISTEN o sondeo) si no está en marcha."""
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        destino = self._escuchar_notify if self.usa_notify else self._sondear
+        self._hilo = threading.Thread(target=destino, name='bus-notificaciones', daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+
+    def _recibir(self, evento):
+        if evento.get('origen') == self.origen:
+            return
+        tags = [evento['tabla']]
+        if evento.get('aire_id') is not None:
+            tags.append(f"aire:{evento['aire_id']}")
+        self.cache.invalidar(*tags)
+        self._avisar_oyentes(evento)
+        self._difundir(evento)
+
+    def _escuchar_notify(self):
+        espera = 1
+        while not self._detener.is_set():
+            conexion = None
+            try:
+                conexion = self.engine.raw_connection()
+                dbapi = conexion.driver_connection
+                dbapi.autocommit = True
+                cursor = dbapi.cursor()
+                cursor.execute(f'LISTEN "{self.canal}"')
+                # Lo cambiado mientras no escuchábamos pudo quedar en caché
+                self.cache.limpiar()
+                self._avisar_oyentes(None)
+                espera = 1
+                while not self._detener.is_set():
+                    if select.select([dbapi], [], [], 5) == ([], [], []):
+                        continue
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        notificacion = dbapi.notifies.pop(0)
+                        try:
+                            self._recibir(json.loads(notificacion.payload))
+                        except (ValueError, KeyError) as e:
+                            print(f"Notificación inválida en {self.canal}: {e}", file=sys.stderr)
+            except Exception as e:
+                print(f"Error en el listener de notificaciones, reintentando en {espera}s: {e}", file=sys.stderr)
+                traceback.print_exc()
+                self._detener.wait(espera)
+                espera = min(espera * 2, 60)
+            finally:
+                if conexion is not None:
+                    try:
+                        conexion.close()
+                    except Exception:
+                        pass
+
+    def _sondear(self):
+        ultimo_id = None
+        ultima_purga = time.monotonic()
+        while not self._detener.is_set():
+            try:
+                with self.engine.begin() as conn:
+                    if ultimo_id is None:
+                        ultimo_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM eventos_cambios")).scalar()
+                    filas = conn.execute(text(
+                        "SELECT id, tabla, aire_id, entidad_id, origen, fecha FROM eventos_cambios "
+                        "WHERE id > :ultimo ORDER BY id"
+                    ), {'ultimo': ultimo_id}).mappings().all()
+                    for fila in filas:
+                        ultimo_id = fila['id']
+                        evento = {k: fila[k] for k in ('tabla', 'aire_id', 'entidad_id', 'origen')}
+                        evento['fecha'] = pd.to_datetime(fila['fecha']).strftime('%Y-%m-%d %H:%M:%S')
+                        self._recibir(evento)
+                    if time.monotonic() - ultima_purga > RETENCION_EVENTOS.total_seconds():
+                        conn.execute(text("DELETE FROM eventos_cambios WHERE fecha < :limite"),
+                                     {'limite': datetime.now() - RETENCION_EVENTOS})
+                        ultima_purga = time.monotonic()
+            except Exception as e:
+                print(f"Error al sondear eventos de cambio: {e}", file=sys.stderr)
+            self._detener.wait(self.intervalo_sondeo)
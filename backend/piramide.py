@@ -0,0 +1,110 @@
+"""
+Pirámide de resúmenes de lecturas para gráficos con zoom.
+
+Cada aire tiene resúmenes (conteo, suma, mínimo y máximo de temperatura y
+humedad) por bloques de tiempo en NIVELES resoluciones que se duplican:
+el nivel 0 resume bloques de RESOLUCION_BASE segundos, el nivel k bloques de
+RESOLUCION_BASE * 2**k. Los bloques se alinean a la época Unix, así que cada
+bloque del nivel k contiene exactamente dos del nivel k - 1.
+
+Para un rango [desde, hasta) dibujado en ancho_px píxeles se usa el nivel más
+fino cuyos bloques no son más pequeños que un píxel: el número de puntos queda
+acotado por el ancho en cualquier zoom. Por debajo del nivel 0 se sirven las
+lecturas crudas.
+
+Los resúmenes son fusionables (sumas, mínimos y máximos), así que al ingestar
+se combinan con los existentes y, tras borrar o actualizar lecturas, cada nivel
+se recalcula a partir del anterior.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+RESOLUCION_BASE = 300
+NIVELES = 13  # 5 minutos .. ~14 días
+
+COLUMNAS_RESUMEN = ['total', 'temp_suma', 'temp_min', 'temp_max', 'hum_suma', 'hum_min', 'hum_max']
+
+
+def resolucion(nivel):
+    """Segundos que abarca un bloque del nivel."""
+    return RESOLUCION_BASE * 2 ** nivel
+
+
+def elegir_nivel(segundos_rango, ancho_px):
+    """
+    Nivel más fino con bloques de al menos un píxel, o None si las lecturas
+    crudas ya caben (el rango por píxel es menor que el nivel 0). Puede ser
+    mayor que el último nivel guardado: esos bloques se obtienen con subir_nivel.
+    """
+    por_pixel = segundos_rango / max(int(ancho_px), 1)
+    if por_pixel < RESOLUCION_BASE:
+        return None
+    return max(int(math.ceil(math.log2(por_pixel / RESOLUCION_BASE) - 1e-9)), 0)
+
+
+def inicio_bloque(fechas, nivel):
+    """Inicio del bloque del nivel que contiene cada fecha."""
+    segundos = pd.to_datetime(pd.Series(fechas)).to_numpy(dtype='datetime64[s]').astype(np.int64)
+    paso = resolucion(nivel)
+    return pd.to_datetime((segundos // paso) * paso, unit='s')
+
+
+def resumir(lecturas_df, nivel):
+    """
+    Resume lecturas crudas por (aire_id, inicio) en el nivel dado.
+
+    Args:
+        lecturas_df: DataFrame con aire_id, fecha, temperatura y humedad
+
+    Returns:
+        DataFrame con aire_id, inicio y COLUMNAS_RESUMEN
+    """
+    df = pd.DataFrame({
+        'aire_id': lecturas_df['aire_id'].to_numpy(dtype=np.int64),
+        'inicio': inicio_bloque(lecturas_df['fecha'], nivel),
+        'temperatura': lecturas_df['temperatura'].to_numpy(dtype=np.float64),
+        'humedad': lecturas_df['humedad'].to_numpy(dtype=np.float64),
+    })
+    resumen = df.groupby(['aire_id', 'inicio'], sort=True).agg(
+        total=('temperatura', 'size'),
+        temp_suma=('temperatura', 'sum'), temp_min=('temperatura', 'min'), temp_max=('temperatura', 'max'),
+        hum_suma=('humedad', 'sum'), hum_min=('humedad', 'min'), hum_max=('humedad', 'max'),
+    )
+    return resumen.reset_index()
+
+
+def subir_nivel(resumen_df, nivel):
+    """Fusiona los bloques de un nivel (DataFrame de resumir) en los del nivel indicado, superior."""
+    df = resumen_df.assign(inicio=inicio_bloque(resumen_df['inicio'], nivel))
+    resumen = df.groupby(['aire_id', 'inicio'], sort=True).agg(
+        total=('total', 'sum'),
+        temp_suma=('temp_suma', 'sum'), temp_min=('temp_min', 'min'), temp_max=('temp_max', 'max'),
+        hum_suma=('hum_suma', 'sum'), hum_min=('hum_min', 'min'), hum_max=('hum_max', 'max'),
+    )
+    return resumen.reset_index()
+
+
+def combinar(existente, nuevo):
+    """Fusiona dos resúmenes del mismo bloque (diccionarios con COLUMNAS_RESUMEN)."""
+    return {
+        'total': existente['total'] + nuevo['total'],
+        'temp_suma': existente['temp_suma'] + nuevo['temp_suma'],
+        'temp_min': min(existente['temp_min'], nuevo['temp_min']),
+        'temp_max': max(existente['temp_max'], nuevo['temp_max']),
+        'hum_suma': existente['hum_suma'] + nuevo['hum_suma'],
+        'hum_min': min(existente['hum_min'], nuevo['hum_min']),
+        'hum_max': max(existente['hum_max'], nuevo['hum_max']),
+    }
+
+
+def limites(desde, hasta, nivel):
+    """Amplía [desde, hasta) a bloques completos del nivel (None se conserva)."""
+    paso = pd.Timedelta(seconds=resolucion(nivel))
+    origen = pd.Timestamp(0)
+    if desde is not None:
+        desde = (origen + ((pd.Timestamp(desde) - origen) // paso) * paso).to_pydatetime()
+    if hasta is not None:
+        hasta = (origen + -((origen - pd.Timestamp(hasta)) // paso) * paso).to_pydatetime()
+    return desde, hasta
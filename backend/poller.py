@@ -0,0 +1,334 @@
+"""
+Sondeo concurrente de sensores: lee periódicamente el endpoint configurado en
+cada aire (sensor_url) y guarda las lecturas por la ruta de ingesta en lote.
+
+Protocolos:
+    http(s)://host[:puerto]/ruta   GET que responde un objeto JSON con
+                                   temperatura, humedad y opcionalmente fecha
+    tcp://host:puerto[/unidad]     se envía "unidad\\n" (si hay) y se lee una
+                                   línea "temperatura,humedad" o un objeto JSON
+
+Cada aire se sondea en su propia tarea asyncio con intervalos con jitter; un
+semáforo limita los sondeos simultáneos y cada uno tiene su timeout. La lista
+de sensores se recarga de la base de datos periódicamente.
+
+Uso (desde el directorio backend):
+    python poller.py [--concurrencia 200] [--timeout 5] [--intervalo 60]
+
+Para pruebas de carga ver sensores_simulados.py.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import signal
+import ssl
+import sys
+import time
+import traceback
+from datetime import datetime
+from urllib.parse import urlparse
+
+import numpy as np
+from dotenv import load_dotenv
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+load_dotenv(dotenv_path=dotenv_path)
+
+from ingesta import guardar_lecturas
+
+MAX_RESPUESTA = 65536
+
+
+class ErrorSensor(Exception):
+    """El sensor respondió algo que no es una lectura válida."""
+
+
+def interpretar_lectura(datos):
+    """
+    Convierte la respuesta de un sensor (dict JSON o línea de texto) en una lectura.
+
+    Returns:
+        Diccionario con fecha, temperatura y humedad (sin aire_id)
+    """
+    if isinstance(datos, (bytes, str)):
+        texto = datos.decode('utf-8', 'replace') if isinstance(datos, bytes) else datos
+        texto = texto.strip()
+        if texto.startswith('{'):
+            try:
+                datos = json.loads(texto)
+            except ValueError:
+                raise ErrorSensor('JSON inválido')
+        else:
+            partes = texto.replace(',', ' ').split()
+            if len(partes) != 2:
+                raise ErrorSensor(f"Línea no reconocida: {texto[:80]!r}")
+            datos = {'temperatura': partes[0], 'humedad': partes[1]}
+    if not isinstance(datos, dict):
+        raise ErrorSensor('Se esperaba un objeto JSON')
+    try:
+        lectura = {'temperatura': float(datos['temperatura']), 'humedad': float(datos['humedad'])}
+    except (KeyError, TypeError, ValueError):
+        raise ErrorSensor('Faltan temperatura/humedad numéricas')
+    fecha = datos.get('fecha') or datos.get('fecha_hora')
+    try:
+        lectura['fecha'] = (datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S') if fecha
+                            else datetime.now().replace(microsecond=0))
+    except (TypeError, ValueError):
+        raise ErrorSensor(f"Fecha inválida: {fecha!r}")
+    return lectura
+
+
+async def _leer_http(partes):
+    seguro = partes.scheme == 'https'
+    puerto = partes.port or (443 if seguro else 80)
+    lector, escritor = await asyncio.open_connection(
+        partes.hostname, puerto, ssl=ssl.create_default_context() if seguro else None
+    )
+    try:
+        ruta = partes.path or '/'
+        if partes.query:
+            ruta += '?' + partes.query
+        # HTTP/1.0: respuesta sin chunked y conexión cerrada al terminar
+        escritor.write(f"GET {ruta} HTTP/1.0\r\nHost: {partes.netloc}\r\nAccept: application/json\r\n\r\n".encode('latin-1'))
+        await escritor.drain()
+        respuesta = await lector.read(MAX_RESPUESTA)
+        while not lector.at_eof() and len(respuesta) < MAX_RESPUESTA:
+            bloque = await lector.read(MAX_RESPUESTA - len(respuesta))
+            if not bloque:
+                break
+            respuesta += bloque
+    finally:
+        escritor.close()
+
+    cabecera, _, cuerpo = respuesta.partition(b'\r\n\r\n')
+    linea_estado = cabecera.split(b'\r\n', 1)[0].split()
+    if len(linea_estado) < 2 or linea_estado[1] != b'200':
+        raise ErrorSensor(f"Respuesta HTTP {linea_estado[1].decode() if len(linea_estado) > 1 else 'inválida'}")
+    try:
+        return interpretar_lectura(json.loads(cuerpo))
+    except ValueError:
+        raise ErrorSensor('JSON inválido')
+
+
+async def _leer_tcp(partes):
+    lector, escritor = await asyncio.open_connection(partes.hostname, partes.port)
+    try:
+        unidad = partes.path.strip('/')
+        if unidad:
+            escritor.write(unidad.encode() + b'\n')
+            await escritor.drain()
+        linea = await lector.readline()
+    finally:
+        escritor.close()
+    if not linea:
+        raise ErrorSensor('El sensor cerró la conexión sin responder')
+    return interpretar_lectura(linea)
+
+
+async def leer_sensor(url):
+    """Hace un sondeo del sensor en 'url' y devuelve la lectura (sin aire_id)."""
+    partes = urlparse(url)
+    if partes.scheme in ('http', 'https'):
+        return await _leer_http(partes)
+    if partes.scheme == 'tcp':
+        return await _leer_tcp(partes)
+    raise ErrorSensor(f"Esquema no soportado: {partes.scheme}")
+
+
+class Sondeador:
+    """
+    Args:
+        data_manager: DataManager para leer los sensores y guardar las lecturas
+        concurrencia: Sondeos simultáneos como máximo
+        timeout: Segundos máximos por sondeo (conexión incluida)
+        intervalo: Segundos entre sondeos de un aire sin sensor_intervalo
+        jitter: Variación relativa aleatoria de cada intervalo (0.1 = ±10 %)
+        max_lote: Lecturas que disparan un guardado sin esperar al siguiente
+        intervalo_guardado: Segundos máximos que una lectura espera a guardarse
+        max_pendientes: Lecturas sin guardar a partir de las cuales se descartan las más viejas
+        recarga: Segundos entre recargas de la lista de sensores
+    """
+
+    def __init__(self, data_manager, concurrencia=200, timeout=5.0, intervalo=60.0, jitter=0.1,
+                 max_lote=1000, intervalo_guardado=1.0, max_pendientes=100000, recarga=60.0):
+        self.data_manager = data_manager
+        self.concurrencia = concurrencia
+        self.timeout = timeout
+        self.intervalo = intervalo
+        self.jitter = jitter
+        self.max_lote = max_lote
+        self.intervalo_guardado = intervalo_guardado
+        self.recarga = recarga
+        self._pendientes = collections.deque(maxlen=max_pendientes)
+        self._latencias = collections.deque(maxlen=10000)
+        self._objetivos = {}
+        self._metricas = {
+            'sondeos': 0,
+            'correctos': 0,
+            'timeouts': 0,
+            'errores': 0,
+            'descartadas': 0,
+            'guardadas': 0,
+            'errores_guardado': 0,
+        }
+
+    def metricas(self):
+        latencias = np.array(self._latencias) if self._latencias else None
+        return dict(
+            self._metricas,
+            objetivos=len(self._objetivos),
+            pendientes=len(self._pendientes),
+            latencia_ms={
+                'promedio': round(float(latencias.mean()) * 1000, 2),
+                'p95': round(float(np.percentile(latencias, 95)) * 1000, 2),
+                'max': round(float(latencias.max()) * 1000, 2),
+            } if latencias is not None else None
+        )
+
+    def detener(self):
+        self._detener.set()
+
+    async def ejecutar(self, duracion=None):
+        """
+        Sondea hasta que se llame a detener() (o hasta que pasen 'duracion' segundos).
+
+        Returns:
+            Métricas finales
+        """
+        self._detener = asyncio.Event()
+        self._hay_lote = asyncio.Event()
+        self._semaforo = asyncio.Semaphore(self.concurrencia)
+        loop = asyncio.get_running_loop()
+        fin = None if duracion is None else loop.time() + duracion
+
+        guardador = asyncio.create_task(self._guardar_periodicamente())
+        try:
+            while not self._detener.is_set():
+                try:
+                    sensores = await loop.run_in_executor(None, self.data_manager.obtener_sensores)
+                    self._sincronizar(sensores)
+                except Exception as e:
+                    print(f"Error al cargar la lista de sensores: {e}", file=sys.stderr)
+                    traceback.print_exc()
+                espera = self.recarga if fin is None else min(self.recarga, fin - loop.time())
+                try:
+                    await asyncio.wait_for(self._detener.wait(), timeout=max(espera, 0))
+                except asyncio.TimeoutError:
+                    pass
+                if fin is not None and loop.time() >= fin:
+                    break
+                print(f"Sondeo: {self.metricas()}")
+        finally:
+            tareas = [tarea for _, _, tarea in self._objetivos.values()] + [guardador]
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+            self._objetivos.clear()
+            await self._guardar()
+        return self.metricas()
+
+    def _sincronizar(self, sensores):
+        """Crea, reinicia o cancela tareas para que coincidan con la configuración."""
+        deseados = {
+            int(fila.id): (fila.sensor_url, float(fila.sensor_intervalo) if fila.sensor_intervalo else self.intervalo)
+            for fila in sensores.itertuples()
+        }
+        for aire_id in list(self._objetivos):
+            url, intervalo, tarea = self._objetivos[aire_id]
+            if deseados.get(aire_id) != (url, intervalo):
+                tarea.cancel()
+                del self._objetivos[aire_id]
+        for aire_id, (url, intervalo) in deseados.items():
+            if aire_id not in self._objetivos:
+                tarea = asyncio.create_task(self._sondear(aire_id, url, intervalo))
+                self._objetivos[aire_id] = (url, intervalo, tarea)
+
+    async def _sondear(self, aire_id, url, intervalo):
+        # Arranque escalonado para no sondear todos los sensores a la vez
+        await asyncio.sleep(random.uniform(0, intervalo))
+        while True:
+            async with self._semaforo:
+                inicio = time.perf_counter()
+                self._metricas['sondeos'] += 1
+                try:
+                    lectura = await asyncio.wait_for(leer_sensor(url), self.timeout)
+                except asyncio.TimeoutError:
+                    self._metricas['timeouts'] += 1
+                except (OSError, ErrorSensor) as e:
+                    self._metricas['errores'] += 1
+                    if self._metricas['errores'] <= 10 or self._metricas['errores'] % 1000 == 0:
+                        print(f"Error al sondear el aire {aire_id} ({url}): {e}", file=sys.stderr)
+                else:
+                    self._latencias.append(time.perf_counter() - inicio)
+                    self._metricas['correctos'] += 1
+                    lectura['aire_id'] = aire_id
+                    if len(self._pendientes) == self._pendientes.maxlen:
+                        self._metricas['descartadas'] += 1
+                    self._pendientes.append(lectura)
+                    if len(self._pendientes) >= self.max_lote:
+                        self._hay_lote.set()
+            await asyncio.sleep(intervalo * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _guardar_periodicamente(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._hay_lote.wait(), timeout=self.intervalo_guardado)
+            except asyncio.TimeoutError:
+                pass
+            self._hay_lote.clear()
+            await self._guardar()
+
+    async def _guardar(self):
+        # Un solo guardado a la vez, fuera del bucle de eventos; si la base de datos
+        # va lenta las lecturas se acumulan (acotadas) en _pendientes
+        while self._pendientes:
+            lote = [self._pendientes.popleft() for _ in range(min(self.max_lote, len(self._pendientes)))]
+            resumen = await asyncio.get_running_loop().run_in_executor(
+                None, guardar_lecturas, self.data_manager, lote
+            )
+            if 'error' in resumen:
+                self._metricas['errores_guardado'] += 1
+            else:
+                self._metricas['guardadas'] += len(lote)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrencia', type=int, default=int(os.environ.get('POLLER_CONCURRENCIA', 200)),
+                        help='Sondeos simultáneos como máximo')
+    parser.add_argument('--timeout', type=float, default=float(os.environ.get('POLLER_TIMEOUT', 5)),
+                        help='Segundos máximos por sondeo')
+    parser.add_argument('--intervalo', type=float, default=float(os.environ.get('POLLER_INTERVALO', 60)),
+                        help='Segundos entre sondeos de los aires sin sensor_intervalo')
+    parser.add_argument('--jitter', type=float, default=float(os.environ.get('POLLER_JITTER', 0.1)),
+                        help='Variación relativa aleatoria de los intervalos')
+    parser.add_argument('--lote', type=int, default=int(os.environ.get('INGESTA_MAX_LOTE', 1000)),
+                        help='Lecturas por transacción')
+    parser.add_argument('--recarga', type=float, default=60,
+                        help='Segundos entre recargas de la lista de sensores')
+    parser.add_argument('--duracion', type=float, default=None,
+                        help='Terminar tras estos segundos (pruebas de carga)')
+    args = parser.parse_args()
+
+    from data_manager import DataManager
+    data_manager = DataManager()
+    sondeador = Sondeador(data_manager, concurrencia=args.concurrencia, timeout=args.timeout,
+                          intervalo=args.intervalo, jitter=args.jitter, max_lote=args.lote,
+                          recarga=args.recarga)
+
+    async def ejecutar():
+        loop = asyncio.get_running_loop()
+        for senal in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(senal, sondeador.detener)
+        return await sondeador.ejecutar(duracion=args.duracion)
+
+    metricas = asyncio.run(ejecutar())
+    data_manager.guardar_estado_anomalias()
+    print(f"Poller terminado: {metricas}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Tendencias y tiempo hasta cruzar los umbrales para toda la flota a la vez.
+
+Las series de todos los aires llegan como una matriz aires x bloques (promedios
+de la pirámide de resúmenes, NaN donde no hubo lecturas) y cada fila se ajusta a
+una recta por mínimos cuadrados ponderados. Las sumas de las ecuaciones normales
+se calculan para todas las filas a la vez, así que el coste es el de unas pocas
+operaciones sobre la matriz, sin bucles por aire. El ajuste es robusto: se
+repite con pesos de Huber (escala por la mediana de los residuos absolutos) para
+que un pico aislado no incline la recta.
+
+El tiempo del eje está en horas relativas al momento de la predicción (negativo
+hacia el pasado), así que la ordenada en el origen es el nivel estimado actual.
+"""
+import warnings
+
+import numpy as np
+
+# Constante de Huber (95% de eficiencia con ruido normal)
+K_HUBER = 1.345
+MINIMO_PUNTOS = 3
+
+
+def _recta(x, y, pesos):
+    """Mínimos cuadrados ponderados de cada fila de y contra x; devuelve (ordenada, pendiente)."""
+    sw = pesos.sum(axis=1)
+    sx = pesos @ x
+    sy = (pesos * y).sum(axis=1)
+    sxx = pesos @ (x * x)
+    sxy = (pesos * y) @ x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        determinante = sw * sxx - sx * sx
+        pendiente = (sw * sxy - sx * sy) / determinante
+        ordenada = (sy - pendiente * sx) / sw
+    return ordenada, pendiente
+
+
+def _residuos(x, y, validos, ordenada, pendiente):
+    return np.where(validos, y - (ordenada[:, None] + pendiente[:, None] * x), np.nan)
+
+
+def _escala(residuos):
+    """Desviación robusta de cada fila (MAD escalada a la normal)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # filas sin datos
+        return 1.4826 * np.nanmedian(np.abs(residuos), axis=1)
+
+
+def ajustar_tendencias(x, y, pesos=None, iteraciones=3):
+    """
+    Ajusta una recta robusta a cada fila de y.
+
+    Args:
+        x: Array (n,) con el instante de cada columna, en horas relativas a la predicción
+        y: Matriz (m, n) de valores, NaN donde no hay dato
+        pesos: Matriz (m, n) de pesos (p. ej. lecturas de cada bloque) o None
+        iteraciones: Pasadas de reponderación de Huber
+
+    Returns:
+        Diccionario de arrays (m,): 'nivel' (valor estimado en x = 0), 'pendiente'
+        (por hora), 'error' (desviación robusta de los residuos) y 'puntos'. Las filas
+        con menos de MINIMO_PUNTOS datos quedan en NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    validos = ~np.isnan(y)
+    base = validos.astype(np.float64) if pesos is None else np.where(validos, pesos, 0.0)
+    y0 = np.where(validos, y, 0.0)
+    puntos = validos.sum(axis=1)
+
+    ordenada, pendiente = _recta(x, y0, base)
+    for _ in range(iteraciones):
+        residuos = _residuos(x, y0, validos, ordenada, pendiente)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            u = np.abs(residuos) / (K_HUBER * _escala(residuos)[:, None])
+            huber = np.where(u > 1.0, 1.0 / u, 1.0)
+        # Escala 0 (ajuste exacto) o filas sin datos: se conserva el peso original
+        huber = np.where(np.isfinite(huber), huber, 1.0)
+        ordenada, pendiente = _recta(x, y0, base * huber)
+    escala = _escala(_residuos(x, y0, validos, ordenada, pendiente))
+
+    insuficientes = puntos < MINIMO_PUNTOS
+    for array in (ordenada, pendiente, escala):
+        array[insuficientes] = np.nan
+    return {'nivel': ordenada, 'pendiente': pendiente, 'error': escala, 'puntos': puntos}
+
+
+def horas_hasta_cruce(nivel, pendiente, limite_inferior, limite_superior, horizonte):
+    """
+    Horas hasta que cada recta cruza su límite inferior o superior.
+
+    Args:
+        nivel, pendiente: Arrays (m,) de ajustar_tendencias
+        limite_inferior, limite_superior: Arrays (m,) con NaN donde no hay límite
+        horizonte: Horas máximas de la proyección
+
+    Returns:
+        (horas, superior): horas hasta el cruce (0 si ya está fuera, NaN si no cruza
+        dentro del horizonte) y True donde el límite que se cruza es el superior
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hasta_superior = np.where(nivel >= limite_superior, 0.0,
+                                  np.where(pendiente > 0, (limite_superior - nivel) / pendiente, np.inf))
+        hasta_inferior = np.where(nivel <= limite_inferior, 0.0,
+                                  np.where(pendiente < 0, (limite_inferior - nivel) / pendiente, np.inf))
+    # Sin límite o sin ajuste la comparación es NaN: no hay cruce
+    hasta_superior = np.where(np.isnan(hasta_superior), np.inf, hasta_superior)
+    hasta_inferior = np.where(np.isnan(hasta_inferior), np.inf, hasta_inferior)
+    superior = hasta_superior <= hasta_inferior
+    horas = np.minimum(hasta_superior, hasta_inferior)
+    return np.where(horas <= horizonte, horas, np.nan), superior
@@ -0,0 +1,378 @@
+"""
+Motor de reglas de alerta declarativas.
+
+Las reglas se guardan en la tabla reglas_alerta (globales o de un aire) y son de
+tres tipos:
+    - cambio: la variable sube (operador '>') o baja ('<') más de 'valor' dentro
+      de una ventana de 'ventana_minutos' (frente al mínimo o máximo de la ventana),
+    - sostenido: la variable está por encima ('>') o por debajo ('<') de 'valor'
+      de forma continua durante al menos 'ventana_minutos',
+    - sin_lecturas: el aire lleva más de 'ventana_minutos' sin lecturas.
+
+Cada regla se compila una vez en una fábrica de evaluadores; cada aire tiene un
+evaluador por regla que le aplica, con el estado de su ventana deslizante, y
+cada lectura lo actualiza en O(1) amortizado (las ventanas de mínimo y máximo
+son colas monótonas). Las alertas se disparan por flanco: una vez por episodio,
+hasta que la condición deja de cumplirse.
+
+Las ventanas de un aire tienen que ver todas sus lecturas, así que el motor no
+se alimenta desde la ingesta (repartida entre procesos) sino desde la base de
+datos, en un único proceso evaluador (DataManager.evaluar_reglas en worker.py).
+evaluar() trabaja sobre una copia del estado de los aires del lote y confirmar()
+la instala tras registrar las alertas; las lecturas con fecha anterior o igual a
+la última evaluada del aire no se evalúan, salvo con desde_cero=True, que
+repasa la ventana del aire con un estado nuevo (lecturas que llegan tarde). Las
+reglas sin_lecturas no pueden esperar a una lectura: se revisan periódicamente
+contra la última lectura guardada de cada aire
+(DataManager.revisar_reglas_sin_lecturas).
+"""
+import collections
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+TIPOS_REGLA = ('cambio', 'sostenido', 'sin_lecturas')
+OPERADORES_REGLA = ('>', '<')
+VARIABLES = ('temperatura', 'humedad')
+_UNIDADES = {'temperatura': '°C', 'humedad': '%'}
+
+
+def validar_regla(tipo, variable, operador, valor, ventana_minutos):
+    """Devuelve un mensaje de error si la definición de la regla no es válida, o None."""
+    if tipo not in TIPOS_REGLA:
+        return f"Tipo de regla inválido. Use {', '.join(TIPOS_REGLA)}"
+    if ventana_minutos is None or not ventana_minutos > 0:
+        return 'La ventana en minutos debe ser positiva'
+    if tipo == 'sin_lecturas':
+        return None
+    if variable not in VARIABLES:
+        return "Variable inválida. Use 'temperatura' o 'humedad'"
+    if operador not in OPERADORES_REGLA:
+        return "Operador inválido. Use '>' o '<'"
+    if valor is None:
+        return 'El valor de la regla es requerido'
+    if tipo == 'cambio' and not valor > 0:
+        return 'El cambio debe ser un valor positivo (el operador indica si sube o baja)'
+    return None
+
+
+class _Cambio:
+    """Sube (o baja) más de 'valor' respecto del mínimo (o máximo) de la ventana."""
+    __slots__ = ('ventana', 'valor', 'subida', 'fechas', 'extremos', 'disparada')
+
+    def __init__(self, ventana, valor, subida):
+        self.ventana = ventana
+        self.valor = valor
+        self.subida = subida
+        # Cola monótona: candidatos a mínimo (subida) o máximo (bajada) de la ventana
+        self.fechas = collections.deque()
+        self.extremos = collections.deque()
+        self.disparada = False
+
+    def copiar(self):
+        copia = _Cambio(self.ventana, self.valor, self.subida)
+        copia.fechas = collections.deque(self.fechas)
+        copia.extremos = collections.deque(self.extremos)
+        copia.disparada = self.disparada
+        return copia
+
+    def evaluar(self, t, x):
+        fechas, extremos = self.fechas, self.extremos
+        limite = t - self.ventana
+        while fechas and fechas[0] < limite:
+            fechas.popleft()
+            extremos.popleft()
+        cambio = 0.0
+        if extremos:
+            cambio = x - extremos[0] if self.subida else extremos[0] - x
+        if self.subida:
+            while extremos and extremos[-1] >= x:
+                fechas.pop()
+                extremos.pop()
+        else:
+            while extremos and extremos[-1] <= x:
+                fechas.pop()
+                extremos.pop()
+        fechas.append(t)
+        extremos.append(x)
+        if cambio > self.valor:
+            if not self.disparada:
+                self.disparada = True
+                return cambio
+        else:
+            self.disparada = False
+        return None
+
+
+class _Sostenido:
+    """Por encima (o debajo) de 'valor' sin interrupción durante al menos la ventana."""
+    __slots__ = ('ventana', 'valor', 'encima', 'desde', 'disparada')
+
+    def __init__(self, ventana, valor, encima):
+        self.ventana = ventana
+        self.valor = valor
+        self.encima = encima
+        self.desde = None
+        self.disparada = False
+
+    def copiar(self):
+        copia = _Sostenido(self.ventana, self.valor, self.encima)
+        copia.desde = self.desde
+        copia.disparada = self.disparada
+        return copia
+
+    def evaluar(self, t, x):
+        if (x > self.valor) if self.encima else (x < self.valor):
+            if self.desde is None:
+                self.desde = t
+            duracion = t - self.desde
+            if duracion >= self.ventana and not self.disparada:
+                self.disparada = True
+                return duracion
+        else:
+            self.desde = None
+            self.disparada = False
+        return None
+
+
+class _ReglaCompilada:
+    __slots__ = ('id', 'clave', 'nombre', 'tipo', 'aire_id', 'variable', 'indice', 'operador', 'valor',
+                 'ventana', 'crear')
+
+    def __init__(self, regla):
+        self.id = int(regla['id'])
+        # Un evaluador se conserva al recompilar mientras la regla no cambie
+        self.clave = (self.id, regla.get('ultima_modificacion'))
+        self.nombre = regla['nombre']
+        self.tipo = regla['tipo']
+        self.aire_id = None if regla.get('es_global') or pd.isna(regla.get('aire_id')) else int(regla['aire_id'])
+        self.variable = regla.get('variable')
+        self.indice = VARIABLES.index(self.variable) if self.variable in VARIABLES else None
+        self.operador = regla.get('operador')
+        self.valor = float(regla['valor']) if regla.get('valor') is not None and not pd.isna(regla['valor']) else None
+        self.ventana = float(regla['ventana_minutos']) * 60.0
+        if self.tipo == 'cambio':
+            ventana, valor, subida = self.ventana, self.valor, self.operador == '>'
+            self.crear = lambda: _Cambio(ventana, valor, subida)
+        elif self.tipo == 'sostenido':
+            ventana, valor, encima = self.ventana, self.valor, self.operador == '>'
+            self.crear = lambda: _Sostenido(ventana, valor, encima)
+        else:
+            self.crear = None
+
+    def mensaje(self, detalle):
+        minutos = round(self.ventana / 60.0, 1)
+        if self.tipo == 'cambio':
+            sentido = 'subió' if self.operador == '>' else 'bajó'
+            texto = f"{self.variable.capitalize()} {sentido} {detalle:.1f}{_UNIDADES[self.variable]} en {minutos:g} min"
+        elif self.tipo == 'sostenido':
+            sentido = 'por encima' if self.operador == '>' else 'por debajo'
+            texto = (f"{self.variable.capitalize()} {sentido} de {self.valor:g}{_UNIDADES[self.variable]} "
+                     f"durante {detalle / 60.0:.0f} min")
+        else:
+            texto = f"Sin lecturas durante {detalle / 60.0:.0f} min"
+        return f"{texto} (regla '{self.nombre}')"[:255]
+
+
+class MotorReglas:
+    """
+    Args:
+        cargar: Función () -> lista de diccionarios de las reglas activas (columnas de reglas_alerta)
+        recarga: Segundos tras los que se vuelven a cargar las reglas aunque no se
+            haya llamado a recargar() (procesos que no escuchan el bus)
+    """
+
+    def __init__(self, cargar, recarga=60.0):
+        self.cargar = cargar
+        self.recarga = recarga
+        self._reglas = None
+        self._globales = []
+        self._por_aire = {}
+        self._cargadas_en = 0.0
+        # Cambia con cada compilación que altera las reglas
+        self._generacion = 0
+        # aire_id -> [última fecha evaluada (s), generación, [(regla, evaluador)], aire_id]
+        self._aires = {}
+        self._lock = threading.Lock()
+        self._metricas = {'evaluadas': 0, 'alertas': 0, 'segundos': 0.0, 'compilaciones': 0}
+
+    def recargar(self):
+        """Fuerza a recompilar las reglas en la próxima evaluación."""
+        with self._lock:
+            self._reglas = None
+
+    def reiniciar(self):
+        """Descarta el estado de todos los aires (otro proceso pudo evaluar entretanto)."""
+        with self._lock:
+            self._aires = {}
+
+    def horizonte(self):
+        """Ventana más larga (segundos) de las reglas cambio y sostenido, o None si no hay."""
+        with self._lock:
+            self._asegurar_compiladas()
+            ventanas = [regla.ventana for regla in self._reglas if regla.crear is not None]
+        return max(ventanas) if ventanas else None
+
+    def ultimas_fechas(self):
+        """Diccionario aire_id -> fecha (datetime) de la última lectura evaluada."""
+        with self._lock:
+            segundos = {aire_id: estado[0] for aire_id, estado in self._aires.items() if estado[0] is not None}
+        return {aire_id: pd.Timestamp(np.datetime64(round(t * 1e6), 'us')).to_pydatetime()
+                for aire_id, t in segundos.items()}
+
+    def _asegurar_compiladas(self):
+        """Compila las reglas si hace falta (con el lock tomado)."""
+        if self._reglas is not None and time.monotonic() - self._cargadas_en < self.recarga:
+            return
+        compiladas = [_ReglaCompilada(regla) for regla in self.cargar()]
+        claves = [regla.clave for regla in compiladas]
+        self._cargadas_en = time.monotonic()
+        if self._reglas is not None and claves == [regla.clave for regla in self._reglas]:
+            return
+        self._reglas = compiladas
+        self._generacion += 1
+        self._metricas['compilaciones'] += 1
+        self._globales = [r for r in compiladas if r.crear is not None and r.aire_id is None]
+        self._por_aire = collections.defaultdict(list)
+        for regla in compiladas:
+            if regla.crear is not None and regla.aire_id is not None:
+                self._por_aire[regla.aire_id].append(regla)
+        for estado in self._aires.values():
+            self._reconciliar(estado)
+
+    def _aplicables(self, aire_id):
+        return self._globales + self._por_aire.get(aire_id, [])
+
+    def _reconciliar(self, estado):
+        """Ajusta los evaluadores de un aire a las reglas vigentes, conservando los que no cambiaron."""
+        if estado[1] == self._generacion:
+            return
+        previos = {regla.clave: evaluador for regla, evaluador in estado[2]}
+        aire_id = estado[3]
+        estado[2] = [(regla, previos.get(regla.clave) or regla.crear()) for regla in self._aplicables(aire_id)]
+        estado[1] = self._generacion
+
+    def evaluar(self, lecturas_df, desde_cero=False):
+        """
+        Evalúa lecturas nuevas sin modificar el estado del motor.
+
+        Args:
+            lecturas_df: DataFrame con aire_id, fecha, temperatura y humedad
+            desde_cero: Empezar los aires del lote con un estado nuevo en lugar del guardado
+
+        Returns:
+            (lista de alertas: diccionarios con regla_id, aire_id, fecha, valor y mensaje;
+            estados nuevos de los aires evaluados, para confirmar() tras el commit)
+        """
+        if lecturas_df is None or lecturas_df.empty:
+            return [], {}
+        inicio_reloj = time.perf_counter()
+        aire_ids = lecturas_df['aire_id'].to_numpy(dtype=np.int64)
+        fechas = pd.to_datetime(lecturas_df['fecha']).to_numpy(dtype='datetime64[us]')
+        segundos = fechas.astype(np.int64) / 1e6
+        orden = np.lexsort((segundos, aire_ids))
+        aire_ids, segundos, fechas = aire_ids[orden].tolist(), segundos[orden].tolist(), fechas[orden]
+        valores = [lecturas_df[variable].to_numpy(dtype=np.float64)[orden].tolist() for variable in VARIABLES]
+
+        with self._lock:
+            self._asegurar_compiladas()
+            if not self._globales and not self._por_aire:
+                return [], {}
+            base = {}
+            for aire_id in set(aire_ids):
+                estado = None if desde_cero else self._aires.get(aire_id)
+                if estado is not None:
+                    self._reconciliar(estado)
+                    base[aire_id] = (estado[0], estado[1], list(estado[2]))
+                else:
+                    base[aire_id] = (None, self._generacion, [(r, None) for r in self._aplicables(aire_id)])
+
+        alertas, nuevos = [], {}
+        aire_actual, estado, evaluadores, evaluadas = None, None, None, 0
+        for i, aire_id in enumerate(aire_ids):
+            if aire_id != aire_actual:
+                aire_actual = aire_id
+                ultima, generacion, previos = base[aire_id]
+                evaluadores = [(regla, evaluador.copiar() if evaluador is not None else regla.crear())
+                               for regla, evaluador in previos]
+                estado = [ultima, generacion, evaluadores, aire_id]
+                nuevos[aire_id] = estado
+            t = segundos[i]
+            if estado[0] is not None and t <= estado[0]:
+                continue  # histórica: no se evalúa
+            estado[0] = t
+            evaluadas += 1
+            for regla, evaluador in evaluadores:
+                detalle = evaluador.evaluar(t, valores[regla.indice][i])
+                if detalle is not None:
+                    alertas.append({'regla_id': regla.id, 'aire_id': aire_id, 'fecha': fechas[i],
+                                    'valor': valores[regla.indice][i], 'mensaje': regla.mensaje(detalle)})
+
+        for alerta in alertas:
+            alerta['fecha'] = pd.Timestamp(alerta['fecha']).to_pydatetime()
+        with self._lock:
+            self._metricas['evaluadas'] += evaluadas
+            self._metricas['segundos'] += time.perf_counter() - inicio_reloj
+        return alertas, nuevos
+
+    def confirmar(self, nuevos, alertas=(), reemplazar=False):
+        """
+        Aplica los estados devueltos por evaluar() una vez confirmadas las lecturas
+        (reemplazar=True para los de evaluar(desde_cero=True)).
+        """
+        if not nuevos:
+            return
+        with self._lock:
+            for aire_id, estado in nuevos.items():
+                actual = self._aires.get(aire_id)
+                # Otro lote del mismo aire pudo confirmarse antes con lecturas más nuevas
+                if reemplazar or actual is None or (estado[0] is not None and (actual[0] is None or estado[0] > actual[0])):
+                    if self._reglas is not None:
+                        self._reconciliar(estado)
+                    self._aires[aire_id] = estado
+            self._metricas['alertas'] += len(alertas)
+
+    def revisar_sin_lecturas(self, ultimas, ahora):
+        """
+        Reglas sin_lecturas que se cumplen.
+
+        Args:
+            ultimas: Diccionario aire_id -> fecha de su última lectura guardada
+            ahora: Fecha de referencia
+
+        Returns:
+            Lista de alertas (diccionarios como los de evaluar, con la fecha de la última
+            lectura: identifica el episodio para no repetir la alerta)
+        """
+        with self._lock:
+            self._asegurar_compiladas()
+            reglas = [regla for regla in self._reglas if regla.tipo == 'sin_lecturas']
+        if not reglas or not ultimas:
+            return []
+        aire_ids = np.fromiter(ultimas.keys(), dtype=np.int64, count=len(ultimas))
+        silencios = (pd.Timestamp(ahora) - pd.to_datetime(list(ultimas.values()))).total_seconds().to_numpy()
+        alertas = []
+        for regla in reglas:
+            cumplen = silencios > regla.ventana
+            if regla.aire_id is not None:
+                cumplen &= aire_ids == regla.aire_id
+            for posicion in np.flatnonzero(cumplen):
+                aire_id = int(aire_ids[posicion])
+                alertas.append({'regla_id': regla.id, 'aire_id': aire_id, 'fecha': ultimas[aire_id],
+                                'valor': round(silencios[posicion] / 60.0, 1),
+                                'mensaje': regla.mensaje(silencios[posicion])})
+        return alertas
+
+    def metricas(self):
+        with self._lock:
+            evaluadas, segundos = self._metricas['evaluadas'], self._metricas['segundos']
+            return dict(
+                self._metricas,
+                segundos=round(segundos, 3),
+                lecturas_por_segundo=round(evaluadas / segundos) if segundos else None,
+                reglas=len(self._reglas) if self._reglas is not None else 0,
+                aires=len(self._aires),
+                instancias=sum(len(estado[2]) for estado in self._aires.values())
+            )
@@ -0,0 +1,171 @@
+"""
+Servidor de sensores simulados para probar poller.py con miles de unidades.
+
+    HTTP  GET /sensor/<n>       -> {"temperatura": 22.1, "humedad": 48.3}
+    TCP   el cliente envía "<n>\\n" y recibe "22.1,48.3\\n"
+
+Cada unidad sigue un paseo aleatorio propio. Se pueden simular latencia,
+respuestas de error y sensores colgados (para ejercitar los timeouts).
+
+Uso (desde el directorio backend):
+    python sensores_simulados.py [--unidades 1000] [--latencia-ms 20] [--fallos 0.01]
+    python sensores_simulados.py --unidades 5000 --registrar   # y en otra terminal: python poller.py
+
+Con --registrar se crean (o reutilizan) aires "Sensor simulado <n>" que apuntan
+a este servidor, mitad por HTTP y mitad por TCP.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+
+PREFIJO_NOMBRE = 'Sensor simulado'
+
+
+class Simulador:
+    def __init__(self, unidades, latencia_ms=20.0, fallos=0.0, colgados=0.0, semilla=None):
+        self.unidades = unidades
+        self.latencia = latencia_ms / 1000.0
+        self.fallos = fallos
+        self.colgados = colgados
+        self._rng = np.random.default_rng(semilla)
+        self.temperatura = self._rng.normal(22.0, 2.0, unidades)
+        self.humedad = self._rng.normal(50.0, 5.0, unidades)
+        self.atendidas = 0
+
+    def leer(self, unidad):
+        """Avanza el paseo aleatorio de la unidad y devuelve (temperatura, humedad)."""
+        self.temperatura[unidad] = np.clip(self.temperatura[unidad] + self._rng.normal(0, 0.2), -10, 60)
+        self.humedad[unidad] = np.clip(self.humedad[unidad] + self._rng.normal(0, 0.5), 0, 100)
+        self.atendidas += 1
+        return round(float(self.temperatura[unidad]), 2), round(float(self.humedad[unidad]), 2)
+
+    async def _esperar(self):
+        """Simula la latencia del sensor; devuelve False si debe fallar."""
+        if self.colgados and random.random() < self.colgados:
+            await asyncio.sleep(3600)
+        if self.latencia:
+            await asyncio.sleep(random.expovariate(1.0 / self.latencia))
+        return not (self.fallos and random.random() < self.fallos)
+
+    def _unidad(self, texto):
+        try:
+            unidad = int(texto)
+        except ValueError:
+            return None
+        return unidad if 0 <= unidad < self.unidades else None
+
+    async def atender_http(self, lector, escritor):
+        try:
+            linea = await lector.readline()
+            while (await lector.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            partes = linea.decode('latin-1').split()
+            ruta = partes[1] if len(partes) > 1 else ''
+            unidad = self._unidad(ruta.rsplit('/', 1)[-1]) if ruta.startswith('/sensor/') else None
+            if unidad is None:
+                estado, cuerpo = '404 Not Found', b'{"error": "unidad inexistente"}'
+            elif not await self._esperar():
+                estado, cuerpo = '503 Service Unavailable', b'{"error": "fallo simulado"}'
+            else:
+                temperatura, humedad = self.leer(unidad)
+                estado, cuerpo = '200 OK', json.dumps({'temperatura': temperatura, 'humedad': humedad}).encode()
+            escritor.write(f"HTTP/1.0 {estado}\r\nContent-Type: application/json\r\n"
+                           f"Content-Length: {len(cuerpo)}\r\nConnection: close\r\n\r\n".encode() + cuerpo)
+            await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+    async def atender_tcp(self, lector, escritor):
+        try:
+            unidad = self._unidad((await lector.readline()).strip())
+            if unidad is not None and await self._esperar():
+                temperatura, humedad = self.leer(unidad)
+                escritor.write(f"{temperatura},{humedad}\n".encode())
+                await escritor.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            escritor.close()
+
+
+def registrar_aires(unidades, host, puerto_http, puerto_tcp, intervalo):
+    """Crea o actualiza los aires simulados para que poller.py los sondee."""
+    from sqlalchemy import insert
+    from database import Session, AireAcondicionado
+    from data_manager import DataManager
+
+    sesion = Session()
+    try:
+        existentes = dict(sesion.query(AireAcondicionado.nombre, AireAcondicionado.id)
+                          .filter(AireAcondicionado.nombre.like(f'{PREFIJO_NOMBRE} %')))
+        nuevos = [{'nombre': f'{PREFIJO_NOMBRE} {n}', 'ubicacion': 'Simulación', 'tipo': 'simulado'}
+                  for n in range(unidades) if f'{PREFIJO_NOMBRE} {n}' not in existentes]
+        if nuevos:
+            sesion.execute(insert(AireAcondicionado), nuevos)
+        ids = dict(sesion.query(AireAcondicionado.nombre, AireAcondicionado.id)
+                   .filter(AireAcondicionado.nombre.like(f'{PREFIJO_NOMBRE} %')))
+        for n in range(unidades):
+            url = (f'http://{host}:{puerto_http}/sensor/{n}' if n % 2 == 0
+                   else f'tcp://{host}:{puerto_tcp}/{n}')
+            sesion.query(AireAcondicionado).filter(AireAcondicionado.id == ids[f'{PREFIJO_NOMBRE} {n}']).update(
+                {'sensor_url': url, 'sensor_intervalo': intervalo}, synchronize_session=False
+            )
+        sesion.commit()
+    except Exception:
+        sesion.rollback()
+        raise
+    finally:
+        sesion.close()
+    DataManager()._registrar_cambio('aires_acondicionados')
+    print(f"{unidades} aires simulados registrados ({len(nuevos)} nuevos)")
+
+
+async def servir(simulador, host, puerto_http, puerto_tcp):
+    servidor_http = await asyncio.start_server(simulador.atender_http, host, puerto_http, backlog=4096)
+    servidor_tcp = await asyncio.start_server(simulador.atender_tcp, host, puerto_tcp, backlog=4096)
+    print(f"{simulador.unidades} sensores simulados en http://{host}:{puerto_http}/sensor/<n> "
+          f"y tcp://{host}:{puerto_tcp}/<n>")
+    async with servidor_http, servidor_tcp:
+        anteriores = 0
+        while True:
+            await asyncio.sleep(10)
+            print(f"Lecturas servidas: {simulador.atendidas} ({(simulador.atendidas - anteriores) / 10:.0f}/s)")
+            anteriores = simulador.atendidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--unidades', type=int, default=1000)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto-http', type=int, default=9100)
+    parser.add_argument('--puerto-tcp', type=int, default=9101)
+    parser.add_argument('--latencia-ms', type=float, default=20.0, help='Latencia media simulada')
+    parser.add_argument('--fallos', type=float, default=0.0, help='Fracción de respuestas de error')
+    parser.add_argument('--colgados', type=float, default=0.0, help='Fracción de sondeos que nunca responden')
+    parser.add_argument('--registrar', action='store_true',
+                        help='Crear/actualizar los aires simulados en la base de datos')
+    parser.add_argument('--intervalo', type=int, default=10,
+                        help='sensor_intervalo de los aires registrados (segundos)')
+    args = parser.parse_args()
+
+    if args.registrar:
+        load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+        registrar_aires(args.unidades, args.host, args.puerto_http, args.puerto_tcp, args.intervalo)
+
+    simulador = Simulador(args.unidades, latencia_ms=args.latencia_ms, fallos=args.fallos, colgados=args.colgados)
+    try:
+        asyncio.run(servir(simulador, args.host, args.puerto_http, args.puerto_tcp))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Caché en disco de las series completas de lecturas para análisis.
+
+Cada aire tiene un archivo binario en data/series/ con sus lecturas ordenadas
+por fecha como registros (id, fecha en microsegundos, temperatura, humedad), que se
+abren con numpy.memmap: los análisis leen los arrays directamente del archivo,
+sin materializar objetos ORM ni copiar el historial en memoria.
+
+La caché se actualiza de forma incremental: se leen de la base de datos solo
+las lecturas con id mayor que la última incorporada y se añaden al final del
+archivo de su aire. Los aires marcados como modificados (lecturas actualizadas
+o borradas) se reconstruyen. Como conciliación, cada 'intervalo_conciliacion'
+segundos se compara además el número de lecturas de cada aire con el de la
+base de datos y se reconstruyen los que difieren (borrados hechos desde otra
+máquina, o ids confirmados fuera de orden); ese recuento recorre toda la tabla,
+así que no se hace en cada sincronización. Varios procesos de la misma máquina
+pueden compartir el directorio: la sincronización se serializa con un bloqueo
+de archivo.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se serializan los hilos del proceso
+    fcntl = None
+
+DTYPE_LECTURA = np.dtype([('id', '<i8'), ('fecha', '<i8'), ('temperatura', '<f8'), ('humedad', '<f8')])
+TAMANO_LOTE_SINCRONIZACION = 200_000
+VERSION = 1
+
+
+def _registros(lecturas_df):
+    """DataFrame (id, fecha, temperatura, humedad) -> array estructurado ordenado por fecha."""
+    registros = np.empty(len(lecturas_df), dtype=DTYPE_LECTURA)
+    registros['id'] = lecturas_df['id'].to_numpy(dtype=np.int64)
+    registros['fecha'] = pd.to_datetime(lecturas_df['fecha']).to_numpy(dtype='datetime64[us]').astype(np.int64)
+    registros['temperatura'] = lecturas_df['temperatura'].to_numpy(dtype=np.float64)
+    registros['humedad'] = lecturas_df['humedad'].to_numpy(dtype=np.float64)
+    return registros[np.argsort(registros['fecha'], kind='stable')]
+
+
+class AlmacenSeries:
+    """
+    Args:
+        directorio: Carpeta de los archivos (se crea si no existe)
+        leer_desde_id: Función (ultimo_id, limite) -> DataFrame con id, aire_id, fecha,
+            temperatura y humedad de las lecturas con id > ultimo_id, ordenadas por id
+        contar_por_aire: Función () -> diccionario aire_id -> número de lecturas
+        leer_aire: Función (aire_id) -> DataFrame con id, fecha, temperatura y humedad del aire
+        intervalo_conciliacion: Segundos entre recuentos de lecturas por aire
+    """
+
+    def __init__(self, directorio, leer_desde_id, contar_por_aire, leer_aire, intervalo_conciliacion=3600):
+        self.directorio = directorio
+        self.leer_desde_id = leer_desde_id
+        self.contar_por_aire = contar_por_aire
+        self.leer_aire = leer_aire
+        self.intervalo_conciliacion = intervalo_conciliacion
+        self.ultima_sincronizacion = None
+        self._lock = threading.Lock()
+        os.makedirs(directorio, exist_ok=True)
+
+    # --- Archivos ---
+
+    def _ruta(self, aire_id):
+        return os.path.join(self.directorio, f'aire_{int(aire_id)}.bin')
+
+    def _ruta_estado(self):
+        return os.path.join(self.directorio, 'estado.json')
+
+    def _leer_estado(self):
+        try:
+            with open(self._ruta_estado()) as archivo:
+                estado = json.load(archivo)
+            if estado.get('version') == VERSION:
+                estado['filas'] = {int(a): n for a, n in estado['filas'].items()}
+                estado['sucios'] = set(estado.get('sucios', []))
+                return estado
+        except (OSError, ValueError, KeyError):
+            pass
+        return {'version': VERSION, 'ultimo_id': 0, 'filas': {}, 'sucios': set(), 'conciliado': 0}
+
+    def _guardar_estado(self, estado):
+        temporal = self._ruta_estado() + '.tmp'
+        with open(temporal, 'w') as archivo:
+            json.dump(dict(estado, filas={str(a): n for a, n in estado['filas'].items()},
+                           sucios=sorted(estado['sucios'])), archivo)
+        os.replace(temporal, self._ruta_estado())
+
+    @contextlib.contextmanager
+    def _bloquear(self):
+        """Bloqueo entre procesos (y entre hilos del proceso) del directorio."""
+        with self._lock, open(os.path.join(self.directorio, '.lock'), 'a') as archivo:
+            if fcntl is not None:
+                fcntl.flock(archivo, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(archivo, fcntl.LOCK_UN)
+
+    def _reconstruir(self, aire_id):
+        """Reescribe el archivo de un aire desde la base de datos; devuelve sus filas."""
+        registros = _registros(self.leer_aire(aire_id))
+        temporal = self._ruta(aire_id) + '.tmp'
+        registros.tofile(temporal)
+        # Los lectores que ya tenían el archivo abierto siguen viendo la versión anterior
+        os.replace(temporal, self._ruta(aire_id))
+        return len(registros)
+
+    # --- Sincronización ---
+
+    def marcar_modificados(self, aire_ids):
+        """Marca aires cuyas lecturas se actualizaron o borraron para reconstruirlos en la próxima sincronización."""
+        aire_ids = {int(a) for a in aire_ids}
+        if not aire_ids:
+            return
+        with self._bloquear():
+            estado = self._leer_estado()
+            estado['sucios'] |= aire_ids
+            self._guardar_estado(estado)
+
+    def sincronizar(self, conciliar=None):
+        """
+        Incorpora las lecturas nuevas y reconstruye los aires marcados como modificados.
+
+        Args:
+            conciliar: True para contar las lecturas de cada aire y reconstruir los que no
+                cuadran con la base de datos; None para hacerlo si pasó intervalo_conciliacion
+
+        Returns:
+            Diccionario con 'agregadas', 'reconstruidos' y 'segundos'
+        """
+        inicio = time.perf_counter()
+        agregadas, reconstruidos = 0, set()
+        with self._bloquear():
+            estado = self._leer_estado()
+            desordenados = set(estado['sucios'])
+            while True:
+                nuevas = self.leer_desde_id(estado['ultimo_id'], TAMANO_LOTE_SINCRONIZACION)
+                if nuevas.empty:
+                    break
+                for aire_id, grupo in nuevas.groupby('aire_id'):
+                    aire_id = int(aire_id)
+                    if aire_id in desordenados:
+                        continue
+                    registros = _registros(grupo)
+                    ruta = self._ruta(aire_id)
+                    filas = estado['filas'].get(aire_id, 0)
+                    if filas and registros['fecha'][0] < self._ultima_fecha(ruta, filas):
+                        # Lecturas anteriores a las ya guardadas (carga histórica): reescribir ordenado
+                        desordenados.add(aire_id)
+                        continue
+                    with open(ruta, 'r+b' if filas else 'wb') as archivo:
+                        archivo.seek(filas * DTYPE_LECTURA.itemsize)
+                        archivo.truncate()
+                        registros.tofile(archivo)
+                    estado['filas'][aire_id] = filas + len(registros)
+                    agregadas += len(registros)
+                estado['ultimo_id'] = int(nuevas['id'].max())
+                if len(nuevas) < TAMANO_LOTE_SINCRONIZACION:
+                    break
+
+            if conciliar is None:
+                conciliar = time.time() - estado.get('conciliado', 0) >= self.intervalo_conciliacion
+            if conciliar:
+                conteos = self.contar_por_aire()
+                desordenados |= {aire_id for aire_id, lecturas in conteos.items()
+                                 if estado['filas'].get(aire_id, 0) != lecturas}
+                # Aires eliminados o sin lecturas
+                desordenados |= set(estado['filas']) - set(conteos)
+                estado['conciliado'] = time.time()
+            for aire_id in desordenados:
+                filas = self._reconstruir(aire_id)
+                if filas:
+                    estado['filas'][aire_id] = filas
+                else:
+                    os.remove(self._ruta(aire_id))
+                    estado['filas'].pop(aire_id, None)
+                reconstruidos.add(aire_id)
+            estado['sucios'] = set()
+            self._guardar_estado(estado)
+        self.ultima_sincronizacion = time.monotonic()
+        return {'agregadas': agregadas, 'reconstruidos': sorted(reconstruidos),
+                'segundos': round(time.perf_counter() - inicio, 3)}
+
+    @staticmethod
+    def _ultima_fecha(ruta, filas):
+        mapa = np.memmap(ruta, dtype=DTYPE_LECTURA, mode='r', shape=(filas,))
+        return int(mapa['fecha'][filas - 1])
+
+    # --- Lectura ---
+
+    def leer(self, aire_id):
+        """
+        Array estructurado (id, fecha, temperatura, humedad) del aire, ordenado por
+        fecha, mapeado en modo solo lectura (vacío si el aire no tiene lecturas).
+        Las columnas (p. ej. leer(1)['temperatura']) son vistas sin copia.
+        """
+        ruta = self._ruta(aire_id)
+        try:
+            filas = os.path.getsize(ruta) // DTYPE_LECTURA.itemsize
+        except OSError:
+            filas = 0
+        if filas == 0:
+            return np.empty(0, dtype=DTYPE_LECTURA)
+        return np.memmap(ruta, dtype=DTYPE_LECTURA, mode='r', shape=(filas,))
+
+    def aires(self):
+        return sorted(self._leer_estado()['filas'])
+
+    def dataframe(self, aire_ids=None):
+        """DataFrame con id, aire_id, fecha, temperatura y humedad de los aires pedidos (todos por defecto)."""
+        partes = []
+        for aire_id in (self.aires() if aire_ids is None else aire_ids):
+            registros = self.leer(aire_id)
+            if len(registros):
+                partes.append(pd.DataFrame({
+                    'id': registros['id'],
+                    'aire_id': np.full(len(registros), int(aire_id), dtype=np.int64),
+                    'fecha': registros['fecha'].astype('datetime64[us]'),
+                    'temperatura': registros['temperatura'],
+                    'humedad': registros['humedad'],
+                }))
+        if not partes:
+            return pd.DataFrame(columns=['id', 'aire_id', 'fecha', 'temperatura', 'humedad'])
+        return pd.concat(partes, ignore_index=True)
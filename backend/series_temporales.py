@@ -0,0 +1,246 @@
+"""
+Cálculos vectorizados sobre series de lecturas con muestreo irregular.
+"""
+import numpy as np
+import pandas as pd
+
+METODOS_INTEGRACION = ('trapecio', 'escalon')
+
+
+def _segundos(fechas):
+    """Convierte una serie de fechas a segundos (float64) desde la época."""
+    fechas = pd.to_datetime(fechas)
+    return fechas.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+
+
+def estadisticas_ponderadas_tiempo(lecturas_df, columnas=('temperatura', 'humedad'), serie='aire_id',
+                                   agrupar_por=None, metodo='trapecio', max_intervalo=None):
+    """
+    Calcula promedio y desviación estándar ponderados por tiempo.
+
+    Cada serie (por defecto cada aire) se integra por separado sobre 'fecha',
+    de modo que una ráfaga de lecturas cargadas en pocos minutos pesa lo que
+    duran esos minutos y no el número de filas. Las integrales se suman por
+    grupo, así que el promedio de un grupo con varios aires queda ponderado
+    por el tiempo cubierto por cada uno.
+
+    Args:
+        lecturas_df: DataFrame con 'fecha', la columna de serie y las columnas a resumir
+        columnas: Columnas numéricas a resumir
+        serie: Columna que identifica cada serie a integrar por separado
+        agrupar_por: Columna por la que agrupar el resultado (None para un único grupo)
+        metodo: 'trapecio' (interpolación lineal) o 'escalon' (se mantiene el último valor)
+        max_intervalo: Segundos máximos que se atribuyen a un intervalo entre dos
+            lecturas; los huecos más largos se recortan a este valor (None sin límite)
+
+    Returns:
+        DataFrame indexado por grupo con '<col>_promedio', '<col>_desviacion',
+        '<col>_min', '<col>_max' por columna, más 'duracion_horas' y 'lecturas'
+    """
+    if metodo not in METODOS_INTEGRACION:
+        raise ValueError(f"Método de integración inválido: {metodo}. Use {', '.join(METODOS_INTEGRACION)}")
+    if lecturas_df.empty:
+        return pd.DataFrame()
+
+    df = lecturas_df
+    t = _segundos(df['fecha'])
+    orden = np.lexsort((t, df[serie].to_numpy()))
+    t = t[orden]
+    series = df[serie].to_numpy()[orden]
+    if agrupar_por is None:
+        codigos, grupos = np.zeros(len(df), dtype=np.int64), pd.Index(['todos'])
+    else:
+        codigos, grupos = pd.factorize(df[agrupar_por].to_numpy()[orden])
+    n_grupos = len(grupos)
+
+    # Intervalos entre lecturas consecutivas de la misma serie
+    dt = np.diff(t)
+    dt[series[1:] != series[:-1]] = 0.0
+    if max_intervalo is not None:
+        np.minimum(dt, max_intervalo, out=dt)
+    codigo_intervalo = codigos[:-1]
+    duracion = np.bincount(codigo_intervalo, weights=dt, minlength=n_grupos)
+
+    resultado = pd.DataFrame(index=grupos)
+    resultado['lecturas'] = np.bincount(codigos, minlength=n_grupos)
+    resultado['duracion_horas'] = duracion / 3600.0
+
+    con_duracion = duracion > 0
+    for col in columnas:
+        x = df[col].to_numpy(dtype=np.float64)[orden]
+        a, b = x[:-1], x[1:]
+        if metodo == 'trapecio':
+            area = dt * (a + b) / 2.0
+            # Integral exacta del cuadrado de la interpolación lineal
+            area_cuadrado = dt * (a * a + a * b + b * b) / 3.0
+        else:
+            area = dt * a
+            area_cuadrado = dt * a * a
+        suma = np.bincount(codigo_intervalo, weights=area, minlength=n_grupos)
+        suma_cuadrado = np.bincount(codigo_intervalo, weights=area_cuadrado, minlength=n_grupos)
+
+        # Grupos sin intervalos (una sola lectura por serie): promedio aritmético
+        conteo = np.bincount(codigos, minlength=n_grupos)
+        media_simple = np.bincount(codigos, weights=x, minlength=n_grupos) / np.maximum(conteo, 1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            promedio = np.where(con_duracion, suma / duracion, media_simple)
+            varianza = np.where(con_duracion, suma_cuadrado / duracion - promedio ** 2, 0.0)
+
+        resultado[f'{col}_promedio'] = promedio
+        resultado[f'{col}_desviacion'] = np.sqrt(np.clip(varianza, 0.0, None))
+        minimos = np.full(n_grupos, np.inf)
+        maximos = np.full(n_grupos, -np.inf)
+        np.minimum.at(minimos, codigos, x)
+        np.maximum.at(maximos, codigos, x)
+        resultado[f'{col}_min'] = minimos
+        resultado[f'{col}_max'] = maximos
+
+    return resultado
+
+
+METODOS_REMUESTREO = ('anterior', 'lineal', 'media')
+
+
+def remuestrear(lecturas_df, desde, hasta, paso, columnas=('temperatura', 'humedad'), serie='aire_id',
+                series=None, metodo='anterior', max_hueco=None):
+    """
+    Alinea varias series irregulares en una rejilla regular común.
+
+    Todas las series se resuelven a la vez: las lecturas se ordenan por
+    (serie, fecha) con una clave entera combinada y cada punto de la rejilla se
+    ubica con una única búsqueda binaria vectorizada.
+
+    Args:
+        lecturas_df: DataFrame con 'fecha', la columna de serie y las columnas a alinear
+        desde, hasta: Rango de la rejilla [desde, hasta)
+        paso: Segundos entre puntos de la rejilla
+        columnas: Columnas numéricas a alinear
+        serie: Columna que identifica cada serie
+        series: Identificadores de las columnas de la matriz, en orden (por defecto
+            los presentes en los datos, ordenados); las series sin lecturas quedan en NaN
+        metodo: 'anterior' (último valor conocido), 'lineal' (interpolación entre la
+            lectura anterior y la siguiente) o 'media' (promedio de las lecturas de cada
+            intervalo [t, t + paso))
+        max_hueco: Segundos máximos para rellenar: con 'anterior', antigüedad máxima
+            del último valor; con 'lineal', distancia máxima entre las dos lecturas
+            que se interpolan. No aplica a 'media' (intervalo sin lecturas = NaN)
+
+    Returns:
+        (DatetimeIndex de la rejilla, array de identificadores de serie,
+        diccionario columna -> matriz de forma (puntos, series))
+    """
+    if metodo not in METODOS_REMUESTREO:
+        raise ValueError(f"Método de remuestreo inválido: {metodo}. Use {', '.join(METODOS_REMUESTREO)}")
+    inicio = pd.Timestamp(desde).to_datetime64().astype('datetime64[s]').astype(np.int64)
+    fin = pd.Timestamp(hasta).to_datetime64().astype('datetime64[s]').astype(np.int64)
+    rejilla = np.arange(inicio, fin, int(paso), dtype=np.int64)
+    fechas = pd.to_datetime(rejilla, unit='s')
+
+    if series is None:
+        series = np.sort(lecturas_df[serie].unique()) if not lecturas_df.empty else np.array([], dtype=np.int64)
+    series = np.asarray(series)
+    m, n = len(rejilla), len(series)
+    matrices = {col: np.full((m, n), np.nan) for col in columnas}
+    if lecturas_df.empty or m == 0 or n == 0:
+        return fechas, series, matrices
+
+    codigos = pd.Index(series).get_indexer(lecturas_df[serie].to_numpy())
+    validas = codigos >= 0
+    t = pd.to_datetime(lecturas_df['fecha']).to_numpy(dtype='datetime64[s]').astype(np.int64)[validas]
+    codigos = codigos[validas]
+    valores = {col: lecturas_df[col].to_numpy(dtype=np.float64)[validas] for col in columnas}
+    if len(t) == 0:
+        return fechas, series, matrices
+
+    if metodo == 'media':
+        dentro = (t >= inicio) & (t < inicio + m * int(paso))
+        celda = ((t[dentro] - inicio) // int(paso)) * n + codigos[dentro]
+        conteo = np.bincount(celda, minlength=m * n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for col in columnas:
+                suma = np.bincount(celda, weights=valores[col][dentro], minlength=m * n)
+                matrices[col] = np.where(conteo > 0, suma / np.maximum(conteo, 1), np.nan).reshape(m, n)
+        return fechas, series, matrices
+
+    # Clave combinada (serie, fecha): las series quedan en tramos disjuntos y ordenados
+    base = min(t.min(), rejilla[0])
+    ancho = max(t.max(), rejilla[-1]) - base + 1
+    clave = codigos.astype(np.int64) * ancho + (t - base)
+    orden = np.argsort(clave, kind='stable')
+    clave, t, codigos = clave[orden], t[orden], codigos[orden]
+    valores = {col: x[orden] for col, x in valores.items()}
+
+    codigo_rejilla = np.broadcast_to(np.arange(n, dtype=np.int64), (m, n))
+    clave_rejilla = codigo_rejilla * ancho + (rejilla[:, None] - base)
+    previa = np.searchsorted(clave, clave_rejilla, side='right') - 1
+    hay_previa = previa >= 0
+    previa = np.clip(previa, 0, None)
+    hay_previa &= codigos[previa] == codigo_rejilla
+
+    if metodo == 'anterior':
+        usar = hay_previa
+        if max_hueco is not None:
+            usar &= rejilla[:, None] - t[previa] <= max_hueco
+        for col in columnas:
+            matrices[col] = np.where(usar, valores[col][previa], np.nan)
+        return fechas, series, matrices
+
+    siguiente = np.clip(previa + 1, 0, len(t) - 1)
+    exacta = hay_previa & (t[previa] == rejilla[:, None])
+    hay_siguiente = hay_previa & (previa + 1 < len(t)) & (codigos[siguiente] == codigo_rejilla)
+    intervalo = (t[siguiente] - t[previa]).astype(np.float64)
+    if max_hueco is not None:
+        hay_siguiente &= intervalo <= max_hueco
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraccion = (rejilla[:, None] - t[previa]) / intervalo
+        for col in columnas:
+            x = valores[col]
+            interpolado = x[previa] + fraccion * (x[siguiente] - x[previa])
+            matrices[col] = np.where(exacta, x[previa], np.where(hay_siguiente, interpolado, np.nan))
+    return fechas, series, matrices
+
+
+def estadisticas_moviles(fechas, valores, ventana):
+    """
+    Media, desviación estándar, mínimo y máximo en una ventana de tiempo móvil.
+
+    La ventana de cada lectura abarca (fecha - ventana, fecha], así que con muestreo
+    irregular cada punto resume las lecturas de ese lapso y no un número fijo de filas.
+    Media y desviación se obtienen de sumas acumuladas (centradas en el primer valor
+    para no perder precisión) y una búsqueda binaria del inicio de cada ventana.
+
+    Args:
+        fechas: Fechas ordenadas de forma creciente
+        valores: Valores de las lecturas
+        ventana: Duración de la ventana en segundos
+
+    Returns:
+        DataFrame con 'media', 'desviacion' (muestral, NaN con una sola lectura),
+        'minimo', 'maximo' y 'lecturas' (lecturas en la ventana), una fila por lectura
+    """
+    t = _segundos(fechas)
+    x = np.asarray(valores, dtype=np.float64)
+    if len(x) == 0:
+        return pd.DataFrame(columns=['media', 'desviacion', 'minimo', 'maximo', 'lecturas'])
+    inicio = np.searchsorted(t, t - ventana, side='right')
+    fin = np.arange(1, len(x) + 1)
+    centrados = x - x[0]
+    suma = np.concatenate(([0.0], np.cumsum(centrados)))
+    suma_cuadrado = np.concatenate(([0.0], np.cumsum(centrados * centrados)))
+    lecturas = fin - inicio
+    media = (suma[fin] - suma[inicio]) / lecturas
+    with np.errstate(invalid='ignore', divide='ignore'):
+        varianza = ((suma_cuadrado[fin] - suma_cuadrado[inicio]) - lecturas * media * media) / (lecturas - 1)
+    desviacion = np.where(lecturas > 1, np.sqrt(np.clip(varianza, 0.0, None)), np.nan)
+
+    # Mínimo y máximo con las ventanas por tiempo de pandas (misma definición (t - ventana, t])
+    serie = pd.Series(x, index=pd.to_datetime(np.asarray(fechas)))
+    movil = serie.rolling(pd.Timedelta(seconds=ventana))
+    return pd.DataFrame({
+        'media': media + x[0],
+        'desviacion': desviacion,
+        'minimo': movil.min().to_numpy(),
+        'maximo': movil.max().to_numpy(),
+        'lecturas': lecturas,
+    })
@@ -0,0 +1,237 @@
+"""
+Sketches de cuantiles fusionables (DDSketch) para temperatura y humedad.
+
+Un DDSketch agrupa los valores en cubetas logarítmicas de razón
+gamma = (1 + alpha) / (1 - alpha). Cada cubeta se representa por un único
+valor cuyo error relativo respecto a cualquier valor de la cubeta es como
+máximo alpha. De ahí la garantía que ofrece:
+
+    Para cualquier cuantil q, el valor devuelto v cumple
+        |v - x_q| <= alpha * |x_q|
+    donde x_q es el elemento de rango floor(q * (n - 1)) de los datos
+    ordenados (equivale a np.percentile(datos, 100 * q, method='lower')).
+
+Frente al percentil interpolado por defecto de NumPy (method='linear') la
+diferencia adicional está acotada por la distancia entre los dos valores
+vecinos que interpola, que con lecturas de un decimal suele ser 0 o 0.1.
+
+Con ALPHA_POR_DEFECTO = 0.005 una temperatura de 24 °C se reporta con un
+error máximo de 0.12 °C y una humedad de 50 % con un error máximo de 0.25 %.
+
+Los sketches se pueden fusionar sin pérdida (la fusión de los sketches de
+dos conjuntos es idéntica al sketch de la unión), así que se guardan por
+aire y por hora y se combinan para cualquier ventana o grupo de aires.
+"""
+import math
+import struct
+import numpy as np
+
+ALPHA_POR_DEFECTO = 0.005
+# Valores con magnitud menor a esto se cuentan como cero
+VALOR_MINIMO_INDEXABLE = 1e-9
+# Límite de cubetas por signo; si se supera se colapsan las más bajas
+MAX_CUBETAS = 2048
+
+_VERSION_FORMATO = 1
+_CABECERA = struct.Struct('<BdQ')  # versión, alpha, conteo de ceros
+_CABECERA_ALMACEN = struct.Struct('<iIB')  # offset, longitud, bytes por conteo
+
+
+class _Almacen:
+    """Conteos densos por índice de cubeta, a partir de un offset."""
+
+    def __init__(self):
+        self.offset = 0
+        self.conteos = np.zeros(0, dtype=np.uint64)
+
+    def vacio(self):
+        return self.conteos.size == 0
+
+    def total(self):
+        return int(self.conteos.sum())
+
+    def agregar_indices(self, indices):
+        if indices.size == 0:
+            return
+        minimo = int(indices.min())
+        maximo = int(indices.max())
+        self._asegurar_rango(minimo, maximo)
+        self.conteos += np.bincount(indices - self.offset, minlength=self.conteos.size).astype(np.uint64)
+        self._colapsar()
+
+    def fusionar(self, otro):
+        if otro.vacio():
+            return
+        self._asegurar_rango(otro.offset, otro.offset + otro.conteos.size - 1)
+        inicio = otro.offset - self.offset
+        self.conteos[inicio:inicio + otro.conteos.size] += otro.conteos
+        self._colapsar()
+
+    def _asegurar_rango(self, minimo, maximo):
+        if self.vacio():
+            self.offset = minimo
+            self.conteos = np.zeros(maximo - minimo + 1, dtype=np.uint64)
+            return
+        nuevo_offset = min(self.offset, minimo)
+        nuevo_fin = max(self.offset + self.conteos.size - 1, maximo)
+        if nuevo_offset == self.offset and nuevo_fin == self.offset + self.conteos.size - 1:
+            return
+        conteos = np.zeros(nuevo_fin - nuevo_offset + 1, dtype=np.uint64)
+        inicio = self.offset - nuevo_offset
+        conteos[inicio:inicio + self.conteos.size] = self.conteos
+        self.offset = nuevo_offset
+        self.conteos = conteos
+
+    def _colapsar(self):
+        # Mantener la memoria acotada sacrificando precisión en los índices más bajos
+        exceso = self.conteos.size - MAX_CUBETAS
+        if exceso > 0:
+            self.conteos[exceso] += self.conteos[:exceso].sum()
+            self.conteos = self.conteos[exceso:].copy()
+            self.offset += exceso
+
+    def a_bytes(self):
+        if self.vacio():
+            return _CABECERA_ALMACEN.pack(0, 0, 1)
+        maximo = int(self.conteos.max())
+        if maximo < 2 ** 8:
+            ancho, dtype = 1, '<u1'
+        elif maximo < 2 ** 16:
+            ancho, dtype = 2, '<u2'
+        elif maximo < 2 ** 32:
+            ancho, dtype = 4, '<u4'
+        else:
+            ancho, dtype = 8, '<u8'
+        return _CABECERA_ALMACEN.pack(self.offset, self.conteos.size, ancho) + self.conteos.astype(dtype).tobytes()
+
+    @classmethod
+    def desde_bytes(cls, datos, posicion):
+        offset, longitud, ancho = _CABECERA_ALMACEN.unpack_from(datos, posicion)
+        posicion += _CABECERA_ALMACEN.size
+        almacen = cls()
+        if longitud:
+            dtype = {1: '<u1', 2: '<u2', 4: '<u4', 8: '<u8'}[ancho]
+            almacen.offset = offset
+            almacen.conteos = np.frombuffer(datos, dtype=dtype, count=longitud, offset=posicion).astype(np.uint64)
+            posicion += longitud * ancho
+        return almacen, posicion
+
+
+class DDSketch:
+    """
+    Sketch de cuantiles con error relativo acotado y fusionable.
+
+    Args:
+        alpha: Precisión relativa garantizada (0 < alpha < 1)
+    """
+
+    def __init__(self, alpha=ALPHA_POR_DEFECTO):
+        if not 0 < alpha < 1:
+            raise ValueError("alpha debe estar entre 0 y 1")
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.positivos = _Almacen()
+        self.negativos = _Almacen()
+        self.ceros = 0
+
+    @property
+    def total(self):
+        return self.positivos.total() + self.negativos.total() + self.ceros
+
+    def agregar(self, valores):
+        """Agrega uno o varios valores (escalar, lista o array de NumPy)."""
+        valores = np.asarray(valores, dtype=np.float64).ravel()
+        valores = valores[np.isfinite(valores)]
+        if valores.size == 0:
+            return
+        magnitudes = np.abs(valores)
+        es_cero = magnitudes < VALOR_MINIMO_INDEXABLE
+        self.ceros += int(es_cero.sum())
+        positivos = valores[(valores > 0) & ~es_cero]
+        negativos = -valores[(valores < 0) & ~es_cero]
+        self.positivos.agregar_indices(self._indices(positivos))
+        self.negativos.agregar_indices(self._indices(negativos))
+
+    def fusionar(self, otro):
+        """Fusiona otro sketch (con el mismo alpha) dentro de este."""
+        if not math.isclose(self.alpha, otro.alpha):
+            raise ValueError("Solo se pueden fusionar sketches con el mismo alpha")
+        self.positivos.fusionar(otro.positivos)
+        self.negativos.fusionar(otro.negativos)
+        self.ceros += otro.ceros
+        return self
+
+    def cuantil(self, q):
+        """
+        Devuelve el cuantil q (0 <= q <= 1) o None si el sketch está vacío.
+        """
+        return self.cuantiles([q])[0]
+
+    def cuantiles(self, qs):
+        """Calcula varios cuantiles de una sola pasada."""
+        total = self.total
+        if total == 0:
+            return [None for _ in qs]
+
+        # Orden ascendente: negativos de mayor a menor magnitud, ceros, positivos
+        valores = []
+        conteos = []
+        if not self.negativos.vacio():
+            indices = np.arange(self.negativos.offset, self.negativos.offset + self.negativos.conteos.size)
+            valores.append(-self._valor_indices(indices)[::-1])
+            conteos.append(self.negativos.conteos[::-1])
+        if self.ceros:
+            valores.append(np.zeros(1))
+            conteos.append(np.array([self.ceros], dtype=np.uint64))
+        if not self.positivos.vacio():
+            indices = np.arange(self.positivos.offset, self.positivos.offset + self.positivos.conteos.size)
+            valores.append(self._valor_indices(indices))
+            conteos.append(self.positivos.conteos)
+        valores = np.concatenate(valores)
+        acumulado = np.cumsum(np.concatenate(conteos))
+
+        resultado = []
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError("El cuantil debe estar entre 0 y 1")
+            rango = math.floor(q * (total - 1))
+            posicion = int(np.searchsorted(acumulado, rango, side='right'))
+            resultado.append(float(valores[min(posicion, valores.size - 1)]))
+        return resultado
+
+    def _indices(self, magnitudes):
+        if magnitudes.size == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+
+    def _valor_indices(self, indices):
+        # Punto de la cubeta (gamma^(i-1), gamma^i] que minimiza el error relativo
+        return 2.0 * np.power(self.gamma, indices.astype(np.float64)) / (self.gamma + 1)
+
+    def a_bytes(self):
+        """Serializa el sketch en un formato binario compacto."""
+        return (_CABECERA.pack(_VERSION_FORMATO, self.alpha, self.ceros)
+                + self.positivos.a_bytes() + self.negativos.a_bytes())
+
+    @classmethod
+    def desde_bytes(cls, datos):
+        """Reconstruye un sketch serializado con a_bytes()."""
+        version, alpha, ceros = _CABECERA.unpack_from(datos, 0)
+        if version != _VERSION_FORMATO:
+            raise ValueError(f"Versión de sketch no soportada: {version}")
+        sketch = cls(alpha)
+        sketch.ceros = ceros
+        posicion = _CABECERA.size
+        sketch.positivos, posicion = _Almacen.desde_bytes(datos, posicion)
+        sketch.negativos, posicion = _Almacen.desde_bytes(datos, posicion)
+        return sketch
+
+
+def fusionar_serializados(lista_bytes, alpha=ALPHA_POR_DEFECTO):
+    """Fusiona una secuencia de sketches serializados en un único DDSketch."""
+    resultado = DDSketch(alpha)
+    for datos in lista_bytes:
+        if datos:
+            resultado.fusionar(DDSketch.desde_bytes(datos))
+    return resultado
@@ -0,0 +1,111 @@
+"""
+Trabajos en segundo plano con estado persistido en la tabla 'trabajos'.
+
+Cada trabajo corre en un hilo del proceso que lo crea, con su propia sesión de
+base de datos, y va registrando su avance para que cualquier worker pueda
+responder a la consulta de estado. Las funciones de trabajo deben ser
+idempotentes: si el proceso muere a mitad, basta con lanzarlas de nuevo.
+"""
+import json
+import sys
+import threading
+import traceback
+from datetime import datetime
+
+from database import Session, Trabajo
+
+ESTADOS_TRABAJO = ('pendiente', 'en_curso', 'completado', 'error')
+
+
+class _Avance:
+    """Callable que recibe la función del trabajo para informar su progreso."""
+
+    def __init__(self, trabajo_id):
+        self.trabajo_id = trabajo_id
+
+    def __call__(self, progreso, total=None, mensaje=None):
+        _actualizar(self.trabajo_id, progreso=progreso, total=total, mensaje=mensaje)
+
+
+def _actualizar(trabajo_id, **campos):
+    sesion = Session()
+    try:
+        trabajo = sesion.query(Trabajo).get(trabajo_id)
+        if trabajo is None:
+            return
+        for campo, valor in campos.items():
+            if valor is not None:
+                setattr(trabajo, campo, valor)
+        sesion.commit()
+    except Exception as e:
+        sesion.rollback()
+        print(f"Error al actualizar el trabajo {trabajo_id}: {e}", file=sys.stderr)
+    finally:
+        sesion.close()
+
+
+def _ejecutar(trabajo_id, funcion):
+    _actualizar(trabajo_id, estado='en_curso', fecha_inicio=datetime.now())
+    try:
+        resultado = funcion(_Avance(trabajo_id))
+        _actualizar(trabajo_id, estado='completado', fecha_fin=datetime.now(),
+                    resultado=json.dumps(resultado, default=str) if resultado is not None else None)
+    except Exception as e:
+        print(f"Error en el trabajo {trabajo_id}: {e}", file=sys.stderr)
+        traceback.print_exc()
+        _actualizar(trabajo_id, estado='error', fecha_fin=datetime.now(), mensaje=str(e))
+
+
+def iniciar_trabajo(tipo, funcion, parametros=None, total=None):
+    """
+    Registra un trabajo y lo ejecuta en un hilo.
+
+    Args:
+        tipo: Nombre del tipo de trabajo (p. ej. 'eliminar_aire')
+        funcion: Callable que recibe avance(progreso, total=None, mensaje=None)
+            y devuelve un resultado serializable a JSON (o None)
+        parametros: Diccionario con los argumentos, para consulta
+        total: Total de unidades de trabajo, si se conoce de antemano
+
+    Returns:
+        ID del trabajo
+    """
+    sesion = Session()
+    try:
+        trabajo = Trabajo(tipo=tipo, estado='pendiente', total=total,
+                          parametros=json.dumps(parametros, default=str) if parametros else None)
+        sesion.add(trabajo)
+        sesion.commit()
+        trabajo_id = trabajo.id
+    finally:
+        sesion.close()
+
+    hilo = threading.Thread(target=_ejecutar, args=(trabajo_id, funcion),
+                            name=f'trabajo-{tipo}-{trabajo_id}', daemon=True)
+    hilo.start()
+    return trabajo_id
+
+
+def obtener_trabajo(trabajo_id):
+    """Devuelve el estado de un trabajo como diccionario, o None si no existe."""
+    sesion = Session()
+    try:
+        trabajo = sesion.query(Trabajo).get(trabajo_id)
+        if trabajo is None:
+            return None
+        return {
+            'id': trabajo.id,
+            'tipo': trabajo.tipo,
+            'estado': trabajo.estado,
+            'parametros': json.loads(trabajo.parametros) if trabajo.parametros else None,
+            'progreso': trabajo.progreso,
+            'total': trabajo.total,
+            'porcentaje': round(100.0 * trabajo.progreso / trabajo.total, 1) if trabajo.total else None,
+            'mensaje': trabajo.mensaje,
+            'resultado': json.loads(trabajo.resultado) if trabajo.resultado else None,
+            'fecha_creacion': trabajo.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S'),
+            'fecha_inicio': trabajo.fecha_inicio.strftime('%Y-%m-%d %H:%M:%S') if trabajo.fecha_inicio else None,
+            'fecha_fin': trabajo.fecha_fin.strftime('%Y-%m-%d %H:%M:%S') if trabajo.fecha_fin else None
+        }
+    finally:
+        sesion.close()
@@ -3,6 +3,7 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from series_temporales import estadisticas_ponderadas_tiempo
 
 def crear_grafico_temperatura_humedad(lecturas_df, aire_id=None, periodo='todo'):
     """
@@ -284,12 +285,16 @@ def crear_grafico_variacion(lecturas_df, aire_id=None, variable='temperatura'):
     
     return fig
 
-def generar_reporte_estadistico(lecturas_df):
+def generar_reporte_estadistico(lecturas_df, ponderado=False, metodo='trapecio', max_intervalo=None):
     """
     Genera un reporte estadístico completo de las lecturas
     
     Args:
         lecturas_df: DataFrame con las lecturas
+        ponderado: Si es True, promedio y desviación se ponderan por el tiempo
+            entre lecturas en lugar de por número de lecturas
+        metodo: 'trapecio' o 'escalon' (solo en modo ponderado)
+        max_intervalo: Segundos máximos atribuidos a un hueco entre lecturas (solo en modo ponderado)
     
     Returns:
         DataFrame con las estadísticas
@@ -308,6 +313,27 @@ def generar_reporte_estadistico(lecturas_df):
             'lecturas_totales': []
         })
     
+    if ponderado:
+        ponderadas = estadisticas_ponderadas_tiempo(
+            lecturas_df, agrupar_por='aire_id', metodo=metodo, max_intervalo=max_intervalo
+        )
+        stats = pd.DataFrame({
+            'aire_id': ponderadas.index,
+            'temperatura_promedio': ponderadas['temperatura_promedio'].to_numpy(),
+            'temperatura_min': ponderadas['temperatura_min'].to_numpy(),
+            'temperatura_max': ponderadas['temperatura_max'].to_numpy(),
+            'temperatura_std': ponderadas['temperatura_desviacion'].to_numpy(),
+            'humedad_promedio': ponderadas['humedad_promedio'].to_numpy(),
+            'humedad_min': ponderadas['humedad_min'].to_numpy(),
+            'humedad_max': ponderadas['humedad_max'].to_numpy(),
+            'humedad_std': ponderadas['humedad_desviacion'].to_numpy(),
+            'lecturas_totales': ponderadas['lecturas'].to_numpy()
+        }).sort_values('aire_id').reset_index(drop=True)
+        for col in stats.columns:
+            if col != 'aire_id' and col != 'lecturas_totales':
+                stats[col] = stats[col].round(2)
+        return stats
+
     # Agrupar por aire_id y calcular estadísticas
     stats = lecturas_df.groupby('aire_id').agg({
         'temperatura': ['mean', 'min', 'max', 'std'],
@@ -0,0 +1,245 @@
+"""
+Ventana caliente: las lecturas recientes de cada aire en memoria del proceso.
+
+Cada aire tiene un buffer circular de tamaño fijo (arrays NumPy de fechas,
+temperatura y humedad) que se carga de la base de datos la primera vez que se
+pide (o al calentar la ventana al arrancar) y se alimenta con las lecturas que
+ingesta este mismo proceso. Los cambios hechos por otros procesos llegan por el
+bus de notificaciones e invalidan el aire, que se recarga en la siguiente consulta.
+
+La memoria total está acotada: al superar el máximo se descartan los aires
+consultados hace más tiempo.
+"""
+import collections
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Bytes por lectura: fecha (int64 en segundos) + temperatura y humedad (float64)
+BYTES_POR_LECTURA = 24
+
+
+class _Anillo:
+    """Buffer circular de lecturas de un aire, siempre en orden de fecha."""
+    __slots__ = ('fechas', 'temperaturas', 'humedades', 'inicio', 'n', 'cubre_desde')
+
+    def __init__(self, capacidad):
+        self.fechas = np.zeros(capacidad, dtype=np.int64)
+        self.temperaturas = np.zeros(capacidad, dtype=np.float64)
+        self.humedades = np.zeros(capacidad, dtype=np.float64)
+        self.inicio = 0
+        self.n = 0
+        # Desde cuándo la ventana tiene todas las lecturas del aire (segundos)
+        self.cubre_desde = None
+
+    @property
+    def capacidad(self):
+        return len(self.fechas)
+
+    def ultima_fecha(self):
+        return self.fechas[(self.inicio + self.n - 1) % self.capacidad] if self.n else None
+
+    def agregar(self, fechas, temperaturas, humedades):
+        """Añade lecturas posteriores a la última; las más viejas se sobrescriben."""
+        k = len(fechas)
+        if k >= self.capacidad:
+            fechas, temperaturas, humedades = fechas[-self.capacidad:], temperaturas[-self.capacidad:], humedades[-self.capacidad:]
+            k = self.capacidad
+        posiciones = (self.inicio + self.n + np.arange(k)) % self.capacidad
+        self.fechas[posiciones] = fechas
+        self.temperaturas[posiciones] = temperaturas
+        self.humedades[posiciones] = humedades
+        sobrantes = max(self.n + k - self.capacidad, 0)
+        self.inicio = (self.inicio + sobrantes) % self.capacidad
+        self.n = min(self.n + k, self.capacidad)
+        if sobrantes:
+            self.cubre_desde = max(self.cubre_desde or 0, int(self.fechas[self.inicio]))
+
+    def ordenadas(self):
+        posiciones = (self.inicio + np.arange(self.n)) % self.capacidad
+        return self.fechas[posiciones], self.temperaturas[posiciones], self.humedades[posiciones]
+
+
+def _a_segundos(fechas):
+    return pd.to_datetime(fechas).to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+
+class VentanaCaliente:
+    """
+    Args:
+        cargar: Función (aire_ids, desde) -> DataFrame con aire_id, fecha, temperatura
+            y humedad, con a lo sumo 'lecturas_por_aire' lecturas (las más recientes) por aire
+        horas: Horas hacia atrás que se cargan de la base de datos
+        lecturas_por_aire: Capacidad del buffer de cada aire
+        max_bytes: Memoria máxima de todos los buffers
+    """
+
+    def __init__(self, cargar, horas=24, lecturas_por_aire=2880, max_bytes=64 * 1024 * 1024):
+        self.cargar = cargar
+        self.horas = horas
+        self.lecturas_por_aire = lecturas_por_aire
+        self.max_aires = max(int(max_bytes // (lecturas_por_aire * BYTES_POR_LECTURA)), 1)
+        self._anillos = collections.OrderedDict()
+        self._invalidos = set()
+        # Aires con una carga en curso y cambios recibidos mientras tanto: la consulta
+        # de la carga pudo no verlos, así que se invalidan al instalarla
+        self._cargando = collections.Counter()
+        self._cambiados_en_carga = set()
+        self._lock = threading.Lock()
+        self._metricas = {'aciertos': 0, 'fallos': 0, 'cargas': 0, 'descartados': 0}
+
+    def metricas(self):
+        with self._lock:
+            return dict(
+                self._metricas,
+                aires=len(self._anillos),
+                max_aires=self.max_aires,
+                lecturas=sum(anillo.n for anillo in self._anillos.values()),
+                bytes=len(self._anillos) * self.lecturas_por_aire * BYTES_POR_LECTURA
+            )
+
+    def calentar(self, aire_ids):
+        """Carga de una vez la ventana de varios aires (hasta el máximo de memoria)."""
+        aire_ids = list(aire_ids)[:self.max_aires]
+        if aire_ids:
+            self._cargar(aire_ids)
+
+    def _cargar(self, aire_ids):
+        desde = datetime.now() - timedelta(hours=self.horas)
+        with self._lock:
+            self._cargando.update(aire_ids)
+        try:
+            lecturas = self.cargar(aire_ids, desde)
+        except Exception:
+            with self._lock:
+                self._cargando.subtract(aire_ids)
+                self._cargando = +self._cargando
+            raise
+        segundos_desde = int(_a_segundos([desde])[0])
+        por_aire = dict(tuple(lecturas.groupby('aire_id'))) if not lecturas.empty else {}
+        with self._lock:
+            self._metricas['cargas'] += 1
+            self._cargando.subtract(aire_ids)
+            for aire_id in aire_ids:
+                anillo = _Anillo(self.lecturas_por_aire)
+                grupo = por_aire.get(aire_id)
+                if grupo is not None:
+                    grupo = grupo.sort_values('fecha')
+                    anillo.agregar(_a_segundos(grupo['fecha']), grupo['temperatura'].to_numpy(dtype=np.float64),
+                                   grupo['humedad'].to_numpy(dtype=np.float64))
+                # Con el buffer lleno puede faltar el principio del rango pedido
+                if anillo.n < anillo.capacidad:
+                    anillo.cubre_desde = segundos_desde
+                else:
+                    anillo.cubre_desde = int(anillo.ordenadas()[0][0])
+                self._instalar(aire_id, anillo)
+                if aire_id in self._cambiados_en_carga:
+                    self._invalidos.add(aire_id)
+                if self._cargando[aire_id] <= 0:
+                    del self._cargando[aire_id]
+                    self._cambiados_en_carga.discard(aire_id)
+
+    def _instalar(self, aire_id, anillo):
+        self._anillos[aire_id] = anillo
+        self._anillos.move_to_end(aire_id)
+        self._invalidos.discard(aire_id)
+        while len(self._anillos) > self.max_aires:
+            self._anillos.popitem(last=False)
+            self._metricas['descartados'] += 1
+
+    def agregar(self, lecturas_df):
+        """
+        Añade lecturas ya confirmadas en la base de datos. Solo se actualizan los aires
+        presentes en la ventana; una lectura anterior a la última del aire (carga
+        histórica o actualización) invalida el aire para recargarlo.
+        """
+        if lecturas_df is None or lecturas_df.empty:
+            return
+        with self._lock:
+            for aire_id, grupo in lecturas_df.groupby('aire_id'):
+                aire_id = int(aire_id)
+                if self._cargando[aire_id] > 0:
+                    self._cambiados_en_carga.add(aire_id)
+                anillo = self._anillos.get(aire_id)
+                if anillo is None or aire_id in self._invalidos:
+                    continue
+                grupo = grupo.sort_values('fecha')
+                fechas = _a_segundos(grupo['fecha'])
+                ultima = anillo.ultima_fecha()
+                if ultima is not None and fechas[0] <= ultima:
+                    self._invalidos.add(aire_id)
+                    continue
+                anillo.agregar(fechas, grupo['temperatura'].to_numpy(dtype=np.float64),
+                               grupo['humedad'].to_numpy(dtype=np.float64))
+
+    def invalidar(self, aire_id=None):
+        """Marca un aire (o todos) para recargarlo de la base de datos en su próxima consulta."""
+        with self._lock:
+            if aire_id is None:
+                self._invalidos.update(self._anillos)
+                self._cambiados_en_carga.update(+self._cargando)
+            else:
+                if aire_id in self._anillos:
+                    self._invalidos.add(aire_id)
+                if self._cargando[aire_id] > 0:
+                    self._cambiados_en_carga.add(aire_id)
+
+    def _anillo(self, aire_id):
+        with self._lock:
+            anillo = self._anillos.get(aire_id)
+            if anillo is not None and aire_id not in self._invalidos:
+                self._anillos.move_to_end(aire_id)
+                self._metricas['aciertos'] += 1
+                return anillo
+            self._metricas['fallos'] += 1
+        self._cargar([aire_id])
+        with self._lock:
+            return self._anillos.get(aire_id)
+
+    def obtener(self, aire_id, desde=None):
+        """
+        Lecturas del aire desde 'desde' (por defecto toda la ventana).
+
+        Returns:
+            DataFrame con fecha, temperatura y humedad, o None si la ventana no
+            cubre 'desde' (hay que consultar la base de datos)
+        """
+        anillo = self._anillo(aire_id)
+        if anillo is None:
+            return None
+        with self._lock:
+            segundos_desde = int(_a_segundos([desde])[0]) if desde is not None else anillo.cubre_desde
+            if anillo.cubre_desde is None or segundos_desde < anillo.cubre_desde:
+                return None
+            fechas, temperaturas, humedades = anillo.ordenadas()
+        corte = np.searchsorted(fechas, segundos_desde, side='left')
+        return pd.DataFrame({
+            'fecha': pd.to_datetime(fechas[corte:], unit='s'),
+            'temperatura': temperaturas[corte:],
+            'humedad': humedades[corte:],
+        })
+
+    def tasa_cambio(self, aire_id, minutos=30):
+        """
+        Pendiente (por hora) de temperatura y humedad en los últimos 'minutos',
+        por mínimos cuadrados sobre las lecturas de la ventana.
+
+        Returns:
+            Diccionario con 'temperatura_por_hora', 'humedad_por_hora' y 'lecturas',
+            o None si la ventana no cubre el periodo o hay menos de dos lecturas
+        """
+        lecturas = self.obtener(aire_id, desde=datetime.now() - timedelta(minutes=minutos))
+        if lecturas is None or len(lecturas) < 2:
+            return None
+        horas = _a_segundos(lecturas['fecha']).astype(np.float64) / 3600.0
+        horas -= horas.mean()
+        denominador = (horas * horas).sum()
+        if denominador == 0:
+            return None
+        return {
+            'temperatura_por_hora': round(float((horas * lecturas['temperatura'].to_numpy()).sum() / denominador), 3) + 0.0,
+            'humedad_por_hora': round(float((horas * lecturas['humedad'].to_numpy()).sum() / denominador), 3) + 0.0,
+            'lecturas': len(lecturas)
+        }
@@ -0,0 +1,86 @@
+"""
+Worker de ingesta: procesa las lecturas que POST /api/lecturas deja en la
+tabla ingest_queue cuando INGESTA_MODO=cola, y evalúa las reglas de alerta.
+
+Se pueden lanzar tantos procesos como se quiera, en una o varias máquinas:
+cada uno toma lotes distintos con FOR UPDATE SKIP LOCKED. Las reglas las evalúa
+uno solo (el que obtiene el bloqueo consultivo en PostgreSQL), así que con
+cualquier INGESTA_MODO debe haber al menos un worker en marcha para que se
+disparen las alertas.
+
+Uso (desde el directorio backend):
+    python worker.py [--lote 1000] [--espera 0.5] [--hasta-vaciar] [--sin-reglas]
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+from dotenv import load_dotenv
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+load_dotenv(dotenv_path=dotenv_path)
+
+from data_manager import DataManager
+
+_detener = False
+
+
+def _senal_detener(signum, frame):
+    global _detener
+    _detener = True
+    print(f"Señal {signum} recibida: terminando tras el lote en curso")
+
+
+def procesar(data_manager, max_lote=1000, espera=0.5, hasta_vaciar=False, max_intentos=3):
+    """
+    Procesa la cola hasta recibir SIGINT/SIGTERM (o hasta vaciarla).
+
+    Returns:
+        Número total de lecturas procesadas
+    """
+    total = 0
+    while not _detener:
+        procesadas = data_manager.procesar_cola_ingesta(max_lote=max_lote, max_intentos=max_intentos)
+        total += procesadas
+        if procesadas == 0:
+            if hasta_vaciar:
+                break
+            time.sleep(espera)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lote', type=int, default=int(os.environ.get('INGESTA_MAX_LOTE', 1000)),
+                        help='Lecturas por transacción')
+    parser.add_argument('--espera', type=float, default=0.5,
+                        help='Segundos de espera cuando la cola está vacía')
+    parser.add_argument('--hasta-vaciar', action='store_true',
+                        help='Terminar cuando la cola quede vacía')
+    parser.add_argument('--sin-reglas', action='store_true',
+                        help='No evaluar las reglas de alerta en este proceso')
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, _senal_detener)
+    signal.signal(signal.SIGINT, _senal_detener)
+
+    data_manager = DataManager()
+    # Las invalidaciones de caché de este proceso llegan a los workers web por el bus
+    evaluar_reglas = not (args.sin_reglas or args.hasta_vaciar)
+    if evaluar_reglas:
+        data_manager.iniciar_evaluador_reglas(float(os.environ.get('REGLAS_INTERVALO', 5)))
+    inicio = time.perf_counter()
+    try:
+        total = procesar(data_manager, max_lote=args.lote, espera=args.espera, hasta_vaciar=args.hasta_vaciar)
+    finally:
+        if evaluar_reglas:
+            data_manager.detener_evaluador_reglas()
+    duracion = time.perf_counter() - inicio
+    data_manager.guardar_estado_anomalias()
+    print(f"Worker de ingesta terminado: {total} lecturas en {duracion:.1f}s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
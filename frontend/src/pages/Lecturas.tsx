@@ -204,7 +204,8 @@ const Lecturas: React.FC = () => {
         humedad: humedadNum
       };
 
-      const response = await api.post('/lecturas', payload);
+      // confirmar=true: con ingesta diferida espera al commit para recibir el ID
+      const response = await api.post('/lecturas?confirmar=true', payload);
 
       // Obtener aire correspondiente
       const aire = aires.find(a => a.id === payload.aire_id);